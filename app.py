@@ -1,1185 +1,2063 @@
-import streamlit as st
-from supabase import create_client
-import os
-from dotenv import load_dotenv
-from datetime import datetime
-import json
-from PIL import Image
-import io
-from openai import OpenAI
-
-# Carica variabili ambiente
-load_dotenv()
-
-# Configurazione pagina
-st.set_page_config(
-    page_title="DVR PRO - Paradigma+",
-    page_icon="🛡️",
-    layout="wide",
-    initial_sidebar_state="collapsed"
-)
-
-# CSS Personalizzato con colori Paradigma+
-st.markdown("""
-<style>
-    /* Colori Paradigma+ */
-    :root {
-        --primary: #1B3A57;
-        --accent: #FF6B6B;
-        --bg: #F8F9FA;
-    }
-    
-    /* Header personalizzato */
-    .main-header {
-        background: linear-gradient(135deg, #1B3A57 0%, #2C5F8D 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-        color: white;
-        text-align: center;
-    }
-    
-    .main-header h1 {
-        margin: 0;
-        font-size: 2.5rem;
-        font-weight: 700;
-    }
-    
-    .accent-text {
-        color: #FF6B6B;
-        font-weight: 600;
-    }
-    
-    /* Bottoni */
-    .stButton>button {
-        background: linear-gradient(135deg, #FF6B6B 0%, #FF8E8E 100%);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.75rem 2rem;
-        font-weight: 600;
-        transition: all 0.3s;
-    }
-    
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 5px 15px rgba(255, 107, 107, 0.3);
-    }
-    
-    /* Tab styling */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 2rem;
-        background-color: white;
-        padding: 1rem;
-        border-radius: 10px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        height: 60px;
-        background-color: transparent;
-        border-radius: 8px;
-        color: #1B3A57;
-        font-weight: 600;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(135deg, #1B3A57 0%, #2C5F8D 100%);
-        color: white !important;
-    }
-    
-    /* Sezioni */
-    .section-header {
-        background: #1B3A57;
-        color: white;
-        padding: 1rem;
-        border-radius: 8px 8px 0 0;
-        margin-top: 1.5rem;
-        font-weight: 600;
-    }
-    
-    .section-content {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 0 0 8px 8px;
-        border: 2px solid #E5E7EB;
-    }
-    
-    /* Alert successo */
-    .success-message {
-        background: #10B981;
-        color: white;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-    }
-    
-    /* Report Box */
-    .report-box {
-        background: #F9FAFB;
-        border: 2px solid #E5E7EB;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 0.5rem 0;
-    }
-    
-    .report-title {
-        font-weight: 600;
-        color: #1B3A57;
-        margin-bottom: 0.5rem;
-    }
-    
-    /* Mobile responsive */
-    @media (max-width: 768px) {
-        .main-header h1 {
-            font-size: 1.8rem;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Inizializza Supabase
-@st.cache_resource
-def init_supabase():
-    return create_client(
-        os.getenv("SUPABASE_URL"),
-        os.getenv("SUPABASE_KEY")
-    )
-
-supabase = init_supabase()
-
-# Inizializza OpenAI per Whisper
-@st.cache_resource
-def init_openai():
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-openai_client = init_openai()
-
-# Inizializza session state
-if 'checklist_id' not in st.session_state:
-    st.session_state.checklist_id = None
-if 'checklist_data' not in st.session_state:
-    st.session_state.checklist_data = {}
-
-# Header
-st.markdown("""
-<div class="main-header">
-    <h1>🛡️ DVR PRO - <span class="accent-text">PARADIGMA+</span></h1>
-    <p style="margin: 0.5rem 0 0 0; opacity: 0.9;">Sistema Intelligente Valutazione Rischi</p>
-</div>
-""", unsafe_allow_html=True)
-
-# Funzioni helper
-def save_checklist(data):
-    """Salva checklist in Supabase"""
-    try:
-        data['updated_at'] = datetime.now().isoformat()
-        
-        if st.session_state.checklist_id:
-            # Update
-            result = supabase.table('checklists').update(data).eq('id', st.session_state.checklist_id).execute()
-        else:
-            # Insert
-            result = supabase.table('checklists').insert(data).execute()
-            st.session_state.checklist_id = result.data[0]['id']
-        
-        return True
-    except Exception as e:
-        st.error(f"Errore salvataggio: {e}")
-        return False
-
-def upload_file_to_supabase(file, path):
-    """Upload file su Supabase Storage"""
-    try:
-        file_bytes = file.read()
-        file_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.name}"
-        full_path = f"{path}/{file_name}"
-        
-        supabase.storage.from_('checklist-files').upload(full_path, file_bytes)
-        
-        # Get public URL
-        url = supabase.storage.from_('checklist-files').get_public_url(full_path)
-        return url
-    except Exception as e:
-        st.error(f"Errore upload: {e}")
-        return None
-
-def transcribe_audio(audio_file):
-    """Trascrizione audio con Whisper"""
-    try:
-        transcript = openai_client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            language="it"
-        )
-        return transcript.text
-    except Exception as e:
-        st.error(f"Errore trascrizione: {e}")
-        return None
-
-# Sidebar - Selezione/Creazione Checklist
-with st.sidebar:
-    st.image("https://via.placeholder.com/200x80/1B3A57/FFFFFF?text=PARADIGMA%2B", use_container_width=True)
-    
-    st.markdown("### 📋 Gestione Checklist")
-    
-    # Nuova checklist
-    if st.button("➕ Nuova Checklist", use_container_width=True):
-        st.session_state.checklist_id = None
-        st.session_state.checklist_data = {}
-        st.rerun()
-    
-    # Carica checklist esistenti
-    try:
-        checklists = supabase.table('checklists').select('id, ragione_sociale, created_at, status').order('created_at', desc=True).limit(10).execute()
-        
-        if checklists.data:
-            st.markdown("### 📂 Checklist Recenti")
-            for cl in checklists.data:
-                status_emoji = "✅" if cl['status'] == 'completa' else "⏳"
-                if st.button(f"{status_emoji} {cl['ragione_sociale'][:20]}", key=cl['id'], use_container_width=True):
-                    st.session_state.checklist_id = cl['id']
-                    # Carica dati
-                    result = supabase.table('checklists').select('*').eq('id', cl['id']).execute()
-                    st.session_state.checklist_data = result.data[0]
-                    st.rerun()
-    except:
-        pass
-
-# Main content
-tab1, tab2, tab3, tab4 = st.tabs(["📍 SOPRALLUOGO", "💻 COMPLETAMENTO", "📊 REPORT FINALE", "🚀 GENERA DVR"])
-
-# ============================================
-# TAB 1: SOPRALLUOGO
-# ============================================
-with tab1:
-    st.markdown('<div class="section-header">🏢 DATI AZIENDA</div>', unsafe_allow_html=True)
-    
-    with st.container():
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            ragione_sociale = st.text_input(
-                "Ragione Sociale",
-                value=st.session_state.checklist_data.get('ragione_sociale', ''),
-                key='ragione_sociale'
-            )
-            
-            ateco = st.text_input(
-                "Codice ATECO",
-                value=st.session_state.checklist_data.get('ateco', ''),
-                placeholder="Es: 25.11.00",
-                key='ateco'
-            )
-            
-            datore_lavoro = st.text_input(
-                "Datore di Lavoro",
-                value=st.session_state.checklist_data.get('datore_lavoro', {}).get('nome', '') if isinstance(st.session_state.checklist_data.get('datore_lavoro'), dict) else '',
-                key='datore_lavoro'
-            )
-        
-        with col2:
-            sede = st.text_area(
-                "Sede Operativa",
-                value=st.session_state.checklist_data.get('sede', ''),
-                height=100,
-                placeholder="Via, Città, CAP, Provincia",
-                key='sede'
-            )
-            
-            n_dipendenti = st.number_input(
-                "Numero Dipendenti",
-                min_value=0,
-                value=st.session_state.checklist_data.get('n_dipendenti', 0),
-                key='n_dipendenti'
-            )
-            
-            rspp_tipo = st.selectbox(
-                "RSPP",
-                ["Datore Lavoro", "Interno", "Esterno"],
-                index=0,
-                key='rspp_tipo'
-            )
-    
-    # LUOGHI DI LAVORO - NUOVA SEZIONE
-    st.markdown('<div class="section-header">🏭 LUOGHI DI LAVORO</div>', unsafe_allow_html=True)
-    
-    if 'luoghi_lavoro' not in st.session_state:
-        st.session_state.luoghi_lavoro = st.session_state.checklist_data.get('luoghi_lavoro', [])
-    
-    with st.expander("➕ Aggiungi Luogo di Lavoro"):
-        luogo_nome = st.text_input("Nome Luogo", placeholder="Es: Ufficio Amministrativo, Magazzino, Officina...", key='new_luogo_nome')
-        luogo_mq = st.number_input("Superficie (mq)", min_value=0, key='new_luogo_mq')
-        luogo_note = st.text_area("Note Descrittive", placeholder="Caratteristiche, layout, particolarità...", key='new_luogo_note')
-        
-        # Audio per descrizione
-        st.markdown("**🎤 Dettatura Vocale**")
-        luogo_audio = st.file_uploader("Registra descrizione vocale", type=['mp3', 'wav', 'm4a'], key='new_luogo_audio')
-        
-        if luogo_audio:
-            with st.spinner("Trascrizione in corso..."):
-                trascrizione = transcribe_audio(luogo_audio)
-                if trascrizione:
-                    st.success("✅ Trascrizione completata!")
-                    luogo_note = st.text_area("Trascrizione", value=trascrizione, key='new_luogo_note_transcript')
-        
-        luogo_foto = st.file_uploader("📷 Foto Luogo", type=['jpg', 'png'], accept_multiple_files=True, key='new_luogo_foto')
-        
-        if st.button("✅ Aggiungi Luogo"):
-            if luogo_nome:
-                nuovo_luogo = {
-                    'nome': luogo_nome,
-                    'superficie_mq': luogo_mq,
-                    'note': luogo_note,
-                    'foto': []
-                }
-                st.session_state.luoghi_lavoro.append(nuovo_luogo)
-                st.success(f"✅ Luogo {luogo_nome} aggiunto!")
-                st.rerun()
-    
-    if st.session_state.luoghi_lavoro:
-        for idx, luogo in enumerate(st.session_state.luoghi_lavoro):
-            with st.expander(f"🏭 {luogo['nome']} - {luogo.get('superficie_mq', 0)} mq"):
-                st.write(f"**Note:** {luogo.get('note', 'N/A')}")
-                if st.button("🗑️ Rimuovi", key=f'remove_luogo_{idx}'):
-                    st.session_state.luoghi_lavoro.pop(idx)
-                    st.rerun()
-    
-    # DIPENDENTI
-    st.markdown('<div class="section-header">👥 ELENCO DIPENDENTI</div>', unsafe_allow_html=True)
-    
-    if 'dipendenti' not in st.session_state:
-        st.session_state.dipendenti = st.session_state.checklist_data.get('dipendenti', [])
-    
-    # Aggiungi dipendente
-    with st.expander("➕ Aggiungi Dipendente"):
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            dip_nome = st.text_input("Nome", key='new_dip_nome')
-        with col2:
-            dip_cognome = st.text_input("Cognome", key='new_dip_cognome')
-        with col3:
-            dip_mansione = st.text_input("Mansione", key='new_dip_mansione')
-        
-        st.markdown("**📄 Documenti**")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            doc_id = st.file_uploader("Carta Identità", type=['pdf', 'jpg', 'png'], key='new_dip_id')
-        with col2:
-            doc_formazione = st.file_uploader("Attestati Formazione", type=['pdf', 'jpg', 'png'], accept_multiple_files=True, key='new_dip_form')
-        with col3:
-            doc_idoneita = st.file_uploader("Idoneità Sanitaria", type=['pdf', 'jpg', 'png'], key='new_dip_idon')
-        
-        if st.button("✅ Aggiungi Dipendente"):
-            if dip_nome or dip_cognome:
-                nuovo_dip = {
-                    'nome': dip_nome,
-                    'cognome': dip_cognome,
-                    'mansione': dip_mansione,
-                    'documenti': []
-                }
-                st.session_state.dipendenti.append(nuovo_dip)
-                st.success(f"✅ Dipendente {dip_nome} {dip_cognome} aggiunto!")
-                st.rerun()
-    
-    # Lista dipendenti
-    if st.session_state.dipendenti:
-        for idx, dip in enumerate(st.session_state.dipendenti):
-            with st.expander(f"👤 {dip['nome']} {dip['cognome']} - {dip.get('mansione', 'N/A')}"):
-                if st.button("🗑️ Rimuovi", key=f'remove_dip_{idx}'):
-                    st.session_state.dipendenti.pop(idx)
-                    st.rerun()
-    
-    # ATTREZZATURE
-    st.markdown('<div class="section-header">⚙️ ELENCO ATTREZZATURE</div>', unsafe_allow_html=True)
-    
-    if 'attrezzature' not in st.session_state:
-        st.session_state.attrezzature = st.session_state.checklist_data.get('attrezzature', [])
-    
-    with st.expander("➕ Aggiungi Attrezzatura"):
-        col1, col2 = st.columns(2)
-        with col1:
-            attr_nome = st.text_input("Nome Attrezzatura", key='new_attr_nome')
-            attr_marca = st.text_input("Marca", key='new_attr_marca')
-        with col2:
-            attr_modello = st.text_input("Modello", key='new_attr_modello')
-            attr_note = st.text_area("Note", key='new_attr_note', height=80)
-        
-        attr_foto = st.file_uploader("📷 Foto Attrezzatura", type=['jpg', 'png'], accept_multiple_files=True, key='new_attr_foto')
-        
-        if st.button("✅ Aggiungi Attrezzatura"):
-            if attr_nome:
-                nuova_attr = {
-                    'nome': attr_nome,
-                    'marca': attr_marca,
-                    'modello': attr_modello,
-                    'note': attr_note,
-                    'foto': []
-                }
-                st.session_state.attrezzature.append(nuova_attr)
-                st.success(f"✅ Attrezzatura {attr_nome} aggiunta!")
-                st.rerun()
-    
-    if st.session_state.attrezzature:
-        for idx, attr in enumerate(st.session_state.attrezzature):
-            with st.expander(f"⚙️ {attr['nome']} - {attr.get('marca', '')} {attr.get('modello', '')}"):
-                st.write(f"**Note:** {attr.get('note', 'N/A')}")
-                if st.button("🗑️ Rimuovi", key=f'remove_attr_{idx}'):
-                    st.session_state.attrezzature.pop(idx)
-                    st.rerun()
-    
-    # ANTINCENDIO
-    st.markdown('<div class="section-header">🔥 CHECK ANTINCENDIO</div>', unsafe_allow_html=True)
-    
-    soggetta_scia = st.radio(
-        "Azienda soggetta a SCIA antincendio?",
-        ["Sì", "No", "Da verificare"],
-        key='soggetta_scia'
-    )
-    
-    if soggetta_scia == "No":
-        st.info("📋 Verifica Conformità Mini Codice D.M. 03/09/2021")
-        
-        check_items = [
-            "Reazione al fuoco materiali conforme",
-            "Compartimentazione adeguata",
-            "Vie di esodo libere e segnalate",
-            "Estintori adeguati e verificati",
-            "Segnaletica sicurezza conforme",
-            "Illuminazione emergenza funzionante"
-        ]
-        
-        checks = {}
-        for item in check_items:
-            checks[item] = st.checkbox(item, key=f'check_{item}')
-        
-        nc_antincendio = st.text_area("❌ Non Conformità Rilevate", key='nc_antincendio')
-    
-    # RISCHI ESTESO CON NOTE
-    st.markdown('<div class="section-header">⚠️ VALUTAZIONE RISCHI DETTAGLIATA</div>', unsafe_allow_html=True)
-    
-    rischi_completi = [
-        "Scivolamento e cadute a livello",
-        "Cadute dall'alto",
-        "Urti, colpi, impatti, compressioni",
-        "Tagli, punture, abrasioni",
-        "Schiacciamento",
-        "Elettrico",
-        "Rumore",
-        "Vibrazioni",
-        "Rischio chimico",
-        "Movimentazione Manuale Carichi (MMC)",
-        "Videoterminali (VDT)",
-        "Lavori in quota",
-        "Incendio ed esplosione",
-        "Biologico",
-        "Radiazioni",
-        "Microclima",
-        "Illuminazione",
-        "Stress lavoro-correlato",
-        "Posture incongrue",
-        "Lavoro notturno",
-        "Lavoro solitario",
-        "Differenze di genere, età, provenienza"
-    ]
-    
-    if 'rischi_selezionati' not in st.session_state:
-        st.session_state.rischi_selezionati = st.session_state.checklist_data.get('rischi_selezionati', {})
-    
-    st.markdown("**Seleziona i rischi presenti e aggiungi note per ognuno:**")
-    
-    # Mostra rischi in colonne
-    col1, col2, col3 = st.columns(3)
-    
-    for idx, rischio in enumerate(rischi_completi):
-        with [col1, col2, col3][idx % 3]:
-            is_selected = st.checkbox(rischio, value=rischio in st.session_state.rischi_selezionati, key=f'rischio_check_{idx}')
-            
-            if is_selected:
-                note = st.text_area(
-                    f"Note per '{rischio}'",
-                    value=st.session_state.rischi_selezionati.get(rischio, {}).get('note', ''),
-                    key=f'rischio_note_{idx}',
-                    height=100,
-                    placeholder="Descrivi il rischio specifico, la gravità, le misure..."
-                )
-                
-                # Audio per note rischio
-                audio_rischio = st.file_uploader(
-                    f"🎤 Dettatura per '{rischio}'",
-                    type=['mp3', 'wav', 'm4a'],
-                    key=f'rischio_audio_{idx}'
-                )
-                
-                if audio_rischio:
-                    with st.spinner("Trascrizione in corso..."):
-                        trascrizione = transcribe_audio(audio_rischio)
-                        if trascrizione:
-                            st.success("✅ Trascrizione completata!")
-                            note = st.text_area(
-                                f"Trascrizione '{rischio}'",
-                                value=trascrizione,
-                                key=f'rischio_note_transcript_{idx}'
-                            )
-                
-                st.session_state.rischi_selezionati[rischio] = {
-                    'presente': True,
-                    'note': note
-                }
-            elif rischio in st.session_state.rischi_selezionati:
-                del st.session_state.rischi_selezionati[rischio]
-    
-    # FOTO GENERALI
-    st.markdown('<div class="section-header">📷 FOTO AMBIENTI</div>', unsafe_allow_html=True)
-    
-    foto_ambienti = st.file_uploader(
-        "Carica foto ambienti di lavoro",
-        type=['jpg', 'png'],
-        accept_multiple_files=True,
-        key='foto_ambienti'
-    )
-    
-    # NON CONFORMITÀ
-    st.markdown('<div class="section-header">❌ NON CONFORMITÀ RILEVATE</div>', unsafe_allow_html=True)
-    
-    if 'non_conformita' not in st.session_state:
-        st.session_state.non_conformita = st.session_state.checklist_data.get('non_conformita', [])
-    
-    with st.expander("➕ Aggiungi Non Conformità"):
-        nc_desc = st.text_area("Descrizione Non Conformità", key='new_nc_desc')
-        
-        # Audio per NC
-        nc_audio = st.file_uploader("🎤 Dettatura NC", type=['mp3', 'wav', 'm4a'], key='new_nc_audio')
-        
-        if nc_audio:
-            with st.spinner("Trascrizione in corso..."):
-                trascrizione = transcribe_audio(nc_audio)
-                if trascrizione:
-                    st.success("✅ Trascrizione completata!")
-                    nc_desc = st.text_area("Trascrizione NC", value=trascrizione, key='new_nc_desc_transcript')
-        
-        nc_priorita = st.select_slider("Priorità", options=["Bassa", "Media", "Alta"], key='new_nc_priorita')
-        nc_foto = st.file_uploader("Foto NC", type=['jpg', 'png'], key='new_nc_foto')
-        
-        if st.button("✅ Aggiungi NC"):
-            if nc_desc:
-                nuova_nc = {
-                    'descrizione': nc_desc,
-                    'priorita': nc_priorita,
-                    'foto_url': None
-                }
-                st.session_state.non_conformita.append(nuova_nc)
-                st.success("✅ Non conformità aggiunta!")
-                st.rerun()
-    
-    if st.session_state.non_conformita:
-        for idx, nc in enumerate(st.session_state.non_conformita):
-            priority_emoji = {"Bassa": "🟢", "Media": "🟡", "Alta": "🔴"}
-            with st.expander(f"{priority_emoji[nc['priorita']]} {nc['descrizione'][:50]}..."):
-                st.write(f"**Priorità:** {nc['priorita']}")
-                if st.button("🗑️ Rimuovi", key=f'remove_nc_{idx}'):
-                    st.session_state.non_conformita.pop(idx)
-                    st.rerun()
-    
-    # NOTE
-    note_sopralluogo = st.text_area(
-        "📝 Note Sopralluogo",
-        value=st.session_state.checklist_data.get('note_sopralluogo', ''),
-        height=150,
-        key='note_sopralluogo'
-    )
-    
-    # SALVA
-    st.markdown("---")
-    if st.button("💾 SALVA SOPRALLUOGO", type="primary", use_container_width=True):
-        data_to_save = {
-            'ragione_sociale': ragione_sociale,
-            'sede': sede,
-            'ateco': ateco,
-            'n_dipendenti': n_dipendenti,
-            'datore_lavoro': {'nome': datore_lavoro},
-            'rspp': {'tipo': rspp_tipo},
-            'luoghi_lavoro': st.session_state.luoghi_lavoro,
-            'dipendenti': st.session_state.dipendenti,
-            'attrezzature': st.session_state.attrezzature,
-            'soggetta_scia_antincendio': soggetta_scia,
-            'rischi_selezionati': st.session_state.rischi_selezionati,
-            'non_conformita': st.session_state.non_conformita,
-            'note_sopralluogo': note_sopralluogo,
-            'status': 'bozza'
-        }
-        
-        if save_checklist(data_to_save):
-            st.markdown('<div class="success-message">✅ Sopralluogo salvato con successo!</div>', unsafe_allow_html=True)
-
-# ============================================
-# TAB 2: COMPLETAMENTO
-# ============================================
-with tab2:
-    if not st.session_state.checklist_id:
-        st.warning("⚠️ Completa prima il sopralluogo nel Tab 1")
-    else:
-        # OFFERTA COMMERCIALE - NUOVA SEZIONE
-        st.markdown('<div class="section-header">💼 OFFERTA COMMERCIALE SERVIZI</div>', unsafe_allow_html=True)
-        
-        if 'servizi_offerta' not in st.session_state:
-            st.session_state.servizi_offerta = st.session_state.checklist_data.get('servizi_offerta', [])
-        
-        with st.expander("➕ Aggiungi Servizio"):
-            serv_nome = st.text_input("Nome Servizio", placeholder="Es: Piano Emergenza, Formazione Antincendio, Visite Mediche...", key='new_serv_nome')
-            serv_categoria = st.selectbox(
-                "Categoria Servizio",
-                ["📄 DOCUMENTO", "🎓 FORMAZIONE", "🏥 SORVEGLIANZA SANITARIA"],
-                key='new_serv_cat'
-            )
-            
-            # Campi specifici per categoria
-            if serv_categoria == "📄 DOCUMENTO":
-                serv_ore = st.number_input("Ore necessarie per produzione documento", min_value=0.5, step=0.5, key='new_serv_ore')
-                serv_dettaglio = f"{serv_ore} ore"
-                
-            elif serv_categoria == "🎓 FORMAZIONE":
-                serv_n_persone = st.number_input("Numero persone da formare", min_value=1, key='new_serv_persone')
-                serv_ore_corso = st.number_input("Ore corso", min_value=1, key='new_serv_ore_corso')
-                serv_dettaglio = f"{serv_n_persone} persone - {serv_ore_corso}h"
-                
-            elif serv_categoria == "🏥 SORVEGLIANZA SANITARIA":
-                st.markdown("**Dipendenti per mansione:**")
-                mansioni_ss = {}
-                n_mansioni_ss = st.number_input("Quante mansioni diverse?", min_value=1, max_value=10, key='new_serv_n_mans')
-                
-                for i in range(int(n_mansioni_ss)):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        mans_nome = st.text_input(f"Mansione {i+1}", key=f'new_serv_mans_{i}')
-                    with col2:
-                        mans_n_dip = st.number_input(f"N. dipendenti", min_value=1, key=f'new_serv_ndip_{i}')
-                    
-                    if mans_nome:
-                        mansioni_ss[mans_nome] = mans_n_dip
-                
-                serv_dettaglio = json.dumps(mansioni_ss)
-            
-            serv_note = st.text_area("Note aggiuntive", key='new_serv_note')
-            serv_prezzo = st.number_input("Prezzo indicativo (€)", min_value=0.0, step=50.0, key='new_serv_prezzo')
-            
-            if st.button("✅ Aggiungi Servizio"):
-                if serv_nome:
-                    nuovo_servizio = {
-                        'nome': serv_nome,
-                        'categoria': serv_categoria,
-                        'dettaglio': serv_dettaglio,
-                        'note': serv_note,
-                        'prezzo': serv_prezzo
-                    }
-                    st.session_state.servizi_offerta.append(nuovo_servizio)
-                    st.success(f"✅ Servizio {serv_nome} aggiunto!")
-                    st.rerun()
-        
-        if st.session_state.servizi_offerta:
-            st.markdown("### 📋 Servizi in Offerta")
-            
-            # Raggruppa per categoria
-            documenti = [s for s in st.session_state.servizi_offerta if s['categoria'] == "📄 DOCUMENTO"]
-            formazione = [s for s in st.session_state.servizi_offerta if s['categoria'] == "🎓 FORMAZIONE"]
-            sorveglianza = [s for s in st.session_state.servizi_offerta if s['categoria'] == "🏥 SORVEGLIANZA SANITARIA"]
-            
-            if documenti:
-                st.markdown("#### 📄 Documenti")
-                for idx, serv in enumerate(documenti):
-                    with st.expander(f"{serv['nome']} - {serv['dettaglio']} - €{serv['prezzo']}"):
-                        st.write(f"**Note:** {serv.get('note', 'N/A')}")
-                        if st.button("🗑️ Rimuovi", key=f'remove_serv_doc_{idx}'):
-                            st.session_state.servizi_offerta.remove(serv)
-                            st.rerun()
-            
-            if formazione:
-                st.markdown("#### 🎓 Formazione")
-                for idx, serv in enumerate(formazione):
-                    with st.expander(f"{serv['nome']} - {serv['dettaglio']} - €{serv['prezzo']}"):
-                        st.write(f"**Note:** {serv.get('note', 'N/A')}")
-                        if st.button("🗑️ Rimuovi", key=f'remove_serv_form_{idx}'):
-                            st.session_state.servizi_offerta.remove(serv)
-                            st.rerun()
-            
-            if sorveglianza:
-                st.markdown("#### 🏥 Sorveglianza Sanitaria")
-                for idx, serv in enumerate(sorveglianza):
-                    with st.expander(f"{serv['nome']} - €{serv['prezzo']}"):
-                        try:
-                            mansioni = json.loads(serv['dettaglio'])
-                            for mans, n in mansioni.items():
-                                st.write(f"- {mans}: {n} dipendenti")
-                        except:
-                            st.write(serv['dettaglio'])
-                        st.write(f"**Note:** {serv.get('note', 'N/A')}")
-                        if st.button("🗑️ Rimuovi", key=f'remove_serv_ss_{idx}'):
-                            st.session_state.servizi_offerta.remove(serv)
-                            st.rerun()
-            
-            # Totale offerta
-            totale_offerta = sum(s['prezzo'] for s in st.session_state.servizi_offerta)
-            st.markdown(f"### 💰 Totale Offerta: **€ {totale_offerta:,.2f}**")
-        
-        # FORMAZIONE OBBLIGATORIA
-        st.markdown('<div class="section-header">🎓 FORMAZIONE OBBLIGATORIA</div>', unsafe_allow_html=True)
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("🔥 Antincendio")
-            livello_antincendio = st.selectbox(
-                "Livello Formazione Richiesto",
-                ["Livello 1 (4h)", "Livello 2 (8h)", "Livello 3 (16h)", "Non necessario"],
-                key='livello_antincendio'
-            )
-            note_antincendio = st.text_area("Note", key='note_antincendio')
-        
-        with col2:
-            st.subheader("🚑 Primo Soccorso")
-            gruppo_ps = st.selectbox(
-                "Gruppo Azienda",
-                ["Gruppo A (16h)", "Gruppo B (12h)", "Gruppo C (12h)", "Non necessario"],
-                key='gruppo_ps'
-            )
-            note_ps = st.text_area("Note", key='note_ps')
-        
-        # MANSIONI
-        st.markdown('<div class="section-header">👷 MANSIONI AZIENDALI</div>', unsafe_allow_html=True)
-        
-        if 'mansioni' not in st.session_state:
-            st.session_state.mansioni = st.session_state.checklist_data.get('mansioni', [])
-        
-        with st.expander("➕ Aggiungi Mansione"):
-            mans_nome = st.text_input("Nome Mansione", placeholder="Es: Operaio Generico", key='new_mans_nome')
-            mans_n_lav = st.number_input("N. Lavoratori", min_value=0, key='new_mans_n')
-            
-            st.markdown("**🎤 Descrizione Dettagliata Mansione**")
-            st.info("💡 Usa il microfono per dettare la descrizione completa")
-            
-            mans_desc = st.text_area(
-                "Descrizione",
-                placeholder="Descrivi dettagliatamente: attività svolte, responsabilità, attrezzature utilizzate, rischi specifici...",
-                height=200,
-                key='new_mans_desc'
-            )
-            
-            # Audio per mansione
-            mans_audio = st.file_uploader("🎤 Dettatura Mansione", type=['mp3', 'wav', 'm4a'], key='new_mans_audio')
-            
-            if mans_audio:
-                with st.spinner("Trascrizione in corso..."):
-                    trascrizione = transcribe_audio(mans_audio)
-                    if trascrizione:
-                        st.success("✅ Trascrizione completata!")
-                        mans_desc = st.text_area("Trascrizione Mansione", value=trascrizione, key='new_mans_desc_transcript')
-            
-            if st.button("✅ Aggiungi Mansione"):
-                if mans_nome:
-                    nuova_mans = {
-                        'nome': mans_nome,
-                        'n_lavoratori': mans_n_lav,
-                        'descrizione': mans_desc
-                    }
-                    st.session_state.mansioni.append(nuova_mans)
-                    st.success(f"✅ Mansione {mans_nome} aggiunta!")
-                    st.rerun()
-        
-        if st.session_state.mansioni:
-            st.markdown("### 📋 Mansioni Inserite")
-            for idx, mans in enumerate(st.session_state.mansioni):
-                with st.expander(f"👷 {mans['nome']} ({mans['n_lavoratori']} lavoratori)"):
-                    st.write(f"**Descrizione:** {mans['descrizione'][:200]}..." if len(mans['descrizione']) > 200 else mans['descrizione'])
-                    if st.button("🗑️ Rimuovi", key=f'remove_mans_{idx}'):
-                        st.session_state.mansioni.pop(idx)
-                        st.rerun()
-        
-        # DESCRIZIONI DETTAGLIATE
-        st.markdown('<div class="section-header">📝 DESCRIZIONI DETTAGLIATE</div>', unsafe_allow_html=True)
-        
-        st.markdown("**🎤 Descrizione Luoghi di Lavoro**")
-        desc_luoghi = st.text_area(
-            "Descrivi i luoghi di lavoro",
-            value=st.session_state.checklist_data.get('desc_luoghi_lavoro', ''),
-            height=200,
-            placeholder="Usa microfono per descrivere ambienti, layout, caratteristiche...",
-            key='desc_luoghi'
-        )
-        
-        # Audio per luoghi
-        audio_luoghi = st.file_uploader("🎤 Dettatura Luoghi", type=['mp3', 'wav', 'm4a'], key='audio_luoghi')
-        
-        if audio_luoghi:
-            with st.spinner("Trascrizione in corso..."):
-                trascrizione = transcribe_audio(audio_luoghi)
-                if trascrizione:
-                    st.success("✅ Trascrizione completata!")
-                    desc_luoghi = st.text_area("Trascrizione Luoghi", value=trascrizione, key='desc_luoghi_transcript')
-        
-        st.markdown("**🎤 Ciclo Lavorativo Generale**")
-        ciclo_lav = st.text_area(
-            "Descrivi il ciclo lavorativo",
-            value=st.session_state.checklist_data.get('ciclo_lavorativo', ''),
-            height=200,
-            placeholder="Usa microfono per descrivere il processo produttivo generale...",
-            key='ciclo_lav'
-        )
-        
-        # Audio per ciclo
-        audio_ciclo = st.file_uploader("🎤 Dettatura Ciclo", type=['mp3', 'wav', 'm4a'], key='audio_ciclo')
-        
-        if audio_ciclo:
-            with st.spinner("Trascrizione in corso..."):
-                trascrizione = transcribe_audio(audio_ciclo)
-                if trascrizione:
-                    st.success("✅ Trascrizione completata!")
-                    ciclo_lav = st.text_area("Trascrizione Ciclo", value=trascrizione, key='ciclo_lav_transcript')
-        
-        st.markdown("**🎤 Misure di Prevenzione Presenti**")
-        misure_prev = st.text_area(
-            "Descrivi misure già presenti",
-            value=st.session_state.checklist_data.get('misure_prevenzione', ''),
-            height=200,
-            placeholder="Usa microfono per descrivere DPI, protezioni, procedure già in atto...",
-            key='misure_prev'
-        )
-        
-        # Audio per misure
-        audio_misure = st.file_uploader("🎤 Dettatura Misure", type=['mp3', 'wav', 'm4a'], key='audio_misure')
-        
-        if audio_misure:
-            with st.spinner("Trascrizione in corso..."):
-                trascrizione = transcribe_audio(audio_misure)
-                if trascrizione:
-                    st.success("✅ Trascrizione completata!")
-                    misure_prev = st.text_area("Trascrizione Misure", value=trascrizione, key='misure_prev_transcript')
-        
-        # PIANO MIGLIORAMENTO
-        st.markdown('<div class="section-header">📈 PIANO DI MIGLIORAMENTO</div>', unsafe_allow_html=True)
-        
-        if 'piano_miglioramento' not in st.session_state:
-            st.session_state.piano_miglioramento = st.session_state.checklist_data.get('piano_miglioramento', [])
-        
-        with st.expander("➕ Aggiungi Azione Migliorativa"):
-            st.markdown("**🎤 Descrizione Azione**")
-            azione_desc = st.text_area(
-                "Descrivi l'azione",
-                placeholder="Usa microfono per descrivere l'intervento di miglioramento...",
-                key='new_azione_desc'
-            )
-            
-            # Audio per azione
-            azione_audio = st.file_uploader("🎤 Dettatura Azione", type=['mp3', 'wav', 'm4a'], key='new_azione_audio')
-            
-            if azione_audio:
-                with st.spinner("Trascrizione in corso..."):
-                    trascrizione = transcribe_audio(azione_audio)
-                    if trascrizione:
-                        st.success("✅ Trascrizione completata!")
-                        azione_desc = st.text_area("Trascrizione Azione", value=trascrizione, key='new_azione_desc_transcript')
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                azione_resp = st.text_input("Responsabile", key='new_azione_resp')
-            with col2:
-                azione_scad = st.date_input("Scadenza", key='new_azione_scad')
-            
-            if st.button("✅ Aggiungi Azione"):
-                if azione_desc:
-                    nuova_azione = {
-                        'descrizione': azione_desc,
-                        'responsabile': azione_resp,
-                        'scadenza': str(azione_scad)
-                    }
-                    st.session_state.piano_miglioramento.append(nuova_azione)
-                    st.success("✅ Azione aggiunta!")
-                    st.rerun()
-        
-        if st.session_state.piano_miglioramento:
-            for idx, azione in enumerate(st.session_state.piano_miglioramento):
-                with st.expander(f"📌 {azione['descrizione'][:50]}..."):
-                    st.write(f"**Responsabile:** {azione.get('responsabile', 'N/A')}")
-                    st.write(f"**Scadenza:** {azione.get('scadenza', 'N/A')}")
-                    if st.button("🗑️ Rimuovi", key=f'remove_azione_{idx}'):
-                        st.session_state.piano_miglioramento.pop(idx)
-                        st.rerun()
-        
-        # SALVA COMPLETAMENTO
-        st.markdown("---")
-        if st.button("💾 SALVA COMPLETAMENTO", type="primary", use_container_width=True):
-            data_to_save = {
-                'servizi_offerta': st.session_state.servizi_offerta,
-                'livello_formazione_antincendio': livello_antincendio,
-                'gruppo_primo_soccorso': gruppo_ps,
-                'mansioni': st.session_state.mansioni,
-                'desc_luoghi_lavoro': desc_luoghi,
-                'ciclo_lavorativo': ciclo_lav,
-                'misure_prevenzione': misure_prev,
-                'piano_miglioramento': st.session_state.piano_miglioramento,
-                'status': 'completa'
-            }
-            
-            # Merge con dati esistenti
-            existing_data = st.session_state.checklist_data.copy()
-            existing_data.update(data_to_save)
-            
-            if save_checklist(existing_data):
-                st.markdown('<div class="success-message">✅ Completamento salvato con successo!</div>', unsafe_allow_html=True)
-
-# ============================================
-# TAB 3: REPORT FINALE
-# ============================================
-with tab3:
-    if not st.session_state.checklist_id:
-        st.warning("⚠️ Completa prima i dati nei Tab precedenti")
-    else:
-        st.markdown('<div class="section-header">📊 REPORT COMPLETO CHECKLIST</div>', unsafe_allow_html=True)
-        
-        data = st.session_state.checklist_data
-        
-        # DATI AZIENDA
-        st.markdown("### 🏢 Dati Azienda")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Ragione Sociale", data.get('ragione_sociale', 'N/A'))
-            st.metric("ATECO", data.get('ateco', 'N/A'))
-        with col2:
-            st.metric("N. Dipendenti", data.get('n_dipendenti', 0))
-            st.metric("Datore Lavoro", data.get('datore_lavoro', {}).get('nome', 'N/A'))
-        with col3:
-            st.metric("RSPP", data.get('rspp', {}).get('tipo', 'N/A'))
-            st.metric("Stato", "✅ Completa" if data.get('status') == 'completa' else "⏳ Bozza")
-        
-        st.markdown(f"**Sede:** {data.get('sede', 'N/A')}")
-        
-        # LUOGHI DI LAVORO
-        st.markdown("### 🏭 Luoghi di Lavoro")
-        luoghi = data.get('luoghi_lavoro', [])
-        if luoghi:
-            for luogo in luoghi:
-                st.markdown(f"""
-                <div class="report-box">
-                    <div class="report-title">📍 {luogo['nome']}</div>
-                    <p><strong>Superficie:</strong> {luogo.get('superficie_mq', 0)} mq</p>
-                    <p><strong>Note:</strong> {luogo.get('note', 'N/A')}</p>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.info("Nessun luogo di lavoro inserito")
-        
-        # DIPENDENTI
-        st.markdown("### 👥 Dipendenti")
-        dipendenti = data.get('dipendenti', [])
-        if dipendenti:
-            st.write(f"**Totale dipendenti inseriti:** {len(dipendenti)}")
-            for dip in dipendenti:
-                st.markdown(f"- **{dip['nome']} {dip['cognome']}** - {dip.get('mansione', 'N/A')}")
-        else:
-            st.info("Nessun dipendente inserito")
-        
-        # ATTREZZATURE
-        st.markdown("### ⚙️ Attrezzature")
-        attrezzature = data.get('attrezzature', [])
-        if attrezzature:
-            st.write(f"**Totale attrezzature:** {len(attrezzature)}")
-            for attr in attrezzature:
-                st.markdown(f"- **{attr['nome']}** - {attr.get('marca', '')} {attr.get('modello', '')}")
-        else:
-            st.info("Nessuna attrezzatura inserita")
-        
-        # RISCHI
-        st.markdown("### ⚠️ Rischi Identificati")
-        rischi = data.get('rischi_selezionati', {})
-        if rischi:
-            st.write(f"**Totale rischi identificati:** {len(rischi)}")
-            for rischio, info in rischi.items():
-                if info.get('presente'):
-                    st.markdown(f"""
-                    <div class="report-box">
-                        <div class="report-title">⚠️ {rischio}</div>
-                        <p><strong>Note:</strong> {info.get('note', 'Nessuna nota')}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-        else:
-            st.info("Nessun rischio selezionato")
-        
-        # NON CONFORMITÀ
-        st.markdown("### ❌ Non Conformità")
-        nc = data.get('non_conformita', [])
-        if nc:
-            st.write(f"**Totale non conformità:** {len(nc)}")
-            for item in nc:
-                priority_emoji = {"Bassa": "🟢", "Media": "🟡", "Alta": "🔴"}
-                st.markdown(f"""
-                <div class="report-box">
-                    <div class="report-title">{priority_emoji[item['priorita']]} Priorità {item['priorita']}</div>
-                    <p>{item['descrizione']}</p>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.info("Nessuna non conformità rilevata")
-        
-        # MANSIONI
-        st.markdown("### 👷 Mansioni")
-        mansioni = data.get('mansioni', [])
-        if mansioni:
-            st.write(f"**Totale mansioni:** {len(mansioni)}")
-            for mans in mansioni:
-                st.markdown(f"""
-                <div class="report-box">
-                    <div class="report-title">👷 {mans['nome']} ({mans['n_lavoratori']} lavoratori)</div>
-                    <p>{mans['descrizione'][:300]}{'...' if len(mans['descrizione']) > 300 else ''}</p>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.info("Nessuna mansione inserita")
-        
-        # FORMAZIONE
-        st.markdown("### 🎓 Formazione Obbligatoria")
-        st.markdown(f"- **Antincendio:** {data.get('livello_formazione_antincendio', 'Non specificato')}")
-        st.markdown(f"- **Primo Soccorso:** {data.get('gruppo_primo_soccorso', 'Non specificato')}")
-        
-        # OFFERTA COMMERCIALE
-        st.markdown("### 💼 Offerta Commerciale")
-        servizi = data.get('servizi_offerta', [])
-        if servizi:
-            st.write(f"**Totale servizi in offerta:** {len(servizi)}")
-            
-            # Raggruppa per categoria
-            documenti = [s for s in servizi if s['categoria'] == "📄 DOCUMENTO"]
-            formazione = [s for s in servizi if s['categoria'] == "🎓 FORMAZIONE"]
-            sorveglianza = [s for s in servizi if s['categoria'] == "🏥 SORVEGLIANZA SANITARIA"]
-            
-            if documenti:
-                st.markdown("#### 📄 Documenti")
-                for serv in documenti:
-                    st.markdown(f"- **{serv['nome']}** - {serv['dettaglio']} - €{serv['prezzo']}")
-            
-            if formazione:
-                st.markdown("#### 🎓 Formazione")
-                for serv in formazione:
-                    st.markdown(f"- **{serv['nome']}** - {serv['dettaglio']} - €{serv['prezzo']}")
-            
-            if sorveglianza:
-                st.markdown("#### 🏥 Sorveglianza Sanitaria")
-                for serv in sorveglianza:
-                    st.markdown(f"- **{serv['nome']}** - €{serv['prezzo']}")
-            
-            totale = sum(s['prezzo'] for s in servizi)
-            st.markdown(f"### 💰 **Totale Offerta: € {totale:,.2f}**")
-        else:
-            st.info("Nessun servizio in offerta")
-        
-        # DESCRIZIONI DETTAGLIATE
-        st.markdown("### 📝 Descrizioni Dettagliate")
-        
-        if data.get('desc_luoghi_lavoro'):
-            st.markdown("**Luoghi di Lavoro:**")
-            st.text_area("", value=data.get('desc_luoghi_lavoro'), height=150, disabled=True, key='report_luoghi')
-        
-        if data.get('ciclo_lavorativo'):
-            st.markdown("**Ciclo Lavorativo:**")
-            st.text_area("", value=data.get('ciclo_lavorativo'), height=150, disabled=True, key='report_ciclo')
-        
-        if data.get('misure_prevenzione'):
-            st.markdown("**Misure di Prevenzione:**")
-            st.text_area("", value=data.get('misure_prevenzione'), height=150, disabled=True, key='report_misure')
-        
-        # PIANO MIGLIORAMENTO
-        st.markdown("### 📈 Piano di Miglioramento")
-        piano = data.get('piano_miglioramento', [])
-        if piano:
-            st.write(f"**Totale azioni:** {len(piano)}")
-            for azione in piano:
-                st.markdown(f"""
-                <div class="report-box">
-                    <div class="report-title">📌 {azione['descrizione'][:100]}</div>
-                    <p><strong>Responsabile:</strong> {azione.get('responsabile', 'N/A')}</p>
-                    <p><strong>Scadenza:</strong> {azione.get('scadenza', 'N/A')}</p>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.info("Nessuna azione di miglioramento")
-        
-        # NOTE
-        if data.get('note_sopralluogo'):
-            st.markdown("### 📝 Note Sopralluogo")
-            st.text_area("", value=data.get('note_sopralluogo'), height=100, disabled=True, key='report_note')
-        
-        # PULSANTE STAMPA/EXPORT
-        st.markdown("---")
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            if st.button("🖨️ STAMPA REPORT", use_container_width=True):
-                st.info("💡 Usa Ctrl+P o Cmd+P per stampare questa pagina come PDF")
-
-# ============================================
-# TAB 4: GENERA DVR
-# ============================================
-with tab4:
-    if not st.session_state.checklist_id:
-        st.warning("⚠️ Completa prima i dati nei Tab precedenti")
-    else:
-        st.markdown('<div class="section-header">📊 ANTEPRIMA DATI</div>', unsafe_allow_html=True)
-        
-        # Mostra riepilogo
-        data = st.session_state.checklist_data
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric("🏢 Azienda", data.get('ragione_sociale', 'N/A'))
-            st.metric("👥 Dipendenti", len(data.get('dipendenti', [])))
-        
-        with col2:
-            st.metric("🏭 Luoghi Lavoro", len(data.get('luoghi_lavoro', [])))
-            st.metric("⚙️ Attrezzature", len(data.get('attrezzature', [])))
-        
-        with col3:
-            st.metric("👷 Mansioni", len(data.get('mansioni', [])))
-            st.metric("⚠️ Rischi", len(data.get('rischi_selezionati', [])))
-        
-        with col4:
-            st.metric("❌ Non Conformità", len(data.get('non_conformita', [])))
-            st.metric("💼 Servizi Offerta", len(data.get('servizi_offerta', [])))
-        
-        st.markdown("---")
-        
-        # Pulsante Genera DVR (FINTO per ora)
-        st.markdown("""
-         <div style="text-align: center; padding: 3rem; background: linear-gradient(135deg, #1B3A57 0%, #2C5F8D 100%); border-radius: 15px; margin: 2rem 0;">
-            <h2 style="color: white; margin-bottom: 1rem;">🚀 Generazione DVR con AI</h2>
-            <p style="color: rgba(255,255,255,0.8); margin-bottom: 2rem;">
-                Il sistema analizzerà tutti i dati inseriti e genererà automaticamente<br>
-                il Documento di Valutazione dei Rischi completo e conforme al D.Lgs. 81/08
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2, col3 = st.columns([1, 2, 1])
-        
-        with col2:
-            if st.button("🚀 GENERA DVR", type="primary", use_container_width=True):
-                st.warning("⚠️ **Funzione in fase di sviluppo**")
-                st.info("""
-                📅 **Disponibile tra 2-3 giorni**
-                
-                Il DVR verrà generato automaticamente con intelligenza artificiale basandosi su:
-                - Dati aziendali inseriti
-                - Luoghi di lavoro con foto e descrizioni
-                - Mansioni e descrizioni dettagliate
-                - Rischi identificati con note specifiche
-                - Misure di prevenzione
-                - Piano di miglioramento
-                - Offerta commerciale servizi
-                
-                💡 L'AI verificherà anche eventuali DPI mancanti o non conformità non rilevate durante il sopralluogo.
-                """)
-
-# Footer
-st.markdown("---")
-st.markdown("""
-<div style="text-align: center; padding: 2rem; color: #6B7280;">
-    <p style="margin: 0;">Powered by <strong style="color: #1B3A57;">PARADIGMA+</strong></p>
-    <p style="margin: 0.5rem 0 0 0; font-size: 0.875rem;">Sistema DVR PRO v2.0 - Dicembre 2024</p>
-</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+import streamlit as st
+from supabase import create_client
+import os
+from dotenv import load_dotenv
+from datetime import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+import io
+from contextlib import ExitStack, contextmanager
+from openai import OpenAI
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from cache import TieredCache, content_key
+from transcription import transcribe_bytes
+from checklist_delta import ChangeTracker, ConflictError, VERSION_COLUMN
+from storage import create_repository
+from autosave import AutosaveEngine, DRAFT_PREFIX
+from lazy_checklist import LazyChecklist, SnapshotStore
+from uploads import PhotoUploader, UploadItem
+from upload_spill import spill_uploads
+from image_ingest import ImageIngestor
+from blobs import BlobStore, file_hash
+from employee_import import import_employees
+from list_view import windowed_list, STATE_PREFIX
+from fragments import section, rerun_section, record_timing, debug_mode, keep_profile, in_fragment_rerun, TIMINGS_KEY, PROFILES_KEY
+import profiling
+from risk_catalog import RiskCatalog, CATALOG_PATH, ateco_digits
+from risk_scoring import RiskMatrix, CLASSI, GENERALE, risk_class, checklist_axes, checklist_matrix
+from report_pdf import cached_report, report_key
+from batch_export import BatchExporter, select_checklists
+from dvr_generation import OpenAIWriter, StubWriter, plan_chapters, generate_chapters, assemble, run_stats
+from prompt_budget import ContextBuilder, PROMPT_TOKENS
+from docx_writer import DocxTemplate, photo_sections, write_docx
+import pandas as pd
+from transcription_queue import TranscriptionScheduler, COMPLETATA, ERRORE
+
+run_started = time.perf_counter()  # durata del rerun completo, mostrata nella sidebar
+
+# Carica variabili ambiente
+load_dotenv()
+
+# Configurazione pagina
+st.set_page_config(
+    page_title="DVR PRO - Paradigma+",
+    page_icon="🛡️",
+    layout="wide",
+    initial_sidebar_state="collapsed"
+)
+
+# Profilazione con ?debug=1: fasi del rerun, chiamate HTTP e byte, span su file JSON lines
+profiling.install_http_hooks()
+if debug_mode():
+    # Un rerun interrotto da st.rerun() non arriva in fondo: la sua traccia si chiude qui
+    interrotto = st.session_state.pop('profilo_attivo', None)
+    if interrotto is not None:
+        keep_profile(interrotto.finish('interrotto'))
+    st.session_state.profilo_attivo = profiling.start('rerun', profiling.PROFILE_LOG)
+
+# CSS Personalizzato con colori Paradigma+
+st.markdown("""
+<style>
+    /* Colori Paradigma+ */
+    :root {
+        --primary: #1B3A57;
+        --accent: #FF6B6B;
+        --bg: #F8F9FA;
+    }
+    
+    /* Header personalizzato */
+    .main-header {
+        background: linear-gradient(135deg, #1B3A57 0%, #2C5F8D 100%);
+        padding: 2rem;
+        border-radius: 10px;
+        margin-bottom: 2rem;
+        color: white;
+        text-align: center;
+    }
+    
+    .main-header h1 {
+        margin: 0;
+        font-size: 2.5rem;
+        font-weight: 700;
+    }
+    
+    .accent-text {
+        color: #FF6B6B;
+        font-weight: 600;
+    }
+    
+    /* Bottoni */
+    .stButton>button {
+        background: linear-gradient(135deg, #FF6B6B 0%, #FF8E8E 100%);
+        color: white;
+        border: none;
+        border-radius: 8px;
+        padding: 0.75rem 2rem;
+        font-weight: 600;
+        transition: all 0.3s;
+    }
+    
+    .stButton>button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 5px 15px rgba(255, 107, 107, 0.3);
+    }
+    
+    /* Tab styling */
+    .stTabs [data-baseweb="tab-list"] {
+        gap: 2rem;
+        background-color: white;
+        padding: 1rem;
+        border-radius: 10px;
+    }
+    
+    .stTabs [data-baseweb="tab"] {
+        height: 60px;
+        background-color: transparent;
+        border-radius: 8px;
+        color: #1B3A57;
+        font-weight: 600;
+    }
+    
+    .stTabs [aria-selected="true"] {
+        background: linear-gradient(135deg, #1B3A57 0%, #2C5F8D 100%);
+        color: white !important;
+    }
+    
+    /* Sezioni */
+    .section-header {
+        background: #1B3A57;
+        color: white;
+        padding: 1rem;
+        border-radius: 8px 8px 0 0;
+        margin-top: 1.5rem;
+        font-weight: 600;
+    }
+    
+    .section-content {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 0 0 8px 8px;
+        border: 2px solid #E5E7EB;
+    }
+    
+    /* Alert successo */
+    .success-message {
+        background: #10B981;
+        color: white;
+        padding: 1rem;
+        border-radius: 8px;
+        margin: 1rem 0;
+    }
+    
+    /* Report Box */
+    .report-box {
+        background: #F9FAFB;
+        border: 2px solid #E5E7EB;
+        border-radius: 8px;
+        padding: 1rem;
+        margin: 0.5rem 0;
+    }
+    
+    .report-title {
+        font-weight: 600;
+        color: #1B3A57;
+        margin-bottom: 0.5rem;
+    }
+    
+    /* Mobile responsive */
+    @media (max-width: 768px) {
+        .main-header h1 {
+            font-size: 1.8rem;
+        }
+    }
+</style>
+""", unsafe_allow_html=True)
+
+# Inizializza Supabase
+@st.cache_resource
+def init_supabase():
+    return create_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_KEY")
+    )
+
+supabase = init_supabase()
+
+# Archivio checklist: di default SQLite locale sincronizzato in background con Supabase
+@st.cache_resource
+def init_repository():
+    return create_repository(
+        os.getenv("DVR_STORAGE", "offline"),
+        client=supabase,
+        path=os.getenv("LOCAL_DB_PATH", ".cache/dvr_local.db")
+    )
+
+repository = init_repository()
+
+# Inizializza OpenAI per Whisper
+@st.cache_resource
+def init_openai():
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+openai_client = init_openai()
+
+# Cache trascrizioni (memoria + disco), condivisa tra le sessioni
+@st.cache_resource
+def init_transcription_cache():
+    return TieredCache(
+        os.getenv("TRANSCRIPTION_CACHE_DIR", ".cache/trascrizioni"),
+        max_disk_bytes=int(os.getenv("TRANSCRIPTION_CACHE_MB", "200")) * 1024 * 1024
+    )
+
+transcription_cache = init_transcription_cache()
+
+# Coda trascrizioni in background, sopravvive ai rerun
+@st.cache_resource
+def init_transcription_scheduler():
+    return TranscriptionScheduler(
+        lambda audio_bytes, filename: transcribe_bytes(openai_client, transcription_cache, audio_bytes, filename),
+        max_workers=int(os.getenv("TRANSCRIPTION_WORKERS", "4")),
+        per_key_limit=int(os.getenv("TRANSCRIPTION_PER_SESSION", "3"))
+    )
+
+transcription_scheduler = init_transcription_scheduler()
+
+# Modello per i capitoli del DVR; DVR_LLM=stub usa un testo locale deterministico (sviluppo, test)
+@st.cache_resource
+def init_dvr_writer():
+    if os.getenv("DVR_LLM", "openai") == "stub":
+        return StubWriter(latency=float(os.getenv("DVR_STUB_LATENCY", "0")))
+    return OpenAIWriter(openai_client)
+
+dvr_writer = init_dvr_writer()
+
+# Capitoli del DVR già generati, per impronta dei dati da cui dipendono (memoria + disco)
+@st.cache_resource
+def init_chapter_cache():
+    return TieredCache(
+        os.getenv("DVR_CACHE_DIR", ".cache/dvr_capitoli"),
+        max_memory_items=int(os.getenv("DVR_CACHE_ITEMS", "512")),
+        max_disk_bytes=int(os.getenv("DVR_CACHE_MB", "100")) * 1024 * 1024
+    )
+
+chapter_cache = init_chapter_cache()
+
+# Dati di ogni capitolo adattati al budget di token (riassunti delle trascrizioni in cache con i capitoli)
+dvr_context = ContextBuilder(dvr_writer, PROMPT_TOKENS, chapter_cache)
+
+# Carta intestata del DVR in Word (DVR_TEMPLATE=percorso di un .docx), riletta solo quando cambia il file
+@st.cache_resource(max_entries=1)
+def init_docx_template(path, modified):
+    return DocxTemplate.from_file(path) if path else DocxTemplate.default()
+
+docx_template_path = os.getenv("DVR_TEMPLATE")
+docx_template_modified = os.path.getmtime(docx_template_path) if docx_template_path else None
+docx_template = init_docx_template(docx_template_path, docx_template_modified)
+
+# Catalogo rischi con indice ATECO, riletto solo quando cambia il file dati
+@st.cache_resource(max_entries=1)
+def init_risk_catalog(path, modified):
+    return RiskCatalog(path)
+
+risk_catalog_path = os.getenv("RISK_CATALOG_PATH", CATALOG_PATH)
+risk_catalog = init_risk_catalog(risk_catalog_path, os.path.getmtime(risk_catalog_path))
+
+# PDF dei report per id e versione della checklist (memoria + disco), condivisi tra le sessioni
+@st.cache_resource
+def init_report_cache():
+    return TieredCache(
+        os.getenv("REPORT_CACHE_DIR", ".cache/report"),
+        max_memory_items=32,
+        max_disk_bytes=int(os.getenv("REPORT_CACHE_MB", "500")) * 1024 * 1024
+    )
+
+report_cache = init_report_cache()
+
+# File da scaricare (DVR in Word, ZIP dei report) scritti a flusso e serviti dal disco, mai tenuti nella sessione
+@st.cache_resource
+def init_download_cache():
+    return TieredCache(
+        os.getenv("DOWNLOAD_CACHE_DIR", ".cache/download"),
+        max_memory_items=0,
+        max_disk_bytes=int(os.getenv("DOWNLOAD_CACHE_MB", "500")) * 1024 * 1024
+    )
+
+download_cache = init_download_cache()
+
+def get_session_id():
+    """Identificativo della sessione browser corrente"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else 'default'
+
+# File caricati indicizzati per contenuto (SHA-256), con i riferimenti delle checklist
+@st.cache_resource
+def init_blob_store():
+    return BlobStore(repository, os.getenv("BLOB_INDEX_PATH", ".cache/blobs.db"))
+
+blob_store = init_blob_store()
+
+def store_insert(data):
+    """Crea la checklist nell'archivio e registra i file che cita"""
+    row = repository.insert(data)
+    blob_store.track(row['id'], data)
+    return row
+
+def store_patch(checklist_id, patch, expected_version):
+    """Salva la patch nell'archivio e aggiorna i riferimenti ai file delle colonne cambiate"""
+    version = repository.update(checklist_id, patch, expected_version)
+    blob_store.track(checklist_id, patch)
+    return version
+
+def session_alive(session_id):
+    """False per le sessioni chiuse dal browser (senza runtime, es. nei test, sono tutte attive)"""
+    return not runtime.exists() or runtime.get_instance().is_active_session(session_id)
+
+# Autosave: journal locale + flush in background su Supabase
+@st.cache_resource
+def init_autosave():
+    return AutosaveEngine(
+        os.getenv("AUTOSAVE_DIR", ".cache/autosave"),
+        insert_fn=store_insert,
+        patch_fn=store_patch,
+        session_alive=session_alive
+    )
+
+autosave = init_autosave()
+
+# Sezioni delle checklist per id e versione: una sola copia in sola lettura per tutte le sessioni
+@st.cache_resource
+def init_snapshot_store():
+    return SnapshotStore(int(os.getenv("SECTION_CACHE_ITEMS", "512")))
+
+# Le sezioni dopo l'intestazione si scaricano in parallelo: tutti i tab si disegnano a ogni rerun
+# completo e le leggerebbero comunque, una query dopo l'altra. SECTION_PREFETCH=0 lo disattiva.
+@st.cache_resource
+def init_section_executor():
+    if os.getenv("SECTION_PREFETCH", "1") == "0":
+        return None
+    return ThreadPoolExecutor(max_workers=int(os.getenv("SECTION_WORKERS", "8")), thread_name_prefix='sezioni')
+
+snapshot_store = init_snapshot_store()
+section_executor = init_section_executor()
+
+# Upload delle foto: pool limitato condiviso tra le sessioni
+@st.cache_resource
+def init_photo_uploader():
+    return PhotoUploader(repository, max_workers=int(os.getenv("UPLOAD_WORKERS", "4")))
+
+photo_uploader = init_photo_uploader()
+
+# Ridimensionamento delle foto prima dell'upload, in un pool di processi
+@st.cache_resource
+def init_image_ingestor():
+    return ImageIngestor(int(os.getenv("IMAGE_WORKERS", "0")) or None)
+
+image_ingestor = init_image_ingestor()
+
+# File caricati nei widget: su file temporanei invece che nella memoria del server
+@st.cache_resource
+def init_upload_spill():
+    if not runtime.exists():
+        return None
+    return spill_uploads(runtime.get_instance().uploaded_file_mgr, os.getenv("UPLOAD_SPILL_DIR") or None,
+                         int(os.getenv("UPLOAD_SPILL_KB", "256")) * 1024)
+
+upload_spill = init_upload_spill()
+
+# Inizializza session state
+if 'checklist_id' not in st.session_state:
+    st.session_state.checklist_id = None
+if 'checklist_data' not in st.session_state:
+    st.session_state.checklist_data = {}
+if 'transcription_jobs' not in st.session_state:
+    st.session_state.transcription_jobs = set()
+
+# Header
+st.markdown("""
+<div class="main-header">
+    <h1>🛡️ DVR PRO - <span class="accent-text">PARADIGMA+</span></h1>
+    <p style="margin: 0.5rem 0 0 0; opacity: 0.9;">Sistema Intelligente Valutazione Rischi</p>
+</div>
+""", unsafe_allow_html=True)
+
+# Funzioni helper
+
+# Stato di sessione legato alla checklist aperta (liste e widget), azzerato al cambio checklist
+CHECKLIST_STATE_KEYS = [
+    'luoghi_lavoro', 'dipendenti', 'attrezzature', 'rischi_selezionati', 'non_conformita',
+    'servizi_offerta', 'mansioni', 'piano_miglioramento', 'foto_ambienti_url', 'rischi_ateco',
+    'valutazione_rischi', 'valutazione_assi', 'pd_rischio', 'pd_luogo', 'report_pdf', 'dvr_documento', 'dvr_docx',
+    'conflitto_checklist',
+    'ragione_sociale', 'ateco', 'datore_lavoro', 'sede', 'n_dipendenti', 'rspp_tipo', 'soggetta_scia',
+    'note_sopralluogo', 'livello_antincendio', 'gruppo_ps', 'desc_luoghi', 'ciclo_lav', 'misure_prev'
+]
+
+@profiling.timed()
+def open_checklist(checklist_id, data, key=None):
+    """Apre una checklist (o una nuova bozza) e collega il salvataggio automatico"""
+    # La checklist precedente non tiene più in memoria le sue sezioni condivise
+    previous = st.session_state.get('checklist_data')
+    if isinstance(previous, LazyChecklist):
+        previous.close()
+    if 'autosave_key' in st.session_state:
+        autosave.detach(st.session_state.autosave_key, get_session_id())
+    for state_key in list(st.session_state.keys()):
+        if state_key in CHECKLIST_STATE_KEYS or state_key.startswith(('rischio_check_', 'rischio_note_', STATE_PREFIX)):
+            del st.session_state[state_key]
+    
+    # Riferimento per salvataggio e autosave: solo le colonne già caricate
+    baseline = data.loaded() if isinstance(data, LazyChecklist) else data
+    st.session_state.checklist_id = checklist_id
+    st.session_state.checklist_data = data
+    st.session_state.checklist_tracker = ChangeTracker(baseline) if checklist_id else None
+    st.session_state.autosave_key = key or (str(checklist_id) if checklist_id else f"{DRAFT_PREFIX}{uuid4().hex[:12]}")
+    st.query_params['checklist'] = st.session_state.autosave_key
+    
+    # Riapplica le modifiche rimaste nel journal (riavvio server, connessione caduta)
+    recovered = autosave.attach(st.session_state.autosave_key, get_session_id(), baseline,
+                                st.session_state.checklist_tracker, checklist_id)
+    if recovered:
+        st.session_state.checklist_data.update(recovered)
+        st.toast(f"♻️ Ripristinate {len(recovered)} modifiche non salvate")
+
+def editable_column(column, default):
+    """Colonna della checklist da modificare sul posto nella sessione (vedi LazyChecklist.editable)"""
+    data = st.session_state.checklist_data
+    if isinstance(data, LazyChecklist):
+        return data.editable(column, default)
+    return data.get(column, default)
+
+def on_section_loaded(values):
+    """Le colonne scaricate dopo l'apertura entrano nel riferimento di salvataggio e autosave"""
+    st.session_state.checklist_tracker.remember(values)
+    autosave.remember(st.session_state.autosave_key, get_session_id(), values)
+
+def record_fields(*fields):
+    """after= per le sezioni del Tab 1: anche i rerun del solo frammento finiscono nell'autosave"""
+    return lambda: autosave.record(st.session_state.autosave_key, get_session_id(),
+                                   {field: st.session_state[field] for field in fields})
+
+def refresh_valutazione(after=None):
+    """after= per le sezioni da cui vengono gli assi P × D (luoghi, mansioni, rischi).
+
+    La valutazione è un altro frammento e un rerun del solo frammento non la ridisegna:
+    se gli assi non sono più quelli mostrati si passa a un rerun completo.
+    """
+    def run():
+        if after is not None:
+            after()
+        assi = st.session_state.get('valutazione_assi')
+        if assi is not None and assi != checklist_axes(st.session_state.get('rischi_selezionati'),
+                                                       st.session_state.get('mansioni'), st.session_state.get('luoghi_lavoro')):
+            st.rerun(scope='app')
+    return run
+
+@profiling.timed()
+def load_checklist(checklist_id):
+    """Carica dall'archivio solo l'intestazione; le altre sezioni arrivano quando vengono lette"""
+    data = LazyChecklist(checklist_id, repository.get_columns, snapshot_store, executor=section_executor)
+    open_checklist(checklist_id, data)
+    data.on_load = on_section_loaded
+    # I salvataggi della sessione (anche dell'autosave) fanno avanzare la versione attesa delle sezioni
+    tracker = st.session_state.checklist_tracker
+    data.current_version = lambda: tracker.version
+
+@contextmanager
+def checklist_conflict():
+    """Una sezione salvata da un altro utente non si mescola alla checklist aperta: si propone di ricaricarla.
+
+    Il ConflictError di LazyChecklist si ripeterebbe a ogni rerun; si registra e si passa a un
+    rerun completo, che mostra l'avviso prima dei tab (fuori dai frammenti).
+    """
+    try:
+        yield
+    except ConflictError as e:
+        st.session_state.conflitto_checklist = str(e)
+        st.rerun(scope='app')
+
+def checklist_section(name, after=None):
+    """section() per le sezioni che leggono la checklist aperta"""
+    return section(name, after=after, guard=checklist_conflict)
+
+@profiling.timed()
+def export_report_pdf():
+    """(versione, chiave, da_cache) del PDF della checklist aperta, lasciato sul disco e non nella sessione.
+
+    Le versioni salvate stanno nella cache dei report; con modifiche non salvate il PDF va
+    solo tra i file da scaricare (versione None).
+    """
+    data = st.session_state.checklist_data
+    if isinstance(data, LazyChecklist):
+        data.load_all()
+    data = dict(data)
+    tracker = st.session_state.checklist_tracker
+    with tracker.lock:
+        version = None if tracker.diff(data) else tracker.version
+    pdf, from_cache = cached_report(report_cache, st.session_state.checklist_id, version, data)
+    if version is not None:
+        return version, report_key(st.session_state.checklist_id, version), from_cache
+    key = content_key(pdf, 'report', st.session_state.checklist_id)
+    download_cache.put_file(key, lambda output: output.write(pdf))
+    return version, key, from_cache
+
+def report_pdf_path(version, key):
+    """Percorso del PDF di export_report_pdf(); None se nel frattempo è uscito dalla cache"""
+    return (report_cache if version is not None else download_cache).path(key)
+
+def prepared_download(label, path, ready=False, **kwargs):
+    """download_button di un file su disco, creato solo quando serve.
+
+    Streamlit legge tutto il file nel gestore dei media a ogni rerun in cui il pulsante
+    compare: il pulsante c'è solo nel rerun in cui il file è stato preparato (ready) o
+    chiesto con "PREPARA DOWNLOAD", negli altri resta la richiesta.
+    """
+    if ready or st.button(f"📥 PREPARA DOWNLOAD {label}", use_container_width=True):
+        with open(path, 'rb') as file:
+            st.download_button(f"⬇️ SCARICA {label}", data=file, use_container_width=True, **kwargs)
+
+# Elenco della barra laterale: pagine per ricerca/stato, in cache fino al prossimo salvataggio
+BROWSER_PAGE_SIZE = 10
+BROWSER_STATUS = {"Tutte": None, "⏳ Bozze": 'bozza', "✅ Complete": 'completa'}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def browse_checklists(text, status, after):
+    return repository.search(text, status, after, BROWSER_PAGE_SIZE)
+
+@profiling.timed()
+def save_checklist(data):
+    """Salva nell'archivio solo i campi modificati dall'ultimo salvataggio"""
+    try:
+        if st.session_state.checklist_id:
+            # Update incrementale con controllo di versione
+            tracker = st.session_state.checklist_tracker
+            with tracker.lock:
+                patch = tracker.diff(data)
+                if patch:
+                    item_changes = tracker.item_changes(patch)
+                    version = store_patch(st.session_state.checklist_id, patch, tracker.version)
+                    tracker.commit(patch, version)
+            if patch:
+                st.caption("Campi aggiornati: " + ", ".join(
+                    f"{col} (+{item_changes[col]['aggiunti']}/-{item_changes[col]['rimossi']})" if col in item_changes else col
+                    for col in patch
+                ))
+        else:
+            # Insert
+            row = store_insert(data)
+            st.session_state.checklist_id = row['id']
+            st.session_state.checklist_tracker = ChangeTracker(row)
+            st.session_state.autosave_key = autosave.bind(st.session_state.autosave_key, get_session_id(),
+                                                          row['id'], st.session_state.checklist_tracker)
+            st.query_params['checklist'] = st.session_state.autosave_key
+        
+        browse_checklists.clear()
+        st.session_state.checklist_data.update(data)
+        st.session_state.checklist_data[VERSION_COLUMN] = st.session_state.checklist_tracker.version
+        return True
+    except ConflictError:
+        st.error("⚠️ Conflitto: la checklist è stata modificata da un altro utente. "
+                 "Le tue modifiche NON sono state salvate: ricarica la checklist dalla barra laterale.")
+        return False
+    except Exception as e:
+        st.error(f"Errore salvataggio: {e}")
+        return False
+
+@profiling.timed()
+def upload_items(items):
+    """Carica un lotto nello storage in parallelo e ne mostra il riepilogo"""
+    progress = st.progress(0.0, text=f"📤 Caricamento di {len(items)} file...")
+    result = photo_uploader.upload_batch(items, lambda done, total: progress.progress(done / total, text=f"📤 {done}/{total} file"))
+    progress.empty()
+    
+    # Il toast resta visibile anche dopo st.rerun()
+    st.toast(f"📤 {len(items) - len(result.failures)}/{len(items)} file caricati, "
+             f"{result.megabytes:.1f} MB a {result.mb_per_s:.1f} MB/s")
+    for item in result.failures:
+        st.toast(f"⚠️ Upload non riuscito: {item.name} ({item.error})")
+    return result
+
+def spilled_path(f):
+    """File temporaneo di un file caricato nel widget, None se Streamlit lo tiene in memoria"""
+    return upload_spill.spilled_path(get_session_id(), f.file_id) if upload_spill is not None else None
+
+def open_source(stack, f):
+    """File caricato leggibile a blocchi: il file temporaneo quando c'è, altrimenti il buffer del widget (senza copie)"""
+    path = spilled_path(f)
+    if path is not None:
+        try:
+            return stack.enter_context(open(path, 'rb'))
+        except FileNotFoundError:
+            pass  # tolto dal widget nel frattempo
+    return f
+
+@profiling.timed()
+def upload_files(files):
+    """Carica i documenti (una sola volta per contenuto) e restituisce {'nome', 'url', 'blob'} per quelli riusciti"""
+    entries, pending = [], []
+    with ExitStack() as stack:
+        planned_files = blob_store.plan_many([
+            (open_source(stack, f), os.path.splitext(f.name)[1].lstrip('.').lower() or 'bin', f.type, f.name, None, None)
+            for f in files])
+        for f, (digest, planned) in zip(files, planned_files):
+            entry = {'nome': f.name, 'url': planned if isinstance(planned, str) else None, 'blob': digest}
+            entries.append(entry)
+            if entry['url'] is None and not any(p[0] == digest for p in pending):
+                pending.append((digest, planned))
+        if pending:
+            upload_items([item for _, item in pending])
+            for digest, item in pending:
+                blob_store.register(digest, item)
+    for entry in entries:
+        if entry['url'] is None:
+            blob = blob_store.get(entry['blob'])
+            entry['url'] = blob['url'] if blob else None
+    return [entry for entry in entries if entry['url']]
+
+def photo_entry(variants, width, height):
+    """Voce salvata nella checklist per una foto: URL delle varianti e hash dei blob"""
+    return {
+        'url': variants['foto']['url'], 'anteprima': variants['anteprima']['url'], 'miniatura': variants['miniatura']['url'],
+        'larghezza': width, 'altezza': height,
+        'blob': {name: v['hash'] for name, v in variants.items()}
+    }
+
+@profiling.timed()
+def upload_photos(files):
+    """Ridimensiona le foto (orientamento, metadati, varianti) e le carica; una voce per foto riuscita.
+    
+    Una foto già vista (stessi byte) non viene né rielaborata né ricaricata."""
+    # Il widget dà un BytesIO: l'hash si calcola sul suo buffer, senza copiarlo
+    hashes = [file_hash(f)[0] for f in files]
+    sources = {}
+    for f, digest in zip(files, hashes):
+        sources.setdefault(digest, f)
+    
+    done = {source: blob_store.source_variants(source) for source in sources}
+    to_ingest = [source for source, variants in done.items() if variants is None]
+    if to_ingest:
+        with st.spinner(f"🖼️ Elaborazione di {len(to_ingest)} foto..."):
+            # Le foto già su disco le legge il processo di elaborazione: qui non passano byte
+            processed = image_ingestor.process_batch([spilled_path(sources[source]) or sources[source].getvalue()
+                                                      for source in to_ingest])
+        
+        ingested = []
+        for source, (renditions, error) in zip(to_ingest, processed):
+            if error:
+                st.toast(f"⚠️ Foto non leggibile: {sources[source].name} ({error})")
+                continue
+            ingested.append((source, renditions))
+        # Un solo lotto per tutte le varianti: i controlli nello storage partono in parallelo
+        lookups = iter(blob_store.plan_many([(r.data, r.extension, r.content_type, sources[source].name, r.width, r.height)
+                                             for source, renditions in ingested for r in renditions.values()]))
+        planned = [(source, renditions, {name: next(lookups) for name in renditions}) for source, renditions in ingested]
+        
+        items = {item.path: item for _, _, variants in planned for _, item in variants.values() if not isinstance(item, str)}
+        if items:
+            upload_items(list(items.values()))
+        for source, renditions, variants in planned:
+            for name, (digest, item) in variants.items():
+                if not isinstance(item, str):
+                    blob_store.register(digest, items[item.path], renditions[name].width, renditions[name].height)
+            if all(blob_store.get(digest) for digest, _ in variants.values()):
+                blob_store.remember_source(source, {name: digest for name, (digest, _) in variants.items()})
+                done[source] = blob_store.source_variants(source)
+    
+    entries = []
+    for digest in hashes:
+        variants = done.get(digest)
+        if variants:
+            entries.append(photo_entry(variants, variants['foto']['width'], variants['foto']['height']))
+    return entries
+
+@profiling.timed()
+def transcribe_audio(audio_file, widget_key):
+    """Accoda la trascrizione con Whisper e restituisce il testo quando pronto"""
+    audio_bytes = audio_file.getvalue()
+    job_id = f"{widget_key}:{content_key(audio_bytes)}"
+    job = transcription_scheduler.submit(job_id, audio_bytes, audio_file.name, key=get_session_id(),
+                                         source=audio_file.file_id)
+    if not job.done and job_id not in st.session_state.transcription_jobs:
+        polling = bool(st.session_state.transcription_jobs)
+        st.session_state.transcription_jobs.add(job_id)
+        if not polling and in_fragment_rerun():
+            # Il controllo periodico (attesa_trascrizioni) parte solo in un rerun completo:
+            # dal rerun di una sola sezione serve riavviare l'app perché il job venga seguito
+            st.rerun(scope='app')
+    
+    if job.status == COMPLETATA:
+        st.success("✅ Trascrizione completata!")
+        return job.result
+    if job.status == ERRORE:
+        st.error(f"Errore trascrizione: {job.error}")
+        return None
+    
+    st.info("⏳ Trascrizione in corso..." if job.attempts <= 1 else f"⏳ Trascrizione in corso (tentativo {job.attempts})...")
+    return None
+
+# Apertura iniziale: riprende la checklist indicata nell'URL, altrimenti nuova bozza
+if 'autosave_key' not in st.session_state:
+    restore_key = st.query_params.get('checklist')
+    try:
+        if restore_key and not restore_key.startswith(DRAFT_PREFIX):
+            load_checklist(restore_key)
+        else:
+            open_checklist(None, {}, key=restore_key)
+    except Exception:
+        open_checklist(None, {})
+
+# Bozza creata in background dall'autosave
+resolved = autosave.resolved(st.session_state.autosave_key, get_session_id())
+if resolved and st.session_state.checklist_id is None:
+    st.session_state.autosave_key, st.session_state.checklist_id, st.session_state.checklist_tracker = resolved
+    st.query_params['checklist'] = st.session_state.autosave_key
+    browse_checklists.clear()
+
+# Sidebar - Selezione/Creazione Checklist
+with st.sidebar, profiling.span('sidebar'):
+    st.image("https://via.placeholder.com/200x80/1B3A57/FFFFFF?text=PARADIGMA%2B", use_container_width=True)
+    
+    st.markdown("### 📋 Gestione Checklist")
+    
+    stats = transcription_cache.stats
+    st.caption(f"🎤 Cache trascrizioni: {stats['memory_hits'] + stats['disk_hits']} hit "
+               f"({stats['disk_hits']} da disco) / {stats['misses']} miss")
+    usage = snapshot_store.usage()
+    st.caption(f"📦 Sezioni checklist condivise: {usage['sezioni']} in memoria, {usage['in_uso']} in uso "
+               f"({usage['riferimenti']} riferimenti) · {snapshot_store.stats['hits']} hit / {snapshot_store.stats['misses']} miss")
+    if upload_spill is not None:
+        spill = upload_spill.spill_stats()
+        st.caption(f"💾 File caricati: {spill['file_su_disco']} su disco ({spill['byte_su_disco'] / 1024 / 1024:.1f} MB), "
+                   f"{spill['byte_in_memoria'] / 1024 / 1024:.1f} MB in memoria")
+    st.caption(f"🗂️ File: {blob_store.stats['caricati']} caricati, {blob_store.stats['riusati']} già presenti "
+               f"({blob_store.stats['byte_risparmiati'] / 1024 / 1024:.1f} MB non ricaricati)")
+    # Ultima esecuzione dell'app intera e di ogni sezione (↻ = rieseguita da sola)
+    if st.session_state.get(TIMINGS_KEY):
+        st.caption("⏱️ " + " · ".join(f"{nome} {ms:.0f} ms{' ↻' if solo else ''}"
+                                      for nome, (ms, solo) in st.session_state[TIMINGS_KEY].items()))
+    
+    # Nuova checklist
+    if st.button("➕ Nuova Checklist", use_container_width=True):
+        open_checklist(None, {})
+        st.rerun()
+    
+    # Stato sincronizzazione
+    sync = repository.status()
+    if sync:
+        if sync['online'] is False:
+            st.warning(f"📴 Offline: {sync['in_coda']} checklist in coda di sincronizzazione")
+        elif sync['in_coda']:
+            st.caption(f"🔄 {sync['in_coda']} checklist in sincronizzazione")
+        elif sync['ultimo_sync']:
+            st.caption(f"🟢 Sincronizzato alle {datetime.fromtimestamp(sync['ultimo_sync']).strftime('%H:%M:%S')}")
+        for conflitto in sync['conflitti'][-3:]:
+            st.caption(f"⚠️ Campo '{conflitto['campo']}' sovrascritto da una modifica più recente di un altro utente")
+    
+    # Carica checklist esistenti
+    st.markdown("### 📂 Checklist")
+    browser_query = st.text_input("🔍 Cerca", key='browser_query', placeholder="Ragione sociale o codice ATECO")
+    browser_status = st.selectbox("Stato", list(BROWSER_STATUS), key='browser_status')
+    
+    # Pila dei cursori delle pagine visitate, azzerata quando cambiano i filtri
+    if st.session_state.get('browser_filters') != (browser_query, browser_status):
+        st.session_state.browser_filters = (browser_query, browser_status)
+        st.session_state.browser_cursors = [None]
+    
+    try:
+        checklists, next_cursor = browse_checklists(browser_query, BROWSER_STATUS[browser_status],
+                                                    st.session_state.browser_cursors[-1])
+        
+        for cl in checklists:
+            status_emoji = "✅" if cl['status'] == 'completa' else "⏳"
+            if st.button(f"{status_emoji} {(cl['ragione_sociale'] or '')[:20]}", key=cl['id'], use_container_width=True):
+                load_checklist(cl['id'])
+                st.rerun()
+        if not checklists:
+            st.caption("Nessuna checklist trovata")
+        
+        col_prev, col_page, col_next = st.columns(3)
+        with col_prev:
+            if st.button("◀", key='browser_prev', disabled=len(st.session_state.browser_cursors) == 1):
+                st.session_state.browser_cursors.pop()
+                st.rerun()
+        with col_page:
+            st.caption(f"Pagina {len(st.session_state.browser_cursors)}")
+        with col_next:
+            if st.button("▶", key='browser_next', disabled=next_cursor is None):
+                st.session_state.browser_cursors.append(next_cursor)
+                st.rerun()
+    except Exception as e:
+        st.error(f"Errore caricamento checklist: {e}")
+    
+    def discard_export():
+        """Toglie lo ZIP esportato dalla sessione e dal disco (scaricato o filtri cambiati)"""
+        export = st.session_state.pop('export_zip', None)
+        if export:
+            download_cache.discard(export[0])
+    
+    # Report di più checklist in un solo ZIP (fine anno, clienti multipli)
+    @section('esportazione')
+    def sezione_esportazione():
+        with st.expander("📦 Esporta report in blocco"):
+            export_status = st.selectbox("Stato", list(BROWSER_STATUS), key='export_status')
+            export_dates = st.date_input("Create dal - al", value=(datetime.now().replace(month=1, day=1), datetime.now()),
+                                         format="DD/MM/YYYY", key='export_dates')
+            export_filters = (export_status, tuple(export_dates))
+            if st.session_state.get('export_zip') and st.session_state.export_zip[2] != export_filters:
+                discard_export()
+            exported = False
+            if st.button("📦 ESPORTA ZIP", use_container_width=True, disabled=len(export_dates) != 2):
+                rows = list(select_checklists(repository, BROWSER_STATUS[export_status],
+                                              export_dates[0].isoformat(), export_dates[1].isoformat()))
+                if not rows:
+                    st.info("Nessuna checklist nel periodo")
+                else:
+                    bar = st.progress(0.0, text=f"0/{len(rows)} report")
+                    discard_export()
+                    # Lo ZIP si scrive a flusso su disco: in sessione solo la chiave, fino al download
+                    export_key = content_key(uuid4().bytes, 'esportazione')
+                    exporter = BatchExporter(repository, report_cache, int(os.getenv("EXPORT_WORKERS", "0")) or None)
+                    with profiling.span('esportazione report', checklist=len(rows)):
+                        _, counts = download_cache.put_file(export_key, lambda output: exporter.export(
+                            rows, output,
+                            lambda done, total, row, outcome: bar.progress(done / total, text=f"{done}/{total} report")))
+                    st.session_state.export_zip = (export_key, f"report_{export_dates[0]:%Y%m%d}_{export_dates[1]:%Y%m%d}.zip",
+                                                   export_filters)
+                    exported = True
+                    st.caption(f"{counts['generato']} generati, {counts['cache']} invariati dall'ultima esportazione"
+                               + (f", {counts['errore']} errori (vedi indice.json)" if counts['errore'] else ""))
+            export = st.session_state.get('export_zip')
+            archive_path = download_cache.path(export[0]) if export else None
+            if archive_path:
+                prepared_download("ZIP", archive_path, ready=exported, file_name=export[1], mime="application/zip",
+                                  on_click=discard_export)
+    
+    sezione_esportazione()
+
+# Checklist modificata da un altro utente mentre se ne caricavano le sezioni
+if st.session_state.get('conflitto_checklist'):
+    st.error("⚠️ Conflitto: la checklist è stata modificata da un altro utente mentre la stavi consultando. "
+             "Ricaricala per continuare sulla versione aggiornata.")
+    if st.button("🔄 Ricarica checklist", type="primary"):
+        load_checklist(st.session_state.checklist_id)
+        st.rerun()
+    st.stop()
+
+# Main content
+tab1, tab2, tab3, tab4 = st.tabs(["📍 SOPRALLUOGO", "💻 COMPLETAMENTO", "📊 REPORT FINALE", "🚀 GENERA DVR"])
+
+# ============================================
+# TAB 1: SOPRALLUOGO
+# ============================================
+with tab1, profiling.span('tab sopralluogo'), checklist_conflict():
+    st.markdown('<div class="section-header">🏢 DATI AZIENDA</div>', unsafe_allow_html=True)
+    
+    with st.container():
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            ragione_sociale = st.text_input(
+                "Ragione Sociale",
+                value=st.session_state.checklist_data.get('ragione_sociale', ''),
+                key='ragione_sociale'
+            )
+            
+            ateco = st.text_input(
+                "Codice ATECO",
+                value=st.session_state.checklist_data.get('ateco', ''),
+                placeholder="Es: 25.11.00",
+                key='ateco'
+            )
+            
+            datore_lavoro = st.text_input(
+                "Datore di Lavoro",
+                value=st.session_state.checklist_data.get('datore_lavoro', {}).get('nome', '') if isinstance(st.session_state.checklist_data.get('datore_lavoro'), dict) else '',
+                key='datore_lavoro'
+            )
+        
+        with col2:
+            sede = st.text_area(
+                "Sede Operativa",
+                value=st.session_state.checklist_data.get('sede', ''),
+                height=100,
+                placeholder="Via, Città, CAP, Provincia",
+                key='sede'
+            )
+            
+            n_dipendenti = st.number_input(
+                "Numero Dipendenti",
+                min_value=0,
+                value=st.session_state.checklist_data.get('n_dipendenti', 0),
+                key='n_dipendenti'
+            )
+            
+            rspp_opzioni = ["Datore Lavoro", "Interno", "Esterno"]
+            rspp_salvato = st.session_state.checklist_data.get('rspp') or {}
+            rspp_tipo = st.selectbox(
+                "RSPP",
+                rspp_opzioni,
+                index=rspp_opzioni.index(rspp_salvato['tipo']) if rspp_salvato.get('tipo') in rspp_opzioni else 0,
+                key='rspp_tipo'
+            )
+    
+    # LUOGHI DI LAVORO - NUOVA SEZIONE
+    @checklist_section('luoghi', after=refresh_valutazione(record_fields('luoghi_lavoro')))
+    def sezione_luoghi():
+        st.markdown('<div class="section-header">🏭 LUOGHI DI LAVORO</div>', unsafe_allow_html=True)
+        
+        if 'luoghi_lavoro' not in st.session_state:
+            st.session_state.luoghi_lavoro = editable_column('luoghi_lavoro', [])
+        
+        with st.expander("➕ Aggiungi Luogo di Lavoro"):
+            luogo_nome = st.text_input("Nome Luogo", placeholder="Es: Ufficio Amministrativo, Magazzino, Officina...", key='new_luogo_nome')
+            luogo_mq = st.number_input("Superficie (mq)", min_value=0, key='new_luogo_mq')
+            luogo_note = st.text_area("Note Descrittive", placeholder="Caratteristiche, layout, particolarità...", key='new_luogo_note')
+            
+            # Audio per descrizione
+            st.markdown("**🎤 Dettatura Vocale**")
+            luogo_audio = st.file_uploader("Registra descrizione vocale", type=['mp3', 'wav', 'm4a'], key='new_luogo_audio')
+            
+            if luogo_audio:
+                trascrizione = transcribe_audio(luogo_audio, 'new_luogo_audio')
+                if trascrizione:
+                    luogo_note = st.text_area("Trascrizione", value=trascrizione, key='new_luogo_note_transcript')
+            
+            luogo_foto = st.file_uploader("📷 Foto Luogo", type=['jpg', 'png'], accept_multiple_files=True, key='new_luogo_foto')
+            
+            if st.button("✅ Aggiungi Luogo"):
+                if luogo_nome:
+                    nuovo_luogo = {
+                        'nome': luogo_nome,
+                        'superficie_mq': luogo_mq,
+                        'note': luogo_note,
+                        'foto': upload_photos(luogo_foto or [])
+                    }
+                    st.session_state.luoghi_lavoro.append(nuovo_luogo)
+                    st.success(f"✅ Luogo {luogo_nome} aggiunto!")
+                    rerun_section()
+        
+        def dettaglio_luogo(luogo):
+            st.write(f"**Note:** {luogo.get('note', 'N/A')}")
+            if luogo.get('foto'):
+                st.caption(f"📷 {len(luogo['foto'])} foto")
+        
+        windowed_list(
+            'luogo', st.session_state.luoghi_lavoro,
+            label=lambda luogo: f"🏭 {luogo['nome']} - {luogo.get('superficie_mq', 0)} mq",
+            detail=dettaglio_luogo,
+            row=lambda luogo: {'Mq': luogo.get('superficie_mq', 0), 'Note': luogo.get('note') or '',
+                               'Foto': len(luogo.get('foto') or [])}
+        )
+    
+    sezione_luoghi()
+    
+    # DIPENDENTI
+    @checklist_section('dipendenti', after=record_fields('dipendenti'))
+    def sezione_dipendenti():
+        st.markdown('<div class="section-header">👥 ELENCO DIPENDENTI</div>', unsafe_allow_html=True)
+        
+        if 'dipendenti' not in st.session_state:
+            st.session_state.dipendenti = editable_column('dipendenti', [])
+        
+        # Aggiungi dipendente
+        with st.expander("➕ Aggiungi Dipendente"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                dip_nome = st.text_input("Nome", key='new_dip_nome')
+            with col2:
+                dip_cognome = st.text_input("Cognome", key='new_dip_cognome')
+            with col3:
+                dip_mansione = st.text_input("Mansione", key='new_dip_mansione')
+            
+            st.markdown("**📄 Documenti**")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                doc_id = st.file_uploader("Carta Identità", type=['pdf', 'jpg', 'png'], key='new_dip_id')
+            with col2:
+                doc_formazione = st.file_uploader("Attestati Formazione", type=['pdf', 'jpg', 'png'], accept_multiple_files=True, key='new_dip_form')
+            with col3:
+                doc_idoneita = st.file_uploader("Idoneità Sanitaria", type=['pdf', 'jpg', 'png'], key='new_dip_idon')
+            
+            if st.button("✅ Aggiungi Dipendente"):
+                if dip_nome or dip_cognome:
+                    documenti = [dict(doc, tipo=tipo) for tipo, files in (
+                        ('carta_identita', [doc_id] if doc_id else []),
+                        ('formazione', doc_formazione or []),
+                        ('idoneita', [doc_idoneita] if doc_idoneita else [])
+                    ) for doc in upload_files(files)]
+                    nuovo_dip = {
+                        'nome': dip_nome,
+                        'cognome': dip_cognome,
+                        'mansione': dip_mansione,
+                        'documenti': documenti
+                    }
+                    st.session_state.dipendenti.append(nuovo_dip)
+                    st.success(f"✅ Dipendente {dip_nome} {dip_cognome} aggiunto!")
+                    rerun_section()
+        
+        # Importazione in blocco da export paghe
+        with st.expander("📥 Importa Dipendenti da CSV/Excel"):
+            st.caption("Colonne riconosciute: Cognome, Nome (oppure Nominativo) e Mansione/Qualifica")
+            file_dipendenti = st.file_uploader("Export paghe", type=['csv', 'xlsx'], key='import_dip_file')
+            
+            if file_dipendenti and st.button("📥 Importa"):
+                mansioni_note = [m.get('nome') for m in st.session_state.get('mansioni', st.session_state.checklist_data.get('mansioni', []))]
+                mansioni_note += [d.get('mansione') for d in st.session_state.dipendenti]
+                try:
+                    risultato = import_employees(file_dipendenti, file_dipendenti.name, st.session_state.dipendenti, mansioni_note)
+                except Exception as e:
+                    st.error(f"File non leggibile: {e}")
+                else:
+                    if risultato.dipendenti:
+                        # Una sola modifica dello stato e un solo salvataggio per tutto il file
+                        st.session_state.dipendenti.extend(risultato.dipendenti)
+                        if st.session_state.checklist_id:
+                            save_checklist({'dipendenti': st.session_state.dipendenti})
+                    st.success(f"✅ {len(risultato.dipendenti)} dipendenti importati da {risultato.rows} righe "
+                               f"in {risultato.seconds:.1f} s ({risultato.duplicates} già presenti)")
+                    if risultato.error_count:
+                        st.warning(f"⚠️ {risultato.error_count} righe scartate")
+                        st.dataframe([{'Riga': n, 'Errore': msg} for n, msg in risultato.errors],
+                                     hide_index=True, use_container_width=True)
+        
+        # Lista dipendenti
+        def dettaglio_dipendente(dip):
+            for doc in dip.get('documenti', []):
+                st.markdown(f"📄 [{doc['nome']}]({doc['url']})")
+        
+        windowed_list(
+            'dip', st.session_state.dipendenti,
+            label=lambda dip: f"👤 {dip['nome']} {dip['cognome']} - {dip.get('mansione', 'N/A')}",
+            detail=dettaglio_dipendente,
+            row=lambda dip: {'Cognome': dip['cognome'], 'Nome': dip['nome'], 'Mansione': dip.get('mansione') or '',
+                             'Documenti': len(dip.get('documenti') or [])}
+        )
+    
+    sezione_dipendenti()
+    
+    # ATTREZZATURE
+    @checklist_section('attrezzature', after=record_fields('attrezzature'))
+    def sezione_attrezzature():
+        st.markdown('<div class="section-header">⚙️ ELENCO ATTREZZATURE</div>', unsafe_allow_html=True)
+        
+        if 'attrezzature' not in st.session_state:
+            st.session_state.attrezzature = editable_column('attrezzature', [])
+        
+        with st.expander("➕ Aggiungi Attrezzatura"):
+            col1, col2 = st.columns(2)
+            with col1:
+                attr_nome = st.text_input("Nome Attrezzatura", key='new_attr_nome')
+                attr_marca = st.text_input("Marca", key='new_attr_marca')
+            with col2:
+                attr_modello = st.text_input("Modello", key='new_attr_modello')
+                attr_note = st.text_area("Note", key='new_attr_note', height=80)
+            
+            attr_foto = st.file_uploader("📷 Foto Attrezzatura", type=['jpg', 'png'], accept_multiple_files=True, key='new_attr_foto')
+            
+            if st.button("✅ Aggiungi Attrezzatura"):
+                if attr_nome:
+                    nuova_attr = {
+                        'nome': attr_nome,
+                        'marca': attr_marca,
+                        'modello': attr_modello,
+                        'note': attr_note,
+                        'foto': upload_photos(attr_foto or [])
+                    }
+                    st.session_state.attrezzature.append(nuova_attr)
+                    st.success(f"✅ Attrezzatura {attr_nome} aggiunta!")
+                    rerun_section()
+        
+        def dettaglio_attrezzatura(attr):
+            st.write(f"**Note:** {attr.get('note', 'N/A')}")
+            if attr.get('foto'):
+                st.caption(f"📷 {len(attr['foto'])} foto")
+        
+        windowed_list(
+            'attr', st.session_state.attrezzature,
+            label=lambda attr: f"⚙️ {attr['nome']} - {attr.get('marca', '')} {attr.get('modello', '')}",
+            detail=dettaglio_attrezzatura,
+            row=lambda attr: {'Marca': attr.get('marca') or '', 'Modello': attr.get('modello') or '',
+                              'Foto': len(attr.get('foto') or [])}
+        )
+    
+    sezione_attrezzature()
+    
+    # ANTINCENDIO
+    st.markdown('<div class="section-header">🔥 CHECK ANTINCENDIO</div>', unsafe_allow_html=True)
+    
+    scia_opzioni = ["Sì", "No", "Da verificare"]
+    soggetta_scia = st.radio(
+        "Azienda soggetta a SCIA antincendio?",
+        scia_opzioni,
+        index=scia_opzioni.index(st.session_state.checklist_data['soggetta_scia_antincendio'])
+        if st.session_state.checklist_data.get('soggetta_scia_antincendio') in scia_opzioni else 0,
+        key='soggetta_scia'
+    )
+    
+    if soggetta_scia == "No":
+        st.info("📋 Verifica Conformità Mini Codice D.M. 03/09/2021")
+        
+        check_items = [
+            "Reazione al fuoco materiali conforme",
+            "Compartimentazione adeguata",
+            "Vie di esodo libere e segnalate",
+            "Estintori adeguati e verificati",
+            "Segnaletica sicurezza conforme",
+            "Illuminazione emergenza funzionante"
+        ]
+        
+        checks = {}
+        for item in check_items:
+            checks[item] = st.checkbox(item, key=f'check_{item}')
+        
+        nc_antincendio = st.text_area("❌ Non Conformità Rilevate", key='nc_antincendio')
+    
+    # RISCHI ESTESO CON NOTE
+    @checklist_section('rischi', after=refresh_valutazione(record_fields('rischi_selezionati')))
+    def sezione_rischi():
+        st.markdown('<div class="section-header">⚠️ VALUTAZIONE RISCHI DETTAGLIATA</div>', unsafe_allow_html=True)
+        
+        rischi_completi = risk_catalog.names
+        
+        if 'rischi_selezionati' not in st.session_state:
+            st.session_state.rischi_selezionati = editable_column('rischi_selezionati', {})
+            # Il codice ATECO della checklist aperta è già stato valutato: si preseleziona solo se cambia
+            st.session_state.rischi_ateco = ateco_digits(st.session_state.checklist_data.get('ateco', ''))
+        
+        # Preselezione dal catalogo: rischi tipici del codice ATECO non ancora selezionati
+        codice_ateco = ateco_digits(st.session_state.get('ateco', ''))
+        if codice_ateco != st.session_state.rischi_ateco:
+            st.session_state.rischi_ateco = codice_ateco
+            suggeriti = {nome: info for nome, info in risk_catalog.suggest(codice_ateco).items()
+                         if nome not in st.session_state.rischi_selezionati} if codice_ateco else {}
+            for nome, info in suggeriti.items():
+                st.session_state.rischi_selezionati[nome] = {'presente': True, 'note': info['nota'], 'misure': info['misure']}
+                idx = rischi_completi.index(nome)
+                st.session_state[f'rischio_check_{idx}'] = True
+                st.session_state[f'rischio_note_{idx}'] = info['nota']
+            if suggeriti:
+                st.info(f"🏷️ ATECO {st.session_state.get('ateco')}: preselezionati {len(suggeriti)} rischi tipici "
+                        f"(catalogo {risk_catalog.version}). Verifica e completa le note.")
+        
+        st.markdown("**Seleziona i rischi presenti e aggiungi note per ognuno:**")
+        
+        # Mostra rischi in colonne
+        col1, col2, col3 = st.columns(3)
+        
+        for idx, rischio in enumerate(rischi_completi):
+            with [col1, col2, col3][idx % 3]:
+                # Valori iniziali nello stato (non value=): la preselezione ATECO li scrive direttamente
+                st.session_state.setdefault(f'rischio_check_{idx}', rischio in st.session_state.rischi_selezionati)
+                is_selected = st.checkbox(rischio, key=f'rischio_check_{idx}')
+                
+                if is_selected:
+                    selezionato = st.session_state.rischi_selezionati.get(rischio, {})
+                    st.session_state.setdefault(f'rischio_note_{idx}', selezionato.get('note', ''))
+                    note = st.text_area(
+                        f"Note per '{rischio}'",
+                        key=f'rischio_note_{idx}',
+                        height=100,
+                        placeholder="Descrivi il rischio specifico, la gravità, le misure..."
+                    )
+                    
+                    # Audio per note rischio
+                    audio_rischio = st.file_uploader(
+                        f"🎤 Dettatura per '{rischio}'",
+                        type=['mp3', 'wav', 'm4a'],
+                        key=f'rischio_audio_{idx}'
+                    )
+                    
+                    if audio_rischio:
+                        trascrizione = transcribe_audio(audio_rischio, f'rischio_audio_{idx}')
+                        if trascrizione:
+                            note = st.text_area(
+                                f"Trascrizione '{rischio}'",
+                                value=trascrizione,
+                                key=f'rischio_note_transcript_{idx}'
+                            )
+                    
+                    misure = selezionato.get('misure') or risk_catalog.risks.get(rischio, {}).get('misure')
+                    if misure:
+                        st.caption("🛡️ Misure suggerite: " + "; ".join(misure))
+                    
+                    st.session_state.rischi_selezionati[rischio] = {
+                        **selezionato,
+                        'presente': True,
+                        'note': note
+                    }
+                elif rischio in st.session_state.rischi_selezionati:
+                    del st.session_state.rischi_selezionati[rischio]
+    
+    sezione_rischi()
+    
+    # FOTO GENERALI
+    st.markdown('<div class="section-header">📷 FOTO AMBIENTI</div>', unsafe_allow_html=True)
+    
+    if 'foto_ambienti_url' not in st.session_state:
+        st.session_state.foto_ambienti_url = editable_column('foto_ambienti', [])
+    
+    foto_ambienti = st.file_uploader(
+        "Carica foto ambienti di lavoro",
+        type=['jpg', 'png'],
+        accept_multiple_files=True,
+        key=f"foto_ambienti_{st.session_state.setdefault('foto_ambienti_lotto', 0)}"
+    )
+    
+    # Dopo il caricamento il widget riparte vuoto: i file elaborati non restano nello stato della sessione
+    if foto_ambienti:
+        st.session_state.foto_ambienti_url.extend(upload_photos(foto_ambienti))
+        st.session_state.foto_ambienti_lotto += 1
+        st.rerun()
+    if st.session_state.foto_ambienti_url:
+        st.caption(f"📷 {len(st.session_state.foto_ambienti_url)} foto ambienti salvate")
+    
+    # NON CONFORMITÀ
+    @checklist_section('non conformità', after=record_fields('non_conformita'))
+    def sezione_non_conformita():
+        st.markdown('<div class="section-header">❌ NON CONFORMITÀ RILEVATE</div>', unsafe_allow_html=True)
+        
+        if 'non_conformita' not in st.session_state:
+            st.session_state.non_conformita = editable_column('non_conformita', [])
+        
+        with st.expander("➕ Aggiungi Non Conformità"):
+            nc_desc = st.text_area("Descrizione Non Conformità", key='new_nc_desc')
+            
+            # Audio per NC
+            nc_audio = st.file_uploader("🎤 Dettatura NC", type=['mp3', 'wav', 'm4a'], key='new_nc_audio')
+            
+            if nc_audio:
+                trascrizione = transcribe_audio(nc_audio, 'new_nc_audio')
+                if trascrizione:
+                    nc_desc = st.text_area("Trascrizione NC", value=trascrizione, key='new_nc_desc_transcript')
+            
+            nc_priorita = st.select_slider("Priorità", options=["Bassa", "Media", "Alta"], key='new_nc_priorita')
+            nc_foto = st.file_uploader("Foto NC", type=['jpg', 'png'], key='new_nc_foto')
+            
+            if st.button("✅ Aggiungi NC"):
+                if nc_desc:
+                    foto_nc = upload_photos([nc_foto] if nc_foto else [])
+                    nuova_nc = {
+                        'descrizione': nc_desc,
+                        'priorita': nc_priorita,
+                        'foto_url': foto_nc[0]['url'] if foto_nc else None,
+                        'foto': foto_nc
+                    }
+                    st.session_state.non_conformita.append(nuova_nc)
+                    st.success("✅ Non conformità aggiunta!")
+                    rerun_section()
+        
+        priority_emoji = {"Bassa": "🟢", "Media": "🟡", "Alta": "🔴"}
+        windowed_list(
+            'nc', st.session_state.non_conformita,
+            label=lambda nc: f"{priority_emoji[nc['priorita']]} {nc['descrizione'][:50]}...",
+            detail=lambda nc: st.write(f"**Priorità:** {nc['priorita']}"),
+            row=lambda nc: {'Priorità': nc['priorita'], 'Descrizione': nc['descrizione'],
+                            'Foto': len(nc.get('foto') or [])}
+        )
+    
+    sezione_non_conformita()
+    
+    # NOTE
+    note_sopralluogo = st.text_area(
+        "📝 Note Sopralluogo",
+        value=st.session_state.checklist_data.get('note_sopralluogo', ''),
+        height=150,
+        key='note_sopralluogo'
+    )
+    
+    sopralluogo_data = {
+        'ragione_sociale': ragione_sociale,
+        'sede': sede,
+        'ateco': ateco,
+        'n_dipendenti': n_dipendenti,
+        'datore_lavoro': {'nome': datore_lavoro},
+        'rspp': {'tipo': rspp_tipo},
+        'luoghi_lavoro': st.session_state.luoghi_lavoro,
+        'dipendenti': st.session_state.dipendenti,
+        'attrezzature': st.session_state.attrezzature,
+        'soggetta_scia_antincendio': soggetta_scia,
+        'rischi_selezionati': st.session_state.rischi_selezionati,
+        'foto_ambienti': st.session_state.foto_ambienti_url,
+        'non_conformita': st.session_state.non_conformita,
+        'note_sopralluogo': note_sopralluogo
+    }
+    
+    # AUTOSAVE
+    autosave.record(st.session_state.autosave_key, get_session_id(), sopralluogo_data)
+    stato_autosave = autosave.status(st.session_state.autosave_key, get_session_id())
+    if stato_autosave:
+        if stato_autosave['conflitto']:
+            st.warning("⚠️ Salvataggio automatico sospeso: la checklist è stata modificata da un altro utente")
+        elif stato_autosave['errore']:
+            st.caption(f"💾 Salvataggio automatico non riuscito, nuovo tentativo a breve ({stato_autosave['in_attesa']} modifiche in attesa)")
+        elif stato_autosave['in_attesa']:
+            st.caption(f"💾 {stato_autosave['in_attesa']} modifiche in attesa di salvataggio automatico")
+        elif stato_autosave['ultimo_salvataggio']:
+            st.caption(f"💾 Salvato automaticamente alle {datetime.fromtimestamp(stato_autosave['ultimo_salvataggio']).strftime('%H:%M:%S')}")
+    
+    # SALVA
+    st.markdown("---")
+    if st.button("💾 SALVA SOPRALLUOGO", type="primary", use_container_width=True):
+        data_to_save = dict(sopralluogo_data, status='bozza')
+        
+        if save_checklist(data_to_save):
+            st.markdown('<div class="success-message">✅ Sopralluogo salvato con successo!</div>', unsafe_allow_html=True)
+
+# ============================================
+# TAB 2: COMPLETAMENTO
+# ============================================
+with tab2, profiling.span('tab completamento'), checklist_conflict():
+    if not st.session_state.checklist_id:
+        st.warning("⚠️ Completa prima il sopralluogo nel Tab 1")
+    else:
+        # OFFERTA COMMERCIALE - NUOVA SEZIONE
+        @checklist_section('servizi')
+        def sezione_servizi():
+            st.markdown('<div class="section-header">💼 OFFERTA COMMERCIALE SERVIZI</div>', unsafe_allow_html=True)
+            
+            if 'servizi_offerta' not in st.session_state:
+                st.session_state.servizi_offerta = editable_column('servizi_offerta', [])
+            
+            with st.expander("➕ Aggiungi Servizio"):
+                serv_nome = st.text_input("Nome Servizio", placeholder="Es: Piano Emergenza, Formazione Antincendio, Visite Mediche...", key='new_serv_nome')
+                serv_categoria = st.selectbox(
+                    "Categoria Servizio",
+                    ["📄 DOCUMENTO", "🎓 FORMAZIONE", "🏥 SORVEGLIANZA SANITARIA"],
+                    key='new_serv_cat'
+                )
+                
+                # Campi specifici per categoria
+                if serv_categoria == "📄 DOCUMENTO":
+                    serv_ore = st.number_input("Ore necessarie per produzione documento", min_value=0.5, step=0.5, key='new_serv_ore')
+                    serv_dettaglio = f"{serv_ore} ore"
+                    
+                elif serv_categoria == "🎓 FORMAZIONE":
+                    serv_n_persone = st.number_input("Numero persone da formare", min_value=1, key='new_serv_persone')
+                    serv_ore_corso = st.number_input("Ore corso", min_value=1, key='new_serv_ore_corso')
+                    serv_dettaglio = f"{serv_n_persone} persone - {serv_ore_corso}h"
+                    
+                elif serv_categoria == "🏥 SORVEGLIANZA SANITARIA":
+                    st.markdown("**Dipendenti per mansione:**")
+                    mansioni_ss = {}
+                    n_mansioni_ss = st.number_input("Quante mansioni diverse?", min_value=1, max_value=10, key='new_serv_n_mans')
+                    
+                    for i in range(int(n_mansioni_ss)):
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            mans_nome = st.text_input(f"Mansione {i+1}", key=f'new_serv_mans_{i}')
+                        with col2:
+                            mans_n_dip = st.number_input(f"N. dipendenti", min_value=1, key=f'new_serv_ndip_{i}')
+                        
+                        if mans_nome:
+                            mansioni_ss[mans_nome] = mans_n_dip
+                    
+                    serv_dettaglio = json.dumps(mansioni_ss)
+                
+                serv_note = st.text_area("Note aggiuntive", key='new_serv_note')
+                serv_prezzo = st.number_input("Prezzo indicativo (€)", min_value=0.0, step=50.0, key='new_serv_prezzo')
+                
+                if st.button("✅ Aggiungi Servizio"):
+                    if serv_nome:
+                        nuovo_servizio = {
+                            'nome': serv_nome,
+                            'categoria': serv_categoria,
+                            'dettaglio': serv_dettaglio,
+                            'note': serv_note,
+                            'prezzo': serv_prezzo
+                        }
+                        st.session_state.servizi_offerta.append(nuovo_servizio)
+                        st.success(f"✅ Servizio {serv_nome} aggiunto!")
+                        rerun_section()
+            
+            if st.session_state.servizi_offerta:
+                st.markdown("### 📋 Servizi in Offerta")
+                
+                # Raggruppa per categoria
+                documenti = [s for s in st.session_state.servizi_offerta if s['categoria'] == "📄 DOCUMENTO"]
+                formazione = [s for s in st.session_state.servizi_offerta if s['categoria'] == "🎓 FORMAZIONE"]
+                sorveglianza = [s for s in st.session_state.servizi_offerta if s['categoria'] == "🏥 SORVEGLIANZA SANITARIA"]
+                
+                if documenti:
+                    st.markdown("#### 📄 Documenti")
+                    for idx, serv in enumerate(documenti):
+                        with st.expander(f"{serv['nome']} - {serv['dettaglio']} - €{serv['prezzo']}"):
+                            st.write(f"**Note:** {serv.get('note', 'N/A')}")
+                            if st.button("🗑️ Rimuovi", key=f'remove_serv_doc_{idx}'):
+                                st.session_state.servizi_offerta.remove(serv)
+                                rerun_section()
+                
+                if formazione:
+                    st.markdown("#### 🎓 Formazione")
+                    for idx, serv in enumerate(formazione):
+                        with st.expander(f"{serv['nome']} - {serv['dettaglio']} - €{serv['prezzo']}"):
+                            st.write(f"**Note:** {serv.get('note', 'N/A')}")
+                            if st.button("🗑️ Rimuovi", key=f'remove_serv_form_{idx}'):
+                                st.session_state.servizi_offerta.remove(serv)
+                                rerun_section()
+                
+                if sorveglianza:
+                    st.markdown("#### 🏥 Sorveglianza Sanitaria")
+                    for idx, serv in enumerate(sorveglianza):
+                        with st.expander(f"{serv['nome']} - €{serv['prezzo']}"):
+                            try:
+                                mansioni = json.loads(serv['dettaglio'])
+                                for mans, n in mansioni.items():
+                                    st.write(f"- {mans}: {n} dipendenti")
+                            except:
+                                st.write(serv['dettaglio'])
+                            st.write(f"**Note:** {serv.get('note', 'N/A')}")
+                            if st.button("🗑️ Rimuovi", key=f'remove_serv_ss_{idx}'):
+                                st.session_state.servizi_offerta.remove(serv)
+                                rerun_section()
+                
+                # Totale offerta
+                totale_offerta = sum(s['prezzo'] for s in st.session_state.servizi_offerta)
+                st.markdown(f"### 💰 Totale Offerta: **€ {totale_offerta:,.2f}**")
+        
+        sezione_servizi()
+        
+        # FORMAZIONE OBBLIGATORIA
+        st.markdown('<div class="section-header">🎓 FORMAZIONE OBBLIGATORIA</div>', unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("🔥 Antincendio")
+            livello_antincendio = st.selectbox(
+                "Livello Formazione Richiesto",
+                ["Livello 1 (4h)", "Livello 2 (8h)", "Livello 3 (16h)", "Non necessario"],
+                key='livello_antincendio'
+            )
+            note_antincendio = st.text_area("Note", key='note_antincendio')
+        
+        with col2:
+            st.subheader("🚑 Primo Soccorso")
+            gruppo_ps = st.selectbox(
+                "Gruppo Azienda",
+                ["Gruppo A (16h)", "Gruppo B (12h)", "Gruppo C (12h)", "Non necessario"],
+                key='gruppo_ps'
+            )
+            note_ps = st.text_area("Note", key='note_ps')
+        
+        # MANSIONI
+        @checklist_section('mansioni', after=refresh_valutazione())
+        def sezione_mansioni():
+            st.markdown('<div class="section-header">👷 MANSIONI AZIENDALI</div>', unsafe_allow_html=True)
+            
+            if 'mansioni' not in st.session_state:
+                st.session_state.mansioni = editable_column('mansioni', [])
+            
+            with st.expander("➕ Aggiungi Mansione"):
+                mans_nome = st.text_input("Nome Mansione", placeholder="Es: Operaio Generico", key='new_mans_nome')
+                mans_n_lav = st.number_input("N. Lavoratori", min_value=0, key='new_mans_n')
+                
+                st.markdown("**🎤 Descrizione Dettagliata Mansione**")
+                st.info("💡 Usa il microfono per dettare la descrizione completa")
+                
+                mans_desc = st.text_area(
+                    "Descrizione",
+                    placeholder="Descrivi dettagliatamente: attività svolte, responsabilità, attrezzature utilizzate, rischi specifici...",
+                    height=200,
+                    key='new_mans_desc'
+                )
+                
+                # Audio per mansione
+                mans_audio = st.file_uploader("🎤 Dettatura Mansione", type=['mp3', 'wav', 'm4a'], key='new_mans_audio')
+                
+                if mans_audio:
+                    trascrizione = transcribe_audio(mans_audio, 'new_mans_audio')
+                    if trascrizione:
+                        mans_desc = st.text_area("Trascrizione Mansione", value=trascrizione, key='new_mans_desc_transcript')
+                
+                if st.button("✅ Aggiungi Mansione"):
+                    if mans_nome:
+                        nuova_mans = {
+                            'nome': mans_nome,
+                            'n_lavoratori': mans_n_lav,
+                            'descrizione': mans_desc
+                        }
+                        st.session_state.mansioni.append(nuova_mans)
+                        st.success(f"✅ Mansione {mans_nome} aggiunta!")
+                        rerun_section()
+            
+            if st.session_state.mansioni:
+                st.markdown("### 📋 Mansioni Inserite")
+                for idx, mans in enumerate(st.session_state.mansioni):
+                    with st.expander(f"👷 {mans['nome']} ({mans['n_lavoratori']} lavoratori)"):
+                        st.write(f"**Descrizione:** {mans['descrizione'][:200]}..." if len(mans['descrizione']) > 200 else mans['descrizione'])
+                        if st.button("🗑️ Rimuovi", key=f'remove_mans_{idx}'):
+                            st.session_state.mansioni.pop(idx)
+                            rerun_section()
+        
+        sezione_mansioni()
+        
+        # VALUTAZIONE P × D
+        @checklist_section('valutazione')
+        def sezione_valutazione():
+            st.markdown('<div class="section-header">📐 VALUTAZIONE DEI RISCHI (P × D)</div>', unsafe_allow_html=True)
+            
+            assi = st.session_state.valutazione_assi = checklist_axes(
+                st.session_state.rischi_selezionati, st.session_state.mansioni, st.session_state.luoghi_lavoro)
+            if 'valutazione_rischi' not in st.session_state:
+                st.session_state.valutazione_rischi = RiskMatrix.from_dict(st.session_state.checklist_data.get('valutazione_rischi'), *assi)
+            matrice = st.session_state.valutazione_rischi = st.session_state.valutazione_rischi.reshape(*assi)
+            
+            if not matrice.risks:
+                st.info("Seleziona i rischi presenti nel Tab 1 per valutarli")
+                return
+            
+            st.caption("P (probabilità) e D (danno) da 1 a 4, 0 = non valutato. "
+                       "R = P × D: 1-2 Basso, 3-4 Medio, 6-8 Alto, 9-16 Molto alto")
+            tutti = "Tutti i luoghi"
+            col1, col2 = st.columns(2)
+            with col1:
+                rischio = st.selectbox("Rischio", matrice.risks, key='pd_rischio')
+            with col2:
+                luogo = st.selectbox("Luogo", [tutti] + matrice.luoghi, key='pd_luogo') if matrice.luoghi != [GENERALE] else GENERALE
+            
+            r = matrice.risks.index(rischio)
+            if luogo == tutti:
+                # Su tutti i luoghi si mostra il valore più alto e la modifica vale per ognuno
+                p, d = matrice.p[r].max(axis=1), matrice.d[r].max(axis=1)
+            else:
+                p, d = matrice.p[r, :, matrice.luoghi.index(luogo)], matrice.d[r, :, matrice.luoghi.index(luogo)]
+            griglia = pd.DataFrame({'P': p.astype(int), 'D': d.astype(int)}, index=pd.Index(matrice.mansioni, name="Mansione"))
+            griglia['R'] = griglia['P'] * griglia['D']
+            griglia['Classe'] = [CLASSI[c][1] for c in risk_class(griglia['R'].to_numpy())]
+            modificata = st.data_editor(
+                griglia, key=f'pd_griglia_{r}_{luogo}', use_container_width=True, disabled=['R', 'Classe'],
+                column_config={
+                    'P': st.column_config.SelectboxColumn("P", options=[0, 1, 2, 3, 4], required=True),
+                    'D': st.column_config.SelectboxColumn("D", options=[0, 1, 2, 3, 4], required=True),
+                }
+            )
+            cambiate = griglia.index[(modificata['P'] != griglia['P']) | (modificata['D'] != griglia['D'])]
+            for mansione in cambiate:
+                matrice.set(rischio, mansione, None if luogo == tutti else luogo,
+                            int(modificata.at[mansione, 'P']), int(modificata.at[mansione, 'D']))
+            if len(cambiate):
+                rerun_section()
+            
+            cols = st.columns(len(CLASSI) - 1)
+            for col, (classe, celle) in zip(cols, matrice.summary().items()):
+                col.metric(classe, celle)
+            classifica = matrice.ranking()
+            if classifica:
+                st.markdown("**Rischi in ordine di priorità**")
+                st.dataframe(classifica[:10], hide_index=True, use_container_width=True)
+        
+        sezione_valutazione()
+        
+        # DESCRIZIONI DETTAGLIATE
+        st.markdown('<div class="section-header">📝 DESCRIZIONI DETTAGLIATE</div>', unsafe_allow_html=True)
+        
+        st.markdown("**🎤 Descrizione Luoghi di Lavoro**")
+        desc_luoghi = st.text_area(
+            "Descrivi i luoghi di lavoro",
+            value=st.session_state.checklist_data.get('desc_luoghi_lavoro', ''),
+            height=200,
+            placeholder="Usa microfono per descrivere ambienti, layout, caratteristiche...",
+            key='desc_luoghi'
+        )
+        
+        # Audio per luoghi
+        audio_luoghi = st.file_uploader("🎤 Dettatura Luoghi", type=['mp3', 'wav', 'm4a'], key='audio_luoghi')
+        
+        if audio_luoghi:
+            trascrizione = transcribe_audio(audio_luoghi, 'audio_luoghi')
+            if trascrizione:
+                desc_luoghi = st.text_area("Trascrizione Luoghi", value=trascrizione, key='desc_luoghi_transcript')
+        
+        st.markdown("**🎤 Ciclo Lavorativo Generale**")
+        ciclo_lav = st.text_area(
+            "Descrivi il ciclo lavorativo",
+            value=st.session_state.checklist_data.get('ciclo_lavorativo', ''),
+            height=200,
+            placeholder="Usa microfono per descrivere il processo produttivo generale...",
+            key='ciclo_lav'
+        )
+        
+        # Audio per ciclo
+        audio_ciclo = st.file_uploader("🎤 Dettatura Ciclo", type=['mp3', 'wav', 'm4a'], key='audio_ciclo')
+        
+        if audio_ciclo:
+            trascrizione = transcribe_audio(audio_ciclo, 'audio_ciclo')
+            if trascrizione:
+                ciclo_lav = st.text_area("Trascrizione Ciclo", value=trascrizione, key='ciclo_lav_transcript')
+        
+        st.markdown("**🎤 Misure di Prevenzione Presenti**")
+        misure_prev = st.text_area(
+            "Descrivi misure già presenti",
+            value=st.session_state.checklist_data.get('misure_prevenzione', ''),
+            height=200,
+            placeholder="Usa microfono per descrivere DPI, protezioni, procedure già in atto...",
+            key='misure_prev'
+        )
+        
+        # Audio per misure
+        audio_misure = st.file_uploader("🎤 Dettatura Misure", type=['mp3', 'wav', 'm4a'], key='audio_misure')
+        
+        if audio_misure:
+            trascrizione = transcribe_audio(audio_misure, 'audio_misure')
+            if trascrizione:
+                misure_prev = st.text_area("Trascrizione Misure", value=trascrizione, key='misure_prev_transcript')
+        
+        # PIANO MIGLIORAMENTO
+        @checklist_section('piano')
+        def sezione_piano():
+            st.markdown('<div class="section-header">📈 PIANO DI MIGLIORAMENTO</div>', unsafe_allow_html=True)
+            
+            if 'piano_miglioramento' not in st.session_state:
+                st.session_state.piano_miglioramento = editable_column('piano_miglioramento', [])
+            
+            with st.expander("➕ Aggiungi Azione Migliorativa"):
+                st.markdown("**🎤 Descrizione Azione**")
+                azione_desc = st.text_area(
+                    "Descrivi l'azione",
+                    placeholder="Usa microfono per descrivere l'intervento di miglioramento...",
+                    key='new_azione_desc'
+                )
+                
+                # Audio per azione
+                azione_audio = st.file_uploader("🎤 Dettatura Azione", type=['mp3', 'wav', 'm4a'], key='new_azione_audio')
+                
+                if azione_audio:
+                    trascrizione = transcribe_audio(azione_audio, 'new_azione_audio')
+                    if trascrizione:
+                        azione_desc = st.text_area("Trascrizione Azione", value=trascrizione, key='new_azione_desc_transcript')
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    azione_resp = st.text_input("Responsabile", key='new_azione_resp')
+                with col2:
+                    azione_scad = st.date_input("Scadenza", key='new_azione_scad')
+                
+                if st.button("✅ Aggiungi Azione"):
+                    if azione_desc:
+                        nuova_azione = {
+                            'descrizione': azione_desc,
+                            'responsabile': azione_resp,
+                            'scadenza': str(azione_scad)
+                        }
+                        st.session_state.piano_miglioramento.append(nuova_azione)
+                        st.success("✅ Azione aggiunta!")
+                        rerun_section()
+            
+            if st.session_state.piano_miglioramento:
+                for idx, azione in enumerate(st.session_state.piano_miglioramento):
+                    with st.expander(f"📌 {azione['descrizione'][:50]}..."):
+                        st.write(f"**Responsabile:** {azione.get('responsabile', 'N/A')}")
+                        st.write(f"**Scadenza:** {azione.get('scadenza', 'N/A')}")
+                        if st.button("🗑️ Rimuovi", key=f'remove_azione_{idx}'):
+                            st.session_state.piano_miglioramento.pop(idx)
+                            rerun_section()
+        
+        sezione_piano()
+        
+        # SALVA COMPLETAMENTO
+        st.markdown("---")
+        if st.button("💾 SALVA COMPLETAMENTO", type="primary", use_container_width=True):
+            data_to_save = {
+                'servizi_offerta': st.session_state.servizi_offerta,
+                'livello_formazione_antincendio': livello_antincendio,
+                'gruppo_primo_soccorso': gruppo_ps,
+                'mansioni': st.session_state.mansioni,
+                'desc_luoghi_lavoro': desc_luoghi,
+                'ciclo_lavorativo': ciclo_lav,
+                'misure_prevenzione': misure_prev,
+                'piano_miglioramento': st.session_state.piano_miglioramento,
+                'valutazione_rischi': st.session_state.valutazione_rischi.to_dict(),
+                'status': 'completa'
+            }
+            
+            if save_checklist(data_to_save):
+                st.markdown('<div class="success-message">✅ Completamento salvato con successo!</div>', unsafe_allow_html=True)
+
+# ============================================
+# TAB 3: REPORT FINALE
+# ============================================
+with tab3, profiling.span('tab report'), checklist_conflict():
+    if not st.session_state.checklist_id:
+        st.warning("⚠️ Completa prima i dati nei Tab precedenti")
+    else:
+        st.markdown('<div class="section-header">📊 REPORT COMPLETO CHECKLIST</div>', unsafe_allow_html=True)
+        
+        data = st.session_state.checklist_data
+        
+        # DATI AZIENDA
+        st.markdown("### 🏢 Dati Azienda")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Ragione Sociale", data.get('ragione_sociale', 'N/A'))
+            st.metric("ATECO", data.get('ateco', 'N/A'))
+        with col2:
+            st.metric("N. Dipendenti", data.get('n_dipendenti', 0))
+            st.metric("Datore Lavoro", data.get('datore_lavoro', {}).get('nome', 'N/A'))
+        with col3:
+            st.metric("RSPP", data.get('rspp', {}).get('tipo', 'N/A'))
+            st.metric("Stato", "✅ Completa" if data.get('status') == 'completa' else "⏳ Bozza")
+        
+        st.markdown(f"**Sede:** {data.get('sede', 'N/A')}")
+        
+        # LUOGHI DI LAVORO
+        st.markdown("### 🏭 Luoghi di Lavoro")
+        luoghi = data.get('luoghi_lavoro', [])
+        if luoghi:
+            windowed_list(
+                'report_luoghi', luoghi, removable=False,
+                label=lambda luogo: f"📍 {luogo['nome']}",
+                row=lambda luogo: {'Mq': luogo.get('superficie_mq', 0), 'Note': luogo.get('note') or ''},
+                block=lambda luogo: st.markdown(f"""
+                <div class="report-box">
+                    <div class="report-title">📍 {luogo['nome']}</div>
+                    <p><strong>Superficie:</strong> {luogo.get('superficie_mq', 0)} mq</p>
+                    <p><strong>Note:</strong> {luogo.get('note', 'N/A')}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            )
+        else:
+            st.info("Nessun luogo di lavoro inserito")
+        
+        # DIPENDENTI
+        st.markdown("### 👥 Dipendenti")
+        dipendenti = data.get('dipendenti', [])
+        if dipendenti:
+            st.write(f"**Totale dipendenti inseriti:** {len(dipendenti)}")
+            windowed_list(
+                'report_dip', dipendenti, removable=False,
+                label=lambda dip: f"{dip['nome']} {dip['cognome']}",
+                row=lambda dip: {'Mansione': dip.get('mansione') or ''},
+                block=lambda dip: st.markdown(f"- **{dip['nome']} {dip['cognome']}** - {dip.get('mansione', 'N/A')}")
+            )
+        else:
+            st.info("Nessun dipendente inserito")
+        
+        # ATTREZZATURE
+        st.markdown("### ⚙️ Attrezzature")
+        attrezzature = data.get('attrezzature', [])
+        if attrezzature:
+            st.write(f"**Totale attrezzature:** {len(attrezzature)}")
+            windowed_list(
+                'report_attr', attrezzature, removable=False,
+                label=lambda attr: attr['nome'],
+                row=lambda attr: {'Marca': attr.get('marca') or '', 'Modello': attr.get('modello') or ''},
+                block=lambda attr: st.markdown(f"- **{attr['nome']}** - {attr.get('marca', '')} {attr.get('modello', '')}")
+            )
+        else:
+            st.info("Nessuna attrezzatura inserita")
+        
+        # RISCHI
+        st.markdown("### ⚠️ Rischi Identificati")
+        rischi = data.get('rischi_selezionati', {})
+        if rischi:
+            st.write(f"**Totale rischi identificati:** {len(rischi)}")
+            for rischio, info in rischi.items():
+                if info.get('presente'):
+                    st.markdown(f"""
+                    <div class="report-box">
+                        <div class="report-title">⚠️ {rischio}</div>
+                        <p><strong>Note:</strong> {info.get('note', 'Nessuna nota')}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+        else:
+            st.info("Nessun rischio selezionato")
+        
+        # VALUTAZIONE P × D
+        st.markdown("### 📐 Valutazione P × D")
+        matrice = checklist_matrix(data)
+        classifica = matrice.ranking()
+        if classifica:
+            st.write(" · ".join(f"**{classe}:** {celle}" for classe, celle in matrice.summary().items()))
+            st.dataframe(classifica, hide_index=True, use_container_width=True)
+            st.markdown("**Mansioni più esposte**")
+            st.dataframe(matrice.by_mansione(), hide_index=True, use_container_width=True)
+        else:
+            st.info("Nessuna valutazione P × D inserita")
+        
+        # NON CONFORMITÀ
+        st.markdown("### ❌ Non Conformità")
+        nc = data.get('non_conformita', [])
+        if nc:
+            st.write(f"**Totale non conformità:** {len(nc)}")
+            priority_emoji = {"Bassa": "🟢", "Media": "🟡", "Alta": "🔴"}
+            windowed_list(
+                'report_nc', nc, removable=False,
+                label=lambda item: f"{priority_emoji[item['priorita']]} {item['descrizione'][:50]}",
+                row=lambda item: {'Priorità': item['priorita'], 'Descrizione': item['descrizione']},
+                block=lambda item: st.markdown(f"""
+                <div class="report-box">
+                    <div class="report-title">{priority_emoji[item['priorita']]} Priorità {item['priorita']}</div>
+                    <p>{item['descrizione']}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            )
+        else:
+            st.info("Nessuna non conformità rilevata")
+        
+        # MANSIONI
+        st.markdown("### 👷 Mansioni")
+        mansioni = data.get('mansioni', [])
+        if mansioni:
+            st.write(f"**Totale mansioni:** {len(mansioni)}")
+            for mans in mansioni:
+                st.markdown(f"""
+                <div class="report-box">
+                    <div class="report-title">👷 {mans['nome']} ({mans['n_lavoratori']} lavoratori)</div>
+                    <p>{mans['descrizione'][:300]}{'...' if len(mans['descrizione']) > 300 else ''}</p>
+                </div>
+                """, unsafe_allow_html=True)
+        else:
+            st.info("Nessuna mansione inserita")
+        
+        # FORMAZIONE
+        st.markdown("### 🎓 Formazione Obbligatoria")
+        st.markdown(f"- **Antincendio:** {data.get('livello_formazione_antincendio', 'Non specificato')}")
+        st.markdown(f"- **Primo Soccorso:** {data.get('gruppo_primo_soccorso', 'Non specificato')}")
+        
+        # OFFERTA COMMERCIALE
+        st.markdown("### 💼 Offerta Commerciale")
+        servizi = data.get('servizi_offerta', [])
+        if servizi:
+            st.write(f"**Totale servizi in offerta:** {len(servizi)}")
+            
+            # Raggruppa per categoria
+            documenti = [s for s in servizi if s['categoria'] == "📄 DOCUMENTO"]
+            formazione = [s for s in servizi if s['categoria'] == "🎓 FORMAZIONE"]
+            sorveglianza = [s for s in servizi if s['categoria'] == "🏥 SORVEGLIANZA SANITARIA"]
+            
+            if documenti:
+                st.markdown("#### 📄 Documenti")
+                for serv in documenti:
+                    st.markdown(f"- **{serv['nome']}** - {serv['dettaglio']} - €{serv['prezzo']}")
+            
+            if formazione:
+                st.markdown("#### 🎓 Formazione")
+                for serv in formazione:
+                    st.markdown(f"- **{serv['nome']}** - {serv['dettaglio']} - €{serv['prezzo']}")
+            
+            if sorveglianza:
+                st.markdown("#### 🏥 Sorveglianza Sanitaria")
+                for serv in sorveglianza:
+                    st.markdown(f"- **{serv['nome']}** - €{serv['prezzo']}")
+            
+            totale = sum(s['prezzo'] for s in servizi)
+            st.markdown(f"### 💰 **Totale Offerta: € {totale:,.2f}**")
+        else:
+            st.info("Nessun servizio in offerta")
+        
+        # DESCRIZIONI DETTAGLIATE
+        st.markdown("### 📝 Descrizioni Dettagliate")
+        
+        if data.get('desc_luoghi_lavoro'):
+            st.markdown("**Luoghi di Lavoro:**")
+            st.text_area("", value=data.get('desc_luoghi_lavoro'), height=150, disabled=True, key='report_luoghi')
+        
+        if data.get('ciclo_lavorativo'):
+            st.markdown("**Ciclo Lavorativo:**")
+            st.text_area("", value=data.get('ciclo_lavorativo'), height=150, disabled=True, key='report_ciclo')
+        
+        if data.get('misure_prevenzione'):
+            st.markdown("**Misure di Prevenzione:**")
+            st.text_area("", value=data.get('misure_prevenzione'), height=150, disabled=True, key='report_misure')
+        
+        # PIANO MIGLIORAMENTO
+        st.markdown("### 📈 Piano di Miglioramento")
+        piano = data.get('piano_miglioramento', [])
+        if piano:
+            st.write(f"**Totale azioni:** {len(piano)}")
+            for azione in piano:
+                st.markdown(f"""
+                <div class="report-box">
+                    <div class="report-title">📌 {azione['descrizione'][:100]}</div>
+                    <p><strong>Responsabile:</strong> {azione.get('responsabile', 'N/A')}</p>
+                    <p><strong>Scadenza:</strong> {azione.get('scadenza', 'N/A')}</p>
+                </div>
+                """, unsafe_allow_html=True)
+        else:
+            st.info("Nessuna azione di miglioramento")
+        
+        # NOTE
+        if data.get('note_sopralluogo'):
+            st.markdown("### 📝 Note Sopralluogo")
+            st.text_area("", value=data.get('note_sopralluogo'), height=100, disabled=True, key='report_note')
+        
+        # EXPORT PDF
+        st.markdown("---")
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            generated = False
+            if st.button("🖨️ GENERA PDF", use_container_width=True):
+                generated = True
+                with st.spinner("Generazione PDF..."), profiling.span('report pdf'):
+                    pdf_version, pdf_key, from_cache = export_report_pdf()
+                st.session_state.report_pdf = (st.session_state.checklist_id, pdf_version, pdf_key)
+                if from_cache:
+                    st.caption("PDF già generato per questa versione")
+            # Il PDF resta scaricabile finché non si salva una nuova versione della checklist;
+            # la sessione tiene solo la chiave, il file si legge dal disco
+            pdf_id, pdf_version, pdf_key = st.session_state.get('report_pdf') or (None, None, None)
+            pdf_path = None
+            if pdf_key and pdf_id == st.session_state.checklist_id and pdf_version in (None, st.session_state.checklist_tracker.version):
+                pdf_path = report_pdf_path(pdf_version, pdf_key)
+            if pdf_path:
+                prepared_download(
+                    "PDF" if pdf_version is not None else "PDF (con modifiche non salvate)", pdf_path, ready=generated,
+                    file_name=f"report_{data.get('ragione_sociale') or 'checklist'}_{datetime.now():%Y%m%d}.pdf".replace(' ', '_'),
+                    mime="application/pdf"
+                )
+
+# ============================================
+# TAB 4: GENERA DVR
+# ============================================
+with tab4, profiling.span('tab genera dvr'), checklist_conflict():
+    if not st.session_state.checklist_id:
+        st.warning("⚠️ Completa prima i dati nei Tab precedenti")
+    else:
+        st.markdown('<div class="section-header">📊 ANTEPRIMA DATI</div>', unsafe_allow_html=True)
+        
+        # Mostra riepilogo
+        data = st.session_state.checklist_data
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("🏢 Azienda", data.get('ragione_sociale', 'N/A'))
+            st.metric("👥 Dipendenti", len(data.get('dipendenti', [])))
+        
+        with col2:
+            st.metric("🏭 Luoghi Lavoro", len(data.get('luoghi_lavoro', [])))
+            st.metric("⚙️ Attrezzature", len(data.get('attrezzature', [])))
+        
+        with col3:
+            st.metric("👷 Mansioni", len(data.get('mansioni', [])))
+            st.metric("⚠️ Rischi", len(data.get('rischi_selezionati', [])))
+            st.metric("🔴 Rischi Alti", sum(r['classe'] in ("Alto", "Molto alto") for r in checklist_matrix(data).ranking()))
+        
+        with col4:
+            st.metric("❌ Non Conformità", len(data.get('non_conformita', [])))
+            st.metric("💼 Servizi Offerta", len(data.get('servizi_offerta', [])))
+        
+        st.markdown("---")
+        
+        # Generazione DVR: capitoli in parallelo, mostrati man mano che sono pronti
+        st.markdown("""
+         <div style="text-align: center; padding: 3rem; background: linear-gradient(135deg, #1B3A57 0%, #2C5F8D 100%); border-radius: 15px; margin: 2rem 0;">
+            <h2 style="color: white; margin-bottom: 1rem;">🚀 Generazione DVR con AI</h2>
+            <p style="color: rgba(255,255,255,0.8); margin-bottom: 2rem;">
+                Il sistema analizzerà tutti i dati inseriti e genererà automaticamente<br>
+                il Documento di Valutazione dei Rischi completo e conforme al D.Lgs. 81/08
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        col1, col2, col3 = st.columns([1, 2, 1])
+        
+        with col2:
+            genera = st.button("🚀 GENERA DVR", type="primary", use_container_width=True)
+        
+        if genera:
+            if isinstance(data, LazyChecklist):
+                data.load_all()
+            chapters = plan_chapters(dict(data))
+            bar = st.progress(0.0, text=f"0/{len(chapters)} capitoli")
+            # Un segnaposto per capitolo, nell'ordine del documento
+            slots = {chapter.key: st.empty() for chapter in chapters}
+            for chapter in chapters:
+                slots[chapter.key].caption(f"⏳ {chapter.title}")
+            start = time.perf_counter()
+            with profiling.span('genera dvr', capitoli=len(chapters)) as span:
+                for done, chapter in enumerate(generate_chapters(dvr_writer, chapters, int(os.getenv("DVR_WORKERS", "4")),
+                                                                 chapter_cache, dvr_context), start=1):
+                    bar.progress(done / len(chapters), text=f"{done}/{len(chapters)} capitoli")
+                    with slots[chapter.key].container():
+                        if chapter.error:
+                            st.error(f"❌ {chapter.title}: {chapter.error}")
+                        else:
+                            with st.expander(f"♻️ {chapter.title} (invariato)" if chapter.cached
+                                             else f"✅ {chapter.title} ({chapter.seconds:.1f} s, {chapter.tokens} token"
+                                                  + (f", -{chapter.tokens_raw - chapter.tokens} compattando)"
+                                                     if chapter.tokens_raw > chapter.tokens else ")")):
+                                st.markdown(chapter.text)
+            st.session_state.dvr_documento = (st.session_state.checklist_id, assemble(data, chapters))
+            stats = run_stats(chapters)
+            if span is not None:
+                span['attributes'].update({f"dvr.{k}": v for k, v in stats.items()})
+            st.caption(f"{stats['capitoli']} capitoli in {time.perf_counter() - start:.1f} s: {stats['generati']} generati, "
+                       f"{stats['cache']} invariati dalla generazione precedente ({stats['hit_rate']:.0%}), "
+                       f"{stats['token_prompt']} token di prompt ({stats['token_risparmiati']} risparmiati)"
+                       + (f", {stats['errori']} da completare" if stats['errori'] else ""))
+        
+        documento = st.session_state.get('dvr_documento')
+        if documento and documento[0] == st.session_state.checklist_id:
+            if not genera:
+                with st.expander("📄 DVR generato"):
+                    st.markdown(documento[1])
+            nome_file = f"DVR_{data.get('ragione_sociale') or 'checklist'}".replace(' ', '_')
+            col_md, col_docx = st.columns(2)
+            with col_md:
+                st.download_button("⬇️ SCARICA DVR (Markdown)", data=documento[1].encode('utf-8'),
+                                   file_name=f"{nome_file}.md", mime="text/markdown", use_container_width=True)
+            with col_docx:
+                # Il documento Word si scrive a flusso nella cache su disco (foto una alla volta) e si
+                # serve da lì: in sessione restano la chiave e il numero di foto, fino al download
+                docx_key = content_key(documento[1].encode('utf-8'), st.session_state.checklist_id,
+                                       st.session_state.checklist_tracker.version, docx_template_path, docx_template_modified)
+                word = st.session_state.get('dvr_docx')
+                docx_path = download_cache.path(docx_key) if word and word[0] == docx_key else None
+                composed = False
+                if docx_path is None and st.button("📝 PREPARA WORD", use_container_width=True):
+                    if isinstance(data, LazyChecklist):
+                        data.load_all()
+                    with st.spinner("Composizione documento Word..."), profiling.span('dvr docx'):
+                        docx_path, n_foto = download_cache.put_file(
+                            docx_key, lambda output: write_docx(output, documento[1], docx_template, photo_sections(data)))
+                    word = st.session_state.dvr_docx = (docx_key, n_foto)
+                    composed = True
+                if docx_path is not None:
+                    prepared_download(f"DVR (Word, {word[1]} foto)", docx_path, ready=composed, file_name=f"{nome_file}.docx",
+                                      mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+
+# Footer
+st.markdown("---")
+st.markdown("""
+<div style="text-align: center; padding: 2rem; color: #6B7280;">
+    <p style="margin: 0;">Powered by <strong style="color: #1B3A57;">PARADIGMA+</strong></p>
+    <p style="margin: 0.5rem 0 0 0; font-size: 0.875rem;">Sistema DVR PRO v2.0 - Dicembre 2024</p>
+</div>
+""", unsafe_allow_html=True)
+
+record_timing('app', run_started)
+
+if debug_mode():
+    keep_profile(profiling.finish())
+    st.session_state.pop('profilo_attivo', None)
+    with st.sidebar:
+        with st.expander("🛠️ Profilo rerun", expanded=True):
+            ultimo = st.session_state[PROFILES_KEY][-1]
+            st.caption(f"Ultimo rerun: {ultimo['duration_ms']:.0f} ms · {ultimo['http_calls']} chiamate HTTP · "
+                       f"{ultimo['http_kb']} KB (richieste dello script di questa sessione)")
+            st.dataframe([{
+                'Fase': '\u2003' * span['depth'] + span['name'],
+                'ms': span['duration_ms'],
+                'HTTP': span['http.calls'],
+                'KB ↑': round(span['http.bytes_sent'] / 1024, 1),
+                'KB ↓': round(span['http.bytes_received'] / 1024, 1),
+            } for span in ultimo['spans']], hide_index=True, use_container_width=True)
+            st.markdown("**Ultimi rerun**")
+            st.dataframe([{k: p[k] for k in ('name', 'duration_ms', 'http_calls', 'http_kb', 'status')}
+                          for p in reversed(st.session_state[PROFILES_KEY])], hide_index=True, use_container_width=True)
+            st.caption(f"Span in formato JSON lines (campi OpenTelemetry) in `{profiling.PROFILE_LOG}`")
+
+# Trascrizioni in corso: un frammento controlla ogni secondo e riesegue l'app solo quando una termina
+@st.fragment(run_every=1)
+def attesa_trascrizioni():
+    pending = transcription_scheduler.pending(st.session_state.transcription_jobs)
+    if pending != st.session_state.transcription_jobs:
+        st.session_state.transcription_jobs = pending
+        st.rerun(scope='app')
+    st.caption(f"⏳ {len(pending)} trascrizioni in corso...")
+
+if st.session_state.transcription_jobs:
+    attesa_trascrizioni()
@@ -0,0 +1,116 @@
+"""Pre-elaborazione audio prima dell'invio a Whisper: mono 16 kHz, taglio silenzi, compressione e suddivisione"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+SILENCE_DB = -45.0          # soglia silenzio rispetto al fondo scala
+PADDING_MS = 250            # margine lasciato attorno al parlato
+MAX_CHUNK_SECONDS = 600     # i chunk più lunghi vengono divisi sui silenzi
+API_MAX_BYTES = 24 * 1024 * 1024  # limite upload Whisper (25 MB) con margine
+OPUS_BITRATE = '24k'
+
+# Da incrementare se cambia l'output, invalida la cache trascrizioni
+PREPROCESS_VERSION = 1
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def decode_pcm(audio_bytes, filename):
+    """Decodifica qualsiasi formato in PCM int16 mono 16 kHz"""
+    suffix = os.path.splitext(filename)[1] or '.bin'
+    # File temporaneo: m4a/mp4 non sono decodificabili da pipe non seekable
+    with tempfile.NamedTemporaryFile(suffix=suffix) as src:
+        src.write(audio_bytes)
+        src.flush()
+        result = subprocess.run(
+            ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', src.name,
+             '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1'],
+            capture_output=True, check=True
+        )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def encode_opus(pcm):
+    """Codifica PCM mono 16 kHz in Ogg/Opus"""
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '1',
+         '-i', 'pipe:0', '-c:a', 'libopus', '-b:a', OPUS_BITRATE, '-application', 'voip', '-f', 'ogg', 'pipe:1'],
+        input=pcm.tobytes(), capture_output=True, check=True
+    )
+    return result.stdout
+
+
+def frame_levels(pcm):
+    """Livello RMS in dBFS per ogni frame da FRAME_MS"""
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    n_frames = len(pcm) // frame
+    if n_frames == 0:
+        return np.zeros(0)
+    frames = pcm[:n_frames * frame].astype(np.float32).reshape(n_frames, frame) / 32768.0
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def trim_silence(pcm, levels=None):
+    """Rimuove il silenzio iniziale e finale, lasciando un piccolo margine"""
+    if levels is None:
+        levels = frame_levels(pcm)
+    voiced = np.flatnonzero(levels > SILENCE_DB)
+    if len(voiced) == 0:
+        return pcm[:0]
+
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    padding = SAMPLE_RATE * PADDING_MS // 1000
+    start = max(voiced[0] * frame - padding, 0)
+    end = min((voiced[-1] + 1) * frame + padding, len(pcm))
+    return pcm[start:end]
+
+
+def split_points(pcm, max_seconds=MAX_CHUNK_SECONDS):
+    """Indici di taglio scelti nel punto più silenzioso vicino al limite di durata"""
+    max_samples = max_seconds * SAMPLE_RATE
+    if len(pcm) <= max_samples:
+        return []
+
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    levels = frame_levels(pcm)
+    points = []
+    start = 0
+    while len(pcm) - start > max_samples:
+        # Cerca il frame più silenzioso nell'ultimo 20% della finestra
+        lo = (start + int(max_samples * 0.8)) // frame
+        hi = (start + max_samples) // frame
+        cut = (lo + int(np.argmin(levels[lo:hi]))) * frame
+        points.append(cut)
+        start = cut
+    return points
+
+
+def preprocess_audio(audio_bytes, filename, max_seconds=MAX_CHUNK_SECONDS):
+    """Restituisce la lista ordinata di chunk (bytes, nome file) pronti per Whisper"""
+    if not ffmpeg_available():
+        if len(audio_bytes) > API_MAX_BYTES:
+            raise ValueError("File audio troppo grande e ffmpeg non disponibile per comprimerlo")
+        return [(audio_bytes, filename)]
+
+    pcm = trim_silence(decode_pcm(audio_bytes, filename))
+    if len(pcm) == 0:
+        return []
+
+    base = os.path.splitext(filename)[0]
+    bounds = [0] + split_points(pcm, max_seconds) + [len(pcm)]
+    chunks = []
+    for idx, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        encoded = encode_opus(pcm[start:end])
+        if len(encoded) > API_MAX_BYTES:
+            # Non dovrebbe accadere con Opus a basso bitrate: dimezza la durata e riprova
+            return preprocess_audio(audio_bytes, filename, max_seconds // 2)
+        chunks.append((encoded, f"{base}_{idx:03d}.ogg"))
+    return chunks
@@ -0,0 +1,353 @@
+"""Salvataggio automatico: journal locale append-only e flush su Supabase in background"""
+import glob
+import json
+import os
+import threading
+import time
+
+from checklist_delta import ChangeTracker, ConflictError, fingerprint
+
+try:
+    import fcntl
+except ImportError:  # Windows: si riconoscono solo le sessioni attive di questo processo
+    fcntl = None
+
+DRAFT_PREFIX = 'bozza-'
+MAX_RETRY_SECONDS = 60          # attesa massima tra due tentativi di salvataggio falliti
+SESSION_CHECK_SECONDS = 30      # ogni quanto si cercano le sessioni chiuse
+
+
+class Owner:
+    """Lock esclusivo (flock) sul journal di una sessione attiva.
+
+    Finché la sessione lo tiene, nessun'altra sessione, anche di un altro processo del
+    server, considera il journal abbandonato. Il lock cade da solo se il processo muore.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        f = open(self.path, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self._file.close()
+        self._file = None
+
+
+class Journal:
+    """File JSONL append-only con le modifiche ai campi di una checklist"""
+
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            for entry in self._read():
+                self.seq = max(self.seq, entry.get('seq', entry.get('flushed', 0)))
+
+    def _read(self):
+        entries = []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # riga troncata da un crash durante la scrittura
+        return entries
+
+    def append(self, changes):
+        with self._lock:
+            now = time.time()
+            lines = []
+            for field, value in changes.items():
+                self.seq += 1
+                lines.append(json.dumps({'seq': self.seq, 'ts': now, 'field': field, 'value': value},
+                                        ensure_ascii=False, default=str))
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def pending(self):
+        """Modifiche non ancora salvate, una per campo (vince l'ultima), e ultimo seq"""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return {}, self.seq
+            entries = self._read()
+        flushed = max((e['flushed'] for e in entries if 'flushed' in e), default=0)
+        changes = {}
+        last_seq = flushed
+        for entry in entries:
+            if entry.get('seq', 0) > flushed:
+                changes[entry['field']] = entry['value']
+                last_seq = entry['seq']
+        return changes, last_seq
+
+    def mark_flushed(self, seq):
+        with self._lock:
+            if seq >= self.seq:
+                # Tutto salvato: il journal può essere compattato
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'flushed': seq}) + '\n')
+
+    def move(self, path):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.replace(self.path, path)
+            self.path = path
+
+
+class _Stream:
+    """Stato dell'autosave per una checklist in una sessione"""
+
+    def __init__(self, journal, owner, tracker, checklist_id):
+        self.journal = journal
+        self.owner = owner
+        self.tracker = tracker
+        self.checklist_id = checklist_id
+        self.draft_key = None
+        self.recorded = {}
+        self.first_pending = None
+        self.last_change = None
+        self.last_flush = None
+        self.error = None
+        self.conflict = False
+        self.failures = 0
+        self.retry_at = 0.0
+        self.closing = False
+
+
+class AutosaveEngine:
+    """Registra le modifiche nel journal e le salva su Supabase a blocchi, dopo una pausa di inattività.
+
+    session_alive(session_id), se indicata, permette di scollegare da sole le sessioni chiuse
+    dal browser; le altre si scollegano con detach() (es. all'apertura di un'altra checklist).
+    """
+
+    def __init__(self, directory, insert_fn, patch_fn, debounce_seconds=3.0, max_delay_seconds=15.0,
+                 session_alive=None):
+        self.directory = directory
+        self.insert_fn = insert_fn
+        self.patch_fn = patch_fn
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.session_alive = session_alive
+        self._streams = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._loop, name='autosave', daemon=True).start()
+
+    def _path(self, key, session_id):
+        return os.path.join(self.directory, f"{key}.{session_id}.jsonl")
+
+    def attach(self, key, session_id, baseline, tracker=None, checklist_id=None):
+        """Collega la sessione alla checklist e restituisce le modifiche non salvate di sessioni terminate.
+
+        Si recuperano solo i journal abbandonati (riavvio del server, sessione chiusa): quelli
+        di sessioni ancora attive hanno il lock del proprietario e restano dove sono.
+        """
+        with self._lock:
+            previous = self._streams.pop((key, session_id), None)
+        if previous is not None:
+            previous.owner.release()
+        path = self._path(key, session_id)
+        owner = Owner(path + '.lock')
+        owner.acquire()
+        journal = Journal(path)
+        stream = _Stream(journal, owner, tracker, checklist_id)
+        stream.recorded = {field: fingerprint(value) for field, value in baseline.items()}
+
+        # Modifiche rimaste nel journal di questa sessione (riapertura della stessa checklist)
+        recovered, _ = journal.pending()
+        orphans = {}
+        with self._lock:
+            live = {s.journal.path for s in self._streams.values()}
+        for other in sorted(glob.glob(self._path(key, '*')), key=os.path.getmtime):
+            if other == path or other in live:
+                continue
+            other_owner = Owner(other + '.lock')
+            if not other_owner.acquire():
+                continue  # sessione ancora attiva, in questo o in un altro processo
+            changes, _ = Journal(other).pending()
+            orphans.update(changes)
+            os.remove(other)
+            other_owner.release()
+        if orphans:
+            journal.append(orphans)
+        recovered.update(orphans)
+        if recovered:
+            stream.first_pending = stream.last_change = time.time()
+
+        with self._lock:
+            self._streams[(key, session_id)] = stream
+        return recovered
+
+    def detach(self, key, session_id):
+        """Scollega la sessione: le modifiche in attesa si salvano in background, poi il journal torna libero"""
+        with self._lock:
+            found = self._find(key, session_id)
+            if found is None:
+                return
+            stream = found[1]
+            stream.closing = True
+            if stream.first_pending is None or stream.conflict:
+                self._close(stream)
+
+    def _find(self, key, session_id):
+        # Chiamato con il lock acquisito; una bozza può essere stata creata in background con un'altra chiave
+        stream = self._streams.get((key, session_id))
+        if stream is not None:
+            return (key, session_id), stream
+        for stream_key, stream in self._streams.items():
+            if stream_key[1] == session_id and stream.draft_key == key:
+                return stream_key, stream
+        return None
+
+    def _close(self, stream):
+        # Chiamato con il lock acquisito. Il journal resta su disco se ha ancora modifiche: senza
+        # il lock del proprietario il prossimo attach() della stessa checklist lo recupera
+        for stream_key in [k for k, s in self._streams.items() if s is stream]:
+            del self._streams[stream_key]
+        stream.owner.release()
+
+    def record(self, key, session_id, data):
+        """Aggiunge al journal i campi cambiati rispetto all'ultima registrazione"""
+        stream = self._streams.get((key, session_id))
+        if stream is None:
+            return
+        changes = {}
+        for field, value in data.items():
+            fp = fingerprint(value)
+            if stream.recorded.get(field) != fp:
+                stream.recorded[field] = fp
+                changes[field] = value
+        if changes:
+            stream.journal.append(changes)
+            stream.last_change = time.time()
+            stream.first_pending = stream.first_pending or stream.last_change
+
+    def remember(self, key, session_id, data):
+        """Registra come già salvati i campi caricati in ritardo (non sono modifiche dell'utente)"""
+        stream = self._streams.get((key, session_id))
+        if stream is not None:
+            for field, value in data.items():
+                stream.recorded[field] = fingerprint(value)
+
+    def bind(self, key, session_id, checklist_id, tracker):
+        """Associa una bozza alla checklist appena creata; restituisce la nuova chiave"""
+        new_key = str(checklist_id)
+        with self._lock:
+            stream = self._streams.pop((key, session_id), None)
+            if stream is None:
+                return new_key
+            stream.checklist_id = checklist_id
+            stream.tracker = tracker
+            path = self._path(new_key, session_id)
+            owner = Owner(path + '.lock')
+            owner.acquire()
+            stream.journal.move(path)
+            stream.owner.release()
+            stream.owner = owner
+            self._streams[(new_key, session_id)] = stream
+        return new_key
+
+    def resolved(self, key, session_id):
+        """Se la bozza è stata creata in background restituisce (nuova chiave, id, tracker)"""
+        if not key.startswith(DRAFT_PREFIX):
+            return None
+        with self._lock:
+            for (stream_key, stream_session), stream in self._streams.items():
+                if stream_session == session_id and stream.draft_key == key:
+                    return stream_key, stream.checklist_id, stream.tracker
+        return None
+
+    def status(self, key, session_id):
+        stream = self._streams.get((key, session_id))
+        if stream is None:
+            return None
+        pending, _ = stream.journal.pending()
+        return {
+            'in_attesa': len(pending),
+            'ultimo_salvataggio': stream.last_flush,
+            'errore': stream.error,
+            'conflitto': stream.conflict
+        }
+
+    def _loop(self):
+        last_check = time.time()
+        while True:
+            time.sleep(0.5)
+            now = time.time()
+            if self.session_alive is not None and now - last_check >= SESSION_CHECK_SECONDS:
+                last_check = now
+                with self._lock:
+                    closed = [k for k in self._streams if not self.session_alive(k[1])]
+                for key, session_id in closed:
+                    self.detach(key, session_id)
+            with self._lock:
+                due = [(k, s) for k, s in self._streams.items()
+                       if s.first_pending and not s.conflict and now >= s.retry_at and (
+                           s.closing
+                           or now - s.last_change >= self.debounce_seconds
+                           or now - s.first_pending >= self.max_delay_seconds)]
+            for (key, session_id), stream in due:
+                self._flush(key, session_id, stream)
+                if stream.closing and (stream.first_pending is None or stream.conflict):
+                    with self._lock:
+                        self._close(stream)
+
+    def _flush(self, key, session_id, stream):
+        changes, last_seq = stream.journal.pending()
+        try:
+            if stream.checklist_id is None:
+                # Bozza: si crea la riga solo quando c'è almeno la ragione sociale. Fino alla
+                # prossima modifica (record) non c'è niente da riprovare
+                if not changes.get('ragione_sociale'):
+                    stream.first_pending = None
+                    return
+                row = self.insert_fn(changes)
+                stream.draft_key = key
+                self.bind(key, session_id, row['id'], ChangeTracker(row))
+            elif changes:
+                with stream.tracker.lock:
+                    patch = stream.tracker.diff(changes)
+                    if patch:
+                        version = self.patch_fn(stream.checklist_id, patch, stream.tracker.version)
+                        stream.tracker.commit(patch, version)
+        except ConflictError as e:
+            stream.conflict = True
+            stream.error = str(e)
+            return
+        except Exception as e:
+            # Rete assente o errore temporaneo: si riprova con attesa crescente
+            stream.error = str(e)
+            stream.failures += 1
+            stream.retry_at = time.time() + min(MAX_RETRY_SECONDS, 2 ** stream.failures)
+            return
+
+        stream.journal.mark_flushed(last_seq)
+        stream.error = None
+        stream.failures = 0
+        stream.retry_at = 0.0
+        stream.last_flush = time.time()
+        if stream.journal.seq <= last_seq:
+            stream.first_pending = None
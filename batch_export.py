@@ -0,0 +1,113 @@
+"""Esportazione in blocco dei report PDF: selezione per stato e date, rendering in più processi, ZIP"""
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from checklist_delta import VERSION_COLUMN
+from process_pool import SpawnPool
+from report_pdf import render_report, report_key
+
+
+def select_checklists(repository, status=None, since=None, until=None, page_size=200):
+    """Righe (id, ragione_sociale, created_at, status) create tra since e until (date ISO, estremi inclusi).
+
+    Le pagine arrivano dalla più recente: ci si ferma alla prima riga precedente a since.
+    """
+    cursor = None
+    while True:
+        rows, cursor = repository.search(status=status, after=cursor, limit=page_size)
+        for row in rows:
+            day = str(row.get('created_at') or '')[:10]
+            if since and day < str(since):
+                return
+            if not until or day <= str(until):
+                yield row
+        if cursor is None:
+            return
+
+
+def archive_name(row, used):
+    """Nome del PDF nello ZIP: ragione sociale leggibile, univoco anche tra omonimi"""
+    base = re.sub(r'[^\w.-]+', '_', row.get('ragione_sociale') or 'checklist').strip('_') or 'checklist'
+    name = f"{base}_{str(row.get('created_at') or '')[:10]}.pdf"
+    if name in used:
+        name = f"{base}_{str(row['id'])[:8]}.pdf"
+    used.add(name)
+    return name
+
+
+class BatchExporter:
+    """Report di molte checklist in un file ZIP.
+
+    Le checklist si leggono dall'archivio nel processo corrente; i PDF mancanti nella
+    cache si disegnano in un pool di processi (SpawnPool) e finiscono
+    in cache per id e versione: una checklist non modificata dall'ultima esportazione
+    non viene ridisegnata.
+    """
+
+    def __init__(self, repository, cache, max_workers=None):
+        self.repository = repository
+        self.cache = cache
+        self.max_workers = max_workers or os.cpu_count()
+
+    def export(self, rows, destination, progress=None):
+        """Scrive lo ZIP in destination (percorso o file binario); progress(fatti, totale, riga, esito).
+
+        esito è 'cache', 'generato' o 'errore: ...'; restituisce il conteggio per esito.
+        """
+        rows = list(rows)
+        counts = {'cache': 0, 'generato': 0, 'errore': 0}
+        manifest, used = [], set()
+
+        with zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED) as archive:
+            def done(row, version, pdf, outcome):
+                name = archive_name(row, used) if pdf is not None else None
+                if pdf is not None:
+                    # I PDF sono già compressi: nello ZIP vanno senza ricomprimerli
+                    archive.writestr(name, pdf, compress_type=zipfile.ZIP_STORED)
+                counts[outcome.split(':')[0]] += 1
+                manifest.append({'id': row['id'], 'ragione_sociale': row.get('ragione_sociale'),
+                                 'versione': version, 'file': name, 'esito': outcome})
+                if progress is not None:
+                    progress(len(manifest), len(rows), row, outcome)
+
+            executor = None
+            pending = {}
+            try:
+                for row in rows:
+                    data = self.repository.get(row['id'])
+                    if data is None:
+                        done(row, None, None, 'errore: checklist non trovata')
+                        continue
+                    version = data.get(VERSION_COLUMN)
+                    key = report_key(row['id'], version)
+                    pdf = self.cache.get(key)
+                    if pdf is not None:
+                        done(row, version, pdf, 'cache')
+                        continue
+                    if executor is None:
+                        executor = SpawnPool(self.max_workers)
+                    pending[executor.submit(render_report, data)] = (row, version, key)
+                    # Al più due checklist in coda per processo: le altre restano nell'archivio
+                    if len(pending) >= 2 * self.max_workers:
+                        self._collect(pending, done, FIRST_COMPLETED)
+                self._collect(pending, done)
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+            archive.writestr('indice.json', json.dumps(manifest, ensure_ascii=False, indent=1))
+        return counts
+
+    def _collect(self, pending, done, return_when='ALL_COMPLETED'):
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            row, version, key = pending.pop(future)
+            try:
+                pdf = future.result()
+            except Exception as e:
+                done(row, version, None, f"errore: {e}")
+                continue
+            self.cache.put(key, pdf)
+            done(row, version, pdf, 'generato')
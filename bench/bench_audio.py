@@ -0,0 +1,94 @@
+"""Benchmark pre-elaborazione audio: byte risparmiati e latenza end-to-end stimata
+
+Uso:
+    python bench/bench_audio.py [cartella_clip] [--bandwidth-kbps 1000] [--whisper]
+
+Senza cartella genera clip sintetici (tono + lunghi silenzi). Con --whisper invia
+davvero i clip a Whisper (serve OPENAI_API_KEY) e misura la latenza reale.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_preprocess import ffmpeg_available, preprocess_audio  # noqa: E402
+from transcription import transcribe_chunks  # noqa: E402
+
+
+def synthetic_clip(speech_seconds, silence_seconds, rate=44100):
+    """WAV stereo 44.1 kHz con silenzio prima e dopo un segnale vocale simulato"""
+    t = np.arange(int(speech_seconds * rate)) / rate
+    voice = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    silence = np.zeros(int(silence_seconds * rate / 2))
+    mono = np.concatenate([silence, voice, silence])
+    stereo = (np.repeat(mono[:, None], 2, axis=1) * 32767).astype(np.int16)
+
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(stereo.tobytes())
+    return buf.getvalue()
+
+
+def load_corpus(folder):
+    if folder:
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(('.wav', '.mp3', '.m4a', '.ogg')):
+                with open(os.path.join(folder, name), 'rb') as f:
+                    yield name, f.read()
+    else:
+        for speech, silence in [(10, 20), (60, 60), (300, 120), (900, 300)]:
+            yield f"sintetico_{speech}s_{silence}s.wav", synthetic_clip(speech, silence)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder', nargs='?')
+    parser.add_argument('--bandwidth-kbps', type=float, default=1000, help="banda upload stimata (rete mobile)")
+    parser.add_argument('--whisper', action='store_true', help="invia davvero i clip a Whisper")
+    args = parser.parse_args()
+
+    if not ffmpeg_available():
+        sys.exit("ffmpeg non trovato nel PATH")
+
+    client = None
+    if args.whisper:
+        from openai import OpenAI
+        client = OpenAI()
+
+    upload_ms = lambda n: n * 8 / (args.bandwidth_kbps * 1000) * 1000
+    header = f"{'clip':<28}{'originale':>12}{'elaborato':>12}{'risparmio':>10}{'chunk':>6}{'prep ms':>9}{'upl. prima':>12}{'upl. dopo':>11}"
+    if client:
+        header += f"{'whisper ms':>12}"
+    print(header)
+
+    tot_before = tot_after = 0
+    for name, data in load_corpus(args.folder):
+        start = time.perf_counter()
+        chunks = preprocess_audio(data, name)
+        prep_ms = (time.perf_counter() - start) * 1000
+        after = sum(len(c) for c, _ in chunks)
+        tot_before += len(data)
+        tot_after += after
+
+        row = (f"{name[:27]:<28}{len(data):>12,}{after:>12,}{1 - after / len(data):>10.1%}{len(chunks):>6}"
+               f"{prep_ms:>9.0f}{upload_ms(len(data)):>12.0f}{upload_ms(after) + prep_ms:>11.0f}")
+        if client:
+            start = time.perf_counter()
+            transcribe_chunks(client, chunks)
+            row += f"{(time.perf_counter() - start) * 1000:>12.0f}"
+        print(row)
+
+    print(f"\nTotale: {tot_before:,} -> {tot_after:,} byte ({1 - tot_after / max(tot_before, 1):.1%} risparmiati)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""DVR Word: tempo e memoria di picco della scrittura a flusso al crescere delle foto
+
+Uso:
+    python bench/bench_docx.py --foto 30 300
+    python bench/bench_docx.py --foto 300 --lato 2048     # foto da ridurre, non anteprime
+
+Ogni misura gira in un processo separato (picco RSS da getrusage). Le foto sono JPEG
+con rumore (1024 px come le anteprime di image_ingest) da un fetch locale senza rete;
+il testo è un DVR generato dal client stub. Il picco deve restare quasi costante: le
+foto entrano nel pacchetto una alla volta, ridotte se serve.
+"""
+import argparse
+import io
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from load_test import MANSIONI, synthetic_checklist  # noqa: E402
+from docx_writer import DocxTemplate, write_docx  # noqa: E402
+from dvr_generation import StubWriter, assemble, generate_chapters, plan_chapters  # noqa: E402
+
+
+def noisy_jpeg(edge):
+    image = Image.effect_noise((edge, edge * 3 // 4), 60).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def measure(n_foto, edge):
+    data = synthetic_checklist(random.Random(7), 1)
+    data['mansioni'] = [{'nome': m, 'descrizione': f"compiti di {m}"} for m in MANSIONI]
+    chapters = plan_chapters(data)
+    for _ in generate_chapters(StubWriter(), chapters):
+        pass
+    markdown = assemble(data, chapters)
+    photos = [(f"Luogo di lavoro: Reparto {i // 10}", f"foto/{i}.jpg") for i in range(n_foto)]
+    raw = noisy_jpeg(edge)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        included = write_docx(output, markdown, DocxTemplate.default(), photos, fetch=lambda url: raw)
+        elapsed = time.perf_counter() - start
+        size = output.seek(0, os.SEEK_END)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{included:>4} foto (JPEG {len(raw) / 1024:.0f} KB): {elapsed:.1f} s, DOCX {size / 1024 / 1024:.1f} MB, "
+          f"picco RSS {peak / 1024:.0f} MB (+{(peak - baseline) / 1024:.0f} MB durante la scrittura)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--foto', type=int, nargs='+', default=[30, 300])
+    parser.add_argument('--lato', type=int, default=1024, help="lato lungo delle foto sorgente (px)")
+    parser.add_argument('--misura', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.misura is not None:
+        measure(args.misura, args.lato)
+        return
+    for n_foto in args.foto:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--misura', str(n_foto), '--lato', str(args.lato)],
+                       check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Generazione DVR: tempo totale per numero di capitoli in parallelo e con la cache dei capitoli, client stub
+
+Uso:
+    python bench/bench_dvr_generation.py --latenza 1.5 --workers 1 4 8
+
+Il client stub simula la latenza del modello senza rete: il confronto misura quanto
+il parallelismo per capitoli riduce l'attesa rispetto alla generazione sequenziale.
+Poi rigenera con la cache dei capitoli dopo aver corretto la descrizione di una mansione.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import MANSIONI, synthetic_checklist  # noqa: E402
+from cache import TieredCache  # noqa: E402
+from dvr_generation import StubWriter, assemble, generate_chapters, plan_chapters, run_stats  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latenza', type=float, default=1.5, help="secondi per capitolo")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    data = synthetic_checklist(random.Random(args.seed), 1)
+    data['mansioni'] = [{'nome': m, 'descrizione': f"compiti di {m}"} for m in MANSIONI]
+    chapters = plan_chapters(data)
+    print(f"{len(chapters)} capitoli, latenza {args.latenza} s ±20%")
+
+    for workers in args.workers:
+        writer = StubWriter(args.latenza, args.latenza * 0.2)
+        chapters = plan_chapters(data)
+        start = time.perf_counter()
+        first = None
+        for chapter in generate_chapters(writer, chapters, workers):
+            first = first or time.perf_counter() - start
+        total = time.perf_counter() - start
+        document = assemble(data, chapters)
+        print(f"{workers:>2} workers: primo capitolo {first:.1f} s, documento {total:.1f} s "
+              f"({len(document) / 1024:.0f} KB)")
+
+    workers = max(args.workers)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TieredCache(directory)
+        writer = StubWriter(args.latenza, args.latenza * 0.2)
+        for label in ("prima generazione", "dopo una correzione"):
+            chapters = plan_chapters(data)
+            start = time.perf_counter()
+            for _ in generate_chapters(writer, chapters, workers, cache):
+                pass
+            stats = run_stats(chapters)
+            print(f"cache, {label}: {time.perf_counter() - start:.1f} s, {stats['generati']} generati, "
+                  f"hit rate {stats['hit_rate']:.0%}")
+            data['mansioni'][0]['descrizione'] += " (corretta)"
+
+
+if __name__ == '__main__':
+    main()
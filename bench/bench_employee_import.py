@@ -0,0 +1,76 @@
+"""Importazione dipendenti: tempo e picco di memoria su export paghe sintetici
+
+Uso:
+    python bench/bench_employee_import.py --righe 10000
+    python bench/bench_employee_import.py --file export_paghe.xlsx
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from employee_import import import_employees  # noqa: E402
+
+MANSIONI = ['OPERAIO GENERICO', 'impiegato', 'Magazziniere', 'carrellista', 'Saldatore']
+
+
+def sample_file(n_rows, fmt='csv'):
+    """Export con n_rows dipendenti e qualche riga sporca (nomi mancanti, duplicati dopo la normalizzazione)"""
+    rows = [['Cognome', 'Nome', 'Qualifica']]
+    for i in range(n_rows):
+        if i % 500 == 499:
+            rows.append([f'Rossi{i}', '', 'impiegato'])
+        elif i % 250 == 0:
+            rows.append(['  bianchi ', ' MARIO ', 'impiegato'])
+        else:
+            rows.append([f"d'angelo {''.join(chr(97 + int(c)) for c in str(i))}", f'MARIA {chr(65 + i % 26)}',
+                         MANSIONI[i % len(MANSIONI)]])
+    buffer = io.BytesIO()
+    if fmt == 'xlsx':
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in rows:
+            sheet.append(row)
+        workbook.save(buffer)
+    else:
+        text = io.StringIO()
+        csv.writer(text, delimiter=';').writerows(rows)
+        buffer.write(text.getvalue().encode('utf-8'))
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--righe', type=int, default=10000)
+    parser.add_argument('--file', help="export reale da importare al posto di quelli sintetici")
+    args = parser.parse_args()
+
+    if args.file:
+        files = [(os.path.basename(args.file), io.BytesIO(open(args.file, 'rb').read()))]
+    else:
+        files = [(f'sintetico.{fmt}', sample_file(args.righe, fmt)) for fmt in ('csv', 'xlsx')]
+
+    print(f"{'file':<16}{'KB':>8}{'righe':>8}{'importati':>10}{'duplicati':>10}{'errori':>8}{'secondi':>9}{'picco MB':>10}")
+    for name, buffer in files:
+        size = len(buffer.getvalue())
+        buffer.seek(0)
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = import_employees(buffer, name, known_mansioni=['Operaio Generico'])
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<16}{size / 1024:>8.0f}{result.rows:>8}{len(result.dipendenti):>10}{result.duplicates:>10}"
+              f"{result.error_count:>8}{elapsed:>9.2f}{peak / 1024 / 1024:>10.1f}")
+        for row_number, message in result.errors[:3]:
+            print(f"   riga {row_number}: {message}")
+
+
+if __name__ == '__main__':
+    main()
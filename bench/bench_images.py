@@ -0,0 +1,85 @@
+"""Ingestione foto: byte e millisecondi per immagine, sequenziale e con il pool di processi
+
+Uso:
+    python bench/bench_images.py --corpus foto/             # jpg/png reali
+    python bench/bench_images.py --foto 40 --mp 12          # foto sintetiche da 12 MP con orientamento EXIF
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_ingest import FORMAT, ImageIngestor, ingest_image  # noqa: E402
+
+
+def synthetic_photo(rng, megapixels):
+    """Gradiente con rumore leggero (si comprime come una foto vera, non come rumore puro)"""
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 6, base.shape), 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels)
+    exif = image.getexif()
+    exif[0x0112] = 6           # ruotata di 90°, come gli scatti in verticale
+    exif[0x010F] = 'Telefono'  # metadati che devono sparire
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def load_corpus(directory):
+    return [open(os.path.join(directory, name), 'rb').read() for name in sorted(os.listdir(directory))
+            if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help="cartella con foto reali")
+    parser.add_argument('--foto', type=int, default=40)
+    parser.add_argument('--mp', type=float, default=12, help="megapixel delle foto sintetiche")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.corpus:
+        photos = load_corpus(args.corpus)
+    else:
+        rng = np.random.default_rng(1)
+        unique = [synthetic_photo(rng, args.mp) for _ in range(min(args.foto, 4))]
+        photos = [unique[i % len(unique)] for i in range(args.foto)]
+
+    # Sequenziale su un campione, per i tempi per immagine
+    sample = photos[:min(len(photos), 8)]
+    timings, sizes = [], {'foto': 0, 'anteprima': 0, 'miniatura': 0}
+    for data in sample:
+        start = time.perf_counter()
+        renditions = ingest_image(data)
+        timings.append((time.perf_counter() - start) * 1000)
+        for name, r in renditions.items():
+            sizes[name] += len(r.data)
+
+    original = sum(len(d) for d in sample) / len(sample)
+    print(f"formato {FORMAT}, {len(photos)} foto, originale medio {original / 1024:.0f} KB")
+    print(f"sequenziale: {sum(timings) / len(timings):.0f} ms/immagine")
+    for name, total in sizes.items():
+        print(f"  {name:<10}{total / len(sample) / 1024:>8.0f} KB ({100 * total / len(sample) / original:.1f}% dell'originale)")
+
+    ingestor = ImageIngestor(args.workers)
+    ingestor.process_batch(photos[:args.workers])  # avvio dei processi
+    start = time.perf_counter()
+    results = ingestor.process_batch(photos)
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for _, error in results if error)
+    print(f"pool da {args.workers} processi: {elapsed:.2f} s per {len(photos)} foto "
+          f"({elapsed * 1000 / len(photos):.0f} ms/immagine effettivi), {errors} errori")
+    ingestor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Apertura di una checklist: select('*') contro intestazione proiettata + sezioni su richiesta
+
+Uso:
+    python bench/bench_lazy_load.py --dipendenti 500 --latency-ms 40        # fake Supabase locale
+    python bench/bench_lazy_load.py --backend sqlite
+
+"Prima sezione" è il tempo fino ai dati dell'intestazione (primo render del Tab 1);
+"tutte" è il tempo per leggere ogni sezione, come fanno i Tab 3 e 4.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lazy_checklist import COLUMN_GROUPS, LazyChecklist, SnapshotStore  # noqa: E402
+from load_test import synthetic_checklist  # noqa: E402
+from storage import create_repository  # noqa: E402
+
+
+def timed(fn, repeat):
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        values.append((time.perf_counter() - start) * 1000)
+    return statistics.median(values)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='supabase', help="supabase (fake locale), sqlite o memory")
+    parser.add_argument('--dipendenti', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=0, help="latenza aggiunta dal fake Supabase")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    client = None
+    if args.backend == 'supabase':
+        from supabase import create_client
+        from fake_supabase import FAKE_KEY, serve
+        server, db = serve(0)
+        db.latency = args.latency_ms / 1000
+        client = create_client(f"http://127.0.0.1:{server.server_address[1]}", FAKE_KEY)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = create_repository(args.backend, client=client, path=os.path.join(tmp, 'bench.db'))
+        data = synthetic_checklist(random.Random(1), 1)
+        data['dipendenti'] = [{'nome': f"Nome{i}", 'cognome': f"Cognome{i}", 'mansione': 'Impiegato', 'documenti': []}
+                              for i in range(args.dipendenti)]
+        data['mansioni'] = [{'nome': 'Impiegato', 'descrizione': 'testo dettato ' * 300}]
+        checklist_id = repo.insert(data)['id']
+
+        full = repo.get(checklist_id)
+        header = repo.get_columns(checklist_id, COLUMN_GROUPS['intestazione'])
+        print(f"dimensione riga completa: {len(json.dumps(full, default=str)) / 1024:.1f} KB, "
+              f"intestazione: {len(json.dumps(header, default=str)) / 1024:.1f} KB")
+
+        executor = ThreadPoolExecutor(max_workers=len(COLUMN_GROUPS))
+
+        def lazy_all(cache, prefetch=False):
+            LazyChecklist(checklist_id, repo.get_columns, cache, executor=executor if prefetch else None).load_all()
+
+        cache = SnapshotStore()
+        lazy_all(cache)
+        print(f"{'apertura':<34}{'ms (mediana)':>14}")
+        for label, fn in [
+            ("select('*')", lambda: repo.get(checklist_id)),
+            ("lazy: prima sezione", lambda: LazyChecklist(checklist_id, repo.get_columns)),
+            ("lazy: tutte le sezioni", lambda: lazy_all(None)),
+            ("lazy: tutte, in parallelo", lambda: lazy_all(None, prefetch=True)),
+            ("lazy: tutte, cache per versione", lambda: lazy_all(cache)),
+        ]:
+            print(f"{label:<34}{timed(fn, args.repeat):>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
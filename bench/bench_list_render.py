@@ -0,0 +1,82 @@
+"""Tempo di rerun di una lista lunga: un expander e un pulsante per elemento contro windowed_list
+
+Uso:
+    python bench/bench_list_render.py --items 10,100,1000 --repeat 5
+
+Ogni configurazione gira in AppTest (stesso script runner dell'app, senza browser): si misura
+la mediana di un rerun completo, come dopo un clic qualsiasi nel Tab 1.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+SCRIPT = """
+import random
+import sys
+sys.path.insert(0, {root!r})
+import streamlit as st
+from list_view import windowed_list
+
+if 'dipendenti' not in st.session_state:
+    rng = random.Random(0)
+    st.session_state.dipendenti = [
+        {{'nome': f"Nome{{i}}", 'cognome': f"Cognome{{i}}", 'mansione': rng.choice(["Operaio", "Impiegato"]),
+          'documenti': [{{'nome': 'attestato.pdf', 'url': 'https://example.com/a.pdf'}}]}}
+        for i in range({items})
+    ]
+
+if {mode!r} == 'legacy':
+    for idx, dip in enumerate(st.session_state.dipendenti):
+        with st.expander(f"👤 {{dip['nome']}} {{dip['cognome']}} - {{dip['mansione']}}"):
+            for doc in dip['documenti']:
+                st.markdown(f"📄 [{{doc['nome']}}]({{doc['url']}})")
+            if st.button("🗑️ Rimuovi", key=f'remove_dip_{{idx}}'):
+                st.session_state.dipendenti.pop(idx)
+                st.rerun()
+else:
+    if {mode!r} == 'tabella':
+        st.session_state.setdefault('lista_dip_vista', "📊 Tabella")
+    windowed_list(
+        'dip', st.session_state.dipendenti,
+        label=lambda dip: f"👤 {{dip['nome']}} {{dip['cognome']}} - {{dip['mansione']}}",
+        detail=lambda dip: [st.markdown(f"📄 [{{doc['nome']}}]({{doc['url']}})") for doc in dip['documenti']],
+        row=lambda dip: {{'Cognome': dip['cognome'], 'Nome': dip['nome'], 'Mansione': dip['mansione']}}
+    )
+"""
+
+
+def rerun_ms(items, mode, repeat):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    at = AppTest.from_string(SCRIPT.format(root=root, items=items, mode=mode), default_timeout=300)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        at.run()
+        values.append((time.perf_counter() - start) * 1000)
+    return statistics.median(values), len(at.expander)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'elementi':>9}{'vista':>10}{'expander':>10}{'rerun ms':>10}")
+    for items in [int(n) for n in args.items.split(',')]:
+        for mode in ('legacy', 'schede', 'tabella'):
+            ms, expanders = rerun_ms(items, mode, args.repeat)
+            print(f"{items:>9}{mode:>10}{expanders:>10}{ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Budget dei prompt DVR: token per capitolo prima e dopo la compattazione, su una checklist grande
+
+Uso:
+    python bench/bench_prompt_budget.py --dipendenti 500 --budget 6000
+
+La checklist ha centinaia di dipendenti, trascrizioni lunghe e ripetitive e non
+conformità duplicate; i riassunti sono del client stub (nessuna rete). Senza
+tiktoken installato i token sono la stima per eccesso di prompt_budget.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import MANSIONI, synthetic_checklist  # noqa: E402
+from dvr_generation import StubWriter, generate_chapters, plan_chapters, run_stats  # noqa: E402
+from prompt_budget import ContextBuilder, tiktoken  # noqa: E402
+
+
+def transcript(rng, sentences):
+    """Dettato con frasi ripetute, come esce da Whisper su un sopralluogo lungo"""
+    return ' '.join(f"Nel reparto {rng.randint(1, 30)} c'è la {rng.choice(['pressa', 'sega', 'mola'])} "
+                    f"numero {i % 200}, {rng.choice(['ok', 'da verificare', 'senza carter'])}." for i in range(sentences))
+
+
+def large_checklist(n_dipendenti, seed):
+    rng = random.Random(seed)
+    data = synthetic_checklist(rng, 1)
+    data['dipendenti'] = [{'nome': f"Nome{i}", 'cognome': f"Cognome{i}", 'mansione': rng.choice(MANSIONI)}
+                          for i in range(n_dipendenti)]
+    data['mansioni'] = [{'nome': m, 'descrizione': f"compiti di {m}"} for m in MANSIONI]
+    data['ciclo_lavorativo'] = transcript(rng, 4000)
+    data['desc_luoghi_lavoro'] = transcript(rng, 1500)
+    data['misure_prevenzione'] = transcript(rng, 800)
+    data['non_conformita'] = ([{'descrizione': "Estintore non revisionato", 'priorita': 'Alta'}] * 60
+                              + [{'descrizione': transcript(rng, 5), 'priorita': 'Media'} for _ in range(150)])
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dipendenti', type=int, default=500)
+    parser.add_argument('--budget', type=int, default=6000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    data = large_checklist(args.dipendenti, args.seed)
+    writer = StubWriter()
+    chapters = plan_chapters(data)
+    start = time.perf_counter()
+    for _ in generate_chapters(writer, chapters, 4, context=ContextBuilder(writer, args.budget)):
+        pass
+    elapsed = time.perf_counter() - start
+
+    print(f"conteggio: {'tiktoken' if tiktoken else 'stima'}, budget {args.budget} token")
+    for chapter in chapters:
+        print(f"{chapter.title[:40]:<40} {chapter.tokens_raw:>8} -> {chapter.tokens:>6}")
+    stats = run_stats(chapters)
+    print(f"totale {stats['token_prompt'] + stats['token_risparmiati']} -> {stats['token_prompt']} token "
+          f"({stats['token_risparmiati']} risparmiati), {writer.calls - len(chapters)} riassunti, {elapsed:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
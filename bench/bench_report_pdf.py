@@ -0,0 +1,77 @@
+"""Report PDF: tempo di generazione e pagine per una checklist sintetica grande
+
+Uso:
+    python bench/bench_report_pdf.py --dipendenti 4000 --foto 200
+
+Le miniature arrivano da un fetch locale (nessuna rete): misura solo impaginazione e
+disegno. Riporta pagine, dimensione, tempo della prima generazione e del PDF in cache.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from load_test import synthetic_checklist  # noqa: E402
+from cache import TieredCache  # noqa: E402
+from report_pdf import cached_report  # noqa: E402
+from risk_scoring import RiskMatrix, checklist_axes  # noqa: E402
+
+
+def thumbnail_bytes(edge=256):
+    buffer = io.BytesIO()
+    Image.new('RGB', (edge, edge * 3 // 4), (120, 140, 160)).save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def large_checklist(n_dipendenti, n_foto, seed):
+    rng = random.Random(seed)
+    data = synthetic_checklist(rng, 1)
+    data['dipendenti'] = [{'nome': f"Nome{i}", 'cognome': f"Cognome{i}", 'mansione': f"Mansione {i % 20}",
+                           'documenti': []} for i in range(n_dipendenti)]
+    data['mansioni'] = [{'nome': f"Mansione {i}", 'n_lavoratori': n_dipendenti // 20, 'descrizione': 'compiti ' * 20}
+                        for i in range(20)]
+    data['luoghi_lavoro'] = [{'nome': f"Reparto {i}", 'superficie_mq': 100 + i, 'note': 'note ' * 30,
+                              'foto': [{'url': f"https://x/{i}/{j}.jpg", 'miniatura': f"https://x/{i}/{j}_m.jpg"}
+                                       for j in range(n_foto // 10)]}
+                             for i in range(10)]
+    data['non_conformita'] = [{'descrizione': 'difformità ' * 20, 'priorita': 'Alta', 'foto': []} for _ in range(50)]
+    risks, mansioni, luoghi = checklist_axes(data['rischi_selezionati'], data['mansioni'], data['luoghi_lavoro'])
+    matrix = RiskMatrix(risks, mansioni, luoghi)
+    for risk in risks:
+        matrix.set(risk, p=rng.randint(1, 4), d=rng.randint(1, 4))
+    data['valutazione_rischi'] = matrix.to_dict()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dipendenti', type=int, default=4000)
+    parser.add_argument('--foto', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    data = large_checklist(args.dipendenti, args.foto, args.seed)
+    thumb = thumbnail_bytes()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TieredCache(directory)
+        start = time.perf_counter()
+        pdf, _ = cached_report(cache, 1, 1, data, fetch=lambda url: thumb)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        _, from_cache = cached_report(cache, 1, 1, data, fetch=lambda url: thumb)
+        cached = time.perf_counter() - start
+
+    pages = pdf.count(b'/Type /Page\n') or pdf.count(b'/Type /Page ')
+    print(f"pagine {pages}, {len(pdf) / 1024:.0f} KB, {args.dipendenti} dipendenti, {args.foto} foto")
+    print(f"generazione {first:.2f} s, dalla cache {cached * 1000:.1f} ms (hit={from_cache})")
+
+
+if __name__ == '__main__':
+    main()
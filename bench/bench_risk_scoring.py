@@ -0,0 +1,69 @@
+"""Matrice P × D: ricalcolo completo contro aggiornamento di una cella, alla dimensione richiesta
+
+Uso:
+    python bench/bench_risk_scoring.py --rischi 50 --mansioni 100 --luoghi 20
+
+Riporta la mediana in millisecondi di compute(), set() di una cella e di una riga
+(tutti i luoghi), ranking() e andata/ritorno della forma salvata nella checklist.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from risk_scoring import LEVELS, RiskMatrix  # noqa: E402
+
+
+def timed(fn, repeat):
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        values.append((time.perf_counter() - start) * 1000)
+    return statistics.median(values)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rischi', type=int, default=50)
+    parser.add_argument('--mansioni', type=int, default=100)
+    parser.add_argument('--luoghi', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    risks = [f"Rischio {i}" for i in range(args.rischi)]
+    mansioni = [f"Mansione {i}" for i in range(args.mansioni)]
+    luoghi = [f"Luogo {i}" for i in range(args.luoghi)]
+    matrix = RiskMatrix(risks, mansioni, luoghi)
+    values = np.random.default_rng(0)
+    matrix.p[:] = values.integers(0, LEVELS + 1, matrix.p.shape)
+    matrix.d[:] = values.integers(0, LEVELS + 1, matrix.d.shape)
+    matrix.compute()
+    saved = json.dumps(matrix.to_dict())
+
+    results = {
+        'compute()': timed(matrix.compute, args.repeat),
+        'set() cella': timed(lambda: matrix.set(rng.choice(risks), rng.choice(mansioni), rng.choice(luoghi),
+                                                rng.randint(0, LEVELS), rng.randint(0, LEVELS)), args.repeat),
+        'set() tutti i luoghi': timed(lambda: matrix.set(rng.choice(risks), rng.choice(mansioni), None,
+                                                         rng.randint(0, LEVELS), rng.randint(0, LEVELS)), args.repeat),
+        'ranking()': timed(matrix.ranking, args.repeat),
+        'to_dict() + json': timed(lambda: json.dumps(matrix.to_dict()), args.repeat),
+        'from_dict()': timed(lambda: RiskMatrix.from_dict(json.loads(saved), risks, mansioni, luoghi), args.repeat),
+    }
+    print(f"{args.rischi} rischi × {args.mansioni} mansioni × {args.luoghi} luoghi = {matrix.p.size} celle, "
+          f"{len(saved) / 1024:.0f} KB salvati")
+    for name, ms in results.items():
+        print(f"{name:<24}{ms:>10.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
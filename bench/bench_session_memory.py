@@ -0,0 +1,108 @@
+"""Memoria per sessione: checklist copiata in ogni sessione contro snapshot condivisi, upload in RAM contro su disco
+
+Uso:
+    python bench/bench_session_memory.py --sessioni 30 --dipendenti 2000
+    python bench/bench_session_memory.py --upload-mb 50
+
+Le sessioni aprono tutte la stessa checklist (archivio SQLite locale) e prendono le
+colonne modificabili come fa l'app (LazyChecklist.editable). Senza store ogni sessione
+ha i suoi oggetti, come quando ogni sessione riceveva la sua copia. La memoria è quella
+trattenuta (tracemalloc) con tutte le sessioni aperte, divisa per il numero di sessioni.
+Per gli upload si confronta il gestore dei file di Streamlit con quello che scrive su disco.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager  # noqa: E402
+from streamlit.runtime.uploaded_file_manager import UploadedFileRec  # noqa: E402
+
+from load_test import MANSIONI, synthetic_checklist  # noqa: E402
+from lazy_checklist import LazyChecklist, SnapshotStore  # noqa: E402
+from storage import create_repository  # noqa: E402
+from upload_spill import spill_uploads  # noqa: E402
+
+# Colonne che l'app prende in modifica al primo render delle sezioni
+EDITABLE = ('luoghi_lavoro', 'dipendenti', 'attrezzature', 'rischi_selezionati', 'non_conformita',
+            'servizi_offerta', 'mansioni', 'piano_miglioramento', 'foto_ambienti')
+
+
+def retained(build, n):
+    """(KB trattenuti dalla prima sessione, KB medi per sessione) con n sessioni vive"""
+    gc.collect()
+    tracemalloc.start()
+    sessions = [build()]
+    first = tracemalloc.get_traced_memory()[0]
+    sessions += [build() for _ in range(n - 1)]
+    gc.collect()
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sessions
+    return first / 1024, total / n / 1024
+
+
+def open_session(repo, checklist_id, store):
+    data = LazyChecklist(checklist_id, repo.get_columns, store)
+    data.load_all()
+    columns = {column: data.editable(column, []) for column in EDITABLE}
+    return data, columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessioni', type=int, default=30)
+    parser.add_argument('--dipendenti', type=int, default=2000)
+    parser.add_argument('--upload-mb', type=float, default=20, help="MB caricati da ogni sessione")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = create_repository('sqlite', path=os.path.join(tmp, 'bench.db'))
+        rng = random.Random(1)
+        data = synthetic_checklist(rng, 1)
+        data['dipendenti'] = [{'nome': f"Nome{i}", 'cognome': f"Cognome{i}", 'mansione': rng.choice(MANSIONI),
+                               'documenti': [{'nome': 'attestato.pdf', 'url': f"https://storage/doc/{i}.pdf"}]}
+                              for i in range(args.dipendenti)]
+        data['foto_ambienti'] = [{'url': f"https://storage/foto/{i}.jpg", 'anteprima': f"https://storage/anteprime/{i}.jpg"}
+                                 for i in range(300)]
+        data['note_sopralluogo'] = "appunti dettati durante il sopralluogo " * 500
+        checklist_id = repo.insert(data)['id']
+
+        print(f"{args.sessioni} sessioni sulla stessa checklist ({args.dipendenti} dipendenti)")
+        store = SnapshotStore()
+        for label, shared in (("copia per sessione", None), ("snapshot condiviso", store)):
+            first, per_session = retained(lambda: open_session(repo, checklist_id, shared), args.sessioni)
+            print(f"  {label:<20} prima sessione {first:>8.0f} KB, media {per_session:>8.0f} KB per sessione")
+        print(f"  store: {store.usage()}")
+
+        size = int(args.upload_mb * 1024 * 1024)
+        chunk = os.urandom(1024 * 1024)
+        print(f"upload: {args.upload_mb:.0f} MB per sessione, file da 1 MB")
+        for label, spill in (("in memoria", False), ("su file temporanei", True)):
+            manager = MemoryUploadedFileManager('/upload')
+            if spill:
+                spill_uploads(manager, tmp)
+
+            def upload(session=iter(range(args.sessioni))):
+                session_id = f"sessione-{next(session)}"
+                for i in range(size // len(chunk)):
+                    # bytes nuovi per ogni file, come quelli ricevuti dal server
+                    record = UploadedFileRec(f"{session_id}-{i}", f"foto_{i}.jpg", 'image/jpeg', bytes(bytearray(chunk)))
+                    manager.add_file(session_id, record)
+                return session_id
+
+            _, per_session = retained(upload, args.sessioni)
+            print(f"  {label:<20} media {per_session / 1024:>8.1f} MB per sessione")
+            if spill:
+                print(f"  su disco: {manager.spill_stats()['byte_su_disco'] / 1024 / 1024:.0f} MB")
+                for n in range(args.sessioni):
+                    manager.remove_session_files(f"sessione-{n}")
+
+
+if __name__ == '__main__':
+    main()
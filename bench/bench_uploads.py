@@ -0,0 +1,59 @@
+"""Throughput del caricamento foto: un file alla volta contro il pool di PhotoUploader
+
+Uso:
+    python bench/bench_uploads.py --foto 40 --mb 3 --latency-ms 30 --fail-rate 0.1   # fake Supabase (TUS)
+    python bench/bench_uploads.py --backend sqlite
+
+Riporta MB/s, tentativi ripetuti e file falliti per ogni configurazione del pool.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+from storage import create_repository  # noqa: E402
+from uploads import PhotoUploader, UploadItem  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='supabase', help="supabase (fake locale), sqlite o memory")
+    parser.add_argument('--foto', type=int, default=40)
+    parser.add_argument('--mb', type=float, default=3.0, help="dimensione di ogni foto")
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="quota di blocchi TUS interrotti a metà")
+    parser.add_argument('--workers', default='1,4,8')
+    args = parser.parse_args()
+
+    client = db = None
+    if args.backend == 'supabase':
+        from supabase import create_client
+        from fake_supabase import FAKE_KEY, serve
+        server, db = serve(0)
+        db.latency = args.latency_ms / 1000
+        db.fail_rate = args.fail_rate
+        client = create_client(f"http://127.0.0.1:{server.server_address[1]}", FAKE_KEY)
+
+    photo = os.urandom(int(args.mb * 1024 * 1024))
+    print(f"{'worker':>7}{'MB':>8}{'secondi':>10}{'MB/s':>8}{'retry':>7}{'falliti':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = create_repository(args.backend, client=client, path=os.path.join(tmp, 'bench.db'))
+        for workers in [int(w) for w in args.workers.split(',')]:
+            uploader = PhotoUploader(repo, max_workers=workers, backoff_seconds=0.05)
+            items = [UploadItem(io.BytesIO(photo), f"bench/{workers}/foto_{i}.jpg", len(photo), 'image/jpeg')
+                     for i in range(args.foto)]
+            result = uploader.upload_batch(items)
+            print(f"{workers:>7}{result.megabytes:>8.1f}{result.seconds:>10.2f}{result.mb_per_s:>8.1f}"
+                  f"{result.retries:>7}{len(result.failures):>9}")
+            if db is not None:
+                corrupted = sum(db.objects.get(f"checklist-files/{item.path}") != photo for item in items if item.url)
+                if corrupted:
+                    print(f"  ⚠️ {corrupted} oggetti diversi dall'originale")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Load test dei backend di archiviazione: cicli create/update/load/list su checklist sintetiche
+
+Uso:
+    python bench/load_test.py --checklists 2000 --threads 8 --backends memory,sqlite
+    python bench/load_test.py --backends supabase,offline --fake     # contro tools/fake_supabase.py
+    python bench/load_test.py --backends supabase                    # progetto reale (SUPABASE_URL/KEY)
+
+Riporta p50/p99 in millisecondi per operazione e backend.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+from checklist_delta import ChangeTracker  # noqa: E402
+from storage import create_repository  # noqa: E402
+
+MANSIONI = ["Operaio Generico", "Impiegato", "Magazziniere", "Saldatore", "Carrellista", "Manutentore"]
+RISCHI = ["Rumore", "Elettrico", "Rischio chimico", "Videoterminali (VDT)", "Microclima", "Cadute dall'alto"]
+
+
+def synthetic_checklist(rng, idx):
+    n_dip = rng.choice([3, 10, 25, 60, 200])
+    return {
+        'ragione_sociale': f"Azienda {idx:05d} S.r.l.",
+        'ateco': f"{rng.randint(10, 99)}.{rng.randint(10, 99)}.00",
+        'sede': f"Via Roma {idx}, Milano",
+        'n_dipendenti': n_dip,
+        'datore_lavoro': {'nome': f"Titolare {idx}"},
+        'rspp': {'tipo': 'Esterno'},
+        'dipendenti': [{'nome': f"Nome{i}", 'cognome': f"Cognome{i}", 'mansione': rng.choice(MANSIONI), 'documenti': []}
+                       for i in range(n_dip)],
+        'attrezzature': [{'nome': f"Macchina {i}", 'marca': 'Marca', 'modello': f"M{i}", 'note': '', 'foto': []}
+                         for i in range(rng.randint(0, 30))],
+        'rischi_selezionati': {r: {'presente': True, 'note': 'nota ' * rng.randint(5, 50)}
+                               for r in rng.sample(RISCHI, rng.randint(1, len(RISCHI)))},
+        'non_conformita': [],
+        'note_sopralluogo': 'testo dettato ' * rng.randint(10, 200),
+        'status': 'bozza'
+    }
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_backend(repo, n_checklists, n_threads, seed):
+    timings = defaultdict(list)
+    lock = threading.Lock()
+
+    def timed(op, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            timings[op].append(elapsed)
+        return result
+
+    def worker(worker_idx):
+        rng = random.Random(seed + worker_idx)
+        for idx in range(worker_idx, n_checklists, n_threads):
+            data = synthetic_checklist(rng, idx)
+            row = timed('create', repo.insert, data)
+            tracker = ChangeTracker(row)
+
+            # Due salvataggi incrementali, come l'autosave del Tab 1
+            for step in range(2):
+                data['note_sopralluogo'] += f" aggiunta {step}"
+                data['dipendenti'].append({'nome': 'Nuovo', 'cognome': f"Assunto{step}", 'mansione': 'Impiegato', 'documenti': []})
+                patch = tracker.diff(data)
+                version = timed('update', repo.update, row['id'], patch, tracker.version)
+                tracker.commit(patch, version)
+
+            timed('load', repo.get, row['id'])
+            timed('list', repo.list_recent, 10)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return timings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checklists', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--backends', default='memory,sqlite')
+    parser.add_argument('--fake', action='store_true', help="usa il fake Supabase locale per supabase/offline")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    client = None
+    backends = args.backends.split(',')
+    if {'supabase', 'offline'} & set(backends):
+        from supabase import create_client
+        url, key = os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY')
+        if args.fake:
+            from fake_supabase import FAKE_KEY, serve
+            server, _ = serve(0)
+            url, key = f"http://127.0.0.1:{server.server_address[1]}", FAKE_KEY
+        client = create_client(url, key)
+
+    print(f"{'backend':<10}{'op':<8}{'n':>7}{'p50 ms':>10}{'p99 ms':>10}{'media ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            repo = create_repository(backend, client=client, path=os.path.join(tmp, f"{backend}.db"))
+            timings, elapsed = run_backend(repo, args.checklists, args.threads, args.seed)
+            for op in ('create', 'update', 'load', 'list'):
+                values = timings[op]
+                print(f"{backend:<10}{op:<8}{len(values):>7}{percentile(values, 50):>10.2f}"
+                      f"{percentile(values, 99):>10.2f}{statistics.mean(values):>10.2f}")
+            total_ops = sum(len(v) for v in timings.values())
+            print(f"{backend:<10}{'totale':<8}{total_ops:>7} op in {elapsed:.1f}s ({total_ops / elapsed:.0f} op/s)\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Archivio dei file per contenuto: SHA-256 dei byte, indice locale, conteggio dei riferimenti e GC in blocco"""
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from uploads import UploadItem
+
+BLOB_PREFIX = 'blobs'
+# Colonne della checklist che contengono riferimenti a blob (chiave 'blob' negli elementi)
+BLOB_COLUMNS = ('luoghi_lavoro', 'dipendenti', 'attrezzature', 'non_conformita', 'foto_ambienti')
+GC_GRACE_SECONDS = 7 * 24 * 3600  # blob appena caricati o riusati e non ancora salvati in una checklist
+LOOKUP_WORKERS = 8  # richieste leggere in parallelo per i blob assenti dall'indice locale
+
+
+def blob_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(source):
+    """(hash, dimensione) di un file binario letto a blocchi, senza caricarlo tutto in memoria"""
+    source.seek(0)
+    digest = hashlib.file_digest(source, 'sha256').hexdigest()
+    return digest, source.seek(0, io.SEEK_END)
+
+
+def blob_path(digest, extension):
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest}.{extension}"
+
+
+def checklist_refs(checklists):
+    """(id checklist, colonna, hash) per ogni blob citato dalle checklist"""
+    for checklist in checklists:
+        for column in BLOB_COLUMNS:
+            if column in checklist:
+                for h in referenced_blobs(checklist[column]):
+                    yield str(checklist['id']), column, h
+
+
+def referenced_blobs(value):
+    """Hash dei blob citati in un valore della checklist: 'blob' è un hash o un dizionario variante -> hash"""
+    found = set()
+    if isinstance(value, dict):
+        ref = value.get('blob')
+        if isinstance(ref, str):
+            found.add(ref)
+        elif isinstance(ref, dict):
+            found.update(h for h in ref.values() if isinstance(h, str))
+        for item in value.values():
+            found |= referenced_blobs(item)
+    elif isinstance(value, list):
+        for item in value:
+            found |= referenced_blobs(item)
+    return found
+
+
+class BlobStore:
+    """Indice locale dei blob caricati nello storage del repository.
+
+    Prima di ogni upload si controlla l'indice e poi lo storage (file_url); i riferimenti
+    delle checklist vengono registrati a ogni salvataggio e gc() elimina in blocco i blob
+    che nessuna checklist cita più.
+    """
+
+    SCHEMA = """
+        create table if not exists blobs (
+            hash text primary key,
+            path text not null,
+            url text not null,
+            size integer not null,
+            content_type text,
+            width integer,
+            height integer,
+            created_at real not null,
+            last_used real
+        );
+        -- Varianti (foto, anteprima, miniatura) già prodotte da un file originale
+        create table if not exists blob_sources (
+            source text not null,
+            variant text not null,
+            hash text not null,
+            primary key (source, variant)
+        );
+        create table if not exists blob_refs (
+            checklist_id text not null,
+            column_name text not null,
+            hash text not null,
+            primary key (checklist_id, column_name, hash)
+        );
+        create index if not exists blob_refs_hash on blob_refs (hash);
+    """
+
+    def __init__(self, repository, path):
+        self.repository = repository
+        self.path = path
+        self.stats = {'riusati': 0, 'caricati': 0, 'byte_risparmiati': 0}
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Colonne aggiunte dopo la prima versione dello schema
+        columns = {r['name'] for r in self._conn().execute('pragma table_info(blobs)')}
+        if 'last_used' not in columns:
+            with self._conn() as conn:
+                conn.execute('alter table blobs add column last_used real')
+                conn.execute('update blobs set last_used = created_at')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('pragma journal_mode=wal')
+            self._local.conn = conn
+        return conn
+
+    def get(self, digest):
+        row = self._conn().execute('select * from blobs where hash = ?', (digest,)).fetchone()
+        return dict(row) if row else None
+
+    def plan(self, source, extension, content_type=None, name=None, width=None, height=None):
+        """(hash, url) se il contenuto è già nello storage, altrimenti (hash, UploadItem da caricare)"""
+        return self.plan_many([(source, extension, content_type, name, width, height)])[0]
+
+    def plan_many(self, files):
+        """plan() per un lotto di (sorgente, estensione, content_type, nome, larghezza, altezza).
+
+        La sorgente sono i byte o un file binario leggibile a blocchi: si calcola l'hash a flusso
+        e l'UploadItem legge dallo stesso file, senza copie in memoria. I blob che mancano
+        dall'indice locale si cercano nello storage con richieste leggere in parallelo.
+        """
+        planned = []
+        for source, extension, content_type, name, width, height in files:
+            if isinstance(source, (bytes, bytearray)):
+                source = io.BytesIO(source)
+            digest, size = file_hash(source)
+            row = self.get(digest)
+            planned.append({'hash': digest, 'size': size, 'source': source, 'path': blob_path(digest, extension),
+                            'content_type': content_type, 'name': name, 'width': width, 'height': height,
+                            'url': row['url'] if row else None})
+
+        # Caricati da un'altra istanza o indice locale perso: una richiesta leggera per blob, in parallelo
+        missing = {p['hash']: p['path'] for p in planned if p['url'] is None}
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(LOOKUP_WORKERS, len(missing)), thread_name_prefix='blob-lookup') as pool:
+                found = dict(zip(missing, pool.map(self.repository.file_url, missing.values())))
+            for p in planned:
+                if p['url'] is None and found[p['hash']] is not None:
+                    p['url'] = found[p['hash']]
+                    self._insert(p['hash'], p['path'], p['url'], p['size'], p['content_type'], p['width'], p['height'])
+
+        results = []
+        for p in planned:
+            if p['url'] is not None:
+                self._touch([p['hash']])
+                self.stats['riusati'] += 1
+                self.stats['byte_risparmiati'] += p['size']
+                results.append((p['hash'], p['url']))
+            else:
+                results.append((p['hash'], UploadItem(p['source'], p['path'], p['size'], p['content_type'], name=p['name'])))
+        return results
+
+    def register(self, digest, item, width=None, height=None):
+        """Registra nell'indice un blob appena caricato"""
+        if item.url:
+            self._insert(digest, item.path, item.url, item.size, item.content_type, width, height)
+            self.stats['caricati'] += 1
+
+    def _insert(self, digest, path, url, size, content_type, width=None, height=None):
+        with self._conn() as conn:
+            now = time.time()
+            conn.execute('insert or replace into blobs (hash, path, url, size, content_type, width, height, created_at, '
+                         'last_used) values (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (digest, path, url, size, content_type, width, height, now, now))
+
+    def _touch(self, digests):
+        """Segna i blob come appena usati: un riuso non ancora salvato in una checklist non va raccolto dal GC"""
+        with self._conn() as conn:
+            conn.executemany('update blobs set last_used = ? where hash = ?', [(time.time(), d) for d in digests])
+
+    def source_variants(self, source):
+        """Varianti già caricate per un file originale (hash SHA-256 dei suoi byte), o None"""
+        rows = self._conn().execute(
+            'select s.variant, b.* from blob_sources s join blobs b on b.hash = s.hash where s.source = ?', (source,)
+        ).fetchall()
+        if rows:
+            self._touch([row['hash'] for row in rows])
+        return {row['variant']: dict(row) for row in rows} or None
+
+    def remember_source(self, source, variants):
+        with self._conn() as conn:
+            conn.executemany('insert or replace into blob_sources (source, variant, hash) values (?, ?, ?)',
+                             [(source, variant, digest) for variant, digest in variants.items()])
+
+    # Riferimenti e garbage collection
+
+    def track(self, checklist_id, data):
+        """Aggiorna i riferimenti per le colonne con blob presenti in data (patch o checklist completa)"""
+        columns = [c for c in BLOB_COLUMNS if c in data]
+        if not columns:
+            return
+        with self._conn() as conn:
+            for column in columns:
+                conn.execute('delete from blob_refs where checklist_id = ? and column_name = ?', (str(checklist_id), column))
+                conn.executemany('insert into blob_refs (checklist_id, column_name, hash) values (?, ?, ?)',
+                                 [(str(checklist_id), column, h) for h in referenced_blobs(data[column])])
+
+    def refcounts(self):
+        """hash -> numero di checklist che lo citano (0 per i blob orfani)"""
+        rows = self._conn().execute(
+            'select b.hash, count(distinct r.checklist_id) as n from blobs b '
+            'left join blob_refs r on r.hash = b.hash group by b.hash'
+        ).fetchall()
+        return {row['hash']: row['n'] for row in rows}
+
+    def rebuild_refs(self, checklists):
+        """Ricostruisce tutti i riferimenti da un iterabile di checklist (con id), in una sola transazione"""
+        rows = list(checklist_refs(checklists))
+        with self._conn() as conn:
+            conn.execute('delete from blob_refs')
+            conn.executemany('insert or ignore into blob_refs (checklist_id, column_name, hash) values (?, ?, ?)', rows)
+
+    def gc(self, grace_seconds=GC_GRACE_SECONDS, dry_run=False, referenced=None):
+        """Elimina in blocco dallo storage e dall'indice i blob senza riferimenti; restituisce (numero, byte).
+
+        Il periodo di grazia parte dall'ultimo uso (caricamento o riuso in plan()), così un
+        blob vecchio appena riusato da una bozza non ancora salvata resta nello storage.
+        I riferimenti registrati dai salvataggi sono solo quelli di questa istanza:
+        prima di eliminare davvero va chiamato rebuild_refs() su tutte le checklist.
+        referenced (insieme di hash) sostituisce i riferimenti dell'indice, per contare
+        gli orfani senza riscriverlo.
+        """
+        rows = self._conn().execute(
+            'select hash, path, size from blobs where coalesce(last_used, created_at) < ? '
+            + ('' if referenced is not None else 'and hash not in (select hash from blob_refs)'),
+            (time.time() - grace_seconds,)
+        ).fetchall()
+        if referenced is not None:
+            rows = [row for row in rows if row['hash'] not in referenced]
+        if rows and not dry_run:
+            self.repository.delete_files([row['path'] for row in rows])
+            hashes = [(row['hash'],) for row in rows]
+            with self._conn() as conn:
+                conn.executemany('delete from blobs where hash = ?', hashes)
+                conn.executemany('delete from blob_sources where hash = ?', hashes)
+        return len(rows), sum(row['size'] for row in rows)
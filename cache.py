@@ -0,0 +1,147 @@
+"""Cache a due livelli (memoria LRU + disco) per risultati costosi da ricalcolare"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def content_key(data, *parts):
+    """Chiave SHA-256 del contenuto più eventuali parametri (modello, lingua...)"""
+    h = hashlib.sha256(data)
+    for part in parts:
+        h.update(b'\0')
+        h.update(str(part).encode('utf-8'))
+    return h.hexdigest()
+
+
+class TieredCache:
+    """Cache chiave -> bytes con tier in memoria (LRU) e tier su disco (eviction per dimensione)"""
+
+    def __init__(self, directory, max_memory_items=256, max_disk_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._disk_sizes = self._scan_disk()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.bin")
+
+    def _scan_disk(self):
+        sizes = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.bin'):
+                    sizes[name[:-4]] = os.path.getsize(os.path.join(root, name))
+        return sizes
+
+    def get(self, key):
+        """Restituisce il valore in cache o None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self._memory[key]
+
+            if key in self._disk_sizes:
+                path = self._path(key)
+                try:
+                    with open(path, 'rb') as f:
+                        value = f.read()
+                    os.utime(path)  # il file diventa il più recente per l'eviction
+                except OSError:
+                    self._disk_sizes.pop(key, None)
+                else:
+                    self.stats['disk_hits'] += 1
+                    self._remember(key, value)
+                    return value
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, value):
+        """Salva il valore in entrambi i tier"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._remember(key, value)
+            self._disk_sizes[key] = len(value)
+            self._evict_disk()
+
+    def path(self, key):
+        """Percorso del valore sul disco, senza leggerlo né portarlo in memoria; None se manca"""
+        with self._lock:
+            if key not in self._disk_sizes:
+                return None
+            path = self._path(key)
+            try:
+                os.utime(path)
+            except OSError:
+                self._disk_sizes.pop(key, None)
+                return None
+            return path
+
+    def put_file(self, key, write):
+        """Salva solo sul disco il valore scritto a flusso da write(file); restituisce (percorso, risultato di write)"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w+b') as f:
+                result = write(f)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._memory.pop(key, None)
+            self._disk_sizes[key] = os.path.getsize(path)
+            self._evict_disk()
+        return path, result
+
+    def discard(self, key):
+        """Toglie il valore da entrambi i tier"""
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._disk_sizes.pop(key, None) is not None:
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        total = sum(self._disk_sizes.values())
+        if total <= self.max_disk_bytes:
+            return
+
+        # Elimina prima i file usati meno di recente
+        def mtime(key):
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0
+
+        for key in sorted(self._disk_sizes, key=mtime):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= self._disk_sizes.pop(key)
@@ -0,0 +1,79 @@
+"""Tracciamento delle modifiche alle checklist: solo i campi cambiati, con controllo di versione"""
+import hashlib
+import json
+import threading
+from collections import Counter
+
+VERSION_COLUMN = 'version'
+SYNC_COLUMN = 'synced_at'   # timestamp assegnato dal database a ogni scrittura (cursore del pull)
+# Campi gestiti dal database, mai confrontati
+SYSTEM_COLUMNS = ('id', 'created_at', 'updated_at', VERSION_COLUMN, 'field_ts', SYNC_COLUMN)
+
+
+class ConflictError(Exception):
+    """La checklist è stata modificata da un altro utente dopo l'ultimo caricamento"""
+
+
+def fingerprint(value):
+    """Impronta stabile di un valore JSON"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def _item_fingerprints(value):
+    if isinstance(value, list):
+        return Counter(fingerprint(item) for item in value)
+    if isinstance(value, dict):
+        return Counter(fingerprint([k, v]) for k, v in value.items())
+    return None
+
+
+class ChangeTracker:
+    """Ricorda lo stato dell'ultimo salvataggio e calcola cosa è cambiato"""
+
+    def __init__(self, saved_row):
+        self.version = saved_row.get(VERSION_COLUMN) or 0
+        self.lock = threading.RLock()  # condiviso tra salvataggio manuale e autosave
+        self._columns = {}
+        self._items = {}
+        self._remember(saved_row)
+
+    def _remember(self, data):
+        for column, value in data.items():
+            if column in SYSTEM_COLUMNS:
+                continue
+            self._columns[column] = fingerprint(value)
+            items = _item_fingerprints(value)
+            if items is not None:
+                self._items[column] = items
+
+    def remember(self, data):
+        """Aggiunge al riferimento colonne lette dall'archivio dopo la creazione del tracker"""
+        with self.lock:
+            self._remember(data)
+
+    def diff(self, data):
+        """Patch con i soli campi di primo livello diversi dall'ultimo salvataggio"""
+        return {
+            column: value for column, value in data.items()
+            if column not in SYSTEM_COLUMNS and self._columns.get(column) != fingerprint(value)
+        }
+
+    def item_changes(self, patch):
+        """Per i campi lista/dizionario: quanti elementi aggiunti e rimossi rispetto al salvataggio"""
+        changes = {}
+        for column, value in patch.items():
+            items = _item_fingerprints(value)
+            if items is None:
+                continue
+            before = self._items.get(column, Counter())
+            changes[column] = {
+                'aggiunti': sum((items - before).values()),
+                'rimossi': sum((before - items).values())
+            }
+        return changes
+
+    def commit(self, patch, version):
+        self._remember(patch)
+        self.version = version
+
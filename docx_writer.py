@@ -0,0 +1,336 @@
+"""DVR in formato Word (DOCX) scritto a flusso nel pacchetto zip, su carta intestata da modello"""
+import io
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from xml.sax.saxutils import escape
+
+import httpx
+from PIL import Image, ImageOps
+
+PHOTO_EDGE = 1200               # lato lungo delle foto nel documento (px)
+PHOTO_WIDTH_EMU = 4320000       # 12 cm: 1 cm = 360000 EMU
+PHOTO_QUALITY = 75
+PHOTO_WORKERS = 4               # download e ridimensionamento in parallelo, al più 2 × foto in memoria
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+IMAGE_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+DOCUMENT_CT = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml'
+
+# Parti del modello rigenerate per ogni documento; tutte le altre si copiano così come sono
+GENERATED = ('[Content_Types].xml', 'word/document.xml', 'word/_rels/document.xml.rels')
+
+_INLINE = re.compile(r'(\*\*[^*]+\*\*|__[^_]+__|\*[^*\s][^*]*\*|_[^_\s][^_]*_)')
+_NUMBERED = re.compile(r'^\d+[.)]\s+')
+_TABLE_RULE = re.compile(r'^\|?\s*:?-{3,}')
+
+
+class DocxTemplate:
+    """Carta intestata: parti di un .docx (stili, intestazione, piè di pagina, loghi) lette una volta.
+
+    Del documento del modello si tengono solo le relazioni e le proprietà di sezione
+    (formato pagina, margini, riferimenti a intestazione e piè di pagina).
+    """
+
+    def __init__(self, parts):
+        # Un DVR generato usato come modello: le sue foto non passano nel nuovo documento
+        self.parts = {name: data for name, data in parts.items()
+                      if name not in GENERATED and not name.startswith('word/media/dvr_foto')}
+        document = parts.get('word/document.xml', b'').decode('utf-8')
+        sections = re.findall(r'<w:sectPr\b.*?</w:sectPr>', document, re.S)
+        self.section = sections[-1] if sections else DEFAULT_SECTION
+        rels = parts.get('word/_rels/document.xml.rels', b'').decode('utf-8')
+        self.relationships = [rel for rel in re.findall(r'<Relationship\b[^>]*/>', rels) if 'Id="rIdDvrFoto' not in rel]
+        types = parts.get('[Content_Types].xml', b'').decode('utf-8')
+        self.defaults = dict(re.findall(r'<Default\s+Extension="([^"]+)"\s+ContentType="([^"]+)"', types))
+        self.overrides = {name: ct for name, ct in re.findall(r'<Override\s+PartName="/([^"]+)"\s+ContentType="([^"]+)"', types)
+                          if name not in GENERATED}
+
+    @classmethod
+    def from_file(cls, path):
+        with zipfile.ZipFile(path) as package:
+            return cls({name: package.read(name) for name in package.namelist()})
+
+    @classmethod
+    def default(cls):
+        """Modello incorporato: stili di base, intestazione PARADIGMA+ e numero di pagina nel piè"""
+        return cls(DEFAULT_PARTS)
+
+
+def _run(text, bold=False, italic=False):
+    props = ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '')
+    return (f'<w:r>{f"<w:rPr>{props}</w:rPr>" if props else ""}'
+            f'<w:t xml:space="preserve">{escape(text)}</w:t></w:r>')
+
+
+def _runs(text):
+    """Grassetto e corsivo Markdown in run Word"""
+    runs = []
+    for part in _INLINE.split(text):
+        if not part:
+            continue
+        if part[:2] in ('**', '__') and part[-2:] == part[:2] and len(part) > 4:
+            runs.append(_run(part[2:-2], bold=True))
+        elif part[0] in '*_' and part[-1] == part[0] and len(part) > 2:
+            runs.append(_run(part[1:-1], italic=True))
+        else:
+            runs.append(_run(part))
+    return ''.join(runs)
+
+
+def paragraph(text, style=None, indent=None):
+    props = (f'<w:pStyle w:val="{style}"/>' if style else '') + (f'<w:ind w:left="{indent}" w:hanging="284"/>' if indent else '')
+    return f'<w:p>{f"<w:pPr>{props}</w:pPr>" if props else ""}{_runs(text)}</w:p>'
+
+
+def table(rows):
+    cells = ''.join(
+        '<w:tr>' + ''.join(f'<w:tc><w:tcPr><w:tcW w:w="0" w:type="auto"/></w:tcPr>{paragraph(cell.strip())}</w:tc>'
+                           for cell in row) + '</w:tr>'
+        for row in rows)
+    return (f'<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="5000" w:type="pct"/></w:tblPr>'
+            f'{cells}</w:tbl><w:p/>')
+
+
+def markdown_to_xml(markdown):
+    """Blocchi WordprocessingML per il Markdown dei capitoli: titoli, elenchi, tabelle, citazioni, paragrafi"""
+    rows = []
+    for line in markdown.splitlines() + ['']:
+        stripped = line.strip()
+        if stripped.startswith('|'):
+            if not _TABLE_RULE.match(stripped):
+                rows.append(stripped.strip('|').split('|'))
+            continue
+        if rows:
+            yield table(rows)
+            rows = []
+        if not stripped:
+            continue
+        heading = re.match(r'^(#{1,4})\s+(.*)', stripped)
+        if heading:
+            level = len(heading.group(1))
+            yield paragraph(heading.group(2), 'Title' if level == 1 else f'Heading{level - 1}')
+        elif stripped[:2] in ('- ', '* ', '+ '):
+            yield paragraph('• ' + stripped[2:], indent=284 + 284 * ((len(line) - len(line.lstrip())) // 2))
+        elif _NUMBERED.match(stripped):
+            yield paragraph(stripped, indent=284)
+        elif stripped.startswith('>'):
+            yield paragraph(stripped.lstrip('> '), 'Quote')
+        else:
+            yield paragraph(stripped)
+
+
+def _image_xml(rel_id, number, width, height, caption):
+    cx = PHOTO_WIDTH_EMU
+    cy = int(cx * height / width)
+    return (
+        f'<w:p><w:pPr><w:jc w:val="center"/><w:keepNext/></w:pPr><w:r><w:drawing>'
+        f'<wp:inline distT="0" distB="0" distL="0" distR="0"><wp:extent cx="{cx}" cy="{cy}"/>'
+        f'<wp:docPr id="{number}" name="Foto {number}"/>'
+        f'<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+        f'<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        f'<pic:pic><pic:nvPicPr><pic:cNvPr id="{number}" name="foto{number}.jpg"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip r:embed="{rel_id}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+        f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr></pic:pic>'
+        f'</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+        + paragraph(caption, 'Caption')
+    )
+
+
+def photo_sections(data):
+    """(didascalia, url) delle foto della checklist per l'allegato fotografico: l'anteprima quando c'è"""
+    groups = [(f"Luogo di lavoro: {l.get('nome', '')}", l.get('foto')) for l in data.get('luoghi_lavoro') or []]
+    groups += [(f"Attrezzatura: {a.get('nome', '')}", a.get('foto')) for a in data.get('attrezzature') or []]
+    groups += [(f"Non conformità: {(n.get('descrizione') or '')[:60]}", n.get('foto')) for n in data.get('non_conformita') or []]
+    groups.append(("Ambienti", data.get('foto_ambienti')))
+    for caption, photos in groups:
+        for photo in photos or []:
+            url = (photo.get('anteprima') or photo.get('url')) if isinstance(photo, dict) else photo
+            if url:
+                yield caption, url
+
+
+def scale_photo(raw, edge=PHOTO_EDGE, quality=PHOTO_QUALITY):
+    """JPEG al più di edge px sul lato lungo: (bytes, larghezza, altezza).
+
+    Le anteprime di image_ingest (JPEG già orientati e ridotti) passano senza ricodifica.
+    """
+    with Image.open(io.BytesIO(raw)) as image:
+        orientation = image.getexif().get(0x0112, 1)
+        if image.format == 'JPEG' and max(image.size) <= edge and orientation == 1 and image.mode == 'RGB':
+            return raw, image.width, image.height
+        image.draft('RGB', (edge, edge))    # i JPEG grandi si decodificano già ridotti
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail((edge, edge), Image.LANCZOS, reducing_gap=2.0)
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=quality)
+        return out.getvalue(), image.width, image.height
+
+
+def _bounded_map(fn, items, workers):
+    """map parallelo nell'ordine di items, con al più 2 × workers risultati in memoria"""
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='docx') as pool:
+        window = deque(pool.submit(fn, item) for item in islice(items, 2 * workers))
+        while window:
+            result = window.popleft().result()
+            window.extend(pool.submit(fn, item) for item in islice(items, 1))
+            yield result
+
+
+def write_docx(destination, markdown, template, photos=(), fetch=None, workers=PHOTO_WORKERS):
+    """Scrive il DVR in destination (percorso o file binario) senza tenere in memoria il documento intero.
+
+    Le foto si scaricano, si riducono e finiscono nel pacchetto una alla volta; poi il
+    testo del documento viene scritto a flusso, capitolo per capitolo. fetch(url) -> bytes
+    sostituisce il download HTTP. Restituisce il numero di foto incluse.
+    """
+    client = httpx.Client(timeout=30, follow_redirects=True) if fetch is None else None
+
+    def download(url):
+        response = client.get(url)
+        response.raise_for_status()
+        return response.content
+
+    def load(photo):
+        caption, url = photo
+        try:
+            return (caption,) + scale_photo((fetch or download)(url))
+        except Exception:
+            return None  # una foto non disponibile non blocca il documento
+
+    images = []     # (rel_id, larghezza, altezza, didascalia): i byte sono già nel pacchetto
+    try:
+        with zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED) as package:
+            for name, data in template.parts.items():
+                package.writestr(name, data)
+            for result in _bounded_map(load, photos, workers):
+                if result is None:
+                    continue
+                caption, jpeg, width, height = result
+                number = len(images) + 1
+                # Le foto sono già compresse: nel pacchetto senza ricomprimerle
+                package.writestr(f'word/media/dvr_foto{number}.jpeg', jpeg, zipfile.ZIP_STORED)
+                images.append((f'rIdDvrFoto{number}', width, height, caption))
+
+            package.writestr('[Content_Types].xml', _content_types(template))
+            package.writestr('word/_rels/document.xml.rels', _relationships(template, images))
+            with package.open('word/document.xml', 'w') as document:
+                def write(xml):
+                    document.write(xml.encode('utf-8'))
+
+                write(DOCUMENT_HEAD)
+                for block in markdown_to_xml(markdown):
+                    write(block)
+                if images:
+                    write('<w:p><w:r><w:br w:type="page"/></w:r></w:p>' + paragraph("Allegato fotografico", 'Heading1'))
+                    previous = None
+                    for number, (rel_id, width, height, caption) in enumerate(images, start=1):
+                        if caption != previous:
+                            write(paragraph(caption, 'Heading2'))
+                            previous = caption
+                        write(_image_xml(rel_id, number, width, height, f"Foto {number}"))
+                write(template.section + '</w:body></w:document>')
+    finally:
+        if client is not None:
+            client.close()
+    return len(images)
+
+
+def _content_types(template):
+    defaults = dict(template.defaults, rels='application/vnd.openxmlformats-package.relationships+xml',
+                    xml='application/xml', jpeg='image/jpeg')
+    overrides = dict(template.overrides, **{'word/document.xml': DOCUMENT_CT})
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Types xmlns="{CT_NS}">'
+            + ''.join(f'<Default Extension="{ext}" ContentType="{ct}"/>' for ext, ct in defaults.items())
+            + ''.join(f'<Override PartName="/{name}" ContentType="{ct}"/>' for name, ct in overrides.items())
+            + '</Types>')
+
+
+def _relationships(template, images):
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{REL_NS}">'
+            + ''.join(template.relationships)
+            + ''.join(f'<Relationship Id="{rel_id}" Type="{IMAGE_REL}" Target="media/dvr_foto{n}.jpeg"/>'
+                      for n, (rel_id, _, _, _) in enumerate(images, start=1))
+            + '</Relationships>')
+
+
+DOCUMENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"><w:body>'
+)
+
+# A4 con margini di 2 cm; intestazione e piè di pagina del modello incorporato
+DEFAULT_SECTION = (
+    '<w:sectPr><w:headerReference w:type="default" r:id="rIdHeader"/>'
+    '<w:footerReference w:type="default" r:id="rIdFooter"/>'
+    '<w:pgSz w:w="11906" w:h="16838"/>'
+    '<w:pgMar w:top="1701" w:right="1134" w:bottom="1134" w:left="1134" w:header="567" w:footer="567" w:gutter="0"/>'
+    '</w:sectPr>'
+)
+
+
+def _style(style_id, name, run='', para='', based='Normal'):
+    return (f'<w:style w:type="paragraph" w:styleId="{style_id}"><w:name w:val="{name}"/>'
+            f'<w:basedOn w:val="{based}"/><w:next w:val="Normal"/><w:qFormat/>'
+            f'<w:pPr>{para}</w:pPr><w:rPr>{run}</w:rPr></w:style>')
+
+
+DEFAULT_PARTS = {
+    '_rels/.rels': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{REL_NS}">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>').encode('utf-8'),
+    'word/styles.xml': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles xmlns:w="{W_NS}">'
+        '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:cs="Calibri"/>'
+        '<w:sz w:val="21"/><w:lang w:val="it-IT"/></w:rPr></w:rPrDefault>'
+        '<w:pPrDefault><w:pPr><w:spacing w:after="120" w:line="264" w:lineRule="auto"/></w:pPr></w:pPrDefault></w:docDefaults>'
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>'
+        + _style('Title', 'Title', '<w:b/><w:color w:val="1B3A57"/><w:sz w:val="40"/>', '<w:spacing w:after="240"/>')
+        + _style('Heading1', 'heading 1', '<w:b/><w:color w:val="1B3A57"/><w:sz w:val="30"/>',
+                 '<w:keepNext/><w:spacing w:before="360" w:after="120"/><w:outlineLvl w:val="0"/>')
+        + _style('Heading2', 'heading 2', '<w:b/><w:color w:val="2C5F8D"/><w:sz w:val="25"/>',
+                 '<w:keepNext/><w:spacing w:before="240" w:after="80"/><w:outlineLvl w:val="1"/>')
+        + _style('Heading3', 'heading 3', '<w:b/><w:sz w:val="22"/>', '<w:keepNext/><w:outlineLvl w:val="2"/>')
+        + _style('Quote', 'Quote', '<w:i/><w:color w:val="6B7280"/>', '<w:ind w:left="567"/>')
+        + _style('Caption', 'caption', '<w:i/><w:sz w:val="18"/>', '<w:jc w:val="center"/>')
+        + '<w:style w:type="table" w:styleId="TableGrid"><w:name w:val="Table Grid"/><w:tblPr><w:tblBorders>'
+        + ''.join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="BFBFBF"/>'
+                  for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'))
+        + '</w:tblBorders></w:tblPr></w:style></w:styles>').encode('utf-8'),
+    'word/header1.xml': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:hdr xmlns:w="{W_NS}">'
+        '<w:p><w:pPr><w:pBdr><w:bottom w:val="single" w:sz="6" w:space="4" w:color="1B3A57"/></w:pBdr></w:pPr>'
+        '<w:r><w:rPr><w:b/><w:color w:val="1B3A57"/></w:rPr><w:t xml:space="preserve">PARADIGMA+ </w:t></w:r>'
+        '<w:r><w:rPr><w:color w:val="6B7280"/></w:rPr><w:t>Documento di Valutazione dei Rischi - D.Lgs. 81/08</w:t></w:r>'
+        '</w:p></w:hdr>').encode('utf-8'),
+    'word/footer1.xml': (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:ftr xmlns:w="{W_NS}">'
+        '<w:p><w:pPr><w:jc w:val="right"/></w:pPr><w:r><w:t xml:space="preserve">Pagina </w:t></w:r>'
+        '<w:r><w:fldChar w:fldCharType="begin"/></w:r><w:r><w:instrText xml:space="preserve"> PAGE </w:instrText></w:r>'
+        '<w:r><w:fldChar w:fldCharType="separate"/></w:r><w:r><w:t>1</w:t></w:r><w:r><w:fldChar w:fldCharType="end"/></w:r>'
+        '</w:p></w:ftr>').encode('utf-8'),
+    'word/document.xml': f'<w:document xmlns:w="{W_NS}"><w:body>{DEFAULT_SECTION}</w:body></w:document>'.encode('utf-8'),
+    'word/_rels/document.xml.rels': (
+        f'<Relationships xmlns="{REL_NS}">'
+        '<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '<Relationship Id="rIdHeader" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/header" Target="header1.xml"/>'
+        '<Relationship Id="rIdFooter" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer" Target="footer1.xml"/>'
+        '</Relationships>').encode('utf-8'),
+    '[Content_Types].xml': (
+        f'<Types xmlns="{CT_NS}">'
+        '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '<Override PartName="/word/header1.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"/>'
+        '<Override PartName="/word/footer1.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml"/>'
+        '</Types>').encode('utf-8'),
+}
@@ -0,0 +1,238 @@
+"""Generazione del DVR per capitoli indipendenti, in parallelo, con client LLM sostituibile"""
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import content_key
+from risk_scoring import CLASSI, checklist_matrix, risk_class
+
+DVR_MODEL = os.getenv('DVR_MODEL', 'gpt-4o-mini')
+PROMPT_VERSION = 1          # da incrementare quando cambiano i prompt
+MAX_CHAPTER_WORKERS = 4
+MAX_OUTPUT_TOKENS = 1500
+
+SYSTEM_PROMPT = (
+    "Sei un consulente RSPP esperto di D.Lgs. 81/08. Scrivi capitoli del Documento di Valutazione "
+    "dei Rischi in italiano, in tono tecnico e formale, in Markdown senza titolo di primo livello. "
+    "Usa solo i dati forniti: se un'informazione manca scrivi che è da completare, senza inventarla."
+)
+
+# Istruzioni per tipo di capitolo; i dati del capitolo seguono in JSON
+TEMPLATES = {
+    'azienda': "Scrivi il capitolo 'Anagrafica e organizzazione aziendale': attività (ATECO), sede, "
+               "figure della sicurezza, organico e ciclo lavorativo.",
+    'luoghi': "Scrivi il capitolo 'Luoghi di lavoro e attrezzature': descrivi ogni ambiente e le attrezzature "
+              "in uso, segnalando gli aspetti rilevanti per la sicurezza.",
+    'mansione': "Scrivi la scheda della mansione: compiti, lavoratori addetti, rischi a cui è esposta con "
+                "indice P x D e classe, DPI e formazione specifici.",
+    'rischio': "Scrivi la valutazione del rischio: fonti di pericolo nel contesto aziendale, mansioni e luoghi "
+               "esposti, indice P x D, misure di prevenzione e protezione adottate e da adottare.",
+    'misure': "Scrivi il capitolo 'Misure di prevenzione e protezione': misure generali, formazione "
+              "antincendio e primo soccorso, gestione delle non conformità rilevate.",
+    'piano': "Scrivi il 'Programma delle misure di miglioramento': azioni con responsabile e scadenza, "
+             "in ordine di priorità, includendo gli interventi per i rischi alti e le non conformità.",
+}
+
+
+class Chapter:
+    """Capitolo del DVR: chiave stabile, titolo, tipo di prompt e i soli dati da cui dipende"""
+
+    def __init__(self, key, title, kind, inputs):
+        self.key = key
+        self.title = title
+        self.kind = kind
+        self.inputs = inputs
+        self.text = None
+        self.error = None
+        self.seconds = None
+        self.cached = False
+        self.tokens_raw = None      # token del prompt con i dati originali e dopo la compattazione
+        self.tokens = None
+
+    def fingerprint(self, model, *parts):
+        """Chiave di cache: dati del capitolo, istruzioni e versione dei prompt, modello (e budget)"""
+        inputs = json.dumps(self.inputs, ensure_ascii=False, sort_keys=True, default=str)
+        return content_key(inputs.encode('utf-8'), self.kind, TEMPLATES[self.kind], SYSTEM_PROMPT, PROMPT_VERSION, model, *parts)
+
+    @property
+    def prompt(self):
+        return f"{TEMPLATES[self.kind]}\n\nDati:\n{json.dumps(self.inputs, ensure_ascii=False, separators=(',', ':'))}"
+
+
+def _names(items, *fields):
+    return [{f: item.get(f) for f in fields if item.get(f) not in (None, '', [])} for item in items or []]
+
+
+def plan_chapters(data):
+    """Capitoli nell'ordine del documento: azienda, luoghi, una per mansione, uno per rischio, misure, piano"""
+    matrix = checklist_matrix(data)
+    by_mansione = matrix.index.max(axis=2)     # R massimo su tutti i luoghi, per (rischio, mansione)
+    by_luogo = matrix.index.max(axis=1)
+    ranking = {r['rischio']: r for r in matrix.ranking()}
+    rischi = {nome: info for nome, info in (data.get('rischi_selezionati') or {}).items() if info.get('presente')}
+
+    def evaluation(values, axis):
+        return {name: {'R': int(v), 'classe': CLASSI[risk_class(v)][1]} for name, v in zip(axis, values) if v > 0}
+
+    chapters = [
+        Chapter('azienda', "Anagrafica aziendale", 'azienda', {
+            'ragione_sociale': data.get('ragione_sociale'),
+            'ateco': data.get('ateco'),
+            'sede': data.get('sede'),
+            'n_dipendenti': data.get('n_dipendenti'),
+            'dipendenti': _names(data.get('dipendenti'), 'nome', 'cognome', 'mansione'),
+            'datore_lavoro': (data.get('datore_lavoro') or {}).get('nome'),
+            'rspp': (data.get('rspp') or {}).get('tipo'),
+            'soggetta_scia_antincendio': data.get('soggetta_scia_antincendio'),
+            'ciclo_lavorativo': data.get('ciclo_lavorativo'),
+        }),
+        Chapter('luoghi', "Luoghi di lavoro e attrezzature", 'luoghi', {
+            'luoghi': _names(data.get('luoghi_lavoro'), 'nome', 'superficie_mq', 'note'),
+            'descrizione': data.get('desc_luoghi_lavoro'),
+            'attrezzature': _names(data.get('attrezzature'), 'nome', 'marca', 'modello', 'note'),
+        }),
+    ]
+
+    dipendenti = data.get('dipendenti') or []
+    for mansione in data.get('mansioni') or []:
+        nome = mansione['nome']
+        m = matrix.mansioni.index(nome) if nome in matrix.mansioni else None
+        chapters.append(Chapter(f"mansione:{nome}", f"Mansione: {nome}", 'mansione', {
+            'mansione': nome,
+            'descrizione': mansione.get('descrizione'),
+            'n_lavoratori': mansione.get('n_lavoratori') or sum(d.get('mansione') == nome for d in dipendenti),
+            'rischi': evaluation(by_mansione[:, m], matrix.risks) if m is not None else {},
+        }))
+
+    for nome, info in rischi.items():
+        r = matrix.risks.index(nome)
+        chapters.append(Chapter(f"rischio:{nome}", f"Rischio: {nome}", 'rischio', {
+            'rischio': nome,
+            'note': info.get('note'),
+            'misure_suggerite': info.get('misure'),
+            'valutazione': {k: v for k, v in ranking.get(nome, {}).items() if k != 'rischio'},
+            'mansioni': evaluation(by_mansione[r], matrix.mansioni),
+            'luoghi': evaluation(by_luogo[r], matrix.luoghi),
+        }))
+
+    chapters += [
+        Chapter('misure', "Misure di prevenzione e protezione", 'misure', {
+            'misure_prevenzione': data.get('misure_prevenzione'),
+            'formazione_antincendio': data.get('livello_formazione_antincendio'),
+            'primo_soccorso': data.get('gruppo_primo_soccorso'),
+            'non_conformita': _names(data.get('non_conformita'), 'descrizione', 'priorita'),
+        }),
+        Chapter('piano', "Programma di miglioramento", 'piano', {
+            'azioni': _names(data.get('piano_miglioramento'), 'descrizione', 'responsabile', 'scadenza'),
+            'rischi_alti': [r for r in ranking.values() if r['classe'] in ("Alto", "Molto alto")],
+            'non_conformita': _names(data.get('non_conformita'), 'descrizione', 'priorita'),
+        }),
+    ]
+    return chapters
+
+
+class OpenAIWriter:
+    """Scrive un capitolo con la chat completion di OpenAI"""
+
+    def __init__(self, client, model=DVR_MODEL, max_tokens=MAX_OUTPUT_TOKENS):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def complete(self, system, prompt):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{'role': 'system', 'content': system}, {'role': 'user', 'content': prompt}],
+            temperature=0.2,
+            max_tokens=self.max_tokens
+        )
+        return response.choices[0].message.content.strip()
+
+
+class StubWriter:
+    """Client locale deterministico per test e benchmark: stesso prompt, stesso testo.
+
+    latency simula il tempo di risposta del modello (secondi, ±jitter), senza rete.
+    """
+
+    model = 'stub'
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+
+    def complete(self, system, prompt):
+        digest = hashlib.sha256(f"{system}\0{prompt}".encode('utf-8')).hexdigest()
+        self.calls += 1
+        if self.latency:
+            time.sleep(max(0.0, self.latency + random.Random(digest).uniform(-self.jitter, self.jitter)))
+        instruction, _, payload = prompt.partition('\n\nDati:\n')
+        return (f"_Testo di prova {digest[:12]}._\n\n{instruction}\n\n"
+                f"Dati considerati: {len(payload)} caratteri.")
+
+
+def generate_chapters(writer, chapters, max_workers=MAX_CHAPTER_WORKERS, cache=None, context=None):
+    """Genera i capitoli in parallelo e li restituisce man mano che sono pronti (ordine di completamento).
+
+    Con una cache, i capitoli con gli stessi dati, prompt e modello di una generazione
+    precedente arrivano subito e senza chiamare il modello (cached=True). Con un
+    ContextBuilder i dati di ogni capitolo vengono adattati al budget di token prima
+    della chiamata. Un capitolo fallito ha error valorizzato, non va in cache e non
+    ferma gli altri.
+    """
+    model = writer.model
+    parts = (context.signature,) if context is not None else ()
+
+    def write(chapter, key):
+        start = time.perf_counter()
+        try:
+            if context is not None:
+                context.fit(chapter, SYSTEM_PROMPT)
+            chapter.text = writer.complete(SYSTEM_PROMPT, chapter.prompt)
+        except Exception as e:
+            chapter.error = str(e) or type(e).__name__
+        else:
+            if cache is not None:
+                cache.put(key, chapter.text.encode('utf-8'))
+        chapter.seconds = time.perf_counter() - start
+        return chapter
+
+    pending = []
+    for chapter in chapters:
+        key = chapter.fingerprint(model, *parts) if cache is not None else None
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            chapter.text, chapter.cached, chapter.seconds = cached.decode('utf-8'), True, 0.0
+            yield chapter
+        else:
+            pending.append((chapter, key))
+    if not pending:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dvr') as pool:
+        for future in as_completed([pool.submit(write, chapter, key) for chapter, key in pending]):
+            yield future.result()
+
+
+def run_stats(chapters):
+    """Riepilogo di una generazione: capitoli, dalla cache, generati, falliti, hit rate e token dei prompt"""
+    cached = sum(chapter.cached for chapter in chapters)
+    failed = sum(chapter.error is not None for chapter in chapters)
+    measured = [chapter for chapter in chapters if chapter.tokens is not None]
+    return {'capitoli': len(chapters), 'cache': cached, 'generati': len(chapters) - cached - failed,
+            'errori': failed, 'hit_rate': cached / len(chapters) if chapters else 0.0,
+            'token_prompt': sum(chapter.tokens for chapter in measured),
+            'token_risparmiati': sum(chapter.tokens_raw - chapter.tokens for chapter in measured)}
+
+
+def assemble(data, chapters):
+    """Documento Markdown completo, con i capitoli nell'ordine del piano"""
+    parts = [f"# Documento di Valutazione dei Rischi\n\n**{data.get('ragione_sociale') or ''}** - "
+             f"redatto ai sensi degli artt. 17 e 28 del D.Lgs. 81/08"]
+    for number, chapter in enumerate(chapters, start=1):
+        body = chapter.text if chapter.error is None else f"> Capitolo da completare: generazione non riuscita ({chapter.error})"
+        parts.append(f"## {number}. {chapter.title}\n\n{body}")
+    return '\n\n'.join(parts) + '\n'
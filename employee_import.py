@@ -0,0 +1,156 @@
+"""Importazione in blocco dei dipendenti da export paghe CSV/XLSX, riga per riga"""
+import codecs
+import csv
+import re
+import time
+import unicodedata
+
+MAX_ERRORS = 200   # errori conservati per il riepilogo (il conteggio resta completo)
+MAX_LENGTH = 60
+
+# Intestazioni riconosciute, già normalizzate (minuscole, senza accenti e punteggiatura)
+HEADER_ALIASES = {
+    'nome': ('nome', 'first name', 'firstname', 'name', 'nome dipendente'),
+    'cognome': ('cognome', 'last name', 'lastname', 'surname'),
+    'mansione': ('mansione', 'mansioni', 'qualifica', 'ruolo', 'posizione', 'job title', 'livello mansione'),
+    'nominativo': ('nominativo', 'dipendente', 'cognome e nome', 'cognome nome', 'lavoratore'),
+}
+NAME_PATTERN = re.compile(r"^[^\W\d_]+(?:[ '\-.][^\W\d_]*)*$")
+
+
+def fold(text):
+    """Forma di confronto: minuscole, senza accenti e spazi ripetuti"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^\w\s\']', ' ', text.lower()).split())
+
+
+def clean(value):
+    return ' '.join(str(value).split()) if value is not None else ''
+
+
+def normalize_name(value):
+    """'  ROSSI  ' -> 'Rossi', "d'angelo" -> "D'Angelo" """
+    return clean(value).title()
+
+
+class ImportResult:
+    """Esito dell'importazione: dipendenti nuovi, righe scartate e conteggi"""
+
+    def __init__(self):
+        self.dipendenti = []
+        self.errors = []       # (numero riga, messaggio), al massimo MAX_ERRORS
+        self.error_count = 0
+        self.duplicates = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def _map_header(header):
+    mapping = {}
+    for idx, name in enumerate(header):
+        key = fold(name)
+        for field, aliases in HEADER_ALIASES.items():
+            if key in aliases and field not in mapping:
+                mapping[field] = idx
+    return mapping
+
+
+def _csv_rows(fileobj):
+    sample = fileobj.read(8192)
+    fileobj.seek(0)
+    encoding = 'utf-8-sig'
+    try:
+        # Incrementale: il campione può troncare un carattere multibyte
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        encoding = 'cp1252'  # export Excel italiani
+    try:
+        dialect = csv.Sniffer().sniff(sample.decode(encoding, errors='ignore'), delimiters=';,\t|')
+    except csv.Error:
+        dialect = csv.excel
+    text = codecs.getreader(encoding)(fileobj, errors='replace')
+    yield from csv.reader(text, dialect)
+
+
+def _xlsx_rows(fileobj):
+    from openpyxl import load_workbook  # dipendenza necessaria solo per i file Excel
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ['' if v is None else v for v in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """(numero riga, valori) dal file, senza caricarlo tutto in memoria; la prima riga non vuota è l'intestazione"""
+    rows = _xlsx_rows(fileobj) if filename.lower().endswith(('.xlsx', '.xlsm')) else _csv_rows(fileobj)
+    return ((n, row) for n, row in enumerate(rows, start=1) if any(clean(v) for v in row))
+
+
+def import_employees(fileobj, filename, existing=(), known_mansioni=()):
+    """Legge, valida e normalizza i dipendenti; scarta quelli già presenti in existing o ripetuti nel file"""
+    start = time.perf_counter()
+    result = ImportResult()
+    rows = read_rows(fileobj, filename)
+
+    first = next(rows, None)
+    if first is None:
+        result.error(0, "File vuoto")
+        return result
+    header_row, header = first
+    columns = _map_header(header)
+    if not ({'nome', 'cognome'} <= set(columns) or 'nominativo' in columns):
+        result.error(header_row, "Intestazione non riconosciuta: servono le colonne Nome e Cognome (oppure Nominativo)")
+        return result
+
+    # Mansioni scritte come quelle già usate nella checklist, se corrispondono
+    mansioni = {fold(m): m for m in known_mansioni if m}
+    seen = {(fold(d.get('cognome')), fold(d.get('nome'))) for d in existing}
+
+    def cell(row, field):
+        idx = columns.get(field)
+        return row[idx] if idx is not None and idx < len(row) else ''
+
+    for row_number, row in rows:
+        result.rows += 1
+        if 'nome' in columns and 'cognome' in columns:
+            nome, cognome = clean(cell(row, 'nome')), clean(cell(row, 'cognome'))
+        else:
+            # "COGNOME NOME": l'ultima parola è il nome
+            parts = clean(cell(row, 'nominativo')).rsplit(' ', 1)
+            cognome, nome = (parts[0], parts[1]) if len(parts) == 2 else (parts[0], '')
+
+        if not nome or not cognome:
+            result.error(row_number, "Manca il nome" if not nome else "Manca il cognome")
+            continue
+        invalid = next((v for v in (nome, cognome) if len(v) > MAX_LENGTH or not NAME_PATTERN.match(v)), None)
+        if invalid is not None:
+            result.error(row_number, f"Nome non valido: '{invalid[:MAX_LENGTH]}'")
+            continue
+
+        key = (fold(cognome), fold(nome))
+        if key in seen:
+            result.duplicates += 1
+            continue
+        seen.add(key)
+
+        mansione = clean(cell(row, 'mansione'))
+        if mansione:
+            mansione = mansioni.setdefault(fold(mansione), mansione[:1].upper() + mansione[1:].lower())
+        result.dipendenti.append({
+            'nome': normalize_name(nome),
+            'cognome': normalize_name(cognome),
+            'mansione': mansione,
+            'documenti': []
+        })
+
+    result.seconds = time.perf_counter() - start
+    return result
+
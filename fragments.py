@@ -0,0 +1,79 @@
+"""Sezioni dell'app come frammenti Streamlit: un'interazione locale riesegue solo la sua sezione"""
+import contextlib
+import functools
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import RerunException, StopException, get_script_run_ctx
+
+import profiling
+
+TIMINGS_KEY = 'tempi_rerun'
+PROFILES_KEY = 'profili_rerun'
+MAX_PROFILES = 20
+
+
+def debug_mode():
+    """Pannello di profilazione e tracce attivi con ?debug=1 nell'URL"""
+    return st.query_params.get('debug') == '1'
+
+
+def keep_profile(summary):
+    """Conserva nella sessione il riepilogo degli ultimi MAX_PROFILES rerun profilati"""
+    if summary is not None:
+        profiles = st.session_state.setdefault(PROFILES_KEY, [])
+        profiles.append(summary)
+        del profiles[:-MAX_PROFILES]
+
+
+def in_fragment_rerun():
+    """True se lo script in esecuzione è il rerun di un solo frammento, non dell'intera app"""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.current_fragment_id and ctx.fragment_ids_this_run)
+
+
+def rerun_section():
+    """st.rerun() limitato al frammento corrente quando possibile (Streamlit lo vieta durante un rerun completo)"""
+    st.rerun(scope='fragment' if in_fragment_rerun() else 'app')
+
+
+def record_timing(name, start):
+    """Durata dell'ultima esecuzione di name in millisecondi, conservata nella sessione"""
+    timings = st.session_state.setdefault(TIMINGS_KEY, {})
+    timings[name] = ((time.perf_counter() - start) * 1000, in_fragment_rerun())
+
+
+def section(name, after=None, guard=None):
+    """Decoratore: la funzione diventa un frammento cronometrato.
+
+    after() viene chiamata alla fine dei rerun del solo frammento, per propagare le
+    modifiche che altrimenti il resto dello script raccoglierebbe (es. autosave), anche
+    quando il corpo termina con st.rerun()/st.stop(); la durata si registra comunque.
+    guard() è un context manager intorno al corpo: gli errori da gestire vanno presi lì,
+    perché Streamlit mostra quelli usciti da un frammento senza propagarli allo script.
+    In modalità debug un rerun del solo frammento è una traccia a sé.
+    """
+    def decorate(body):
+        @functools.wraps(body)
+        def run(*args, **kwargs):
+            start = time.perf_counter()
+            trace = in_fragment_rerun() and debug_mode()
+            if trace:
+                profiling.start(f"frammento {name}", profiling.PROFILE_LOG)
+            try:
+                with profiling.span(f"sezione {name}"):
+                    try:
+                        with guard() if guard is not None else contextlib.nullcontext():
+                            body(*args, **kwargs)
+                    except (RerunException, StopException):
+                        if after is not None and in_fragment_rerun():
+                            after()
+                        raise
+                    if after is not None and in_fragment_rerun():
+                        after()
+            finally:
+                if trace:
+                    keep_profile(profiling.finish())
+                record_timing(name, start)
+        return st.fragment(run)
+    return decorate
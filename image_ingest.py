@@ -0,0 +1,83 @@
+"""Ingestione delle foto prima dell'upload: orientamento EXIF, metadati rimossi, ridimensionamento e varianti"""
+import io
+import os
+
+from PIL import Image, ImageOps, features
+
+from process_pool import SpawnPool
+
+MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', '2048'))        # lato lungo dell'immagine salvata
+PREVIEW_EDGE = int(os.getenv('IMAGE_PREVIEW_EDGE', '1024'))  # anteprima per report e DVR
+THUMB_EDGE = int(os.getenv('IMAGE_THUMB_EDGE', '256'))      # miniatura per l'interfaccia
+QUALITY = int(os.getenv('IMAGE_QUALITY', '80'))
+FORMAT = os.getenv('IMAGE_FORMAT', 'WEBP' if features.check('webp') else 'JPEG').upper()
+
+EXTENSIONS = {'WEBP': ('webp', 'image/webp'), 'JPEG': ('jpg', 'image/jpeg')}
+
+
+class Rendition:
+    """Una variante codificata di una foto"""
+
+    def __init__(self, data, width, height, extension, content_type):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.extension = extension
+        self.content_type = content_type
+
+
+def _encode(image, fmt, quality):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    # Nessun exif/icc passato a save(): i metadati (GPS, modello telefono) non vengono scritti
+    if fmt == 'WEBP':
+        image.save(buffer, 'WEBP', quality=quality, method=2)
+    else:
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    extension, content_type = EXTENSIONS[fmt]
+    return Rendition(buffer.getvalue(), image.width, image.height, extension, content_type)
+
+
+def ingest_image(data, max_edge=MAX_EDGE, preview_edge=PREVIEW_EDGE, thumb_edge=THUMB_EDGE,
+                 fmt=FORMAT, quality=QUALITY):
+    """Restituisce {'foto', 'anteprima', 'miniatura'} come Rendition; eseguibile in un processo separato.
+
+    data sono i byte della foto o il percorso del file, che il processo legge da sé.
+    """
+    with Image.open(data if isinstance(data, str) else io.BytesIO(data)) as image:
+        # thumbnail() sui JPEG usa draft(): la decodifica scala già in DCT, molto più veloce su foto da 12-48 MP.
+        # Si ridimensiona prima di ruotare, così la rotazione lavora sull'immagine piccola.
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=2.0)
+        image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    # Via exif, icc e commenti del file originale
+    image.info = {}
+
+    renditions = {}
+    for name, edge in (('foto', max_edge), ('anteprima', preview_edge), ('miniatura', thumb_edge)):
+        image.thumbnail((edge, edge), Image.LANCZOS, reducing_gap=2.0)
+        renditions[name] = _encode(image, fmt, quality)
+    return renditions
+
+
+class ImageIngestor:
+    """Elabora lotti di foto in un pool di processi (una foto per core)"""
+
+    def __init__(self, max_workers=None):
+        self._executor = SpawnPool(max_workers or os.cpu_count())
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+    def process_batch(self, images):
+        """Lista di (rendition o None, errore) nello stesso ordine delle foto ricevute (byte o percorsi)"""
+        futures = [self._executor.submit(ingest_image, data) for data in images]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, str(e) or type(e).__name__))
+        return results
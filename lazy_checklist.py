@@ -0,0 +1,264 @@
+"""Checklist caricata a gruppi di colonne, solo quando una sezione dell'app le legge"""
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from checklist_delta import ConflictError, VERSION_COLUMN
+
+# Gruppi di colonne nell'ordine in cui le sezioni dell'app li leggono.
+# L'intestazione serve subito (Tab 1) e fornisce la versione; il resto arriva su richiesta.
+COLUMN_GROUPS = {
+    'intestazione': ('ragione_sociale', 'ateco', 'sede', 'n_dipendenti', 'datore_lavoro', 'rspp',
+                     'soggetta_scia_antincendio', 'status', 'created_at', 'updated_at'),
+    'luoghi_lavoro': ('luoghi_lavoro',),
+    'dipendenti': ('dipendenti',),
+    'attrezzature': ('attrezzature',),
+    'rischi': ('rischi_selezionati', 'foto_ambienti', 'non_conformita', 'note_sopralluogo', 'valutazione_rischi'),
+    'offerta': ('servizi_offerta', 'livello_formazione_antincendio', 'gruppo_primo_soccorso', 'mansioni'),
+    'descrizioni': ('desc_luoghi_lavoro', 'ciclo_lavorativo', 'misure_prevenzione', 'piano_miglioramento'),
+}
+HEADER_GROUP = 'intestazione'
+GROUP_OF = {column: group for group, columns in COLUMN_GROUPS.items() for column in columns}
+
+
+class FrozenDict(dict):
+    """Dizionario di una sezione condivisa: si legge come un dict, ogni modifica solleva TypeError"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("sezione condivisa tra le sessioni: in sola lettura (vedi LazyChecklist.editable)")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    setdefault = update = pop = popitem = clear = _readonly
+
+    def __reduce__(self):
+        # Copie e pickle diventano dizionari normali, modificabili
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """Lista di una sezione condivisa: si legge come una list, ogni modifica solleva TypeError"""
+
+    _readonly = FrozenDict._readonly
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def freeze(value):
+    """Copia in sola lettura di un valore JSON, a ogni profondità"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Copia modificabile del solo primo livello: gli elementi restano quelli condivisi"""
+    if isinstance(value, FrozenDict):
+        return dict(value)
+    if isinstance(value, FrozenList):
+        return list(value)
+    return value
+
+
+class SnapshotStore:
+    """Sezioni delle checklist condivise tra le sessioni: (id, versione, gruppo) -> colonne in sola lettura.
+
+    Due sessioni sulla stessa versione di una checklist leggono gli stessi oggetti, senza
+    copie. Ogni LazyChecklist tiene un riferimento alle sezioni che ha letto e lo rilascia
+    alla chiusura (o quando la sessione viene raccolta): le sezioni in uso restano in
+    memoria, le altre in un LRU di max_items sezioni.
+    """
+
+    def __init__(self, max_items=512):
+        self.max_items = max_items
+        self.stats = {'hits': 0, 'misses': 0}
+        self._items = {}
+        self._refs = {}
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Colonne della sezione (con un riferimento in più) o None se non è in memoria"""
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self._hold(key)
+            return value
+
+    def publish(self, key, values):
+        """Registra una sezione appena scaricata e ne restituisce la versione condivisa (con un riferimento)"""
+        values = freeze(values)
+        with self._lock:
+            # Due sessioni possono scaricare la stessa sezione insieme: vale la prima
+            values = self._items.setdefault(key, values)
+            self._hold(key)
+            return values
+
+    def release(self, keys):
+        with self._lock:
+            for key in keys:
+                refs = self._refs.get(key, 0) - 1
+                if refs > 0:
+                    self._refs[key] = refs
+                    continue
+                self._refs.pop(key, None)
+                if key in self._items:
+                    self._idle[key] = None
+            while len(self._idle) > self.max_items:
+                key, _ = self._idle.popitem(last=False)
+                del self._items[key]
+
+    def _hold(self, key):
+        self._refs[key] = self._refs.get(key, 0) + 1
+        self._idle.pop(key, None)
+
+    def usage(self):
+        """Sezioni in memoria, quante usate da almeno una sessione e riferimenti totali"""
+        with self._lock:
+            return {'sezioni': len(self._items), 'in_uso': len(self._refs), 'riferimenti': sum(self._refs.values())}
+
+
+class LazyChecklist(MutableMapping):
+    """Dizionario della checklist che scarica un gruppo di colonne al primo accesso a una sua chiave.
+
+    fetch(checklist_id, columns) restituisce le colonne richieste più id e version (vedi
+    ChecklistRepository.get_columns); on_load(valori) viene chiamato con ogni gruppo scaricato.
+    Con un executor le sezioni successive all'intestazione vengono richieste subito in background
+    e consegnate solo alla prima lettura.
+    Con uno SnapshotStore le sezioni arrivano in sola lettura e condivise con le altre sessioni:
+    le colonne da modificare sul posto si prendono con editable().
+    I valori scritti localmente (salvataggi, modifiche recuperate) hanno la precedenza su quelli scaricati.
+    Tutti i gruppi sono della versione attesa, current_version() (di default quella dell'intestazione;
+    l'app la fa avanzare con i propri salvataggi): se nel frattempo la checklist è stata salvata
+    da un altro utente il gruppo non viene mescolato agli altri e si solleva ConflictError.
+    Le colonne lette devono stare in COLUMN_GROUPS (le altre sollevano KeyError).
+    """
+
+    def __init__(self, checklist_id, fetch, store=None, on_load=None, executor=None):
+        self.checklist_id = checklist_id
+        self.on_load = on_load
+        self.loads = {}
+        self._fetch = fetch
+        self._store = store
+        self._data = {}
+        self._groups = set()
+        self._pending = {}
+        self._held = []
+        self._lock = threading.Lock()
+        # Riferimenti alle sezioni condivise rilasciati con close() o quando la sessione viene raccolta
+        self._release = weakref.finalize(self, store.release, self._held) if store is not None else None
+        self.version = None
+        self.current_version = lambda: self.version
+        if not self._load(HEADER_GROUP):
+            raise KeyError(checklist_id)
+        if executor is not None:
+            # Le altre sezioni si scaricano in parallelo mentre il Tab 1 viene disegnato
+            self._pending = {group: executor.submit(self._get_group, group)
+                             for group in COLUMN_GROUPS if group != HEADER_GROUP}
+
+    def _get_group(self, group):
+        """(valori, provenienza) di un gruppo; sicuro da chiamare da un altro thread"""
+        columns = COLUMN_GROUPS[group]
+        expected = self.current_version() if self.version is not None else None
+        if self._store is not None and expected is not None:
+            # Dopo un salvataggio della sessione la sezione da cercare è quella della nuova versione
+            key = (str(self.checklist_id), expected, group)
+            values = self._store.acquire(key)
+            if values is not None:
+                self._hold(key)
+                return values, 'cache'
+        row = self._fetch(self.checklist_id, columns)
+        if row is None:
+            return None, None
+        if expected is not None and row.get(VERSION_COLUMN) != expected:
+            raise ConflictError(f"Checklist {self.checklist_id} modificata da un altro utente durante il caricamento "
+                                f"(versione {expected}, sezione '{group}' alla versione {row.get(VERSION_COLUMN)})")
+        values = {c: row[c] for c in (*columns, 'id', VERSION_COLUMN) if row.get(c) is not None}
+        if self._store is not None:
+            key = (str(self.checklist_id), row.get(VERSION_COLUMN), group)
+            values = self._store.publish(key, values)
+            self._hold(key)
+        return values, 'archivio'
+
+    def _hold(self, key):
+        with self._lock:
+            if self._release.alive:
+                self._held.append(key)
+                return
+        # Chiusa mentre la sezione arrivava in background
+        self._store.release([key])
+
+    def close(self):
+        """Rilascia le sezioni condivise; restano leggibili i valori già caricati"""
+        if self._release is not None:
+            with self._lock:
+                self._release()
+
+    def _load(self, group):
+        future = self._pending.pop(group, None)
+        values, source = future.result() if future is not None else self._get_group(group)
+        if values is None:
+            return False
+        if self.version is None:
+            self.version = values.get(VERSION_COLUMN)
+        self._groups.add(group)
+        self.loads[group] = source
+        for column, value in values.items():
+            self._data.setdefault(column, value)
+        if self.on_load:
+            self.on_load(values)
+        return True
+
+    def load_all(self):
+        for group in COLUMN_GROUPS:
+            if group not in self._groups:
+                self._load(group)
+
+    def editable(self, column, default=None):
+        """Valore da modificare sul posto (append, pop, ...): copia privata della sessione al primo uso.
+
+        La copia è del solo primo livello, gli elementi restano quelli della sezione condivisa;
+        le letture successive di column restituiscono la stessa copia.
+        """
+        if column not in self:
+            return default
+        value = self[column]
+        if isinstance(value, (FrozenDict, FrozenList)):
+            value = self._data[column] = thaw(value)
+        return value
+
+    def loaded(self):
+        """Copia delle sole colonne già disponibili, senza scaricare nulla"""
+        return dict(self._data)
+
+    def __getitem__(self, column):
+        if column not in self._data:
+            group = GROUP_OF.get(column)
+            if group is None:
+                # Fuori da COLUMN_GROUPS: va aggiunta a un gruppo, non si scarica tutta la checklist per cercarla
+                raise KeyError(column)
+            if group not in self._groups:
+                self._load(group)
+        return self._data[column]
+
+    def __setitem__(self, column, value):
+        self._data[column] = value
+
+    def __delitem__(self, column):
+        del self._data[column]
+
+    def __iter__(self):
+        self.load_all()
+        return iter(self._data)
+
+    def __len__(self):
+        self.load_all()
+        return len(self._data)
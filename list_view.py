@@ -0,0 +1,102 @@
+"""Liste lunghe in Streamlit: filtro, pagine e vista tabella, disegnando solo gli elementi visibili"""
+import pandas as pd
+import streamlit as st
+
+from fragments import rerun_section
+
+PAGE_SIZES = (10, 25, 50, 100)
+STATE_PREFIX = 'lista_'   # chiavi di stato delle liste, azzerate all'apertura di un'altra checklist
+VIEWS = ("📋 Schede", "📊 Tabella")
+
+
+def _matches(text, label, row):
+    haystack = ' '.join([label, *(str(v) for v in row.values())]).casefold()
+    return all(word in haystack for word in text.casefold().split())
+
+
+def _first_page(state):
+    # Anche le selezioni della tabella sono per posizione nell'elenco filtrato
+    st.session_state[f'{state}_pagina'] = 0
+    st.session_state.pop(f'{state}_tabella', None)
+
+
+def windowed_list(key, items, label, detail=None, row=None, block=None, removable=True, page_sizes=PAGE_SIZES):
+    """Mostra items una pagina alla volta.
+
+    label(item) è il titolo dell'elemento, row(item) il dizionario di colonne per la tabella
+    e per il filtro. Nella vista a schede ogni elemento della pagina è un expander con
+    detail(item) e il pulsante di rimozione, oppure block(item) per le liste in sola lettura.
+    La vista tabella è un solo st.data_editor (la griglia scorre nel browser) con una colonna
+    di selezione per rimuovere più elementi insieme. Le rimozioni modificano items sul posto.
+    Fino a page_sizes[0] elementi non servono controlli e la lista è disegnata per intero.
+    """
+    row = row or (lambda item: {})
+    state = f"{STATE_PREFIX}{key}"
+    visible = list(enumerate(items))
+
+    if len(items) <= page_sizes[0]:
+        view, per_page = VIEWS[0], page_sizes[0]
+    else:
+        col_filter, col_size, col_view = st.columns([3, 1, 2])
+        with col_filter:
+            text = st.text_input("🔍 Filtra", key=f'{state}_filtro', placeholder="Cerca nell'elenco...",
+                                 on_change=_first_page, args=(state,))
+        with col_size:
+            per_page = st.selectbox("Per pagina", page_sizes, key=f'{state}_per_pagina',
+                                    on_change=_first_page, args=(state,))
+        with col_view:
+            view = st.radio("Vista", VIEWS, key=f'{state}_vista', horizontal=True)
+        if text.strip():
+            visible = [(idx, item) for idx, item in visible if _matches(text, label(item), row(item))]
+            st.caption(f"{len(visible)} di {len(items)} elementi")
+
+    if view == VIEWS[1]:
+        _table(state, items, visible, label, row, removable)
+        return
+
+    pages = max((len(visible) - 1) // per_page + 1, 1)
+    page = min(st.session_state.get(f'{state}_pagina', 0), pages - 1)
+    for idx, item in visible[page * per_page:(page + 1) * per_page]:
+        if block is not None:
+            block(item)
+            continue
+        with st.expander(label(item)):
+            if detail is not None:
+                detail(item)
+            if removable and st.button("🗑️ Rimuovi", key=f'remove_{key}_{idx}'):
+                items.pop(idx)
+                rerun_section()
+
+    if pages > 1:
+        col_prev, col_page, col_next = st.columns(3)
+        with col_prev:
+            if st.button("◀", key=f'{state}_prev', disabled=page == 0):
+                st.session_state[f'{state}_pagina'] = page - 1
+                rerun_section()
+        with col_page:
+            st.caption(f"Pagina {page + 1} di {pages}")
+        with col_next:
+            if st.button("▶", key=f'{state}_next', disabled=page == pages - 1):
+                st.session_state[f'{state}_pagina'] = page + 1
+                rerun_section()
+
+
+def _table(state, items, visible, label, row, removable):
+    rows = [{'Elemento': label(item), **row(item)} for _, item in visible]
+    frame = pd.DataFrame(rows, index=[idx for idx, _ in visible])
+    if not removable:
+        st.dataframe(frame, hide_index=True, use_container_width=True)
+        return
+
+    frame.insert(0, '🗑️', False)
+    edited = st.data_editor(
+        frame, key=f'{state}_tabella', hide_index=True, use_container_width=True,
+        disabled=[c for c in frame.columns if c != '🗑️'],
+        column_config={'🗑️': st.column_config.CheckboxColumn("🗑️", help="Seleziona per rimuovere", width='small')}
+    )
+    selected = [idx for idx, checked in edited['🗑️'].items() if checked] if len(edited) else []
+    if st.button(f"🗑️ Rimuovi selezionati ({len(selected)})", key=f'{state}_rimuovi', disabled=not selected):
+        for idx in sorted(selected, reverse=True):
+            items.pop(idx)
+        st.session_state.pop(f'{state}_tabella', None)
+        rerun_section()
@@ -0,0 +1,29 @@
+"""Pool di processi spawn avviabile dallo script Streamlit"""
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+_main_lock = threading.Lock()
+
+
+class SpawnPool(ProcessPoolExecutor):
+    """ProcessPoolExecutor con processi spawn (il processo Streamlit ha molti thread, fork non è sicuro).
+
+    Streamlit esegue app.py come modulo __main__: spawn lo rieseguirebbe da capo in ogni
+    processo figlio. I processi partono con un __main__ vuoto, quindi le funzioni da
+    eseguire vanno definite nei moduli importabili, non in app.py.
+    """
+
+    def __init__(self, max_workers=None):
+        super().__init__(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _spawn_process(self):
+        with _main_lock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = types.ModuleType('__main__')
+            try:
+                super()._spawn_process()
+            finally:
+                sys.modules['__main__'] = main
@@ -0,0 +1,198 @@
+"""Profilazione dei rerun: fasi cronometrate, chiamate HTTP e byte, esportazione in JSON lines"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from uuid import uuid4
+
+import httpx
+
+PROFILE_LOG = os.getenv('PROFILE_LOG', '.cache/profile.jsonl')
+_local = threading.local()      # profiler attivo nel thread dello script (uno per sessione Streamlit)
+_http_lock = threading.Lock()
+_http = {'calls': 0, 'bytes_sent': 0, 'bytes_received': 0}
+# Contatori della traccia in corso, impostati da start() nel contesto dello script della sessione
+_trace_http = ContextVar('trace_http', default=None)
+
+
+def _new_counters():
+    return {'calls': 0, 'bytes_sent': 0, 'bytes_received': 0}
+
+
+def http_counters(counters=None):
+    """Copia dei contatori indicati, o di quelli del processo"""
+    with _http_lock:
+        return dict(_http if counters is None else counters)
+
+
+def _body_size(message):
+    try:
+        return len(message.content)
+    except (httpx.RequestNotRead, httpx.ResponseNotRead):
+        return int(message.headers.get('content-length') or 0)
+
+
+def install_http_hooks():
+    """Conta richieste e byte di tutti gli httpx.Client (Supabase, storage, OpenAI); idempotente.
+
+    Ogni richiesta va nei contatori del processo e in quelli della traccia del contesto che
+    la invia: gli span di un rerun vedono solo le chiamate dello script della loro sessione,
+    non quelle delle altre sessioni né dei thread di upload e prefetch.
+    """
+    if getattr(httpx.Client.send, '_profiled', False):
+        return
+    send = httpx.Client.send
+
+    @functools.wraps(send)
+    def counted_send(self, request, *args, **kwargs):
+        response = send(self, request, *args, **kwargs)
+        sent, received = _body_size(request), _body_size(response)
+        trace = _trace_http.get()
+        with _http_lock:
+            for counters in (_http, trace) if trace is not None else (_http,):
+                counters['calls'] += 1
+                counters['bytes_sent'] += sent
+                counters['bytes_received'] += received
+        return response
+
+    counted_send._profiled = True
+    httpx.Client.send = counted_send
+
+
+class Profiler:
+    """Span di un rerun (una traccia): nome, inizio/fine, genitore e delta dei contatori HTTP.
+
+    Ogni span diventa una riga JSON con i campi di uno span OpenTelemetry
+    (trace_id, span_id, parent_span_id, start/end_time_unix_nano, attributes).
+    """
+
+    def __init__(self, name, path=None, attributes=None, counters=None):
+        self.trace_id = uuid4().hex
+        self.path = path
+        self.counters = counters    # None: contatori del processo
+        self.spans = []
+        self.finished = False
+        self._stack = []
+        self._opened = []   # ordine di apertura, per mostrare l'albero delle fasi
+        self._root = self._open(name, attributes or {})
+
+    def _open(self, name, attributes):
+        span = {
+            'trace_id': self.trace_id,
+            'span_id': uuid4().hex[:16],
+            'parent_span_id': self._stack[-1]['span_id'] if self._stack else None,
+            'name': name,
+            'start_time_unix_nano': time.time_ns(),
+            'end_time_unix_nano': None,
+            'attributes': dict(attributes),
+            '_start': time.perf_counter(),
+            '_http': http_counters(self.counters),
+        }
+        self._stack.append(span)
+        self._opened.append(span['span_id'])
+        return span
+
+    def _close(self, span, status='ok'):
+        before, after = span.pop('_http'), http_counters(self.counters)
+        span['end_time_unix_nano'] = time.time_ns()
+        span['attributes'].update({
+            'duration_ms': round((time.perf_counter() - span.pop('_start')) * 1000, 2),
+            'http.calls': after['calls'] - before['calls'],
+            'http.bytes_sent': after['bytes_sent'] - before['bytes_sent'],
+            'http.bytes_received': after['bytes_received'] - before['bytes_received'],
+            'status': status,
+        })
+        self._stack.remove(span)
+        self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self._open(name, attributes)
+        status = 'ok'
+        try:
+            yield span
+        except BaseException as e:
+            # st.rerun()/st.stop() passano di qui come eccezioni di controllo
+            status = type(e).__name__
+            raise
+        finally:
+            self._close(span, status)
+
+    def finish(self, status='ok'):
+        """Chiude gli span ancora aperti e, se c'è un percorso, li accoda al file JSON lines"""
+        if self.finished:
+            return self.summary()
+        self.finished = True
+        for span in reversed(self._stack[:]):
+            self._close(span, status)
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for span in self.spans:
+                    f.write(json.dumps(span, ensure_ascii=False, default=str) + '\n')
+        return self.summary()
+
+    def summary(self):
+        root = self._root['attributes']
+        return {
+            'trace_id': self.trace_id,
+            'name': self._root['name'],
+            'duration_ms': root.get('duration_ms'),
+            'http_calls': root.get('http.calls'),
+            'http_kb': round((root.get('http.bytes_sent', 0) + root.get('http.bytes_received', 0)) / 1024, 1),
+            'status': root.get('status'),
+            'spans': [dict(s['attributes'], name=s['name'], depth=self._depth(s))
+                      for s in sorted(self.spans, key=lambda s: self._opened.index(s['span_id']))],
+        }
+
+    def _depth(self, span):
+        parents = {s['span_id']: s['parent_span_id'] for s in self.spans}
+        depth, parent = 0, span['parent_span_id']
+        while parent:
+            depth, parent = depth + 1, parents.get(parent)
+        return depth
+
+
+def start(name, path=None, **attributes):
+    """Inizia la traccia di un rerun nel thread corrente; chiude quella precedente se interrotta.
+
+    Da qui le richieste HTTP del contesto corrente si contano a parte, per questa traccia.
+    """
+    previous = getattr(_local, 'profiler', None)
+    if previous is not None:
+        previous.finish('interrotto')
+    counters = _new_counters()
+    _trace_http.set(counters)
+    _local.profiler = Profiler(name, path, attributes, counters)
+    return _local.profiler
+
+
+def finish():
+    profiler = getattr(_local, 'profiler', None)
+    _local.profiler = None
+    _trace_http.set(None)
+    return profiler.finish() if profiler is not None else None
+
+
+def active():
+    return getattr(_local, 'profiler', None)
+
+
+def span(name, **attributes):
+    """Span nel profiler attivo; senza profilazione non costa nulla"""
+    profiler = active()
+    return profiler.span(name, **attributes) if profiler is not None else nullcontext()
+
+
+def timed(name=None):
+    """Decoratore: la funzione diventa uno span (nome della funzione se name è None)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
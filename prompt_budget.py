@@ -0,0 +1,200 @@
+"""Budget di token per i prompt del DVR: conteggio locale e compattazione dei dati di ogni capitolo"""
+import functools
+import json
+import os
+import re
+from collections import Counter
+
+from cache import content_key
+
+try:
+    import tiktoken
+except ImportError:  # senza tiktoken si usa una stima prudente
+    tiktoken = None
+
+PROMPT_TOKENS = int(os.getenv('DVR_PROMPT_TOKENS', '6000'))   # sistema + istruzioni + dati, per capitolo
+SUMMARY_CHUNK_TOKENS = 1500     # blocco di trascrizione riassunto in una chiamata
+MIN_TEXT_TOKENS = 120           # lunghezza minima di un testo riassunto; sotto il doppio non si riassume
+BYTES_PER_TOKEN = 3             # stima senza tiktoken: per l'italiano sovrastima leggermente
+COMPACTION_VERSION = 1          # da incrementare quando cambiano le regole di compattazione
+
+SUMMARY_SYSTEM = ("Riassumi appunti di sopralluogo per un DVR. Mantieni fatti, luoghi, macchine, sostanze, "
+                  "numeri e criticità di sicurezza; elimina ripetizioni e intercalari del parlato.")
+
+_SENTENCE = re.compile(r'(?<=[.!?;])\s+|\n+')
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass  # modello sconosciuto (es. 'stub'): encoding dei modelli recenti
+    except Exception:
+        return None  # file BPE non scaricabile (offline): stima
+    try:
+        return tiktoken.get_encoding('o200k_base')
+    except Exception:
+        return None
+
+
+def count_tokens(text, model):
+    """Token del testo per il modello: tiktoken se disponibile, altrimenti stima per eccesso"""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text.encode('utf-8')) // BYTES_PER_TOKEN)
+
+
+def _normalized(value):
+    return re.sub(r'\s+', ' ', json.dumps(value, ensure_ascii=False, sort_keys=True).lower())
+
+
+def dedupe_sentences(text):
+    """Testo senza frasi ripetute (tipiche delle trascrizioni) e senza spazi superflui"""
+    seen, kept = set(), []
+    for sentence in _SENTENCE.split(text or ''):
+        sentence = ' '.join(sentence.split())
+        key = sentence.lower().rstrip('.!?;')
+        if sentence and key not in seen:
+            seen.add(key)
+            kept.append(sentence)
+    return ' '.join(kept)
+
+
+def dedupe_items(items):
+    """Voci uguali (a meno di maiuscole e spazi) una sola volta, con il numero di occorrenze"""
+    counts, first = Counter(), {}
+    for item in items:
+        key = _normalized(item)
+        counts[key] += 1
+        first.setdefault(key, item)
+    return [dict(item, occorrenze=counts[key]) if counts[key] > 1 and isinstance(item, dict) else item
+            for key, item in first.items()]
+
+
+def aggregate_employees(dipendenti):
+    """Organico per mansione al posto dei nominativi: il DVR non ne ha bisogno"""
+    counts = Counter((d.get('mansione') or 'Non assegnata') for d in dipendenti)
+    return dict(counts.most_common())
+
+
+def compact(value, key=None):
+    """Compattazione senza perdita di contenuto utile: organico aggregato, duplicati e ripetizioni rimossi"""
+    if key == 'dipendenti' and isinstance(value, list):
+        return aggregate_employees(value)
+    if isinstance(value, dict):
+        return {('organico' if k == 'dipendenti' else k): compact(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return dedupe_items([compact(v) for v in value])
+    if isinstance(value, str):
+        return dedupe_sentences(value)
+    return value
+
+
+class ContextBuilder:
+    """Adatta i dati di un capitolo al budget di token del prompt.
+
+    Passi, finché il prompt supera il budget: compattazione (sempre), riassunto
+    gerarchico del testo più lungo con lo stesso client del DVR (blocchi riassunti,
+    poi riassunti dei riassunti), riduzione degli elenchi più lunghi e infine
+    troncamento. I riassunti vanno in cache per contenuto del blocco.
+    """
+
+    def __init__(self, writer, tokens=PROMPT_TOKENS, cache=None):
+        self.writer = writer
+        self.tokens = tokens
+        self.cache = cache
+
+    @property
+    def signature(self):
+        """Parte della chiave dei capitoli: stessi dati con altro budget danno un altro prompt"""
+        return f"budget:{self.tokens}:{COMPACTION_VERSION}"
+
+    def count(self, text):
+        return count_tokens(text, self.writer.model)
+
+    def fit(self, chapter, system):
+        """Compatta chapter.inputs in place; registra i token prima e dopo"""
+        fixed = self.count(system)
+        chapter.tokens_raw = fixed + self.count(chapter.prompt)
+        chapter.inputs = compact(chapter.inputs)
+        for _ in range(50):
+            excess = fixed + self.count(chapter.prompt) - self.tokens
+            if excess <= 0:
+                break
+            if not self._shrink(chapter.inputs, excess):
+                break
+        chapter.tokens = fixed + self.count(chapter.prompt)
+
+    def _shrink(self, inputs, excess):
+        texts = sorted(self._fields(inputs, str), key=lambda f: -f[2])
+        if texts and texts[0][2] > 2 * MIN_TEXT_TOKENS:
+            container, key, tokens = texts[0]
+            target = max(MIN_TEXT_TOKENS, tokens - excess)
+            summary = self.summarize(container[key], target)
+            if self.count(summary) > target:
+                summary = self.truncate(summary, target)
+            container[key] = summary
+            return True
+        for container, key, _ in sorted(self._fields(inputs, list), key=lambda f: -f[2]):
+            items = container[key]
+            # Un solo segnaposto finale {'omessi': n} per elenco, aggiornato a ogni riduzione
+            omitted = items[-1]['omessi'] if items and isinstance(items[-1], dict) and list(items[-1]) == ['omessi'] else 0
+            kept = items[:-1] if omitted else items
+            if len(kept) > 1:
+                half = len(kept) // 2
+                container[key] = kept[:half] + [{'omessi': omitted + len(kept) - half}]
+                return True
+        return False
+
+    def _fields(self, value, kind):
+        """(contenitore, chiave, token) dei valori di tipo kind, a qualunque profondità"""
+        entries = value.items() if isinstance(value, dict) else enumerate(value) if isinstance(value, list) else ()
+        for key, item in entries:
+            if isinstance(item, kind):
+                yield value, key, self.count(item if isinstance(item, str) else json.dumps(item, ensure_ascii=False))
+            if isinstance(item, (dict, list)):
+                yield from self._fields(item, kind)
+
+    def truncate(self, text, tokens):
+        encoding = _encoding(self.writer.model)
+        if encoding is not None:
+            return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens]) + ' [...]'
+        return text.encode('utf-8')[:tokens * BYTES_PER_TOKEN].decode('utf-8', 'ignore') + ' [...]'
+
+    def _chunks(self, text):
+        chunk, size = [], 0
+        for sentence in _SENTENCE.split(text):
+            tokens = self.count(sentence)
+            if chunk and size + tokens > SUMMARY_CHUNK_TOKENS:
+                yield ' '.join(chunk)
+                chunk, size = [], 0
+            chunk.append(sentence)
+            size += tokens
+        if chunk:
+            yield ' '.join(chunk)
+
+    def summarize(self, text, target):
+        """Riassunto gerarchico: ogni blocco in proporzione al target, poi di nuovo sull'insieme se serve"""
+        tokens = self.count(text)
+        if tokens <= target:
+            return text
+        chunks = list(self._chunks(text))
+        words = max(30, int(target * 0.6 / len(chunks)))   # circa 0,6 parole per token in italiano
+        summary = ' '.join(self._summarize_chunk(chunk, words) for chunk in chunks)
+        if self.count(summary) > target and len(chunks) > 1 and self.count(summary) < tokens:
+            return self.summarize(summary, target)
+        return summary
+
+    def _summarize_chunk(self, chunk, words):
+        key = content_key(chunk.encode('utf-8'), 'riassunto', words, SUMMARY_SYSTEM, self.writer.model, COMPACTION_VERSION)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            return cached.decode('utf-8')
+        summary = self.writer.complete(SUMMARY_SYSTEM, f"Riassumi in al massimo {words} parole.\n\nDati:\n{chunk}")
+        if self.cache is not None:
+            self.cache.put(key, summary.encode('utf-8'))
+        return summary
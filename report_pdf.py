@@ -0,0 +1,285 @@
+"""Report della checklist in PDF (reportlab), con le miniature delle foto e cache per versione"""
+import io
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import httpx
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import (Image, KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table,
+                                TableStyle)
+
+from cache import content_key
+from risk_scoring import checklist_matrix
+
+REPORT_FORMAT = 1        # da incrementare quando cambia il layout: invalida i PDF in cache
+THUMB_WIDTH = 32 * mm
+THUMBS_PER_ROW = 5
+IMAGE_WORKERS = 8
+CHAR_WIDTH = 1.8 * mm     # larghezza prudente di un carattere a 8 pt, più il margine della cella
+
+BLU = colors.HexColor('#1B3A57')
+GRIGIO = colors.HexColor('#F3F4F6')
+
+_styles = getSampleStyleSheet()
+STYLES = {
+    'titolo': ParagraphStyle('titolo', parent=_styles['Title'], textColor=BLU),
+    'h2': ParagraphStyle('h2', parent=_styles['Heading2'], textColor=BLU, spaceBefore=10),
+    'h3': ParagraphStyle('h3', parent=_styles['Heading4'], spaceBefore=6, spaceAfter=2),
+    'testo': ParagraphStyle('testo', parent=_styles['BodyText'], fontSize=9, leading=12),
+    'cella': ParagraphStyle('cella', parent=_styles['BodyText'], fontSize=8, leading=10),
+    'intestazione': ParagraphStyle('intestazione', parent=_styles['BodyText'], fontSize=8, leading=10,
+                                   textColor=colors.white, fontName='Helvetica-Bold'),
+    'vuoto': ParagraphStyle('vuoto', parent=_styles['BodyText'], fontSize=9, textColor=colors.grey),
+    'piede': ParagraphStyle('piede', parent=_styles['BodyText'], fontSize=7, alignment=TA_CENTER, textColor=colors.grey),
+}
+
+
+def report_key(checklist_id, version):
+    """Chiave di cache del PDF: cambia a ogni salvataggio della checklist e a ogni nuovo layout"""
+    return content_key(f"{checklist_id}:{version}".encode(), 'report', REPORT_FORMAT)
+
+
+def _plain(value):
+    # Helvetica copre cp1252 (accenti, €): emoji e simili non avrebbero un glifo
+    return str(value if value is not None else '').encode('cp1252', 'ignore').decode('cp1252').strip()
+
+
+def _text(value):
+    # Solo per il markup dei Paragraph: canvas e metadati vogliono il testo senza entità XML
+    return escape(_plain(value)).replace('\n', '<br/>')
+
+
+def _p(value, style='testo'):
+    return Paragraph(_text(value) or '-', STYLES[style])
+
+
+def thumbnail_url(photo):
+    """URL della miniatura (o dell'anteprima) di una foto; None per le voci con il solo originale"""
+    if isinstance(photo, dict):
+        return photo.get('miniatura') or photo.get('anteprima')
+    return None
+
+
+def fetch_thumbnails(urls, fetch=None):
+    """Scarica le miniature in parallelo: url -> bytes (le non disponibili sono assenti).
+
+    fetch(url) -> bytes | None sostituisce il download HTTP (bench, export senza rete).
+    """
+    urls = list(dict.fromkeys(u for u in urls if u))
+    if not urls:
+        return {}
+    with httpx.Client(timeout=10, follow_redirects=True) as client:
+        def download(url):
+            response = client.get(url)
+            return response.content if response.status_code == 200 else None
+
+        def get(url):
+            try:
+                return (fetch or download)(url)
+            except Exception:
+                return None  # una foto mancante non blocca il report
+
+        with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+            return {url: data for url, data in zip(urls, pool.map(get, urls)) if data}
+
+
+def _photo_urls(data):
+    for column in ('luoghi_lavoro', 'attrezzature', 'non_conformita'):
+        for item in data.get(column) or []:
+            for photo in item.get('foto') or []:
+                yield thumbnail_url(photo)
+    for photo in data.get('foto_ambienti') or []:
+        yield thumbnail_url(photo)
+
+
+def _gallery(photos, images):
+    cells = []
+    for photo in photos or []:
+        raw = images.get(thumbnail_url(photo))
+        if raw:
+            image = Image(io.BytesIO(raw))
+            image.drawHeight = THUMB_WIDTH * image.imageHeight / image.imageWidth
+            image.drawWidth = THUMB_WIDTH
+            cells.append(image)
+    if not cells:
+        return []
+    rows = [cells[i:i + THUMBS_PER_ROW] for i in range(0, len(cells), THUMBS_PER_ROW)]
+    rows[-1] += [''] * (THUMBS_PER_ROW - len(rows[-1]))
+    return [Table(rows, hAlign='LEFT', style=[('VALIGN', (0, 0), (-1, -1), 'TOP')])]
+
+
+def _cell(value, width):
+    # Un Paragraph per cella costa: i testi brevi restano stringhe, senza andare a capo
+    text = str(value if value is not None else '')
+    if '\n' not in text and len(text) * CHAR_WIDTH < width:
+        return text.encode('cp1252', 'ignore').decode('cp1252')
+    return _p(text, 'cella')
+
+
+def _table(header, rows, widths):
+    """Tabella a righe alterne che si spezza tra le pagine ripetendo l'intestazione"""
+    body = [[_p(h, 'intestazione') for h in header]] + [[_cell(v, w) for v, w in zip(row, widths)] for row in rows]
+    table = Table(body, colWidths=widths, repeatRows=1, hAlign='LEFT')
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), BLU),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, GRIGIO]),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+    return table
+
+
+def _section(title, flowables, empty):
+    return [Paragraph(_text(title), STYLES['h2'])] + (flowables or [Paragraph(_text(empty), STYLES['vuoto'])])
+
+
+def _name(value):
+    return value.get('nome', '') if isinstance(value, dict) else value
+
+
+def build_story(data, images):
+    """Flowable del report nello stesso ordine del Tab 3"""
+    story = [Paragraph(f"Report sopralluogo - {_text(data.get('ragione_sociale') or 'N/A')}", STYLES['titolo'])]
+
+    story += _section("Dati azienda", [_table(["Campo", "Valore"], [
+        ["Ragione sociale", data.get('ragione_sociale')],
+        ["Codice ATECO", data.get('ateco')],
+        ["Sede", data.get('sede')],
+        ["N. dipendenti", data.get('n_dipendenti')],
+        ["Datore di lavoro", _name(data.get('datore_lavoro') or {})],
+        ["RSPP", (data.get('rspp') or {}).get('tipo')],
+        ["Stato", "Completa" if data.get('status') == 'completa' else "Bozza"],
+        ["Soggetta a SCIA antincendio", data.get('soggetta_scia_antincendio')],
+    ], widths=[55 * mm, 115 * mm])], "")
+
+    luoghi = []
+    for luogo in data.get('luoghi_lavoro') or []:
+        luoghi.append(KeepTogether([
+            Paragraph(f"{_text(luogo.get('nome'))} - {_text(luogo.get('superficie_mq', 0))} mq", STYLES['h3']),
+            _p(luogo.get('note') or 'N/A'),
+            *_gallery(luogo.get('foto'), images),
+        ]))
+    story += _section("Luoghi di lavoro", luoghi, "Nessun luogo di lavoro inserito")
+
+    dipendenti = data.get('dipendenti') or []
+    story += _section(f"Dipendenti ({len(dipendenti)})", dipendenti and [_table(
+        ["Cognome", "Nome", "Mansione", "Documenti"],
+        [[d.get('cognome'), d.get('nome'), d.get('mansione'), len(d.get('documenti') or [])] for d in dipendenti],
+        widths=[45 * mm, 45 * mm, 60 * mm, 20 * mm])], "Nessun dipendente inserito")
+
+    attrezzature = data.get('attrezzature') or []
+    story += _section(f"Attrezzature ({len(attrezzature)})", attrezzature and [_table(
+        ["Attrezzatura", "Marca", "Modello", "Note"],
+        [[a.get('nome'), a.get('marca'), a.get('modello'), a.get('note')] for a in attrezzature],
+        widths=[45 * mm, 30 * mm, 30 * mm, 65 * mm])] + [
+        flowable for a in attrezzature if a.get('foto')
+        for flowable in [Paragraph(_text(a.get('nome')), STYLES['h3']), *_gallery(a['foto'], images)]
+    ], "Nessuna attrezzatura inserita")
+
+    rischi = [(nome, info) for nome, info in (data.get('rischi_selezionati') or {}).items() if info.get('presente')]
+    story += _section(f"Rischi identificati ({len(rischi)})", rischi and [_table(
+        ["Rischio", "Note", "Misure suggerite"],
+        [[nome, info.get('note'), '; '.join(info.get('misure') or [])] for nome, info in rischi],
+        widths=[45 * mm, 75 * mm, 50 * mm])], "Nessun rischio selezionato")
+
+    classifica = checklist_matrix(data).ranking()
+    story += _section("Valutazione P x D", classifica and [_table(
+        ["Rischio", "R max", "R medio", "Classe", "Priorità", "Mansioni", "Luoghi"],
+        [[r['rischio'], r['indice_max'], r['indice_medio'], r['classe'], r['priorita'],
+          r['mansioni_esposte'], r['luoghi_esposti']] for r in classifica],
+        widths=[50 * mm, 15 * mm, 17 * mm, 22 * mm, 26 * mm, 20 * mm, 20 * mm])], "Nessuna valutazione P x D inserita")
+
+    nc = data.get('non_conformita') or []
+    story += _section(f"Non conformità ({len(nc)})", [
+        KeepTogether([Paragraph(f"Priorità {_text(item.get('priorita'))}", STYLES['h3']),
+                      _p(item.get('descrizione')), *_gallery(item.get('foto'), images)])
+        for item in nc
+    ], "Nessuna non conformità rilevata")
+
+    mansioni = data.get('mansioni') or []
+    story += _section(f"Mansioni ({len(mansioni)})", mansioni and [_table(
+        ["Mansione", "Lavoratori", "Descrizione"],
+        [[m.get('nome'), m.get('n_lavoratori'), m.get('descrizione')] for m in mansioni],
+        widths=[45 * mm, 20 * mm, 105 * mm])], "Nessuna mansione inserita")
+
+    story += _section("Formazione obbligatoria", [_table(["Corso", "Livello"], [
+        ["Antincendio", data.get('livello_formazione_antincendio') or 'Non specificato'],
+        ["Primo soccorso", data.get('gruppo_primo_soccorso') or 'Non specificato'],
+    ], widths=[55 * mm, 115 * mm])], "")
+
+    servizi = data.get('servizi_offerta') or []
+    righe = []
+    for serv in servizi:
+        dettaglio = serv.get('dettaglio')
+        try:
+            # Sorveglianza sanitaria: dettaglio = {mansione: dipendenti} in JSON
+            dettaglio = ', '.join(f"{m}: {n}" for m, n in json.loads(dettaglio).items())
+        except (TypeError, ValueError, AttributeError):
+            pass
+        righe.append([re.sub(r'^\W+', '', serv.get('categoria') or ''), serv.get('nome'), dettaglio,
+                      f"€ {serv.get('prezzo', 0):,.2f}"])
+    if servizi:
+        righe.append(["", "Totale offerta", "", f"€ {sum(s.get('prezzo', 0) for s in servizi):,.2f}"])
+    story += _section("Offerta commerciale", servizi and [_table(
+        ["Categoria", "Servizio", "Dettaglio", "Prezzo"], righe,
+        widths=[40 * mm, 50 * mm, 55 * mm, 25 * mm])], "Nessun servizio in offerta")
+
+    descrizioni = [(titolo, data.get(colonna)) for titolo, colonna in (
+        ("Luoghi di lavoro", 'desc_luoghi_lavoro'), ("Ciclo lavorativo", 'ciclo_lavorativo'),
+        ("Misure di prevenzione", 'misure_prevenzione'), ("Note sopralluogo", 'note_sopralluogo')) if data.get(colonna)]
+    story += _section("Descrizioni dettagliate", [
+        flowable for titolo, testo in descrizioni for flowable in (Paragraph(_text(titolo), STYLES['h3']), _p(testo))
+    ], "Nessuna descrizione inserita")
+
+    piano = data.get('piano_miglioramento') or []
+    story += _section(f"Piano di miglioramento ({len(piano)})", piano and [_table(
+        ["Azione", "Responsabile", "Scadenza"],
+        [[a.get('descrizione'), a.get('responsabile'), a.get('scadenza')] for a in piano],
+        widths=[110 * mm, 35 * mm, 25 * mm])], "Nessuna azione di miglioramento")
+
+    foto_ambienti = _gallery(data.get('foto_ambienti'), images)
+    if foto_ambienti:
+        story += _section("Foto ambienti", foto_ambienti, "")
+    return story
+
+
+def render_report(data, fetch=None):
+    """PDF del report per una checklist (dizionario completo); le foto sono le miniature, scaricate in parallelo"""
+    images = fetch_thumbnails(_photo_urls(data), fetch)
+    buffer = io.BytesIO()
+    azienda = ' '.join(_plain(data.get('ragione_sociale')).split())
+    generato = datetime.now().strftime('%d/%m/%Y %H:%M')
+
+    def footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 7)
+        canvas.setFillColor(colors.grey)
+        canvas.drawString(doc.leftMargin, 10 * mm, f"DVR PRO - {azienda}")
+        canvas.drawRightString(A4[0] - doc.rightMargin, 10 * mm, f"Pagina {doc.page} - generato il {generato}")
+        canvas.restoreState()
+
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm,
+                            topMargin=16 * mm, bottomMargin=18 * mm,
+                            title=f"Report sopralluogo {azienda}", author="DVR PRO - Paradigma+")
+    doc.build(build_story(data, images), onFirstPage=footer, onLaterPages=footer)
+    return buffer.getvalue()
+
+
+def cached_report(cache, checklist_id, version, data, fetch=None):
+    """(pdf, da_cache): il PDF di una versione già esportata non viene ridisegnato"""
+    key = report_key(checklist_id, version)
+    pdf = cache.get(key) if version is not None else None
+    if pdf is not None:
+        return pdf, True
+    pdf = render_report(data, fetch)
+    if version is not None:
+        cache.put(key, pdf)
+    return pdf, False
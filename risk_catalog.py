@@ -0,0 +1,76 @@
+"""Catalogo dei rischi da file dati versionato, con indice per prefisso ATECO"""
+import json
+import os
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'catalogo_rischi.json')
+
+
+def ateco_digits(code):
+    """'25.11.00' -> '251100': i livelli ATECO sono cifre successive, i punti non contano"""
+    return ''.join(c for c in str(code or '') if c.isdigit())
+
+
+class PrefixTrie:
+    """Trie sulle cifre del codice: lookup() raccoglie i valori di tutti i prefissi del codice"""
+
+    def __init__(self):
+        self._root = {}
+
+    def insert(self, prefix, value):
+        node = self._root
+        for digit in prefix:
+            node = node.setdefault(digit, {})
+        node.setdefault(None, []).append(value)
+
+    def lookup(self, code):
+        """Valori dal prefisso più generico al più specifico"""
+        node = self._root
+        found = list(node.get(None, []))
+        for digit in code:
+            node = node.get(digit)
+            if node is None:
+                break
+            found.extend(node.get(None, []))
+        return found
+
+
+class RiskCatalog:
+    """Rischi con nota e misure predefinite, e rischi tipici per prefisso ATECO.
+
+    Il file JSON ha 'versione', 'rischi' (nome, nota, misure) e 'ateco' (prefisso,
+    descrizione, rischi); un rischio di un prefisso è un nome o un dizionario che
+    sostituisce nota e misure per quel settore. Un prefisso vuoto vale per tutti.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        with open(path, encoding='utf-8') as f:
+            doc = json.load(f)
+        self.version = doc['versione']
+        self.risks = {r['nome']: {'nota': r.get('nota', ''), 'misure': list(r.get('misure', []))} for r in doc['rischi']}
+        self._trie = PrefixTrie()
+        for entry in doc.get('ateco', []):
+            for risk in entry['rischi']:
+                risk = {'nome': risk} if isinstance(risk, str) else risk
+                if risk['nome'] not in self.risks:
+                    raise ValueError(f"Catalogo rischi {self.version}: '{risk['nome']}' (ATECO {entry['prefisso']}) "
+                                     f"non è tra i rischi")
+                self._trie.insert(ateco_digits(entry['prefisso']), (entry.get('descrizione', ''), risk))
+
+    @property
+    def names(self):
+        return list(self.risks)
+
+    def suggest(self, ateco):
+        """Rischi tipici per il codice: nome -> {'nota', 'misure', 'settore'}, nell'ordine del catalogo.
+
+        I prefissi più specifici sostituiscono nota e misure di quelli generici.
+        """
+        suggested = {}
+        for sector, risk in self._trie.lookup(ateco_digits(ateco)):
+            base = suggested.get(risk['nome']) or self.risks[risk['nome']]
+            suggested[risk['nome']] = {
+                'nota': risk.get('nota', base['nota']),
+                'misure': list(risk.get('misure', base['misure'])),
+                'settore': sector or base.get('settore', ''),
+            }
+        return {name: suggested[name] for name in self.risks if name in suggested}
@@ -0,0 +1,163 @@
+"""Valutazione quantitativa dei rischi: matrice P × D per rischio, mansione e luogo su array NumPy"""
+import base64
+
+import numpy as np
+
+LEVELS = 4  # scala 1-4 per probabilità e danno; 0 = cella non valutata
+PROBABILITA = {1: "Improbabile", 2: "Poco probabile", 3: "Probabile", 4: "Altamente probabile"}
+DANNO = {1: "Lieve", 2: "Medio", 3: "Grave", 4: "Gravissimo"}
+
+# Classi di rischio R = P × D: (limite superiore, nome, priorità dell'intervento)
+CLASSI = (
+    (0, "Non valutato", ""),
+    (2, "Basso", "Da programmare"),
+    (4, "Medio", "Medio termine"),
+    (8, "Alto", "Breve termine"),
+    (16, "Molto alto", "Immediata"),
+)
+_BOUNDS = np.array([limit for limit, _, _ in CLASSI])
+GENERALE = "Generale"  # mansione o luogo unico quando la checklist non ne elenca
+
+
+def risk_class(index):
+    """Indice di classe (0-4) per valori R scalari o array"""
+    return np.searchsorted(_BOUNDS, index)
+
+
+def checklist_axes(rischi_selezionati, mansioni, luoghi):
+    """Assi della matrice per una checklist: rischi presenti, mansioni e luoghi (nomi senza ripetizioni)"""
+    return (
+        [nome for nome, info in (rischi_selezionati or {}).items() if info.get('presente')],
+        list(dict.fromkeys(m['nome'] for m in mansioni or [])),
+        list(dict.fromkeys(l['nome'] for l in luoghi or [])),
+    )
+
+
+def checklist_matrix(data):
+    """Matrice P × D salvata nella checklist, sugli assi attuali (report e DVR)"""
+    return RiskMatrix.from_dict(data.get('valutazione_rischi'), *checklist_axes(
+        data.get('rischi_selezionati'), data.get('mansioni'), data.get('luoghi_lavoro')))
+
+
+class RiskMatrix:
+    """Probabilità e danno per ogni (rischio, mansione, luogo) in due array uint8.
+
+    compute() calcola R, classi e aggregati con un solo passaggio vettoriale; set()
+    aggiorna le celle e ricalcola solo le fette toccate. Gli aggregati restano validi
+    dopo ogni set(): massimi per rischio/mansione/luogo e conteggio per classe.
+    """
+
+    def __init__(self, risks, mansioni=(), luoghi=()):
+        self.risks = list(risks)
+        self.mansioni = list(mansioni) or [GENERALE]
+        self.luoghi = list(luoghi) or [GENERALE]
+        self._r = {name: i for i, name in enumerate(self.risks)}
+        self._m = {name: i for i, name in enumerate(self.mansioni)}
+        self._l = {name: i for i, name in enumerate(self.luoghi)}
+        shape = (len(self.risks), len(self.mansioni), len(self.luoghi))
+        self.p = np.zeros(shape, dtype=np.uint8)
+        self.d = np.zeros(shape, dtype=np.uint8)
+        self.compute()
+
+    @property
+    def axes(self):
+        return self.risks, self.mansioni, self.luoghi
+
+    def compute(self):
+        """Ricalcolo completo di R (uint8, al massimo 16), classi e aggregati"""
+        self.index = self.p * self.d
+        self.classes = risk_class(self.index)
+        self.max_by_risk = self.index.max(axis=(1, 2), initial=0)
+        self.max_by_mansione = self.index.max(axis=(0, 2), initial=0)
+        self.max_by_luogo = self.index.max(axis=(0, 1), initial=0)
+        self.class_counts = np.bincount(self.classes.ravel(), minlength=len(CLASSI))
+
+    def _positions(self, names, lookup):
+        if names is None:
+            return np.arange(len(lookup))
+        names = [names] if isinstance(names, str) else names
+        return np.array([lookup[name] for name in names], dtype=np.intp)
+
+    def set(self, risk, mansione=None, luogo=None, p=0, d=0):
+        """Imposta P e D per un rischio; mansione/luogo None = tutte/tutti, oppure un nome o una lista"""
+        r = self._r[risk]
+        m_idx, l_idx = self._positions(mansione, self._m), self._positions(luogo, self._l)
+        cells = np.ix_([r], m_idx, l_idx)
+        old = self.classes[cells].ravel()
+        self.p[cells] = p
+        self.d[cells] = d
+        self.index[cells] = self.p[cells] * self.d[cells]
+        self.classes[cells] = risk_class(self.index[cells])
+        # Conteggi per differenza; i massimi solo sulle fette del rischio, delle mansioni e dei luoghi toccati
+        self.class_counts -= np.bincount(old, minlength=len(CLASSI))
+        self.class_counts += np.bincount(self.classes[cells].ravel(), minlength=len(CLASSI))
+        self.max_by_risk[r] = self.index[r].max()
+        self.max_by_mansione[m_idx] = self.index[:, m_idx, :].max(axis=(0, 2))
+        self.max_by_luogo[l_idx] = self.index[:, :, l_idx].max(axis=(0, 1))
+
+    def cell(self, risk, mansione=GENERALE, luogo=GENERALE):
+        cells = (self._r[risk], self._m[mansione], self._l[luogo])
+        return int(self.p[cells]), int(self.d[cells])
+
+    def ranking(self):
+        """Rischi valutati dal più alto: nome, R massimo, classe, priorità, mansioni e luoghi esposti"""
+        exposed_m = (self.index > 0).any(axis=2).sum(axis=1)
+        exposed_l = (self.index > 0).any(axis=1).sum(axis=1)
+        mean = np.divide(self.index.sum(axis=(1, 2)), (self.index > 0).sum(axis=(1, 2)),
+                         out=np.zeros(len(self.risks)), where=(self.index > 0).any(axis=(1, 2)))
+        order = np.lexsort((-mean, -self.max_by_risk.astype(np.int16)))
+        return [{
+            'rischio': self.risks[i],
+            'indice_max': int(self.max_by_risk[i]),
+            'indice_medio': round(float(mean[i]), 1),
+            'classe': CLASSI[risk_class(self.max_by_risk[i])][1],
+            'priorita': CLASSI[risk_class(self.max_by_risk[i])][2],
+            'mansioni_esposte': int(exposed_m[i]),
+            'luoghi_esposti': int(exposed_l[i]),
+        } for i in order if self.max_by_risk[i] > 0]
+
+    def by_mansione(self):
+        """R massimo e classe per mansione, dalla più esposta"""
+        order = np.argsort(-self.max_by_mansione.astype(np.int16), kind='stable')
+        return [{'mansione': self.mansioni[i], 'indice_max': int(self.max_by_mansione[i]),
+                 'classe': CLASSI[risk_class(self.max_by_mansione[i])][1]}
+                for i in order if self.max_by_mansione[i] > 0]
+
+    def summary(self):
+        """Celle per classe di rischio (escluse le non valutate)"""
+        return {name: int(n) for (_, name, _), n in zip(CLASSI[1:], self.class_counts[1:])}
+
+    # Persistenza: assi per nome e P/D in un byte per cella (P nei 4 bit alti), in base64.
+    # Sugli assi correnti si riportano le celle per nome: rischi, mansioni e luoghi possono cambiare.
+
+    def to_dict(self):
+        packed = (self.p << 4) | self.d
+        return {'rischi': self.risks, 'mansioni': self.mansioni, 'luoghi': self.luoghi,
+                'pd': base64.b64encode(packed.tobytes()).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data, risks, mansioni=(), luoghi=()):
+        if not data or not data.get('pd'):
+            return cls(risks, mansioni, luoghi)
+        stored = cls(data['rischi'], data['mansioni'], data['luoghi'])
+        packed = np.frombuffer(base64.b64decode(data['pd']), dtype=np.uint8).reshape(stored.p.shape)
+        stored.p = np.minimum(packed >> 4, LEVELS)
+        stored.d = np.minimum(packed & 0x0F, LEVELS)
+        stored.compute()
+        return stored.reshape(risks, mansioni, luoghi)
+
+    def reshape(self, risks, mansioni=(), luoghi=()):
+        """Stessa valutazione sui nuovi assi, copiando le celle dei nomi in comune (self se non cambiano)"""
+        matrix = RiskMatrix(risks, mansioni, luoghi)
+        if matrix.axes == self.axes:
+            return self
+        # Una valutazione "Generale" vale per tutte le mansioni (o i luoghi) elencati in seguito
+        pairs = [[(old[name], i) for i, name in enumerate(names) if name in old] or
+                 ([(0, i) for i in range(len(names))] if list(old) == [GENERALE] else [])
+                 for old, names in ((self._r, matrix.risks), (self._m, matrix.mansioni), (self._l, matrix.luoghi))]
+        if all(pairs):
+            src = np.ix_(*[[a for a, _ in axis] for axis in pairs])
+            dst = np.ix_(*[[b for _, b in axis] for axis in pairs])
+            matrix.p[dst], matrix.d[dst] = self.p[src], self.d[src]
+            matrix.compute()
+        return matrix
@@ -0,0 +1,898 @@
+"""Archivio checklist: interfaccia ChecklistRepository con backend Supabase, SQLite (offline-first) e in memoria"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import httpx
+from postgrest.types import ReturnMethod
+
+from checklist_delta import ConflictError, SYNC_COLUMN, VERSION_COLUMN
+
+TABLE = 'checklists'
+BUCKET = 'checklist-files'
+LIST_COLUMNS = 'id, ragione_sociale, ateco, created_at, status'
+# Colonne di servizio, fuori dal documento JSON
+META_COLUMNS = ('id', 'created_at', 'updated_at', VERSION_COLUMN, 'field_ts', SYNC_COLUMN)
+PULL_PAGE_SIZE = 500
+# Ogni pull riparte da synced_at meno questo margine: synced_at si assegna alla scrittura, non al
+# commit, e una transazione più lenta può rendersi visibile con un synced_at già superato dal cursore
+PULL_OVERLAP_SECONDS = 60
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def split_row(row):
+    """Separa una riga in (documento, metadati)"""
+    data = {k: v for k, v in row.items() if k not in META_COLUMNS}
+    meta = {k: row.get(k) for k in META_COLUMNS}
+    return data, meta
+
+
+def clean_search(text):
+    """Testo di ricerca senza i caratteri riservati dei filtri PostgREST/LIKE"""
+    return ''.join(c for c in (text or '') if c not in ',()"*%_\\').strip()
+
+
+def new_row(data):
+    """Documento e metadati di una checklist appena creata (id generato dal client)"""
+    data = {k: v for k, v in data.items() if k not in META_COLUMNS}
+    now = now_iso()
+    ts = time.time()
+    return data, {'id': str(uuid4()), VERSION_COLUMN: 1, 'field_ts': {k: ts for k in data},
+                  'created_at': now, 'updated_at': now}
+
+
+class ChecklistRepository(ABC):
+    """Interfaccia comune degli archivi di checklist e file allegati"""
+
+    @abstractmethod
+    def list_recent(self, limit=10):
+        """Ultime checklist create: id, ragione_sociale, created_at, status"""
+
+    @abstractmethod
+    def search(self, text='', status=None, after=None, limit=20):
+        """Pagina di checklist filtrate per ragione sociale/ATECO e stato, dalla più recente.
+
+        after è il cursore (created_at, id) dell'ultima riga della pagina precedente;
+        restituisce (righe, cursore della pagina successiva o None)
+        """
+
+    @abstractmethod
+    def get(self, checklist_id):
+        """Checklist completa (con id e version) o None"""
+
+    def get_columns(self, checklist_id, columns):
+        """Solo le colonne richieste (più id e version) o None; i backend remoti proiettano lato server"""
+        row = self.get(checklist_id)
+        if row is None:
+            return None
+        return {c: row[c] for c in (*columns, 'id', VERSION_COLUMN) if c in row}
+
+    @abstractmethod
+    def insert(self, data):
+        """Crea una checklist e restituisce la riga salvata"""
+
+    @abstractmethod
+    def update(self, checklist_id, patch, expected_version):
+        """Applica la patch se la versione è quella attesa (altrimenti ConflictError); restituisce la nuova versione"""
+
+    @abstractmethod
+    def put_file(self, path, data, content_type=None):
+        """Salva un file allegato e restituisce l'URL pubblico"""
+
+    @abstractmethod
+    def file_url(self, path):
+        """URL pubblico del file se è già nello storage, altrimenti None"""
+
+    @abstractmethod
+    def delete_files(self, paths):
+        """Elimina in blocco i file indicati"""
+
+    def open_upload(self, path, size, content_type=None):
+        """Sessione di upload a blocchi riprendibile (vedi uploads.py); di default i blocchi restano in memoria"""
+        return BufferedUpload(self, path, content_type)
+
+    def status(self):
+        """Stato della sincronizzazione, None se il backend non ne ha"""
+        return None
+
+
+class BufferedUpload:
+    """Sessione di upload che accumula i blocchi e salva il file con put_file alla fine.
+
+    Interfaccia comune delle sessioni: chunk_size, offset() (byte già ricevuti dalla destinazione,
+    da cui riprendere dopo un errore), write(blocco, offset) -> nuovo offset, finish() -> URL pubblico,
+    close() per liberare le risorse (chiamata sempre, anche dopo un errore).
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, repository, path, content_type=None):
+        self.repository = repository
+        self.path = path
+        self.content_type = content_type
+        self._buffer = bytearray()
+
+    def offset(self):
+        return len(self._buffer)
+
+    def write(self, chunk, offset):
+        del self._buffer[offset:]
+        self._buffer += chunk
+        return len(self._buffer)
+
+    def finish(self):
+        return self.repository.put_file(self.path, bytes(self._buffer), self.content_type)
+
+    def close(self):
+        self._buffer = bytearray()
+
+
+class FileUpload:
+    """Sessione di upload su file locale: i blocchi vanno in un file .part rinominato alla fine"""
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, full_path):
+        self.full_path = full_path
+        self.part_path = full_path + '.part'
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    def offset(self):
+        return os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+
+    def write(self, chunk, offset):
+        with open(self.part_path, 'r+b' if os.path.exists(self.part_path) else 'wb') as f:
+            f.seek(offset)
+            f.write(chunk)
+            f.truncate()
+            return f.tell()
+
+    def finish(self):
+        os.replace(self.part_path, self.full_path)
+        return f"file://{os.path.abspath(self.full_path)}"
+
+    def close(self):
+        pass
+
+
+class TusUpload:
+    """Upload riprendibile sullo storage Supabase con il protocollo TUS (blocchi da 6 MB, richiesti dal server)"""
+
+    chunk_size = 6 * 1024 * 1024
+
+    def __init__(self, client, path, size, content_type=None):
+        self.client = client
+        self.path = path
+        self.size = size
+        self.endpoint = f"{client.supabase_url}/storage/v1/upload/resumable"
+        self.headers = {
+            'authorization': f"Bearer {client.supabase_key}",
+            'apikey': client.supabase_key,
+            'tus-resumable': '1.0.0',
+            'x-upsert': 'true'
+        }
+        self.metadata = {'bucketName': BUCKET, 'objectName': path, 'contentType': content_type or 'application/octet-stream'}
+        self.location = None
+        self._http = httpx.Client(timeout=60)
+
+    def _create(self):
+        metadata = ','.join(f"{k} {base64.b64encode(v.encode('utf-8')).decode('ascii')}" for k, v in self.metadata.items())
+        response = self._http.post(self.endpoint, headers=dict(self.headers, **{
+            'upload-length': str(self.size), 'upload-metadata': metadata}))
+        response.raise_for_status()
+        self.location = response.headers['location']
+
+    def offset(self):
+        if self.location is None:
+            self._create()
+            return 0
+        response = self._http.head(self.location, headers=self.headers)
+        if response.status_code in (404, 410):
+            # Upload scaduto o rimosso dal server: si ricomincia con uno nuovo
+            self._create()
+            return 0
+        response.raise_for_status()
+        return int(response.headers['upload-offset'])
+
+    def write(self, chunk, offset):
+        if self.location is None:
+            self._create()
+        response = self._http.patch(self.location, content=chunk, headers=dict(self.headers, **{
+            'upload-offset': str(offset), 'content-type': 'application/offset+octet-stream'}))
+        response.raise_for_status()
+        return int(response.headers['upload-offset'])
+
+    def finish(self):
+        self.close()
+        return self.client.storage.from_(BUCKET).get_public_url(self.path)
+
+    def close(self):
+        self._http.close()
+
+
+class SupabaseChecklistRepository(ChecklistRepository):
+    """Accesso diretto alla tabella checklists e allo storage di Supabase"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def list_recent(self, limit=10):
+        return self.client.table(TABLE).select(LIST_COLUMNS).order('created_at', desc=True).limit(limit).execute().data
+
+    def search(self, text='', status=None, after=None, limit=20):
+        query = self.client.table(TABLE).select(LIST_COLUMNS).limit(limit + 1)
+        # Un solo parametro order con entrambe le colonne (postgrest-py ne aggiungerebbe due)
+        query.params = query.params.add('order', 'created_at.desc,id.desc')
+        if status:
+            query = query.eq('status', status)
+
+        conditions = []
+        text = clean_search(text)
+        if text:
+            # ilike su ragione_sociale usa l'indice trigram (vedi migrazione)
+            conditions.append(f'or(ragione_sociale.ilike."*{text}*",ateco.ilike."{text}*")')
+        if after:
+            # Keyset pagination: niente offset, costo costante anche a pagine lontane
+            created_at, last_id = after
+            conditions.append(f'or(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{last_id}"))')
+        if conditions:
+            query.params = query.params.add('and', f"({','.join(conditions)})")
+
+        rows = query.execute().data
+        return rows[:limit], (rows[limit - 1]['created_at'], rows[limit - 1]['id']) if len(rows) > limit else None
+
+    def get(self, checklist_id):
+        result = self.client.table(TABLE).select('*').eq('id', checklist_id).execute()
+        return result.data[0] if result.data else None
+
+    def get_columns(self, checklist_id, columns):
+        select = ','.join(dict.fromkeys((*columns, 'id', VERSION_COLUMN)))
+        result = self.client.table(TABLE).select(select).eq('id', checklist_id).execute()
+        return result.data[0] if result.data else None
+
+    def insert(self, data):
+        data, meta = new_row(data)
+        row = dict(data, **meta)
+        self.insert_row(row)
+        return row
+
+    def update(self, checklist_id, patch, expected_version):
+        state = self.sync_state(checklist_id)
+        if state is None or state[VERSION_COLUMN] != expected_version:
+            raise ConflictError(f"Checklist {checklist_id} modificata da un altro utente (versione attesa {expected_version})")
+
+        fields = {k: v for k, v in patch.items() if k not in META_COLUMNS}
+        ts = time.time()
+        update = dict(fields, field_ts=dict(state.get('field_ts') or {}, **{f: ts for f in fields}), updated_at=now_iso())
+        update[VERSION_COLUMN] = expected_version + 1
+        if not self.update_if_version(checklist_id, update, expected_version):
+            raise ConflictError(f"Checklist {checklist_id} modificata da un altro utente (versione attesa {expected_version})")
+        return expected_version + 1
+
+    def put_file(self, path, data, content_type=None):
+        bucket = self.client.storage.from_(BUCKET)
+        bucket.upload(path, data, file_options={'content-type': content_type} if content_type else None)
+        return bucket.get_public_url(path)
+
+    def open_upload(self, path, size, content_type=None):
+        return TusUpload(self.client, path, size, content_type)
+
+    def file_url(self, path):
+        url = self.client.storage.from_(BUCKET).get_public_url(path)
+        return url if httpx.head(url, timeout=10).status_code == 200 else None
+
+    def delete_files(self, paths):
+        bucket = self.client.storage.from_(BUCKET)
+        for start in range(0, len(paths), 100):
+            bucket.remove(paths[start:start + 100])
+
+    # API per la sincronizzazione
+
+    def sync_state(self, checklist_id):
+        """Versione e timestamp per campo della riga remota"""
+        result = self.client.table(TABLE).select(f'id, {VERSION_COLUMN}, field_ts').eq('id', checklist_id).execute()
+        return result.data[0] if result.data else None
+
+    def insert_row(self, row):
+        self.client.table(TABLE).insert(row, returning=ReturnMethod.minimal).execute()
+
+    def update_if_version(self, checklist_id, fields, expected_version):
+        """Aggiorna i campi solo se la versione remota è quella attesa; False se è cambiata"""
+        query = self.client.table(TABLE).update(fields) \
+            .eq('id', checklist_id).eq(VERSION_COLUMN, expected_version)
+        # Il database rimanda solo l'id delle righe aggiornate, non l'intera riga
+        query.params = query.params.add('select', 'id')
+        return bool(query.execute().data)
+
+    def changes_since(self, cursor, limit=PULL_PAGE_SIZE):
+        """Righe dopo il cursore (synced_at, id) in ordine di synced_at; con id None anche quelle a synced_at.
+
+        synced_at lo assegna il database a ogni insert/update (vedi migrazione), non l'orologio
+        dei client; a parità di timestamp decide l'id, così nessuna riga si perde tra due pagine.
+        È l'istante della scrittura, non del commit: una transazione lenta può diventare visibile
+        dopo righe con synced_at più alto, per questo il pull rilegge un margine (PULL_OVERLAP_SECONDS).
+        """
+        query = self.client.table(TABLE).select('*').limit(limit)
+        query.params = query.params.add('order', f'{SYNC_COLUMN}.asc,id.asc')
+        if cursor:
+            synced_at, last_id = cursor
+            query = query.gte(SYNC_COLUMN, synced_at)
+            if last_id is not None:
+                query.params = query.params.add('or', f'({SYNC_COLUMN}.gt."{synced_at}",id.gt."{last_id}")')
+        return query.execute().data
+
+
+class SQLiteChecklistRepository(ChecklistRepository):
+    """Checklist in SQLite locale: letture e scritture non toccano la rete"""
+
+    SCHEMA = """
+        create table if not exists checklists (
+            id text primary key,
+            data text not null,
+            field_ts text not null default '{}',
+            version integer not null,
+            remote_version integer,
+            ragione_sociale text,
+            ateco text,
+            status text,
+            created_at text,
+            updated_at text
+        );
+        create index if not exists checklists_created_at on checklists (created_at desc, id desc);
+        create index if not exists checklists_status on checklists (status, created_at desc, id desc);
+        create table if not exists outbox (
+            checklist_id text primary key,
+            fields text not null,
+            seq integer not null,
+            attempts integer not null default 0,
+            next_attempt real not null default 0,
+            last_error text
+        );
+        create table if not exists meta (key text primary key, value text);
+    """
+
+    def __init__(self, path, files_dir=None):
+        self.path = path
+        self.files_dir = files_dir or os.path.join(os.path.dirname(path) or '.', 'files')
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+        self._migrate()
+        self.has_fts = self._create_fts()
+
+    def _conn(self):
+        # Una connessione per thread (sessioni Streamlit e thread di sync)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('pragma synchronous=normal')
+            self._local.conn = conn
+        return conn
+
+    # Letture
+
+    def _migrate(self):
+        # Colonne aggiunte dopo la prima versione dello schema
+        columns = {r['name'] for r in self._conn().execute('pragma table_info(checklists)')}
+        if 'ateco' not in columns:
+            with self._conn() as conn:
+                conn.execute('alter table checklists add column ateco text')
+                conn.execute("update checklists set ateco = json_extract(data, '$.ateco')")
+
+    def _create_fts(self):
+        """Indice full-text a trigrammi su ragione sociale e ATECO (SQLite >= 3.34)"""
+        try:
+            with self._conn() as conn:
+                exists = conn.execute("select 1 from sqlite_master where name = 'checklists_fts'").fetchone()
+                conn.executescript("""
+                    create virtual table if not exists checklists_fts using fts5(
+                        ragione_sociale, ateco, content='checklists', content_rowid='rowid', tokenize='trigram'
+                    );
+                    create trigger if not exists checklists_fts_ins after insert on checklists begin
+                        insert into checklists_fts (rowid, ragione_sociale, ateco)
+                        values (new.rowid, new.ragione_sociale, new.ateco);
+                    end;
+                    create trigger if not exists checklists_fts_del after delete on checklists begin
+                        insert into checklists_fts (checklists_fts, rowid, ragione_sociale, ateco)
+                        values ('delete', old.rowid, old.ragione_sociale, old.ateco);
+                    end;
+                    create trigger if not exists checklists_fts_upd after update of ragione_sociale, ateco on checklists begin
+                        insert into checklists_fts (checklists_fts, rowid, ragione_sociale, ateco)
+                        values ('delete', old.rowid, old.ragione_sociale, old.ateco);
+                        insert into checklists_fts (rowid, ragione_sociale, ateco)
+                        values (new.rowid, new.ragione_sociale, new.ateco);
+                    end;
+                """)
+                if not exists:
+                    conn.execute("insert into checklists_fts (checklists_fts) values ('rebuild')")
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def list_recent(self, limit=10):
+        rows = self._conn().execute(
+            'select id, ragione_sociale, ateco, created_at, status from checklists order by created_at desc limit ?', (limit,)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def search(self, text='', status=None, after=None, limit=20):
+        sql = 'select id, ragione_sociale, ateco, created_at, status from checklists where 1 = 1'
+        params = []
+        text = clean_search(text)
+        if text:
+            if self.has_fts and len(text) >= 3:
+                sql += ' and rowid in (select rowid from checklists_fts where checklists_fts match ?)'
+                params.append('"' + text + '"')
+            else:
+                sql += ' and (ragione_sociale like ? or ateco like ?)'
+                params += [f'%{text}%', f'{text}%']
+        if status:
+            sql += ' and status = ?'
+            params.append(status)
+        if after:
+            sql += ' and (created_at < ? or (created_at = ? and id < ?))'
+            params += [after[0], after[0], after[1]]
+        sql += ' order by created_at desc, id desc limit ?'
+        params.append(limit + 1)
+
+        rows = [dict(r) for r in self._conn().execute(sql, params).fetchall()]
+        return rows[:limit], (rows[limit - 1]['created_at'], rows[limit - 1]['id']) if len(rows) > limit else None
+
+    def get(self, checklist_id):
+        row = self._conn().execute('select * from checklists where id = ?', (str(checklist_id),)).fetchone()
+        if row is None:
+            return None
+        return dict(json.loads(row['data']), id=row['id'], version=row['version'],
+                    created_at=row['created_at'], updated_at=row['updated_at'])
+
+    def get_columns(self, checklist_id, columns):
+        # Estrae dal documento solo i campi richiesti, senza decodificare tutto il JSON in Python
+        fields = [c for c in columns if c not in META_COLUMNS]
+        select = ', '.join(['id', 'version', 'created_at', 'updated_at'] + ['data -> ?'] * len(fields))
+        row = self._conn().execute(f'select {select} from checklists where id = ?',
+                                   [f'$."{c}"' for c in fields] + [str(checklist_id)]).fetchone()
+        if row is None:
+            return None
+        result = {k: row[k] for k in ('id', 'version', 'created_at', 'updated_at')}
+        for idx, column in enumerate(fields, start=4):
+            if row[idx] is not None:
+                result[column] = json.loads(row[idx])
+        return result
+
+    # Scritture della app
+
+    def insert(self, data):
+        """Crea una checklist locale e la mette in coda per la sincronizzazione"""
+        data, meta = new_row(data)
+        with self._write_lock, self._conn() as conn:
+            conn.execute(
+                'insert into checklists (id, data, field_ts, version, ragione_sociale, ateco, status, created_at, updated_at) '
+                'values (?, ?, ?, 1, ?, ?, ?, ?, ?)',
+                (meta['id'], json.dumps(data, ensure_ascii=False, default=str), json.dumps(meta['field_ts']),
+                 data.get('ragione_sociale'), data.get('ateco'), data.get('status'), meta['created_at'], meta['updated_at'])
+            )
+            self._enqueue(conn, meta['id'], list(data))
+        return self.get(meta['id'])
+
+    def update(self, checklist_id, patch, expected_version):
+        """Applica la patch se la versione locale è quella attesa; restituisce la nuova versione"""
+        checklist_id = str(checklist_id)
+        with self._write_lock, self._conn() as conn:
+            row = conn.execute('select data, field_ts, version from checklists where id = ?', (checklist_id,)).fetchone()
+            if row is None or row['version'] != expected_version:
+                raise ConflictError(f"Checklist {checklist_id} modificata da un altro utente (versione attesa {expected_version})")
+
+            data = json.loads(row['data'])
+            field_ts = json.loads(row['field_ts'])
+            ts = time.time()
+            for field, value in patch.items():
+                if field in META_COLUMNS:
+                    continue
+                data[field] = value
+                field_ts[field] = ts
+
+            new_version = expected_version + 1
+            conn.execute(
+                'update checklists set data = ?, field_ts = ?, version = ?, ragione_sociale = ?, ateco = ?, status = ?, '
+                'updated_at = ? where id = ?',
+                (json.dumps(data, ensure_ascii=False, default=str), json.dumps(field_ts), new_version,
+                 data.get('ragione_sociale'), data.get('ateco'), data.get('status'), now_iso(), checklist_id)
+            )
+            self._enqueue(conn, checklist_id, [f for f in patch if f not in META_COLUMNS])
+        return new_version
+
+    def put_file(self, path, data, content_type=None):
+        full_path = os.path.join(self.files_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+        return f"file://{os.path.abspath(full_path)}"
+
+    def open_upload(self, path, size, content_type=None):
+        return FileUpload(os.path.join(self.files_dir, path))
+
+    def file_url(self, path):
+        full_path = os.path.join(self.files_dir, path)
+        return f"file://{os.path.abspath(full_path)}" if os.path.exists(full_path) else None
+
+    def delete_files(self, paths):
+        for path in paths:
+            full_path = os.path.join(self.files_dir, path)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+
+    def _enqueue(self, conn, checklist_id, fields):
+        row = conn.execute('select fields, seq from outbox where checklist_id = ?', (checklist_id,)).fetchone()
+        if row is None:
+            conn.execute('insert into outbox (checklist_id, fields, seq) values (?, ?, 1)',
+                         (checklist_id, json.dumps(sorted(fields))))
+        else:
+            merged = sorted(set(json.loads(row['fields'])) | set(fields))
+            # Una nuova modifica azzera il backoff
+            conn.execute('update outbox set fields = ?, seq = seq + 1, attempts = 0, next_attempt = 0 where checklist_id = ?',
+                         (json.dumps(merged), checklist_id))
+
+    # API per la sincronizzazione
+
+    def pending_count(self):
+        return self._conn().execute('select count(*) from outbox').fetchone()[0]
+
+    def due_outbox(self, now):
+        rows = self._conn().execute(
+            'select checklist_id, fields, seq, attempts from outbox where next_attempt <= ? order by next_attempt', (now,)
+        ).fetchall()
+        return [(r['checklist_id'], json.loads(r['fields']), r['seq'], r['attempts']) for r in rows]
+
+    def sync_row(self, checklist_id):
+        row = self._conn().execute('select * from checklists where id = ?', (checklist_id,)).fetchone()
+        return dict(row) if row else None
+
+    def mark_pushed(self, checklist_id, seq, remote_version):
+        with self._write_lock, self._conn() as conn:
+            conn.execute('update checklists set remote_version = ? where id = ?', (remote_version, checklist_id))
+            # Se nel frattempo ci sono state altre modifiche la voce resta in coda
+            conn.execute('delete from outbox where checklist_id = ? and seq = ?', (checklist_id, seq))
+
+    def mark_failed(self, checklist_id, error, delay):
+        with self._write_lock, self._conn() as conn:
+            conn.execute('update outbox set attempts = attempts + 1, next_attempt = ?, last_error = ? where checklist_id = ?',
+                         (time.time() + delay, error, checklist_id))
+
+    def apply_remote(self, remote_row):
+        """Unisce una riga remota con la copia locale (last-writer-wins per campo); restituisce i campi in conflitto"""
+        remote_data, meta = split_row(remote_row)
+        remote_ts = meta['field_ts'] or {}
+        checklist_id = str(meta['id'])
+        conflicts = []
+
+        with self._write_lock, self._conn() as conn:
+            row = conn.execute('select * from checklists where id = ?', (checklist_id,)).fetchone()
+            if row is None:
+                conn.execute(
+                    'insert into checklists (id, data, field_ts, version, remote_version, ragione_sociale, ateco, status, '
+                    'created_at, updated_at) values (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)',
+                    (checklist_id, json.dumps(remote_data, ensure_ascii=False, default=str), json.dumps(remote_ts),
+                     meta[VERSION_COLUMN], remote_data.get('ragione_sociale'), remote_data.get('ateco'), remote_data.get('status'),
+                     meta['created_at'], meta['updated_at'])
+                )
+                return conflicts
+
+            data = json.loads(row['data'])
+            field_ts = json.loads(row['field_ts'])
+            outbox = conn.execute('select fields from outbox where checklist_id = ?', (checklist_id,)).fetchone()
+            pending = set(json.loads(outbox['fields'])) if outbox else set()
+
+            changed = False
+            for field, value in remote_data.items():
+                if data.get(field) == value:
+                    continue
+                if field in pending:
+                    if remote_ts.get(field, 0) <= field_ts.get(field, 0):
+                        continue  # la modifica locale è più recente e verrà inviata
+                    conflicts.append(field)
+                data[field] = value
+                field_ts[field] = remote_ts.get(field, field_ts.get(field, 0))
+                changed = True
+
+            if changed:
+                conn.execute(
+                    'update checklists set data = ?, field_ts = ?, version = version + 1, ragione_sociale = ?, ateco = ?, '
+                    'status = ?, updated_at = ? where id = ?',
+                    (json.dumps(data, ensure_ascii=False, default=str), json.dumps(field_ts),
+                     data.get('ragione_sociale'), data.get('ateco'), data.get('status'), meta['updated_at'], checklist_id)
+                )
+            conn.execute('update checklists set remote_version = max(coalesce(remote_version, 0), ?) where id = ?',
+                         (meta[VERSION_COLUMN] or 0, checklist_id))
+        return conflicts
+
+    def get_meta(self, key):
+        row = self._conn().execute('select value from meta where key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_meta(self, key, value):
+        with self._write_lock, self._conn() as conn:
+            conn.execute('insert or replace into meta (key, value) values (?, ?)', (key, value))
+
+
+class SyncReconciler:
+    """Thread che invia la coda locale a Supabase e scarica le modifiche remote"""
+
+    def __init__(self, local, remote, interval_seconds=5.0, max_backoff_seconds=300.0):
+        self.local = local
+        self.remote = remote
+        self.interval_seconds = interval_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.online = None
+        self.last_sync = None
+        self.last_error = None
+        self.conflicts = []
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._loop, name='sync-supabase', daemon=True).start()
+        return self
+
+    def nudge(self):
+        """Anticipa il prossimo ciclo (dopo un salvataggio locale)"""
+        self._wake.set()
+
+    def status(self):
+        return {
+            'online': self.online,
+            'in_coda': self.local.pending_count(),
+            'ultimo_sync': self.last_sync,
+            'errore': self.last_error,
+            'conflitti': list(self.conflicts[-20:])
+        }
+
+    def _loop(self):
+        while True:
+            self.sync_once()
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+
+    def sync_once(self):
+        with self._lock:
+            try:
+                failed = self._push()
+                self._pull()
+                if failed:
+                    raise failed[0]
+            except Exception as e:
+                self.online = False
+                self.last_error = str(e)
+            else:
+                self.online = True
+                self.last_error = None
+                self.last_sync = time.time()
+
+    def _push(self):
+        """Invia la coda; restituisce gli errori, che non fermano l'invio delle altre checklist.
+
+        Un errore di rete invece interrompe il ciclo: gli invii successivi fallirebbero allo stesso modo.
+        """
+        failed = []
+        for checklist_id, fields, seq, attempts in self.local.due_outbox(time.time()):
+            try:
+                self._push_one(checklist_id, fields, seq)
+            except Exception as e:
+                delay = min(self.interval_seconds * (2 ** attempts), self.max_backoff_seconds)
+                self.local.mark_failed(checklist_id, str(e), delay)
+                failed.append(e)
+                if isinstance(e, httpx.TransportError):
+                    break
+        return failed
+
+    def _push_one(self, checklist_id, fields, seq):
+        row = self.local.sync_row(checklist_id)
+        data = json.loads(row['data'])
+        field_ts = json.loads(row['field_ts'])
+        # Anche per le checklist mai inviate: un inserimento precedente può essere arrivato al
+        # server con la risposta persa, e allora si prosegue con l'update con controllo di versione
+        state = self.remote.sync_state(checklist_id)
+
+        if state is None:
+            # Creata offline (o cancellata in remoto): inserimento completo
+            self.remote.insert_row(dict(data, id=checklist_id, field_ts=field_ts, version=1,
+                                    created_at=row['created_at'], updated_at=now_iso()))
+            self.local.mark_pushed(checklist_id, seq, 1)
+            return
+
+        remote_ts = state.get('field_ts') or {}
+        push = {}
+        for field in fields:
+            if remote_ts.get(field, 0) > field_ts.get(field, 0):
+                # Modificato in remoto più di recente: vince il remoto, lo applicherà il pull
+                self.conflicts.append({'checklist_id': checklist_id, 'campo': field, 'ts': time.time()})
+            else:
+                push[field] = data.get(field)
+
+        version = state[VERSION_COLUMN] or 0
+        merged_ts = dict(remote_ts, **{f: field_ts[f] for f in push if f in field_ts})
+        update = dict(push, field_ts=merged_ts, updated_at=now_iso())
+        update[VERSION_COLUMN] = version + 1
+        if self.remote.update_if_version(checklist_id, update, version):
+            self.local.mark_pushed(checklist_id, seq, version + 1)
+        # Altrimenti un altro client ha scritto nel frattempo: si riprova al ciclo successivo
+
+    def _pull(self):
+        try:
+            cursor = tuple(json.loads(self.local.get_meta('pull_cursor') or 'null') or ()) or None
+        except ValueError:
+            cursor = None  # cursore del formato precedente (solo updated_at): si riscarica tutto
+        if cursor:
+            # Si rileggono le righe dell'ultimo margine: apply_remote() su una riga già applicata non cambia nulla
+            since = datetime.fromisoformat(cursor[0]) - timedelta(seconds=PULL_OVERLAP_SECONDS)
+            cursor = (since.isoformat(), None)
+        while True:
+            rows = self.remote.changes_since(cursor, PULL_PAGE_SIZE)
+            for row in rows:
+                for field in self.local.apply_remote(row):
+                    self.conflicts.append({'checklist_id': str(row['id']), 'campo': field, 'ts': time.time()})
+                cursor = (row[SYNC_COLUMN], str(row['id']))
+            if rows:
+                self.local.set_meta('pull_cursor', json.dumps(cursor))
+            if len(rows) < PULL_PAGE_SIZE:
+                break
+
+
+class SyncedChecklistRepository(ChecklistRepository):
+    """Offline-first: tutto passa dalla copia SQLite, il reconciler allinea Supabase in background"""
+
+    def __init__(self, local, remote, reconciler):
+        self.local = local
+        self.remote = remote
+        self.reconciler = reconciler
+
+    def list_recent(self, limit=10):
+        return self.local.list_recent(limit)
+
+    def search(self, text='', status=None, after=None, limit=20):
+        return self.local.search(text, status, after, limit)
+
+    def get(self, checklist_id):
+        row = self.local.get(checklist_id)
+        if row is None:
+            # Non ancora sincronizzata: la si scarica una volta
+            remote_row = self.remote.get(checklist_id)
+            if remote_row is not None:
+                self.local.apply_remote(remote_row)
+                row = self.local.get(checklist_id)
+        return row
+
+    def get_columns(self, checklist_id, columns):
+        row = self.local.get_columns(checklist_id, columns)
+        if row is None and self.get(checklist_id) is not None:
+            row = self.local.get_columns(checklist_id, columns)
+        return row
+
+    def insert(self, data):
+        row = self.local.insert(data)
+        self.reconciler.nudge()
+        return row
+
+    def update(self, checklist_id, patch, expected_version):
+        version = self.local.update(checklist_id, patch, expected_version)
+        self.reconciler.nudge()
+        return version
+
+    def put_file(self, path, data, content_type=None):
+        # I file vanno direttamente nello storage remoto
+        return self.remote.put_file(path, data, content_type)
+
+    def open_upload(self, path, size, content_type=None):
+        return self.remote.open_upload(path, size, content_type)
+
+    def file_url(self, path):
+        return self.remote.file_url(path)
+
+    def delete_files(self, paths):
+        self.remote.delete_files(paths)
+
+    def status(self):
+        return self.reconciler.status()
+
+
+class InMemoryChecklistRepository(ChecklistRepository):
+    """Archivio in memoria per test e benchmark"""
+
+    def __init__(self):
+        self._rows = {}
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def list_recent(self, limit=10):
+        with self._lock:
+            rows = sorted(self._rows.values(), key=lambda r: r['created_at'], reverse=True)[:limit]
+            return [{k: r.get(k) for k in ('id', 'ragione_sociale', 'ateco', 'created_at', 'status')} for r in rows]
+
+    def search(self, text='', status=None, after=None, limit=20):
+        text = clean_search(text).lower()
+        with self._lock:
+            rows = [r for r in self._rows.values()
+                    if (not text or text in (r['ragione_sociale'] or '').lower() or (r['ateco'] or '').startswith(text))
+                    and (not status or r['status'] == status)
+                    and (not after or (r['created_at'], r['id']) < tuple(after))]
+        rows.sort(key=lambda r: (r['created_at'], r['id']), reverse=True)
+        page = [{k: r.get(k) for k in ('id', 'ragione_sociale', 'ateco', 'created_at', 'status')} for r in rows[:limit]]
+        return page, (page[-1]['created_at'], page[-1]['id']) if len(rows) > limit else None
+
+    def get(self, checklist_id):
+        with self._lock:
+            row = self._rows.get(str(checklist_id))
+            # Copia profonda: come per gli altri backend il chiamante può modificarla liberamente
+            return json.loads(row['json']) if row else None
+
+    def insert(self, data):
+        data, meta = new_row(data)
+        row = dict(data, **{k: meta[k] for k in ('id', VERSION_COLUMN, 'created_at', 'updated_at')})
+        with self._lock:
+            self._store(row)
+        return self.get(row['id'])
+
+    def update(self, checklist_id, patch, expected_version):
+        checklist_id = str(checklist_id)
+        with self._lock:
+            current = self._rows.get(checklist_id)
+            if current is None or current[VERSION_COLUMN] != expected_version:
+                raise ConflictError(f"Checklist {checklist_id} modificata da un altro utente (versione attesa {expected_version})")
+            row = json.loads(current['json'])
+            row.update({k: v for k, v in patch.items() if k not in META_COLUMNS})
+            row[VERSION_COLUMN] = expected_version + 1
+            row['updated_at'] = now_iso()
+            self._store(row)
+        return expected_version + 1
+
+    def _store(self, row):
+        self._rows[row['id']] = {
+            'json': json.dumps(row, ensure_ascii=False, default=str),
+            'created_at': row['created_at'],
+            'ragione_sociale': row.get('ragione_sociale'),
+            'ateco': row.get('ateco'),
+            'status': row.get('status'),
+            'id': row['id'],
+            VERSION_COLUMN: row[VERSION_COLUMN]
+        }
+
+    def put_file(self, path, data, content_type=None):
+        with self._lock:
+            self._files[path] = bytes(data)
+        return f"memory://{path}"
+
+    def file_url(self, path):
+        with self._lock:
+            return f"memory://{path}" if path in self._files else None
+
+    def delete_files(self, paths):
+        with self._lock:
+            for path in paths:
+                self._files.pop(path, None)
+
+
+def create_repository(backend, client=None, path='.cache/dvr_local.db'):
+    """Crea il backend indicato: 'offline' (SQLite + sync Supabase), 'supabase', 'sqlite' o 'memory'"""
+    if backend == 'memory':
+        return InMemoryChecklistRepository()
+    if backend == 'sqlite':
+        return SQLiteChecklistRepository(path)
+    if backend == 'supabase':
+        return SupabaseChecklistRepository(client)
+    if backend == 'offline':
+        local = SQLiteChecklistRepository(path)
+        remote = SupabaseChecklistRepository(client)
+        return SyncedChecklistRepository(local, remote, SyncReconciler(local, remote).start())
+    raise ValueError(f"Backend di archiviazione sconosciuto: {backend}")
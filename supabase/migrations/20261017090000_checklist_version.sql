@@ -0,0 +1,2 @@
+-- Versione per il controllo di concorrenza ottimistico sui salvataggi incrementali
+alter table checklists add column if not exists version integer not null default 0;
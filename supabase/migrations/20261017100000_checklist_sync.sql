@@ -0,0 +1,3 @@
+-- Sincronizzazione offline-first: timestamp per campo (last-writer-wins) e id generati dal client
+alter table checklists add column if not exists field_ts jsonb not null default '{}'::jsonb;
+create index if not exists checklists_updated_at on checklists (updated_at);
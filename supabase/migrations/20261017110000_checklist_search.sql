@@ -0,0 +1,8 @@
+-- Ricerca e paginazione della barra laterale
+create extension if not exists pg_trgm;
+-- ilike '%testo%' su ragione sociale e ATECO tramite indici trigram
+create index if not exists checklists_ragione_sociale_trgm on checklists using gin (ragione_sociale gin_trgm_ops);
+create index if not exists checklists_ateco_trgm on checklists using gin (ateco gin_trgm_ops);
+-- Keyset pagination (created_at, id), anche filtrata per stato
+create index if not exists checklists_created_at_id on checklists (created_at desc, id desc);
+create index if not exists checklists_status_created_at_id on checklists (status, created_at desc, id desc);
@@ -0,0 +1,2 @@
+-- URL delle foto generali degli ambienti caricate nel Tab 1
+alter table checklists add column if not exists foto_ambienti jsonb not null default '[]'::jsonb;
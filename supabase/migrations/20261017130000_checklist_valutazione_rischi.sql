@@ -0,0 +1,2 @@
+-- Matrice P × D del Tab 2: assi (rischi, mansioni, luoghi) e un byte per cella in base64
+alter table checklists add column if not exists valutazione_rischi jsonb;
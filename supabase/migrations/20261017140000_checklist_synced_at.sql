@@ -0,0 +1,17 @@
+-- Cursore del pull: timestamp assegnato dal database a ogni scrittura, non dall'orologio dei client
+-- (updated_at lo scrive ogni dispositivo e con orologi sfasati alcune righe non venivano scaricate)
+alter table checklists add column if not exists synced_at timestamptz not null default clock_timestamp();
+
+create or replace function checklists_set_synced_at() returns trigger language plpgsql as $$
+begin
+    new.synced_at := clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists checklists_synced_at on checklists;
+create trigger checklists_synced_at before insert or update on checklists
+    for each row execute function checklists_set_synced_at();
+
+-- Paginazione a chiave (synced_at, id) di changes_since
+create index if not exists checklists_synced_at_id on checklists (synced_at, id);
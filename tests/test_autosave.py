@@ -0,0 +1,107 @@
+import glob
+import os
+import time
+
+from autosave import AutosaveEngine, Journal
+from checklist_delta import ChangeTracker
+
+
+def engine(directory, **kwargs):
+    # Debounce lungo: i flush avvengono solo quando il test chiama _flush
+    return AutosaveEngine(str(directory), insert_fn=lambda data: {'id': 1, 'version': 1},
+                          patch_fn=lambda *args: 2, debounce_seconds=3600, max_delay_seconds=3600, **kwargs)
+
+
+def test_live_session_journal_is_not_taken_over(tmp_path):
+    autosave = engine(tmp_path)
+    baseline = {'sede': 'Via Roma 1'}
+    autosave.attach('42', 'prima', baseline, ChangeTracker(baseline), 42)
+    autosave.record('42', 'prima', {'sede': 'Via Milano 2'})
+
+    assert autosave.attach('42', 'seconda', baseline, ChangeTracker(baseline), 42) == {}
+    first = autosave._streams[('42', 'prima')]
+    assert os.path.exists(first.journal.path)
+    autosave.record('42', 'prima', {'note_sopralluogo': 'ancora attiva'})
+    assert first.journal.pending()[0] == {'sede': 'Via Milano 2', 'note_sopralluogo': 'ancora attiva'}
+
+
+def test_live_session_of_another_process_is_not_taken_over(tmp_path):
+    # Due motori sulla stessa cartella come due processi del server: decide il lock sul journal
+    baseline = {'sede': 'Via Roma 1'}
+    first, second = engine(tmp_path), engine(tmp_path)
+    first.attach('42', 'prima', baseline, ChangeTracker(baseline), 42)
+    first.record('42', 'prima', {'sede': 'Via Milano 2'})
+    assert second.attach('42', 'seconda', baseline, ChangeTracker(baseline), 42) == {}
+    assert first._streams[('42', 'prima')].journal.pending()[0] == {'sede': 'Via Milano 2'}
+
+
+def test_orphaned_journal_is_recovered(tmp_path):
+    Journal(os.path.join(tmp_path, '42.interrotta.jsonl')).append({'sede': 'Via Milano 2'})
+    autosave = engine(tmp_path)
+    baseline = {'sede': 'Via Roma 1'}
+    assert autosave.attach('42', 'nuova', baseline, ChangeTracker(baseline), 42) == {'sede': 'Via Milano 2'}
+    assert glob.glob(os.path.join(tmp_path, '42.interrotta.*')) == []
+
+
+def test_detached_session_journal_becomes_recoverable(tmp_path):
+    autosave = engine(tmp_path)
+    baseline = {'sede': 'Via Roma 1'}
+    autosave.attach('42', 'prima', baseline, ChangeTracker(baseline), 42)
+    autosave.record('42', 'prima', {'sede': 'Via Milano 2'})
+    autosave.detach('42', 'prima')
+    # Con modifiche in attesa lo stream resta fino al salvataggio in background
+    assert autosave._streams[('42', 'prima')].closing
+    autosave._streams[('42', 'prima')].conflict = True
+    autosave.detach('42', 'prima')
+    assert ('42', 'prima') not in autosave._streams
+    assert autosave.attach('42', 'seconda', baseline, ChangeTracker(baseline), 42) == {'sede': 'Via Milano 2'}
+
+
+def test_detach_without_pending_changes_releases_stream(tmp_path):
+    autosave = engine(tmp_path)
+    autosave.attach('42', 'prima', {}, ChangeTracker({}), 42)
+    autosave.detach('42', 'prima')
+    assert autosave._streams == {}
+    assert os.listdir(tmp_path) == []
+
+
+def test_closed_sessions_are_detached(tmp_path, monkeypatch):
+    monkeypatch.setattr('autosave.SESSION_CHECK_SECONDS', 0)
+    alive = {'prima'}
+    autosave = engine(tmp_path, session_alive=lambda session_id: session_id in alive)
+    autosave.attach('42', 'prima', {}, ChangeTracker({}), 42)
+    alive.clear()
+    deadline = time.time() + 5
+    while autosave._streams and time.time() < deadline:
+        time.sleep(0.1)
+    assert autosave._streams == {}
+
+
+def test_draft_without_company_name_waits_for_next_change(tmp_path):
+    inserted = []
+    autosave = AutosaveEngine(str(tmp_path), insert_fn=lambda data: inserted.append(data) or {'id': 7, 'version': 1},
+                              patch_fn=lambda *args: 2, debounce_seconds=3600, max_delay_seconds=3600)
+    autosave.attach('bozza-1', 'sessione', {})
+    autosave.record('bozza-1', 'sessione', {'sede': 'Via Roma 1'})
+    stream = autosave._streams[('bozza-1', 'sessione')]
+    autosave._flush('bozza-1', 'sessione', stream)
+    assert stream.first_pending is None and inserted == []
+
+    autosave.record('bozza-1', 'sessione', {'ragione_sociale': 'ACME'})
+    assert stream.first_pending is not None
+    autosave._flush('bozza-1', 'sessione', stream)
+    assert inserted == [{'sede': 'Via Roma 1', 'ragione_sociale': 'ACME'}]
+    assert ('7', 'sessione') in autosave._streams
+
+
+def test_failed_flush_backs_off(tmp_path):
+    def offline(*args):
+        raise OSError("rete assente")
+    autosave = AutosaveEngine(str(tmp_path), insert_fn=offline, patch_fn=offline, debounce_seconds=3600)
+    baseline = {'sede': 'Via Roma 1'}
+    autosave.attach('42', 'sessione', baseline, ChangeTracker(baseline), 42)
+    autosave.record('42', 'sessione', {'sede': 'Via Milano 2'})
+    stream = autosave._streams[('42', 'sessione')]
+    autosave._flush('42', 'sessione', stream)
+    autosave._flush('42', 'sessione', stream)
+    assert stream.failures == 2 and stream.retry_at - time.time() > 3
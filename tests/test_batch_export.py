@@ -0,0 +1,59 @@
+import io
+import json
+import zipfile
+
+from batch_export import BatchExporter, archive_name, select_checklists
+from cache import TieredCache
+from storage import InMemoryChecklistRepository
+
+
+def repository_with(*names):
+    repository = InMemoryChecklistRepository()
+    rows = [repository.insert({'ragione_sociale': name, 'status': 'bozza'}) for name in names]
+    return repository, rows
+
+
+def export(exporter, rows):
+    output = io.BytesIO()
+    counts = exporter.export(rows, output)
+    archive = zipfile.ZipFile(output)
+    return counts, archive, json.loads(archive.read('indice.json'))
+
+
+def test_zip_has_the_manifest_and_reuses_cached_pdfs(tmp_path):
+    repository, rows = repository_with("ACME", "Rossi & C.")
+    rows.append({'id': 'sparita', 'ragione_sociale': "Cancellata"})
+    exporter = BatchExporter(repository, TieredCache(str(tmp_path)), max_workers=2)
+
+    counts, archive, manifest = export(exporter, rows)
+    assert counts == {'cache': 0, 'generato': 2, 'errore': 1}
+    assert sorted(entry['esito'] for entry in manifest) == ['errore: checklist non trovata', 'generato', 'generato']
+    pdfs = {entry['file'] for entry in manifest if entry['file']}
+    assert pdfs | {'indice.json'} == set(archive.namelist())
+    assert all(archive.read(name).startswith(b'%PDF') for name in pdfs)
+    assert all(archive.getinfo(name).compress_type == zipfile.ZIP_STORED for name in pdfs)
+
+    # Seconda esportazione: solo la checklist modificata si ridisegna
+    repository.update(rows[0]['id'], {'sede': "Torino"}, rows[0]['version'])
+    counts, _, manifest = export(exporter, rows[:2])
+    assert counts == {'cache': 1, 'generato': 1, 'errore': 0}
+    assert {entry['id']: entry['esito'] for entry in manifest} == {rows[0]['id']: 'generato', rows[1]['id']: 'cache'}
+
+
+def test_archive_names_are_unique_among_namesakes():
+    used = set()
+    first = archive_name({'id': 'aaaaaaaa-1', 'ragione_sociale': "Rossi & C.", 'created_at': '2026-10-17T08:00'}, used)
+    second = archive_name({'id': 'bbbbbbbb-2', 'ragione_sociale': "Rossi & C.", 'created_at': '2026-10-17T09:00'}, used)
+
+    assert first == "Rossi_C._2026-10-17.pdf"
+    assert second == "Rossi_C._bbbbbbbb.pdf"
+
+
+def test_select_checklists_stops_before_the_start_date():
+    repository, rows = repository_with("A", "B", "C")
+    for row, day in zip(rows, ('2026-01-10', '2026-02-10', '2026-03-10')):
+        repository._rows[row['id']]['created_at'] = f"{day}T08:00:00+00:00"
+
+    selected = select_checklists(repository, since='2026-02-01', until='2026-02-28', page_size=1)
+
+    assert [row['ragione_sociale'] for row in selected] == ["B"]
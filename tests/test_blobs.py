@@ -0,0 +1,71 @@
+import sqlite3
+import time
+
+from blobs import BlobStore, blob_hash, blob_path, checklist_refs
+from storage import InMemoryChecklistRepository
+
+MONTH = 30 * 24 * 3600
+
+
+def uploaded(store, repository, data):
+    """Blob caricato un mese fa e mai citato da una checklist"""
+    digest = blob_hash(data)
+    url = repository.put_file(blob_path(digest, 'jpg'), data, 'image/jpeg')
+    store._insert(digest, blob_path(digest, 'jpg'), url, len(data), 'image/jpeg')
+    with store._conn() as conn:
+        conn.execute('update blobs set created_at = ?, last_used = ? where hash = ?',
+                     (time.time() - MONTH, time.time() - MONTH, digest))
+    return digest
+
+
+def test_gc_keeps_an_old_blob_just_reused_by_a_draft(tmp_path):
+    repository = InMemoryChecklistRepository()
+    store = BlobStore(repository, str(tmp_path / 'blobs.db'))
+    reused = uploaded(store, repository, b'foto riusata')
+    orphan = uploaded(store, repository, b'foto dimenticata')
+
+    digest, url = store.plan(b'foto riusata', 'jpg', 'image/jpeg')
+    assert digest == reused and isinstance(url, str)
+
+    assert store.gc() == (1, len(b'foto dimenticata'))
+    assert store.get(reused) is not None
+    assert store.get(orphan) is None
+    assert repository.file_url(blob_path(reused, 'jpg')) is not None
+
+
+def test_reused_variants_are_kept_too(tmp_path):
+    repository = InMemoryChecklistRepository()
+    store = BlobStore(repository, str(tmp_path / 'blobs.db'))
+    preview = uploaded(store, repository, b'anteprima')
+    store.remember_source('originale', {'anteprima': preview})
+
+    assert store.source_variants('originale')['anteprima']['hash'] == preview
+    assert store.gc() == (0, 0)
+
+
+def test_index_without_last_used_is_migrated(tmp_path):
+    path = str(tmp_path / 'blobs.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('create table blobs (hash text primary key, path text not null, url text not null, '
+                     'size integer not null, content_type text, width integer, height integer, created_at real not null)')
+        conn.execute("insert into blobs values ('h', 'blobs/h.jpg', 'u', 1, null, null, null, 123)")
+
+    store = BlobStore(InMemoryChecklistRepository(), path)
+
+    assert store.get('h')['last_used'] == 123
+
+
+def test_dry_run_counts_orphans_from_references_in_memory(tmp_path):
+    repository = InMemoryChecklistRepository()
+    store = BlobStore(repository, str(tmp_path / 'blobs.db'))
+    cited = uploaded(store, repository, b'foto citata')
+    uploaded(store, repository, b'foto orfana')
+    store.rebuild_refs([{'id': 'vecchia', 'foto_ambienti': [{'blob': cited}]}])
+    checklists = [{'id': 'c1', 'luoghi_lavoro': [{'nome': 'Officina', 'foto': [{'blob': {'originale': cited}}]}]}]
+
+    referenced = {h for _, _, h in checklist_refs(checklists)}
+    assert store.gc(dry_run=True, referenced=referenced) == (1, len(b'foto orfana'))
+    # L'indice non è stato riscritto e nulla è stato eliminato
+    assert store.refcounts()[cited] == 1
+    assert dict(store._conn().execute('select checklist_id, hash from blob_refs').fetchall()) == {'vecchia': cited}
+    assert len(store.refcounts()) == 2
@@ -0,0 +1,39 @@
+from cache import TieredCache
+
+
+def test_put_file_stays_on_disk_and_is_served_by_path(tmp_path):
+    cache = TieredCache(str(tmp_path), max_disk_bytes=1024)
+
+    path, result = cache.put_file('ab' * 32, lambda f: f.write(b'x' * 100))
+
+    assert result == 100
+    assert cache.path('ab' * 32) == path
+    assert open(path, 'rb').read() == b'x' * 100
+    assert not cache._memory
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path):
+    cache = TieredCache(str(tmp_path))
+
+    def broken(f):
+        f.write(b'parziale')
+        raise OSError("disco pieno")
+
+    try:
+        cache.put_file('cd' * 32, broken)
+    except OSError:
+        pass
+    assert cache.path('cd' * 32) is None
+    assert not list(tmp_path.rglob('*.tmp'))
+
+
+def test_discard_and_eviction_remove_the_file(tmp_path):
+    cache = TieredCache(str(tmp_path), max_disk_bytes=150)
+    cache.put_file('01' * 32, lambda f: f.write(b'x' * 100))
+    cache.discard('01' * 32)
+    assert cache.path('01' * 32) is None
+
+    cache.put_file('02' * 32, lambda f: f.write(b'x' * 100))
+    cache.put_file('03' * 32, lambda f: f.write(b'x' * 100))
+    assert cache.path('02' * 32) is None
+    assert cache.path('03' * 32) is not None
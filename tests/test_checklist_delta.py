@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+from checklist_delta import ChangeTracker, ConflictError
+from storage import InMemoryChecklistRepository, SQLiteChecklistRepository
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'supabase'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        yield InMemoryChecklistRepository()
+    elif request.param == 'sqlite':
+        yield SQLiteChecklistRepository(str(tmp_path / 'dvr.db'))
+    else:
+        supabase = pytest.importorskip('supabase')
+        from fake_supabase import FAKE_KEY, serve
+        from storage import SupabaseChecklistRepository
+        server, _ = serve(0)
+        yield SupabaseChecklistRepository(supabase.create_client(f"http://127.0.0.1:{server.server_address[1]}", FAKE_KEY))
+        server.shutdown()
+
+
+def saved():
+    return {'id': 'c1', 'version': 3, 'ragione_sociale': "ACME", 'sede': "Milano",
+            'luoghi_lavoro': [{'nome': 'Officina'}, {'nome': 'Magazzino'}]}
+
+
+def test_diff_contains_only_the_changed_field():
+    tracker = ChangeTracker(saved())
+    data = dict(saved(), sede="Torino", updated_at="2027-01-01", version=4)
+
+    assert tracker.diff(data) == {'sede': "Torino"}
+
+
+def test_item_changes_count_added_and_removed_elements():
+    tracker = ChangeTracker(saved())
+    patch = tracker.diff(dict(saved(), luoghi_lavoro=[{'nome': 'Officina'}, {'nome': 'Uffici'}, {'nome': 'Piazzale'}]))
+
+    assert list(patch) == ['luoghi_lavoro']
+    assert tracker.item_changes(patch) == {'luoghi_lavoro': {'aggiunti': 2, 'rimossi': 1}}
+
+
+def test_commit_moves_the_reference_forward():
+    tracker = ChangeTracker(saved())
+    data = dict(saved(), sede="Torino")
+    tracker.commit(tracker.diff(data), 4)
+
+    assert tracker.diff(data) == {}
+    assert tracker.version == 4
+
+
+def test_update_writes_the_patch_and_refuses_a_stale_version(repository):
+    row = repository.insert({'ragione_sociale': "ACME", 'sede': "Milano", 'ateco': '25.11'})
+    tracker = ChangeTracker(row)
+
+    version = repository.update(row['id'], tracker.diff(dict(row, sede="Torino")), tracker.version)
+    stored = repository.get(row['id'])
+    assert version == row['version'] + 1 == stored['version']
+    assert (stored['sede'], stored['ragione_sociale'], stored['ateco']) == ("Torino", "ACME", '25.11')
+
+    # Un'altra sessione ferma alla versione precedente non sovrascrive
+    with pytest.raises(ConflictError):
+        repository.update(row['id'], {'ragione_sociale': "Altro"}, row['version'])
+    assert repository.get(row['id'])['ragione_sociale'] == "ACME"
@@ -0,0 +1,82 @@
+import io
+import posixpath
+import zipfile
+from xml.etree import ElementTree
+
+import pytest
+from PIL import Image
+
+from docx_writer import CT_NS, R_NS, REL_NS, DocxTemplate, markdown_to_xml, photo_sections, write_docx
+
+MARKDOWN = "## Capitolo\n\nTesto con **grassetto** e _corsivo_ & simboli <x>.\n\n- voce\n1. passo\n"
+
+
+def photo(size, mode='RGB', fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'white').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def written(photos, fetch):
+    output = io.BytesIO()
+    n = write_docx(output, MARKDOWN, DocxTemplate.default(), photos, fetch=fetch)
+    return n, zipfile.ZipFile(output)
+
+
+def test_package_has_valid_rels_and_content_types_for_every_photo():
+    images = {'a': photo((3000, 2000)), 'b': photo((400, 300), fmt='JPEG'), 'c': photo((50, 80), 'RGBA')}
+    photos = [("Luogo di lavoro: Officina", 'a'), ("Luogo di lavoro: Officina", 'b'),
+              ("Ambienti", 'mancante'), ("Ambienti", 'c')]
+
+    n, package = written(photos, lambda url: images[url])
+
+    assert n == 3
+    names = set(package.namelist())
+    assert {f'word/media/dvr_foto{i}.jpeg' for i in (1, 2, 3)} <= names
+    for i in (1, 2, 3):
+        with Image.open(package.open(f'word/media/dvr_foto{i}.jpeg')) as image:
+            assert image.format == 'JPEG' and max(image.size) <= 1200
+
+    # Ogni immagine citata dal documento ha la sua relazione, e ogni relazione punta a una parte esistente
+    rels = {rel.get('Id'): rel.get('Target') for rel in
+            ElementTree.fromstring(package.read('word/_rels/document.xml.rels')).iter(f'{{{REL_NS}}}Relationship')}
+    document = ElementTree.fromstring(package.read('word/document.xml'))
+    embedded = [blip.get(f'{{{R_NS}}}embed') for blip in document.iter() if blip.tag.endswith('}blip')]
+    assert embedded == ['rIdDvrFoto1', 'rIdDvrFoto2', 'rIdDvrFoto3']
+    for rel_id in embedded:
+        assert posixpath.join('word', rels[rel_id]) in names
+
+    # Ogni parte del pacchetto ha un tipo di contenuto
+    types = ElementTree.fromstring(package.read('[Content_Types].xml'))
+    defaults = {d.get('Extension') for d in types.iter(f'{{{CT_NS}}}Default')}
+    overrides = {o.get('PartName') for o in types.iter(f'{{{CT_NS}}}Override')}
+    for name in names - {'[Content_Types].xml'}:
+        assert f'/{name}' in overrides or name.rsplit('.', 1)[-1] in defaults, name
+
+
+def test_python_docx_reads_text_and_pictures():
+    docx = pytest.importorskip('docx')
+    n, package = written([("Ambienti", 'x')] * 2, lambda url: photo((200, 100)))
+    package.fp.seek(0)
+
+    document = docx.Document(package.fp)
+
+    assert n == 2
+    assert len(document.inline_shapes) == 2
+    text = [p.text for p in document.paragraphs]
+    assert "Capitolo" in text and "Allegato fotografico" in text
+    assert any("grassetto" in t and "& simboli <x>." in t for t in text)
+
+
+def test_markdown_blocks_are_well_formed_xml():
+    body = ''.join(markdown_to_xml(MARKDOWN + "\n| A | B |\n|---|---|\n| 1 | 2 |\n"))
+
+    ElementTree.fromstring(f'<w:body xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">{body}</w:body>')
+
+
+def test_photo_sections_prefer_the_preview():
+    data = {'luoghi_lavoro': [{'nome': 'Officina', 'foto': [{'url': 'u1', 'anteprima': 'p1'}, 'u2']}],
+            'foto_ambienti': [{'url': 'u3'}]}
+
+    assert list(photo_sections(data)) == [("Luogo di lavoro: Officina", 'p1'), ("Luogo di lavoro: Officina", 'u2'),
+                                          ("Ambienti", 'u3')]
@@ -0,0 +1,96 @@
+import threading
+
+from cache import TieredCache
+from dvr_generation import StubWriter, assemble, generate_chapters, plan_chapters, run_stats
+
+
+def checklist():
+    return {
+        'ragione_sociale': "ACME S.r.l.", 'ateco': '25.11',
+        'dipendenti': [{'nome': "Mario", 'cognome': "Rossi", 'mansione': "Saldatore"}],
+        'mansioni': [{'nome': "Saldatore"}, {'nome': "Impiegato"}],
+        'luoghi_lavoro': [{'nome': "Officina"}],
+        'rischi_selezionati': {'Rumore': {'presente': True, 'note': "Molatrici"}, 'Incendio': {'presente': False}},
+    }
+
+
+class FailingWriter(StubWriter):
+    """Stub che fallisce sui capitoli indicati e conta le chiamate contemporanee"""
+
+    def __init__(self, failing=()):
+        super().__init__(latency=0.02)
+        self.failing = failing
+        self.running = self.peak = 0
+        self._lock = threading.Lock()
+
+    def complete(self, system, prompt):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            if any(f in prompt for f in self.failing):
+                raise RuntimeError("quota superata")
+            return super().complete(system, prompt)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def test_plan_has_one_chapter_per_mansione_and_present_risk():
+    keys = [chapter.key for chapter in plan_chapters(checklist())]
+
+    assert keys == ['azienda', 'luoghi', 'mansione:Saldatore', 'mansione:Impiegato', 'rischio:Rumore', 'misure', 'piano']
+
+
+def test_chapters_run_in_parallel_and_a_failure_does_not_stop_the_others():
+    chapters = plan_chapters(checklist())
+    writer = FailingWriter(failing=['"mansione":"Impiegato"'])
+
+    done = list(generate_chapters(writer, chapters, max_workers=4))
+
+    assert len(done) == len(chapters)
+    assert writer.peak > 1
+    failed = [chapter.key for chapter in chapters if chapter.error is not None]
+    assert failed == ['mansione:Impiegato']
+    assert run_stats(chapters)['errori'] == 1
+
+    document = assemble(checklist(), chapters)
+    titles = [line for line in document.splitlines() if line.startswith('## ')]
+    assert titles[0] == "## 1. Anagrafica aziendale" and titles[-1] == "## 7. Programma di miglioramento"
+    assert "generazione non riuscita (quota superata)" in document
+
+
+def test_unchanged_chapters_come_from_the_cache(tmp_path):
+    cache = TieredCache(str(tmp_path))
+    first = plan_chapters(checklist())
+    list(generate_chapters(StubWriter(), first, cache=cache))
+
+    # Cambia solo la nota del rumore: si rigenera il solo capitolo del rischio
+    data = checklist()
+    data['rischi_selezionati']['Rumore']['note'] = "Molatrici e presse"
+    writer = StubWriter()
+    second = plan_chapters(data)
+    list(generate_chapters(writer, second, cache=cache))
+
+    assert [chapter.key for chapter in second if not chapter.cached] == ['rischio:Rumore']
+    assert writer.calls == 1
+    assert [c.text for c in second if c.cached] == [c.text for c in first if c.key != 'rischio:Rumore']
+
+
+def test_cache_key_depends_on_model_and_budget():
+    chapter = plan_chapters(checklist())[0]
+
+    assert chapter.fingerprint('stub') == chapter.fingerprint('stub')
+    assert chapter.fingerprint('stub') != chapter.fingerprint('gpt-4o-mini')
+    assert chapter.fingerprint('stub', 'budget:6000:1') != chapter.fingerprint('stub', 'budget:3000:1')
+
+
+def test_failed_chapters_are_not_cached(tmp_path):
+    cache = TieredCache(str(tmp_path))
+    list(generate_chapters(FailingWriter(failing=['"mansione":"Impiegato"']), plan_chapters(checklist()), cache=cache))
+
+    writer = StubWriter()
+    retried = [chapter for chapter in generate_chapters(writer, plan_chapters(checklist()), cache=cache) if not chapter.cached]
+
+    assert [chapter.key for chapter in retried] == ['mansione:Impiegato']
+    assert retried[0].error is None
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+from employee_import import import_employees
+
+
+def test_csv_with_semicolons_in_cp1252_is_normalized_and_deduplicated():
+    content = ("Cognome;Nome;Qualifica\n"
+               "ROSSI;mario;saldatore\n"
+               "d'angelo;  Lucia ;IMPIEGATA\n"
+               "Rossi;Mario;Saldatore\n"          # ripetuto nel file
+               "Bianchi;Anna;Magazziniere\n"      # già in checklist
+               "Verdi;;Operaio\n"
+               "R2D2;Robot;Operaio\n")
+    result = import_employees(io.BytesIO(content.encode('cp1252')), 'paghe.csv',
+                              existing=[{'cognome': 'Bianchi', 'nome': 'Anna'}], known_mansioni=['Impiegata amministrativa', 'Impiegata'])
+
+    assert [(d['cognome'], d['nome'], d['mansione']) for d in result.dipendenti] == [
+        ("Rossi", "Mario", "Saldatore"), ("D'Angelo", "Lucia", "Impiegata")]
+    assert result.rows == 6
+    assert result.duplicates == 2
+    assert [n for n, _ in result.errors] == [6, 7]
+
+
+def test_nominativo_column_splits_surname_and_name():
+    content = "Nominativo,Mansione\nDE LUCA GIOVANNI,autista\n"
+    result = import_employees(io.BytesIO(content.encode('utf-8')), 'paghe.csv')
+
+    assert result.dipendenti == [{'nome': "Giovanni", 'cognome': "De Luca", 'mansione': "Autista", 'documenti': []}]
+
+
+def test_unknown_header_is_reported_once():
+    result = import_employees(io.BytesIO(b"Matricola,Reparto\n1,A\n"), 'paghe.csv')
+
+    assert result.dipendenti == []
+    assert result.error_count == 1
+
+
+def test_xlsx_is_read_from_the_first_sheet():
+    openpyxl = pytest.importorskip('openpyxl')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Nome", "Cognome", "Mansione"])
+    sheet.append([None, None, None])
+    sheet.append(["Paolo", "Neri", "Carrellista"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+
+    result = import_employees(buffer, 'paghe.xlsx')
+
+    assert [(d['cognome'], d['mansione']) for d in result.dipendenti] == [("Neri", "Carrellista")]
+    assert result.error_count == 0
@@ -0,0 +1,67 @@
+from streamlit.testing.v1 import AppTest
+
+
+def section_app():
+    import streamlit as st
+
+    import fragments
+
+    st.session_state.setdefault('timed', [])
+    st.session_state.setdefault('after', 0)
+
+    def after():
+        st.session_state.after += 1
+
+    @fragments.section('prova', after=after)
+    def body():
+        if not st.session_state.get('rerun_done'):
+            st.session_state.rerun_done = True
+            st.rerun()
+
+    # Esecuzione come il rerun del solo frammento, tempi registrati in una lista
+    original = fragments.in_fragment_rerun, fragments.record_timing
+    fragments.in_fragment_rerun = lambda: True
+    fragments.record_timing = lambda name, start: st.session_state.timed.append(name)
+    try:
+        body()
+    finally:
+        fragments.in_fragment_rerun, fragments.record_timing = original
+
+
+def test_section_records_timing_and_runs_after_when_the_body_reruns():
+    at = AppTest.from_function(section_app).run()
+
+    assert not at.exception
+    # Prima esecuzione interrotta da st.rerun(), poi quella normale
+    assert at.session_state.timed == ['prova', 'prova']
+    assert at.session_state.after == 2
+
+
+def guard_app():
+    import contextlib
+
+    import streamlit as st
+
+    import fragments
+
+    @contextlib.contextmanager
+    def guard():
+        try:
+            yield
+        except LookupError as e:
+            st.session_state.handled = str(e)
+
+    @fragments.section('prova', guard=guard)
+    def body():
+        raise LookupError("sezione cambiata")
+
+    body()
+    st.session_state.after_section = True
+
+
+def test_guard_handles_errors_inside_the_fragment():
+    at = AppTest.from_function(guard_app).run()
+
+    assert not at.exception
+    assert at.session_state.handled == "sezione cambiata"
+    assert at.session_state.after_section
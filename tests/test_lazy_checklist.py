@@ -0,0 +1,61 @@
+import pytest
+
+from checklist_delta import ConflictError
+from lazy_checklist import LazyChecklist, SnapshotStore
+
+
+class Archive:
+    """fetch di get_columns su una checklist che si può salvare tra una lettura e l'altra"""
+
+    def __init__(self):
+        self.version = 1
+        self.calls = []
+
+    def fetch(self, checklist_id, columns):
+        self.calls.append(columns)
+        return dict({c: f"{c} v{self.version}" for c in columns}, id=checklist_id, version=self.version)
+
+
+@pytest.mark.parametrize('store', [None, SnapshotStore()])
+def test_group_of_a_newer_version_is_not_mixed_in(store):
+    archive = Archive()
+    data = LazyChecklist('c1', archive.fetch, store)
+    archive.version = 2     # salvata da un altro utente dopo l'intestazione
+
+    with pytest.raises(ConflictError):
+        data['luoghi_lavoro']
+    assert data['ragione_sociale'] == "ragione_sociale v1"
+    assert 'luoghi_lavoro' not in data.loaded()
+
+
+def test_column_outside_the_groups_does_not_load_everything():
+    archive = Archive()
+    data = LazyChecklist('c1', archive.fetch)
+
+    with pytest.raises(KeyError):
+        data['colonna_sconosciuta']
+    assert data.get('colonna_sconosciuta', 'predefinito') == 'predefinito'
+    assert len(archive.calls) == 1
+
+
+def test_own_saves_move_the_expected_version_forward():
+    archive = Archive()
+    data = LazyChecklist('c1', archive.fetch)
+    saved = {'version': 1}
+    data.current_version = lambda: saved['version']
+    archive.version = saved['version'] = 2     # salvataggio della stessa sessione
+
+    assert data['luoghi_lavoro'] == "luoghi_lavoro v2"
+
+
+def test_shared_sections_follow_the_expected_version():
+    archive = Archive()
+    store = SnapshotStore()
+    LazyChecklist('c1', archive.fetch, store)['luoghi_lavoro']     # sezione v1 condivisa
+    data = LazyChecklist('c1', archive.fetch, store)
+    saved = {'version': 1}
+    data.current_version = lambda: saved['version']
+    archive.version = saved['version'] = 2     # salvataggio della stessa sessione
+
+    assert data['luoghi_lavoro'] == "luoghi_lavoro v2"
+    assert data.loads['luoghi_lavoro'] == 'archivio'
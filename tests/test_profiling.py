@@ -0,0 +1,48 @@
+import threading
+
+import httpx
+
+import profiling
+
+
+def client():
+    return httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=b'x' * 10)))
+
+
+def test_trace_counts_only_the_requests_of_its_own_session():
+    profiling.install_http_hooks()
+    # Tracce aperte insieme, come due sessioni che eseguono lo script in parallelo
+    opened, sent = threading.Barrier(3), threading.Barrier(3)
+    summaries = {}
+
+    def session(name, calls):
+        profiling.start(name)
+        opened.wait()
+        with client() as c:
+            for _ in range(calls):
+                c.post('http://test/', content=b'abc')
+        sent.wait()
+        summaries[name] = profiling.finish()
+
+    threads = [threading.Thread(target=session, args=(name, calls)) for name, calls in (('a', 2), ('b', 5))]
+    for thread in threads:
+        thread.start()
+    opened.wait()
+    # Traffico di un thread senza traccia (upload in background) mentre le sessioni sono aperte
+    with client() as c:
+        c.get('http://test/')
+    sent.wait()
+    for thread in threads:
+        thread.join()
+
+    assert summaries['a']['http_calls'] == 2
+    assert summaries['b']['http_calls'] == 5
+    assert summaries['b']['http_kb'] == round(5 * 13 / 1024, 1)
+
+
+def test_process_counters_still_see_everything():
+    profiling.install_http_hooks()
+    before = profiling.http_counters()['calls']
+    with client() as c:
+        c.get('http://test/')
+    assert profiling.http_counters()['calls'] == before + 1
@@ -0,0 +1,70 @@
+import types
+
+import pytest
+
+import prompt_budget
+from dvr_generation import SYSTEM_PROMPT, Chapter, StubWriter, generate_chapters
+from prompt_budget import ContextBuilder, count_tokens
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    """tiktoken installato ma senza accesso ai file BPE: nessun modello noto, download fallito"""
+    def encoding_for_model(model):
+        raise KeyError(model)
+
+    def get_encoding(name):
+        raise ConnectionError(f"download di {name} non riuscito")
+
+    monkeypatch.setattr(prompt_budget, 'tiktoken', types.SimpleNamespace(encoding_for_model=encoding_for_model,
+                                                                         get_encoding=get_encoding))
+    prompt_budget._encoding.cache_clear()
+    yield
+    prompt_budget._encoding.cache_clear()
+
+
+@pytest.fixture
+def estimate(monkeypatch):
+    """Conteggio con la stima per eccesso, con o senza tiktoken installato"""
+    monkeypatch.setattr(prompt_budget, 'tiktoken', None)
+    prompt_budget._encoding.cache_clear()
+    yield
+    prompt_budget._encoding.cache_clear()
+
+
+def note(words):
+    return ' '.join(f"Nel reparto {i} il carrello elevatore passa vicino alla linea di saldatura." for i in range(words))
+
+
+def test_offline_fallback_encoding_falls_back_to_the_estimate(offline_tiktoken):
+    assert count_tokens("abcdef", 'stub') == 2
+
+    chapter = Chapter('azienda', "Anagrafica aziendale", 'azienda', {'ciclo_lavorativo': note(5)})
+    [done] = generate_chapters(StubWriter(), [chapter], context=ContextBuilder(StubWriter(), tokens=6000))
+    assert done.error is None
+    assert done.tokens is not None
+
+
+def test_fit_brings_a_long_prompt_under_budget(estimate):
+    writer = StubWriter()
+    context = ContextBuilder(writer, tokens=800)
+    chapter = Chapter('azienda', "Anagrafica aziendale", 'azienda', {
+        'ciclo_lavorativo': note(200),
+        'dipendenti': [{'nome': f"N{i}", 'mansione': 'Saldatore'} for i in range(30)],
+    })
+
+    context.fit(chapter, SYSTEM_PROMPT)
+
+    assert chapter.tokens_raw > 800 >= chapter.tokens
+    assert chapter.inputs['organico'] == {'Saldatore': 30}
+    assert writer.calls > 0     # il testo più lungo è stato riassunto
+
+
+def test_shrink_halves_long_lists_with_a_single_placeholder(estimate):
+    context = ContextBuilder(StubWriter(), tokens=50)
+    inputs = {'attrezzature': [{'nome': f"Macchina {i}"} for i in range(8)]}
+
+    assert context._shrink(inputs, excess=10)
+    assert context._shrink(inputs, excess=10)
+
+    assert inputs['attrezzature'] == [{'nome': "Macchina 0"}, {'nome': "Macchina 1"}, {'omessi': 6}]
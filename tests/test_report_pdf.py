@@ -0,0 +1,43 @@
+import base64
+import re
+import zlib
+
+from cache import TieredCache
+from report_pdf import cached_report, render_report
+
+
+def checklist(**fields):
+    return dict({'ragione_sociale': "Rossi & C. S.r.l.", 'ateco': '25.11', 'luoghi_lavoro': [{'nome': 'Officina'}]},
+                **fields)
+
+
+def page_text(pdf):
+    """Metadati e contenuto delle pagine (flussi ASCII85 + Flate di reportlab)"""
+    streams = re.findall(rb'/Filter \[ /ASCII85Decode /FlateDecode \].*?stream\r?\n(.*?)~>', pdf, re.S)
+    return pdf + b''.join(zlib.decompress(base64.a85decode(s.replace(b'\n', b''))) for s in streams)
+
+
+def test_company_name_is_not_escaped_in_footer_and_metadata():
+    text = page_text(render_report(checklist()))
+
+    assert b'(DVR PRO - Rossi & C. S.r.l.)' in text     # piè di pagina (canvas)
+    assert b'/Title (Report sopralluogo Rossi & C. S.r.l.)' in text
+    assert b'&amp;' not in text
+
+
+def test_saved_versions_are_rendered_once(tmp_path):
+    cache = TieredCache(str(tmp_path))
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+
+    data = checklist(foto_ambienti=[{'miniatura': 'https://foto/1.jpg'}])
+    pdf, from_cache = cached_report(cache, 'c1', 3, data, fetch)
+    assert not from_cache
+    assert cached_report(cache, 'c1', 3, data, fetch) == (pdf, True)
+    assert fetched == ['https://foto/1.jpg']
+
+    # Con modifiche non salvate (versione None) il PDF si ridisegna e non va in cache
+    assert not cached_report(cache, 'c1', None, data, fetch)[1]
+    assert not cached_report(cache, 'c1', None, data, fetch)[1]
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from risk_catalog import PrefixTrie, RiskCatalog, ateco_digits
+
+
+def catalog(tmp_path, ateco):
+    path = tmp_path / 'catalogo.json'
+    path.write_text(json.dumps({
+        'versione': 'prova',
+        'rischi': [
+            {'nome': 'Rumore', 'nota': "Generica", 'misure': ["Otoprotettori"]},
+            {'nome': 'Incendio', 'nota': "Materiali combustibili", 'misure': ["Estintori"]},
+            {'nome': 'Cadute dall\'alto', 'nota': "Quota", 'misure': ["Parapetti"]},
+        ],
+        'ateco': ateco,
+    }), encoding='utf-8')
+    return RiskCatalog(str(path))
+
+
+def test_ateco_digits_ignores_dots():
+    assert ateco_digits('25.11.00') == '251100'
+    assert ateco_digits(None) == ''
+
+
+def test_trie_collects_values_of_every_prefix():
+    trie = PrefixTrie()
+    trie.insert('', 'tutti')
+    trie.insert('25', 'metallo')
+    trie.insert('2511', 'strutture')
+    trie.insert('26', 'elettronica')
+
+    assert trie.lookup('251100') == ['tutti', 'metallo', 'strutture']
+    assert trie.lookup('9') == ['tutti']
+
+
+def test_specific_prefix_overrides_note_and_keeps_catalog_order(tmp_path):
+    risks = catalog(tmp_path, [
+        {'prefisso': '', 'descrizione': "Tutti i settori", 'rischi': ['Incendio']},
+        {'prefisso': '25', 'descrizione': "Prodotti in metallo", 'rischi': ['Rumore']},
+        {'prefisso': '25.11', 'descrizione': "Strutture metalliche",
+         'rischi': [{'nome': 'Rumore', 'nota': "Taglio e molatura"}, "Cadute dall'alto"]},
+    ]).suggest('25.11.00')
+
+    assert list(risks) == ['Rumore', 'Incendio', "Cadute dall'alto"]
+    assert risks['Rumore'] == {'nota': "Taglio e molatura", 'misure': ["Otoprotettori"], 'settore': "Strutture metalliche"}
+    assert risks['Incendio']['settore'] == "Tutti i settori"
+
+
+def test_unknown_risk_in_a_sector_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="Vibrazioni"):
+        catalog(tmp_path, [{'prefisso': '25', 'rischi': ['Vibrazioni']}])
+
+
+def test_shipped_catalog_loads():
+    shipped = RiskCatalog()
+
+    assert shipped.version
+    assert set(shipped.suggest('25.11')) <= set(shipped.names)
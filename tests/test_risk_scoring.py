@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+from risk_scoring import GENERALE, RiskMatrix, checklist_axes, risk_class
+
+RISKS = ['Rumore', 'Incendio', 'Chimico']
+MANSIONI = ['Saldatore', 'Magazziniere', 'Impiegato']
+LUOGHI = ['Officina', 'Magazzino']
+
+
+def aggregates(matrix):
+    return (matrix.index.copy(), matrix.classes.copy(), matrix.max_by_risk.copy(), matrix.max_by_mansione.copy(),
+            matrix.max_by_luogo.copy(), matrix.class_counts.copy())
+
+
+def test_incremental_set_matches_a_full_compute():
+    matrix = RiskMatrix(RISKS, MANSIONI, LUOGHI)
+    rng = random.Random(7)
+    for _ in range(200):
+        mansione = rng.choice([None, rng.choice(MANSIONI), rng.sample(MANSIONI, 2)])
+        luogo = rng.choice([None, rng.choice(LUOGHI)])
+        matrix.set(rng.choice(RISKS), mansione, luogo, p=rng.randint(0, 4), d=rng.randint(0, 4))
+
+        incremental = aggregates(matrix)
+        matrix.compute()
+        for got, expected in zip(incremental, aggregates(matrix)):
+            np.testing.assert_array_equal(got, expected)
+
+
+def test_class_boundaries():
+    assert [int(risk_class(r)) for r in (0, 1, 2, 3, 4, 6, 8, 9, 16)] == [0, 1, 1, 2, 2, 3, 3, 4, 4]
+
+
+def test_ranking_and_summary():
+    matrix = RiskMatrix(RISKS, MANSIONI, LUOGHI)
+    matrix.set('Rumore', 'Saldatore', 'Officina', p=4, d=3)
+    matrix.set('Incendio', p=1, d=2)
+
+    ranking = matrix.ranking()
+    assert [r['rischio'] for r in ranking] == ['Rumore', 'Incendio']
+    assert ranking[0] == {'rischio': 'Rumore', 'indice_max': 12, 'indice_medio': 12.0, 'classe': "Molto alto",
+                          'priorita': "Immediata", 'mansioni_esposte': 1, 'luoghi_esposti': 1}
+    assert ranking[1]['mansioni_esposte'] == 3
+    assert matrix.summary() == {"Basso": 6, "Medio": 0, "Alto": 0, "Molto alto": 1}
+
+
+def test_saved_matrix_follows_renamed_axes():
+    matrix = RiskMatrix(RISKS, [], LUOGHI)
+    matrix.set('Chimico', GENERALE, 'Magazzino', p=3, d=2)
+    saved = matrix.to_dict()
+
+    # Dopo il salvataggio: un rischio in meno, le mansioni elencate, un luogo nuovo
+    restored = RiskMatrix.from_dict(saved, ['Chimico', 'Rumore'], ['Saldatore', 'Magazziniere'], ['Magazzino', 'Uffici'])
+
+    assert restored.cell('Chimico', 'Saldatore', 'Magazzino') == (3, 2)
+    assert restored.cell('Chimico', 'Magazziniere', 'Magazzino') == (3, 2)
+    assert restored.cell('Chimico', 'Saldatore', 'Uffici') == (0, 0)
+    assert restored.summary()["Alto"] == 2
+
+
+def test_checklist_axes_keep_present_risks_and_unique_names():
+    axes = checklist_axes({'Rumore': {'presente': True}, 'Incendio': {'presente': False}},
+                          [{'nome': 'Saldatore'}, {'nome': 'Saldatore'}], None)
+
+    assert axes == (['Rumore'], ['Saldatore'], [])
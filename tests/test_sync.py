@@ -0,0 +1,122 @@
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+import storage  # noqa: E402
+from fake_supabase import FAKE_KEY, serve  # noqa: E402
+from storage import SQLiteChecklistRepository, SupabaseChecklistRepository, SyncReconciler  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    supabase = pytest.importorskip('supabase')
+    server, db = serve(0)
+    client = supabase.create_client(f"http://127.0.0.1:{server.server_address[1]}", FAKE_KEY)
+    yield SupabaseChecklistRepository(client), db
+    server.shutdown()
+
+
+def device(tmp_path, name, remote):
+    local = SQLiteChecklistRepository(str(tmp_path / name / 'dvr.db'))
+    return local, SyncReconciler(local, remote)
+
+
+def test_pull_does_not_skip_rows_with_equal_timestamps_across_pages(server, tmp_path, monkeypatch):
+    remote, db = server
+    # Tutte le scritture nello stesso istante, per il server e per il client
+    db.clock = lambda: 1_800_000_000.0
+    monkeypatch.setattr(storage, 'now_iso', lambda: '2027-01-15T08:00:00+00:00')
+    monkeypatch.setattr(storage, 'PULL_PAGE_SIZE', 2)
+    ids = {remote.insert({'ragione_sociale': f"Azienda {i}"})['id'] for i in range(5)}
+
+    local, reconciler = device(tmp_path, 'b', remote)
+    reconciler.sync_once()
+
+    assert reconciler.online
+    assert {row['id'] for row in local.list_recent(10)} == ids
+
+
+def test_pull_is_not_fooled_by_a_client_clock_behind(server, tmp_path):
+    remote, _ = server
+    local, reconciler = device(tmp_path, 'b', remote)
+    remote.insert({'ragione_sociale': "Prima"})
+    reconciler.sync_once()
+
+    # Un dispositivo con l'orologio indietro di un giorno scrive dopo l'ultimo pull
+    late = remote.insert({'ragione_sociale': "Orologio indietro"})
+    remote.update_if_version(late['id'], {'updated_at': '2000-01-01T00:00:00+00:00'}, 1)
+    reconciler.sync_once()
+
+    assert local.get(late['id'])['ragione_sociale'] == "Orologio indietro"
+
+
+def test_insert_retried_after_lost_response_reaches_the_update_path(server, tmp_path, monkeypatch):
+    remote, db = server
+    local, reconciler = device(tmp_path, 'a', remote)
+    checklist_id = local.insert({'ragione_sociale': "Offline"})['id']
+
+    insert_row = remote.insert_row
+
+    def lost_response(row):
+        insert_row(row)     # la riga arriva al server, la risposta no
+        raise httpx.ReadTimeout("risposta persa")
+
+    monkeypatch.setattr(remote, 'insert_row', lost_response)
+    reconciler.sync_once()
+    assert not reconciler.online
+    assert local.pending_count() == 1
+
+    monkeypatch.setattr(remote, 'insert_row', insert_row)
+    with local._conn() as conn:
+        conn.execute('update outbox set next_attempt = 0')
+    reconciler.sync_once()
+
+    assert reconciler.online, reconciler.last_error
+    assert local.pending_count() == 0
+    assert len(db.rows('checklists')) == 1
+    assert remote.get(checklist_id)['ragione_sociale'] == "Offline"
+
+
+def test_pull_rereads_rows_committed_after_a_later_synced_at(server, tmp_path):
+    remote, db = server
+    local, reconciler = device(tmp_path, 'b', remote)
+    db.clock = lambda: 1_800_000_010.0
+    remote.insert({'ragione_sociale': "Commit veloce"})
+    reconciler.sync_once()
+
+    # Transazione iniziata prima (synced_at più basso) ma visibile solo dopo il pull
+    db.clock = lambda: 1_800_000_005.0
+    late = remote.insert({'ragione_sociale': "Commit lento"})
+    reconciler.sync_once()
+
+    assert reconciler.online, reconciler.last_error
+    assert local.get(late['id'])['ragione_sociale'] == "Commit lento"
+
+
+def test_a_failing_checklist_does_not_stop_the_others_or_the_pull(server, tmp_path, monkeypatch):
+    remote, _ = server
+    local, reconciler = device(tmp_path, 'a', remote)
+    rejected = local.insert({'ragione_sociale': "Rifiutata"})['id']
+    accepted = local.insert({'ragione_sociale': "Accettata"})['id']
+    other = remote.insert({'ragione_sociale': "Da un altro dispositivo"})
+
+    insert_row = remote.insert_row
+
+    def reject(row):
+        if row['id'] == rejected:
+            raise ValueError("riga non valida")
+        return insert_row(row)
+
+    monkeypatch.setattr(remote, 'insert_row', reject)
+    reconciler.sync_once()
+
+    assert not reconciler.online
+    assert reconciler.last_error == "riga non valida"
+    assert remote.get(accepted)['ragione_sociale'] == "Accettata"
+    assert remote.get(rejected) is None
+    assert local.pending_count() == 1
+    assert local.get(other['id'])['ragione_sociale'] == "Da un altro dispositivo"
@@ -0,0 +1,66 @@
+import time
+
+from transcription_queue import COMPLETATA, ERRORE, TranscriptionScheduler
+
+
+def wait_done(job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.done
+
+
+def failing_once():
+    calls = []
+
+    def transcribe(audio, filename):
+        calls.append(audio)
+        if len(calls) == 1:
+            raise RuntimeError("whisper non disponibile")
+        return "testo"
+    return transcribe, calls
+
+
+def test_failed_job_retried_on_new_upload():
+    transcribe, calls = failing_once()
+    scheduler = TranscriptionScheduler(transcribe, max_retries=0)
+    job = scheduler.submit('audio:abc', b'audio', 'a.wav', source='file-1')
+    wait_done(job)
+    assert job.status == ERRORE
+
+    retry = scheduler.submit('audio:abc', b'audio', 'a.wav', source='file-2')
+    assert retry is not job
+    wait_done(retry)
+    assert retry.status == COMPLETATA and retry.result == "testo"
+    assert len(calls) == 2
+
+
+def test_failed_job_not_retried_for_same_upload():
+    transcribe, calls = failing_once()
+    scheduler = TranscriptionScheduler(transcribe, max_retries=0)
+    job = scheduler.submit('audio:abc', b'audio', 'a.wav', source='file-1')
+    wait_done(job)
+    assert scheduler.submit('audio:abc', b'audio', 'a.wav', source='file-1') is job
+    assert len(calls) == 1
+
+
+def test_pending_excludes_finished_and_unknown_jobs():
+    scheduler = TranscriptionScheduler(lambda audio, filename: "ok")
+    job = scheduler.submit('audio:1', b'x', 'a.wav')
+    wait_done(job)
+    assert scheduler.pending({'audio:1', 'audio:sconosciuto'}) == set()
+
+
+def test_finished_jobs_have_a_finish_time_and_prune_skips_the_others():
+    scheduler = TranscriptionScheduler(lambda audio, filename: "ok", keep_finished_seconds=0)
+    job = scheduler.submit('audio:1', b'x', 'a.wav')
+    wait_done(job)
+    assert job.finished_at is not None
+
+    # Stato finale visto prima di finished_at (job di un'altra versione o scritto a metà)
+    half_done = scheduler.submit('audio:2', b'y', 'b.wav')
+    wait_done(half_done)
+    half_done.finished_at = None
+    scheduler.submit('audio:3', b'z', 'c.wav')
+    assert scheduler.get('audio:2') is half_done
+    assert scheduler.get('audio:1') is None
@@ -0,0 +1,41 @@
+import logging
+
+import streamlit
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager
+from streamlit.runtime.uploaded_file_manager import UploadedFileRec
+
+from upload_spill import SpillingUploadedFileManager, spill_uploads
+
+
+def test_large_files_go_to_disk_and_come_back(tmp_path):
+    manager = spill_uploads(MemoryUploadedFileManager('/upload'), str(tmp_path), spill_bytes=10)
+
+    assert isinstance(manager, SpillingUploadedFileManager)
+    manager.add_file('s', UploadedFileRec('f1', 'foto.jpg', 'image/jpeg', b'x' * 100))
+    manager.add_file('s', UploadedFileRec('f2', 'nota.txt', 'text/plain', b'breve'))
+    assert manager.spill_stats() == {'file_su_disco': 1, 'byte_su_disco': 100, 'byte_in_memoria': 5}
+    assert [r.data for r in manager.get_files('s', ['f1', 'f2'])] == [b'x' * 100, b'breve']
+
+    manager.remove_session_files('s')
+    assert manager.spill_stats()['file_su_disco'] == 0
+
+
+def test_unverified_streamlit_version_is_logged_and_left_alone(monkeypatch, caplog):
+    monkeypatch.setattr(streamlit, '__version__', '9.0.0')
+    manager = MemoryUploadedFileManager('/upload')
+
+    with caplog.at_level(logging.WARNING, logger='upload_spill'):
+        assert spill_uploads(manager) is None
+
+    assert type(manager) is MemoryUploadedFileManager
+    assert "Streamlit 9.0.0" in caplog.text
+
+
+def test_other_manager_types_are_logged(caplog):
+    class CustomManager(MemoryUploadedFileManager):
+        pass
+
+    with caplog.at_level(logging.WARNING, logger='upload_spill'):
+        assert spill_uploads(CustomManager('/upload')) is None
+
+    assert "CustomManager" in caplog.text
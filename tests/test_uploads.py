@@ -0,0 +1,84 @@
+import io
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+from blobs import BlobStore, blob_hash  # noqa: E402
+from fake_supabase import FAKE_KEY, serve  # noqa: E402
+from storage import InMemoryChecklistRepository, TusUpload  # noqa: E402
+from uploads import PhotoUploader, UploadItem  # noqa: E402
+
+
+class BrokenSession:
+    chunk_size = 4
+
+    def __init__(self):
+        self.closed = False
+
+    def offset(self):
+        raise ConnectionError("rete assente")
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_is_closed_after_the_last_failed_attempt():
+    session = BrokenSession()
+    repository = InMemoryChecklistRepository()
+    repository.open_upload = lambda path, size, content_type=None: session
+    item = UploadItem(io.BytesIO(b'dati'), 'blobs/x.jpg', 4)
+
+    PhotoUploader(repository, max_workers=1, max_retries=1, backoff_seconds=0).upload_batch([item])
+
+    assert item.error == "rete assente"
+    assert session.closed
+
+
+def test_tus_upload_is_recreated_when_the_server_forgot_it():
+    supabase = pytest.importorskip('supabase')
+    server, db = serve(0)
+    try:
+        client = supabase.create_client(f"http://127.0.0.1:{server.server_address[1]}", FAKE_KEY)
+        upload = TusUpload(client, 'blobs/foto.jpg', 8)
+        assert upload.write(b'abcd', upload.offset()) == 4
+        db.uploads.clear()     # upload scaduto sul server
+
+        offset = upload.offset()
+        assert offset == 0
+        assert upload.write(b'abcdefgh', offset) == 8
+        upload.finish()
+        assert db.objects['checklist-files/blobs/foto.jpg'] == b'abcdefgh'
+    finally:
+        server.shutdown()
+
+
+def test_plan_many_streams_files_and_checks_the_storage_in_parallel(tmp_path):
+    repository = InMemoryChecklistRepository()
+    known = [b'gia caricato %d' % i for i in range(4)]
+    for data in known:
+        repository.put_file(f"blobs/{blob_hash(data)[:2]}/{blob_hash(data)}.jpg", data)
+    lookups = threading.Barrier(5, timeout=5)
+    file_url = repository.file_url
+
+    def slow_file_url(path):
+        lookups.wait()      # passa solo se le cinque richieste sono in corso insieme
+        return file_url(path)
+
+    repository.file_url = slow_file_url
+    store = BlobStore(repository, str(tmp_path / 'blobs.db'))
+    path = tmp_path / 'documento.pdf'
+    path.write_bytes(b'x' * 100_000)
+
+    with open(path, 'rb') as source:
+        files = [(data, 'jpg', 'image/jpeg', None, None, None) for data in known]
+        planned = store.plan_many(files + [(source, 'pdf', 'application/pdf', 'documento.pdf', None, None)])
+
+        assert all(isinstance(url, str) for _, url in planned[:4])
+        assert store.stats['byte_risparmiati'] == sum(len(data) for data in known)
+        digest, item = planned[4]
+        assert digest == blob_hash(b'x' * 100_000)
+        assert item.source is source and item.size == 100_000
@@ -0,0 +1,67 @@
+"""Garbage collection dei file caricati che nessuna checklist cita più
+
+Uso:
+    python tools/blob_gc.py --dry-run            # solo conteggio, senza scrivere l'indice
+    python tools/blob_gc.py --grace-days 7
+
+Legge tutte le checklist dall'archivio configurato (DVR_STORAGE, come la app), ricostruisce
+i riferimenti dell'indice locale (BLOB_INDEX_PATH) ed elimina in blocco i blob orfani.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from blobs import BLOB_COLUMNS, BlobStore, checklist_refs  # noqa: E402
+from storage import create_repository  # noqa: E402
+
+
+def all_checklists(repository, page_size=200):
+    """Tutte le checklist, con le sole colonne che possono citare blob"""
+    cursor = None
+    while True:
+        rows, cursor = repository.search(after=cursor, limit=page_size)
+        for row in rows:
+            checklist = repository.get_columns(row['id'], BLOB_COLUMNS)
+            if checklist is not None:
+                yield checklist
+        if cursor is None:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--grace-days', type=float, default=7)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = None
+    backend = os.getenv("DVR_STORAGE", "offline")
+    if backend in ('supabase', 'offline'):
+        from supabase import create_client
+        client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    repository = create_repository(backend, client=client, path=os.getenv("LOCAL_DB_PATH", ".cache/dvr_local.db"))
+    store = BlobStore(repository, os.getenv("BLOB_INDEX_PATH", ".cache/blobs.db"))
+
+    referenced = None
+    if args.dry_run:
+        # Riferimenti contati in memoria: l'indice locale resta com'è
+        referenced = {h for _, _, h in checklist_refs(all_checklists(repository))}
+        hashes = store.refcounts()
+        orphans = sum(1 for h in hashes if h not in referenced)
+    else:
+        store.rebuild_refs(all_checklists(repository))
+        hashes = store.refcounts()
+        orphans = sum(1 for n in hashes.values() if n == 0)
+    print(f"{len(hashes)} blob nell'indice, {orphans} senza riferimenti")
+    removed, size = store.gc(args.grace_days * 24 * 3600, dry_run=args.dry_run, referenced=referenced)
+    action = "da eliminare" if args.dry_run else "eliminati"
+    print(f"{removed} blob {action} ({size / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Esportazione in blocco dei report PDF in un file ZIP
+
+Uso:
+    python tools/export_reports.py --stato completa --dal 2026-01-01 --al 2026-12-31 -o report_2026.zip
+    python tools/export_reports.py --processi 4 -o tutte.zip
+
+Legge le checklist dall'archivio configurato (DVR_STORAGE, come la app). I PDF sono in
+cache per id e versione (REPORT_CACHE_DIR, la stessa della app): una seconda esportazione
+ridisegna solo le checklist modificate nel frattempo.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from batch_export import BatchExporter, select_checklists  # noqa: E402
+from cache import TieredCache  # noqa: E402
+from storage import create_repository  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', required=True, help="file ZIP da scrivere")
+    parser.add_argument('--stato', choices=['bozza', 'completa'])
+    parser.add_argument('--dal', help="data di creazione minima (AAAA-MM-GG)")
+    parser.add_argument('--al', help="data di creazione massima (AAAA-MM-GG)")
+    parser.add_argument('--processi', type=int, default=None)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = None
+    backend = os.getenv("DVR_STORAGE", "offline")
+    if backend in ('supabase', 'offline'):
+        from supabase import create_client
+        client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    repository = create_repository(backend, client=client, path=os.getenv("LOCAL_DB_PATH", ".cache/dvr_local.db"))
+    cache = TieredCache(os.getenv("REPORT_CACHE_DIR", ".cache/report"), max_memory_items=0,
+                        max_disk_bytes=int(os.getenv("REPORT_CACHE_MB", "500")) * 1024 * 1024)
+
+    rows = list(select_checklists(repository, args.stato, args.dal, args.al))
+    print(f"{len(rows)} checklist da esportare")
+    start = time.perf_counter()
+
+    def progress(done, total, row, outcome):
+        print(f"[{done}/{total}] {row.get('ragione_sociale') or row['id']}: {outcome}", flush=True)
+
+    counts = BatchExporter(repository, cache, args.processi).export(rows, args.output, progress)
+    print(f"{args.output}: {counts['generato']} generati, {counts['cache']} dalla cache, "
+          f"{counts['errore']} errori in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
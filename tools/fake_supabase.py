@@ -0,0 +1,341 @@
+"""Sostituto locale dell'API REST di Supabase (sottoinsieme PostgREST) per test e sviluppo offline
+
+Uso:
+    python tools/fake_supabase.py --port 54321
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=<FAKE_KEY> streamlit run app.py
+
+Supporta select/insert/update/delete su tabelle in memoria con filtri eq, neq, gt, gte,
+lt, lte, like, ilike, is, i gruppi logici and=(...)/or=(...), order, limit, offset
+e gli header Prefer return/count. Come il trigger della migrazione, insert e update sulla
+tabella checklists assegnano synced_at con l'orologio del server (db.clock, sostituibile nei test).
+Per lo storage: upload semplice (POST /storage/v1/object/<bucket>/<path>), upload
+riprendibile TUS (/storage/v1/upload/resumable), lettura pubblica (/object/public/...)
+ed eliminazione in blocco, con gli oggetti tenuti in memoria.
+POST /_fake/offline?value=1 simula la perdita di connessione (risposte 503),
+POST /_fake/latency?ms=200 aggiunge latenza a ogni richiesta,
+POST /_fake/fail_rate?value=0.2 fa fallire a metà una parte dei blocchi TUS.
+"""
+import argparse
+import base64
+import fnmatch
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Chiave fittizia in formato JWT (il client supabase rifiuta chiavi non JWT)
+FAKE_KEY = 'eyJhbGciOiJIUzI1NiJ9.e30.ZmFrZQ'
+# Colonne scritte dal database a ogni insert/update (trigger lato server)
+SERVER_TIMESTAMPS = {'checklists': 'synced_at'}
+
+
+class FakeDatabase:
+    """Tabelle in memoria, una lista di righe per tabella"""
+
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.offline = False
+        self.latency = 0.0
+        self.fail_rate = 0.0
+        self.objects = {}   # 'bucket/percorso' -> bytes
+        self.uploads = {}   # id upload TUS -> {'length', 'object', 'data'}
+        self.clock = time.time
+
+    def rows(self, table):
+        return self.tables.setdefault(table, [])
+
+    def stamp(self, table, row):
+        column = SERVER_TIMESTAMPS.get(table)
+        if column:
+            # Larghezza fissa, così l'ordine delle stringhe è quello temporale
+            row[column] = datetime.fromtimestamp(self.clock(), timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+
+def _coerce(value, raw):
+    if raw == 'null':
+        return None
+    if isinstance(value, bool):
+        return raw == 'true'
+    if isinstance(value, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    if isinstance(value, float):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _match(row, column, expr):
+    op, _, raw = expr.partition('.')
+    value = row.get(column)
+    if op == 'is':
+        return value is None if raw == 'null' else str(value).lower() == raw
+    if value is None:
+        return False
+    other = _coerce(value, raw)
+    if op == 'eq':
+        return str(value) == str(other)
+    if op == 'neq':
+        return str(value) != str(other)
+    if op in ('like', 'ilike'):
+        pattern = raw.replace('%', '*')
+        if op == 'ilike':
+            return fnmatch.fnmatch(str(value).lower(), pattern.lower())
+        return fnmatch.fnmatchcase(str(value), pattern)
+    try:
+        return {'gt': value > other, 'gte': value >= other, 'lt': value < other, 'lte': value <= other}[op]
+    except (KeyError, TypeError):
+        return False
+
+
+def _split_terms(body):
+    """Divide 'a.eq.1,or(b.eq.2,c.eq.3)' al primo livello, rispettando parentesi e virgolette"""
+    terms, depth, quoted, start = [], 0, False, 0
+    for i, c in enumerate(body):
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c == '(':
+            depth += 1
+        elif not quoted and c == ')':
+            depth -= 1
+        elif not quoted and c == ',' and depth == 0:
+            terms.append(body[start:i])
+            start = i + 1
+    terms.append(body[start:])
+    return terms
+
+
+def _match_group(row, op, body):
+    """Valuta un gruppo logico PostgREST: op è 'and' oppure 'or', body il contenuto tra parentesi"""
+    results = []
+    for term in _split_terms(body):
+        if term.startswith(('and(', 'or(')):
+            inner_op, _, rest = term.partition('(')
+            results.append(_match_group(row, inner_op, rest[:-1]))
+        else:
+            column, _, expr = term.partition('.')
+            op_name, _, raw = expr.partition('.')
+            results.append(_match(row, column, f"{op_name}.{raw.strip(chr(34))}"))
+    return all(results) if op == 'and' else any(results)
+
+
+class Handler(BaseHTTPRequestHandler):
+    db = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        payload = b'' if body is None else json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _parse(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        params = parse_qsl(url.query, keep_blank_values=True)
+        prefer = self.headers.get('Prefer', '')
+        return parts, params, prefer
+
+    def _raw_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _body(self):
+        return json.loads(self._raw_body() or b'null')
+
+    def _storage(self, method, parts):
+        """Upload semplice e protocollo TUS dello storage"""
+        tus = {'Tus-Resumable': '1.0.0'}
+        if parts[2:4] == ['upload', 'resumable']:
+            if method == 'POST' and len(parts) == 4:
+                metadata = {}
+                for pair in self.headers.get('Upload-Metadata', '').split(','):
+                    key, _, value = pair.partition(' ')
+                    metadata[key] = base64.b64decode(value).decode('utf-8')
+                length = int(self.headers['Upload-Length'])
+                with self.db.lock:
+                    upload_id = f"{len(self.db.uploads) + 1:08d}"
+                    self.db.uploads[upload_id] = {'length': length, 'data': bytearray(),
+                                                  'object': f"{metadata['bucketName']}/{metadata['objectName']}"}
+                    if length == 0:
+                        self.db.objects[self.db.uploads[upload_id]['object']] = b''
+                location = f"http://{self.headers['Host']}/storage/v1/upload/resumable/{upload_id}"
+                return self._send(201, None, dict(tus, Location=location))
+            upload = self.db.uploads.get(parts[4]) if len(parts) == 5 else None
+            if upload is None:
+                return self._send(404, {'message': 'upload non trovato'})
+            if method == 'HEAD':
+                return self._send(200, None, dict(tus, **{'Upload-Offset': str(len(upload['data'])),
+                                                          'Upload-Length': str(upload['length'])}))
+            if method == 'PATCH':
+                chunk = self._raw_body()
+                with self.db.lock:
+                    if int(self.headers['Upload-Offset']) != len(upload['data']):
+                        return self._send(409, {'message': 'offset non valido'})
+                    if self.db.fail_rate and random.random() < self.db.fail_rate:
+                        # Connessione caduta a metà blocco: il server tiene quanto ricevuto
+                        upload['data'] += chunk[:len(chunk) // 2]
+                        return self._send(500, {'message': 'connessione interrotta'})
+                    upload['data'] += chunk
+                    if len(upload['data']) >= upload['length']:
+                        self.db.objects[upload['object']] = bytes(upload['data'])
+                return self._send(204, None, dict(tus, **{'Upload-Offset': str(len(upload['data']))}))
+        if parts[2] == 'object' and parts[3:4] == ['public'] and method in ('GET', 'HEAD'):
+            data = self.db.objects.get('/'.join(parts[4:]))
+            if data is None:
+                return self._send(404, {'message': 'oggetto non trovato'})
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            if method == 'GET':
+                self.wfile.write(data)
+            return
+        if parts[2] == 'object' and method == 'POST':
+            data = self._raw_body()
+            with self.db.lock:
+                self.db.objects['/'.join(parts[3:])] = data
+            return self._send(200, {'Key': '/'.join(parts[3:])})
+        if parts[2] == 'object' and method == 'DELETE' and len(parts) == 4:
+            prefixes = self._body().get('prefixes', [])
+            with self.db.lock:
+                removed = [p for p in prefixes if self.db.objects.pop(f"{parts[3]}/{p}", None) is not None]
+            return self._send(200, [{'name': p} for p in removed])
+        return self._send(404, {'message': f'percorso non supportato: {self.path}'})
+
+    def _filtered(self, rows, params):
+        for column, expr in params:
+            if column in ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns'):
+                continue
+            if column in ('and', 'or'):
+                rows = [r for r in rows if _match_group(r, column, expr[1:-1])]
+            else:
+                rows = [r for r in rows if _match(r, column, expr)]
+        return rows
+
+    def _project(self, rows, params):
+        select = dict(params).get('select', '*')
+        if select == '*':
+            return [dict(r) for r in rows]
+        columns = [c.strip() for c in select.split(',')]
+        return [{c: r.get(c) for c in columns} for r in rows]
+
+    def _handle(self, method):
+        if self.db.latency:
+            time.sleep(self.db.latency)
+        parts, params, prefer = self._parse()
+
+        if parts[0] == '_fake':
+            value = dict(params)
+            if parts[1] == 'offline':
+                self.db.offline = value.get('value', '1') == '1'
+            elif parts[1] == 'latency':
+                self.db.latency = float(value.get('ms', 0)) / 1000
+            elif parts[1] == 'fail_rate':
+                self.db.fail_rate = float(value.get('value', 0))
+            return self._send(200, {'offline': self.db.offline, 'latency_ms': self.db.latency * 1000,
+                                    'fail_rate': self.db.fail_rate})
+
+        if self.db.offline:
+            return self._send(503, {'message': 'offline'})
+        if parts[:2] == ['storage', 'v1']:
+            return self._storage(method, parts)
+        if len(parts) != 3 or parts[:2] != ['rest', 'v1']:
+            return self._send(404, {'message': f'percorso non supportato: {self.path}'})
+
+        table = parts[2]
+        with self.db.lock:
+            rows = self.db.rows(table)
+
+            if method == 'GET':
+                result = self._filtered(rows, params)
+                orders = ','.join(v for k, v in params if k == 'order')
+                for order in reversed(orders.split(',')):
+                    if order:
+                        column, _, direction = order.partition('.')
+                        desc = direction.startswith('desc')
+                        result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+                total = len(result)
+                offset = int(dict(params).get('offset', 0))
+                limit = dict(params).get('limit')
+                result = result[offset:offset + int(limit)] if limit else result[offset:]
+                headers = {'Content-Range': f"{offset}-{offset + len(result) - 1}/{total if 'count=' in prefer else '*'}"}
+                return self._send(200, self._project(result, params), headers)
+
+            if method == 'POST':
+                body = self._body()
+                new_rows = body if isinstance(body, list) else [body]
+                for row in new_rows:
+                    if any(str(r.get('id')) == str(row.get('id')) for r in rows if row.get('id') is not None):
+                        return self._send(409, {'message': 'duplicate key value violates unique constraint'})
+                    row.setdefault('id', len(rows) + 1)
+                    self.db.stamp(table, row)
+                    rows.append(dict(row))
+                body = None if 'return=minimal' in prefer else self._project(new_rows, params)
+                return self._send(201, body)
+
+            matched = self._filtered(rows, params)
+            if method == 'PATCH':
+                changes = self._body()
+                for row in matched:
+                    row.update(changes)
+                    self.db.stamp(table, row)
+            elif method == 'DELETE':
+                self.db.tables[table] = [r for r in rows if r not in matched]
+
+            headers = {'Content-Range': f"0-{len(matched) - 1}/{len(matched)}"}
+            if 'return=minimal' in prefer:
+                return self._send(204, None, headers)
+            return self._send(200, self._project(matched, params), headers)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def do_HEAD(self):
+        self._handle('HEAD')
+
+
+def serve(port=54321, db=None):
+    """Avvia il server in un thread; restituisce (server, database)"""
+    db = db or FakeDatabase()
+    handler = type('BoundHandler', (Handler,), {'db': db})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, db
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=54321)
+    args = parser.parse_args()
+    server, _ = serve(args.port)
+    print(f"Fake Supabase REST su http://127.0.0.1:{args.port}, SUPABASE_KEY={FAKE_KEY} (Ctrl+C per uscire)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
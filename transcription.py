@@ -0,0 +1,40 @@
+"""Trascrizione audio con Whisper, con cache sul contenuto del file"""
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_preprocess import PREPROCESS_VERSION, preprocess_audio
+from cache import content_key
+
+WHISPER_MODEL = "whisper-1"
+WHISPER_LANGUAGE = "it"
+MAX_CHUNK_WORKERS = 4
+
+
+def transcribe_bytes(client, cache, audio_bytes, filename, model=WHISPER_MODEL, language=WHISPER_LANGUAGE):
+    """Trascrive i bytes audio, riusando la trascrizione se lo stesso clip è già stato inviato"""
+    key = content_key(audio_bytes, model, language, PREPROCESS_VERSION)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached.decode('utf-8')
+
+    text = transcribe_chunks(client, preprocess_audio(audio_bytes, filename), model, language)
+    cache.put(key, text.encode('utf-8'))
+    return text
+
+
+def transcribe_chunks(client, chunks, model=WHISPER_MODEL, language=WHISPER_LANGUAGE):
+    """Trascrive i chunk in parallelo e ricompone il testo nell'ordine originale"""
+    def transcribe(chunk):
+        chunk_bytes, chunk_name = chunk
+        transcript = client.audio.transcriptions.create(
+            model=model,
+            file=(chunk_name, chunk_bytes),
+            language=language
+        )
+        return transcript.text.strip()
+
+    if len(chunks) <= 1:
+        return transcribe(chunks[0]) if chunks else ''
+
+    with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_CHUNK_WORKERS)) as pool:
+        texts = list(pool.map(transcribe, chunks))
+    return ' '.join(t for t in texts if t)
@@ -0,0 +1,116 @@
+"""Coda di trascrizioni in background con pool di thread limitato"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Stati di un job
+IN_CODA = 'in_coda'
+IN_CORSO = 'in_corso'
+COMPLETATA = 'completata'
+ERRORE = 'errore'
+
+
+class TranscriptionJob:
+    """Singola richiesta di trascrizione"""
+
+    def __init__(self, job_id, audio_bytes, filename, key, source=None):
+        self.id = job_id
+        self.source = source    # caricamento da cui arriva l'audio (es. file_id del widget)
+        self.audio_bytes = audio_bytes
+        self.filename = filename
+        self.key = key
+        self.status = IN_CODA
+        self.result = None
+        self.error = None
+        self.attempts = 0
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in (COMPLETATA, ERRORE)
+
+
+class TranscriptionScheduler:
+    """Esegue le trascrizioni in parallelo, con limite di concorrenza per chiave e retry con backoff"""
+
+    def __init__(self, transcribe_fn, max_workers=4, per_key_limit=2, max_retries=3,
+                 backoff_seconds=1.0, keep_finished_seconds=3600):
+        self.transcribe_fn = transcribe_fn
+        self.per_key_limit = per_key_limit
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.keep_finished_seconds = keep_finished_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trascrizioni')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._waiting = {}   # chiave -> deque di job in attesa di uno slot
+        self._running = {}   # chiave -> numero di job in esecuzione
+
+    def submit(self, job_id, audio_bytes, filename, key='default', source=None):
+        """Accoda un job; se lo stesso job_id esiste già restituisce quello.
+
+        Un job fallito viene ritentato solo se l'audio arriva da un altro caricamento
+        (source diverso): lo stesso file rimasto nel widget non riparte a ogni rerun.
+        """
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is not None and not (job.status == ERRORE and source != job.source):
+                return job
+
+            job = TranscriptionJob(job_id, audio_bytes, filename, key, source)
+            self._jobs[job_id] = job
+            self._waiting.setdefault(key, deque()).append(job)
+            self._dispatch(key)
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self, job_ids):
+        """Sottoinsieme dei job indicati non ancora terminati"""
+        with self._lock:
+            return {job_id for job_id in job_ids if job_id in self._jobs and not self._jobs[job_id].done}
+
+    def _dispatch(self, key):
+        # Chiamato con il lock acquisito
+        waiting = self._waiting.get(key)
+        while waiting and self._running.get(key, 0) < self.per_key_limit:
+            job = waiting.popleft()
+            self._running[key] = self._running.get(key, 0) + 1
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        job.status = IN_CORSO
+        while True:
+            job.attempts += 1
+            try:
+                job.result = self.transcribe_fn(job.audio_bytes, job.filename)
+                status = COMPLETATA
+                break
+            except Exception as e:
+                if job.attempts > self.max_retries:
+                    job.error = str(e)
+                    status = ERRORE
+                    break
+                # Backoff esponenziale con jitter
+                delay = self.backoff_seconds * (2 ** (job.attempts - 1))
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+        job.audio_bytes = None
+        # finished_at prima dello stato finale: _prune() considera solo i job terminati
+        job.finished_at = time.time()
+        job.status = status
+        with self._lock:
+            self._running[job.key] -= 1
+            self._dispatch(job.key)
+
+    def _prune(self):
+        # Rimuove i job terminati da troppo tempo (chiamato con il lock acquisito)
+        limit = time.time() - self.keep_finished_seconds
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.done and j.finished_at is not None and j.finished_at < limit]:
+            del self._jobs[job_id]
@@ -0,0 +1,118 @@
+"""File caricati nei widget di Streamlit tenuti su file temporanei invece che nella memoria del server"""
+import logging
+import os
+import tempfile
+import threading
+import uuid
+
+import streamlit
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager
+
+SPILL_BYTES = 256 * 1024    # sotto questa soglia il file resta in memoria
+# Versioni di Streamlit di cui è verificato il gestore in memoria (file_storage, add_file, get_files...)
+SUPPORTED_STREAMLIT = ('1.40',)
+
+logger = logging.getLogger(__name__)
+
+
+class SpillingUploadedFileManager(MemoryUploadedFileManager):
+    """Gestore dei file caricati che scrive su disco quelli oltre spill_bytes.
+
+    Streamlit conserva ogni file caricato per tutta la sessione, anche dopo che l'app lo ha
+    elaborato, finché l'utente non lo toglie dal widget. Qui i byte stanno in un file
+    temporaneo e tornano in memoria solo nei rerun che leggono il widget; i file vengono
+    cancellati con la rimozione dal widget o alla chiusura della sessione.
+    Si installa sul gestore del server già avviato con spill_uploads().
+    """
+
+    def _init_spill(self, directory, spill_bytes):
+        self.spill_bytes = spill_bytes
+        self._spill_dir = tempfile.TemporaryDirectory(prefix='upload_', dir=directory)
+        self._spilled = {}
+        self._spill_lock = threading.Lock()
+
+    def add_file(self, session_id, file):
+        if len(file.data) > self.spill_bytes:
+            path = os.path.join(self._spill_dir.name, uuid.uuid4().hex)
+            with open(path, 'wb') as f:
+                f.write(file.data)
+            with self._spill_lock:
+                self._spilled[(session_id, file.file_id)] = (path, len(file.data))
+            file = file._replace(data=b'')
+        super().add_file(session_id, file)
+
+    def get_files(self, session_id, file_ids):
+        records = []
+        for record in super().get_files(session_id, file_ids):
+            with self._spill_lock:
+                spilled = self._spilled.get((session_id, record.file_id))
+            if spilled is not None:
+                try:
+                    with open(spilled[0], 'rb') as f:
+                        record = record._replace(data=f.read())
+                except FileNotFoundError:
+                    continue    # rimosso nel frattempo: Streamlit lo tratta come file cancellato
+            records.append(record)
+        return records
+
+    def spilled_path(self, session_id, file_id):
+        """File temporaneo con i byte del file caricato, None se è rimasto in memoria"""
+        with self._spill_lock:
+            spilled = self._spilled.get((session_id, file_id))
+        return spilled[0] if spilled is not None else None
+
+    def remove_file(self, session_id, file_id):
+        super().remove_file(session_id, file_id)
+        with self._spill_lock:
+            spilled = self._spilled.pop((session_id, file_id), None)
+        if spilled is not None:
+            _unlink(spilled[0])
+
+    def remove_session_files(self, session_id):
+        super().remove_session_files(session_id)
+        with self._spill_lock:
+            keys = [key for key in self._spilled if key[0] == session_id]
+            paths = [self._spilled.pop(key)[0] for key in keys]
+        for path in paths:
+            _unlink(path)
+
+    def spill_stats(self):
+        """File e byte su disco, byte dei file rimasti in memoria"""
+        with self._spill_lock:
+            on_disk = list(self._spilled.values())
+        in_memory = sum(len(record.data) for files in list(self.file_storage.values()) for record in list(files.values()))
+        return {'file_su_disco': len(on_disk), 'byte_su_disco': sum(size for _, size in on_disk),
+                'byte_in_memoria': in_memory}
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def spill_uploads(manager, directory=None, spill_bytes=SPILL_BYTES):
+    """Trasforma il gestore in memoria di Streamlit in uno che scrive su disco; None se non è quello previsto.
+
+    Il gestore è condiviso dal server, dalle sessioni e dagli script in esecuzione, quindi
+    non si può sostituire: se ne cambia la classe. Dipende dagli interni del gestore, per
+    questo si installa solo sulle versioni di Streamlit verificate (SUPPORTED_STREAMLIT);
+    altrimenti gli upload restano in memoria e lo si segnala nel log. I file già caricati
+    restano in memoria.
+    """
+    if isinstance(manager, SpillingUploadedFileManager):
+        return manager
+    version = '.'.join(streamlit.__version__.split('.')[:2])
+    if version not in SUPPORTED_STREAMLIT:
+        logger.warning("Upload su disco non attivo: Streamlit %s non è tra le versioni verificate (%s), "
+                       "i file caricati restano in memoria", streamlit.__version__, ', '.join(SUPPORTED_STREAMLIT))
+        return None
+    if type(manager) is not MemoryUploadedFileManager or not isinstance(getattr(manager, 'file_storage', None), dict):
+        logger.warning("Upload su disco non attivo: gestore dei file %s.%s invece di MemoryUploadedFileManager, "
+                       "i file caricati restano in memoria", type(manager).__module__, type(manager).__qualname__)
+        return None
+    # Attributi prima della classe: il server può ricevere un file in qualunque momento
+    SpillingUploadedFileManager._init_spill(manager, directory, spill_bytes)
+    manager.__class__ = SpillingUploadedFileManager
+    return manager
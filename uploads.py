@@ -0,0 +1,95 @@
+"""Caricamento dei file nello storage: pool limitato, blocchi riprendibili e riepilogo per lotto"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class UploadItem:
+    """File da caricare: sorgente leggibile a blocchi (seek/read) e percorso di destinazione"""
+
+    def __init__(self, source, path, size, content_type=None, name=None):
+        self.source = source
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.name = name or path.rsplit('/', 1)[-1]
+        self.url = None
+        self.error = None
+        self.attempts = 0
+
+
+class BatchResult:
+    """Esito di un lotto: URL nell'ordine dei file (None per quelli falliti) e throughput"""
+
+    def __init__(self, items, seconds):
+        self.items = items
+        self.seconds = seconds
+
+    @property
+    def urls(self):
+        return [item.url for item in self.items]
+
+    @property
+    def failures(self):
+        return [item for item in self.items if item.error]
+
+    @property
+    def retries(self):
+        return sum(max(item.attempts - 1, 0) for item in self.items)
+
+    @property
+    def megabytes(self):
+        return sum(item.size for item in self.items if item.url) / (1024 * 1024)
+
+    @property
+    def mb_per_s(self):
+        return self.megabytes / self.seconds if self.seconds else 0.0
+
+
+class PhotoUploader:
+    """Carica lotti di file in parallelo con un pool condiviso tra le sessioni.
+
+    Ogni file viaggia a blocchi attraverso la sessione di upload del repository
+    (ChecklistRepository.open_upload); dopo un errore si riprende dall'offset che la
+    destinazione dichiara di aver ricevuto, con backoff esponenziale e jitter.
+    """
+
+    def __init__(self, repository, max_workers=4, max_retries=4, backoff_seconds=0.5):
+        self.repository = repository
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+
+    def upload_batch(self, items, progress=None):
+        """Carica i file e attende la fine del lotto; progress(completati, totale) dopo ogni file"""
+        start = time.perf_counter()
+        futures = [self._executor.submit(self._upload, item) for item in items]
+        for done, _ in enumerate(as_completed(futures), start=1):
+            if progress:
+                progress(done, len(futures))
+        return BatchResult(items, time.perf_counter() - start)
+
+    def _upload(self, item):
+        session = None
+        try:
+            while True:
+                item.attempts += 1
+                try:
+                    if session is None:
+                        session = self.repository.open_upload(item.path, item.size, item.content_type)
+                    offset = session.offset()
+                    while offset < item.size:
+                        item.source.seek(offset)
+                        offset = session.write(item.source.read(session.chunk_size), offset)
+                    item.url = session.finish()
+                    item.error = None
+                    return
+                except Exception as e:
+                    item.error = str(e) or type(e).__name__
+                    if item.attempts > self.max_retries:
+                        return
+                    time.sleep(self.backoff_seconds * 2 ** (item.attempts - 1) * (0.5 + random.random()))
+        finally:
+            # Anche dopo l'ultimo tentativo fallito: la sessione tiene connessioni o buffer
+            if session is not None:
+                session.close()